@@ -11,6 +11,7 @@ import json
 from django.contrib.auth.models import User
 from core.models import UserProfile
 from ai_chatbot.models import ChatSession, ChatMessage, FarmerQuery, AIKnowledgeBase
+from farmer_problems import reputation
 from farmer_problems.models import FarmerProblem as Problem, Solution, ExpertProfile
 # Community functionality removed
 from schemes.models import GovernmentScheme
@@ -362,12 +363,8 @@ def delete_problem(request, problem_id):
 def accept_solution(request, solution_id):
     """Accept a solution"""
     if request.method == 'POST':
-        solution = get_object_or_404(Solution, id=solution_id)
-        solution.is_accepted = True
-        solution.problem.status = 'solved'
-        solution.problem.solved_at = timezone.now()
-        solution.problem.save()
-        solution.save()
+        solution = get_object_or_404(Solution.objects.select_related('problem'), id=solution_id)
+        reputation.accept_solution(solution)
         
         return JsonResponse({'success': True})
     
@@ -13,6 +13,9 @@ class ChatSession(models.Model):
     
     class Meta:
         ordering = ['-updated_at']
+        indexes = [
+            models.Index(fields=['updated_at'], name='chat_session_updated_idx'),
+        ]
     
     def __str__(self):
         return f"Chat Session {self.session_id} - {self.user.username}"
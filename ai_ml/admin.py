@@ -8,8 +8,9 @@ from django.urls import reverse
 from django.utils.safestring import mark_safe
 from .models import (
     AIModel, Prediction, ComputerVisionAnalysis, 
-    Recommendation, TrainingJob, DataSource
+    Recommendation, TrainingJob, DataSource, ModelEvaluation
 )
+from . import progress
 
 
 @admin.register(AIModel)
@@ -229,8 +230,8 @@ class TrainingJobAdmin(admin.ModelAdmin):
     """Admin interface for AI model training jobs."""
     
     list_display = [
-        'model', 'user', 'status', 'progress_percentage', 
-        'current_epoch', 'total_epochs', 'started_at', 'duration'
+        'model', 'user', 'status', 'live_progress', 
+        'live_epoch', 'total_epochs', 'started_at', 'duration'
     ]
     
     list_filter = [
@@ -242,7 +243,7 @@ class TrainingJobAdmin(admin.ModelAdmin):
     list_editable = ['status']
     
     readonly_fields = [
-        'id', 'created_at', 'updated_at', 'duration'
+        'id', 'created_at', 'updated_at', 'duration', 'live_progress', 'live_epoch'
     ]
     
     fieldsets = (
@@ -254,7 +255,7 @@ class TrainingJobAdmin(admin.ModelAdmin):
             'classes': ('collapse',)
         }),
         ('Progress', {
-            'fields': ('progress_percentage', 'current_epoch', 'total_epochs')
+            'fields': ('live_progress', 'live_epoch', 'total_epochs')
         }),
         ('Performance', {
             'fields': ('training_loss', 'validation_loss', 'training_accuracy', 'validation_accuracy'),
@@ -272,6 +273,26 @@ class TrainingJobAdmin(admin.ModelAdmin):
     
     actions = ['cancel_jobs', 'restart_jobs', 'cleanup_completed']
     
+    def get_changelist_instance(self, request):
+        changelist = super().get_changelist_instance(request)
+        # One cache read for the whole page instead of two per row
+        live = progress.live_many(changelist.result_list)
+        for job in changelist.result_list:
+            job._live_progress = live[job.pk]
+        return changelist
+    
+    def _live(self, obj):
+        return getattr(obj, '_live_progress', None) or progress.live(obj)
+    
+    def live_progress(self, obj):
+        """Progress of running jobs comes from the cache (or the throttled row writes, see ai_ml.progress)."""
+        return f"{self._live(obj)['progress_percentage']:.1f}%"
+    live_progress.short_description = "Progress"
+    
+    def live_epoch(self, obj):
+        return self._live(obj)['current_epoch']
+    live_epoch.short_description = "Current epoch"
+    
     def cancel_jobs(self, request, queryset):
         """Cancel selected training jobs."""
         updated = queryset.filter(status='running').update(status='cancelled')
@@ -347,6 +368,28 @@ class DataSourceAdmin(admin.ModelAdmin):
     update_quality_scores.short_description = "Update quality scores"
 
 
+@admin.register(ModelEvaluation)
+class ModelEvaluationAdmin(admin.ModelAdmin):
+    """Admin interface for the model quality time series."""
+    
+    list_display = [
+        'window_end', 'model', 'model_version', 'recommendation_type', 'samples',
+        'quality', 'baseline', 'drift', 'retrain_triggered'
+    ]
+    
+    list_filter = ['model', 'recommendation_type', 'retrain_triggered', 'window_end']
+    
+    readonly_fields = [
+        'model', 'model_version', 'recommendation_type', 'window_start', 'window_end', 'samples',
+        'quality', 'metrics', 'baseline', 'drift', 'retrain_triggered', 'created_at'
+    ]
+    
+    date_hierarchy = 'window_end'
+    
+    def has_add_permission(self, request):
+        return False
+
+
 # Customize admin site
 admin.site.site_header = "Farmazee Enterprise Admin"
 admin.site.site_title = "Farmazee Admin Portal"
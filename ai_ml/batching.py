@@ -0,0 +1,250 @@
+"""
+Micro-batched predictions
+
+Scoring one row per call spends most of its time outside the model: the
+Python and NumPy call overhead and a database round trip per Prediction.
+``MicroBatcher`` collects concurrent requests per (model, prediction type)
+until ``AI_BATCH_MAX_SIZE`` requests are waiting or the oldest has waited
+``AI_BATCH_MAX_WAIT_MS``, scores them with one vectorized model call,
+bulk-inserts their Prediction rows and hands each caller its own result.
+Requests that ``prediction_cache`` can answer skip the model and the wait.
+
+Requests only share a batch when they are submitted concurrently from the
+same process, so the ``ai_ml`` queue should run a thread pool, e.g.
+``celery -A farmazee worker -Q ai_ml -P threads -c 32``; under prefork a
+request waits at most the window and is scored alone. Producers that have
+many requests at once use ``make_predictions`` instead, which scores the
+whole list in batches without waiting. Requests made inside a transaction
+are scored inline.
+
+``benchmark_predictions`` compares row-at-a-time and batched throughput.
+"""
+
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+from simple_history.utils import bulk_create_with_history
+
+from . import inference, prediction_cache
+from .models import Prediction
+
+logger = logging.getLogger(__name__)
+
+PREDICTION_TTL = timedelta(days=30)
+
+
+def _max_batch():
+    return getattr(settings, 'AI_BATCH_MAX_SIZE', 64)
+
+
+def _max_wait():
+    return getattr(settings, 'AI_BATCH_MAX_WAIT_MS', 20) / 1000
+
+
+class PredictionRequest:
+    __slots__ = ('user_id', 'input_data', 'prediction_type', 'future', 'input_hash', 'checked')
+
+    def __init__(self, user_id, input_data, prediction_type, input_hash=None, checked=False):
+        self.user_id = user_id
+        self.input_data = input_data
+        self.prediction_type = prediction_type
+        self.future = Future()
+        self.input_hash = input_hash
+        self.checked = checked      # already looked up in the prediction cache
+
+
+def run_batch(ai_model, prediction_type, requests):
+    """
+    Answer requests for one model and prediction type: still-valid results
+    from the prediction cache, the rest scored in a single model call (once
+    per distinct input) and bulk-inserted. Returns one result dict per
+    request.
+    """
+    for request in requests:
+        if request.input_hash is None:
+            request.input_hash = prediction_cache.input_hash(ai_model, prediction_type, request.input_data)
+    found = prediction_cache.lookup(request.input_hash for request in requests if not request.checked)
+
+    to_score = {}
+    for request in requests:
+        if request.input_hash not in found:
+            to_score.setdefault(request.input_hash, request)
+    new = {}
+    if to_score:
+        scored = inference.predict_many(ai_model, prediction_type, [request.input_data for request in to_score.values()])
+        expires_at = timezone.now() + PREDICTION_TTL
+        predictions = [
+            Prediction(
+                model=ai_model,
+                user_id=request.user_id,
+                prediction_type=prediction_type,
+                input_data=request.input_data,
+                input_hash=request.input_hash,
+                prediction_result=result,
+                confidence_score=confidence_score,
+                confidence_level=inference.confidence_level(confidence_score),
+                expires_at=expires_at,
+            )
+            for request, (result, confidence_score) in zip(to_score.values(), scored)
+        ]
+        bulk_create_with_history(predictions, Prediction, batch_size=500)
+        new = {
+            prediction.input_hash: prediction_cache.result_dict(
+                prediction.id, prediction.confidence_score, prediction.prediction_result, prediction.expires_at,
+            )
+            for prediction in predictions
+        }
+        prediction_cache.store(new)
+
+    results = []
+    for request in requests:
+        if request.input_hash in found:
+            results.append(dict(found[request.input_hash], cached=True))
+        else:
+            results.append(dict(new[request.input_hash], cached=to_score[request.input_hash] is not request))
+    # lookup counted each distinct input once; repeats within the batch are hits too
+    prediction_cache.record(hits=len(requests) - len(to_score) - len(
+        {request.input_hash for request in requests if request.input_hash in found}
+    ))
+    return results
+
+
+class MicroBatcher:
+    """Collects concurrent prediction requests and scores them in batches"""
+
+    def __init__(self, max_batch=None, max_wait=None):
+        self._max_batch = max_batch
+        self._max_wait = max_wait
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._cond = threading.Condition()
+        self._pending = {}      # (model id, prediction type) -> [PredictionRequest]
+        self._oldest = {}       # key -> monotonic time of its first pending request
+        self._models = {}       # key -> latest AIModel instance submitted
+        self._thread = None
+        self.batches = self.requests = 0
+
+    @property
+    def max_batch(self):
+        return self._max_batch or _max_batch()
+
+    @property
+    def max_wait(self):
+        return self._max_wait if self._max_wait is not None else _max_wait()
+
+    def submit(self, ai_model, user_id, input_data, prediction_type, input_hash=None):
+        """
+        Queue a request; returns a Future of its result dict. Pass the
+        input_hash of a request that was already looked up in the cache.
+        """
+        if self._pid != os.getpid():     # forked: the parent's thread and lock are not ours
+            self._reset()
+        request = PredictionRequest(user_id, input_data, prediction_type, input_hash, checked=input_hash is not None)
+        key = (ai_model.pk, prediction_type)
+        with self._cond:
+            queue = self._pending.setdefault(key, [])
+            if not queue:
+                self._oldest[key] = time.monotonic()
+            queue.append(request)
+            self._models[key] = ai_model
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='prediction-batcher', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+        return request.future
+
+    def predict(self, ai_model, user_id, input_data, prediction_type, timeout=30, input_hash=None):
+        return self.submit(ai_model, user_id, input_data, prediction_type, input_hash).result(timeout)
+
+    def _take_ready(self):
+        """Pop the batches that are full or old enough; else how long to wait"""
+        now = time.monotonic()
+        ready, wait = [], None
+        for key in list(self._pending):
+            queue = self._pending[key]
+            remaining = self._oldest[key] + self.max_wait - now
+            if len(queue) >= self.max_batch or remaining <= 0:
+                batch, self._pending[key] = queue[:self.max_batch], queue[self.max_batch:]
+                ready.append((self._models[key], key[1], batch))
+                if self._pending[key]:
+                    self._oldest[key] = now
+                else:
+                    del self._pending[key], self._oldest[key], self._models[key]
+            else:
+                wait = remaining if wait is None else min(wait, remaining)
+        return ready, wait
+
+    def _run(self):
+        while True:
+            with self._cond:
+                ready, wait = self._take_ready()
+                while not ready:
+                    self._cond.wait(wait)
+                    ready, wait = self._take_ready()
+            close_old_connections()
+            for ai_model, prediction_type, batch in ready:
+                self._score(ai_model, prediction_type, batch)
+
+    def _score(self, ai_model, prediction_type, batch):
+        try:
+            results = run_batch(ai_model, prediction_type, batch)
+        except Exception as exc:
+            logger.error(f"Prediction batch of {len(batch)} for model {ai_model.pk} failed: {exc}")
+            for request in batch:
+                request.future.set_exception(exc)
+            return
+        self.batches += 1
+        self.requests += len(batch)
+        for request, result in zip(batch, results):
+            request.future.set_result(result)
+
+
+batcher = MicroBatcher()
+
+
+def predict(ai_model, user_id, input_data, prediction_type, timeout=30):
+    """
+    Score one request as part of whatever batch it lands in. Inside a
+    transaction it is scored inline: the batching thread could not see rows
+    the caller has not committed yet.
+    """
+    digest = prediction_cache.input_hash(ai_model, prediction_type, input_data)
+    found = prediction_cache.lookup([digest])
+    if digest in found:
+        return dict(found[digest], cached=True)     # no need to wait for a batch
+    if connection.in_atomic_block:
+        request = PredictionRequest(user_id, input_data, prediction_type, digest, checked=True)
+        return run_batch(ai_model, prediction_type, [request])[0]
+    return batcher.predict(ai_model, user_id, input_data, prediction_type, timeout, digest)
+
+
+def predict_all(ai_model, requests):
+    """
+    Score a list of {'user_id', 'input_data', 'prediction_type'} requests now,
+    in batches of AI_BATCH_MAX_SIZE per prediction type, in one transaction.
+    Results keep the order of requests.
+    """
+    results = [None] * len(requests)
+    by_type = {}
+    for position, request in enumerate(requests):
+        by_type.setdefault(request['prediction_type'], []).append(position)
+    with transaction.atomic():
+        for prediction_type, positions in by_type.items():
+            for start in range(0, len(positions), _max_batch()):
+                chunk = positions[start:start + _max_batch()]
+                batch = [
+                    PredictionRequest(requests[n]['user_id'], requests[n]['input_data'], prediction_type)
+                    for n in chunk
+                ]
+                for position, result in zip(chunk, run_batch(ai_model, prediction_type, batch)):
+                    results[position] = result
+    return results
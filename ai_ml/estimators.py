@@ -0,0 +1,131 @@
+"""
+NumPy estimators for the tabular models
+
+Small, picklable models trained by ``ai_ml.training`` and served through the
+model registry like any other ``.pkl`` artifact. They follow the familiar
+``fit``/``predict``/``predict_proba`` interface. This module imports nothing
+from Django, so process-pool workers can unpickle them and run
+``evaluate`` under any multiprocessing start method.
+
+* ``RidgeRegressor``: L2-regularized least squares on standardized
+  features, optionally with squared terms (``degree=2``), solved in closed
+  form.
+* ``LogisticClassifier``: binary logistic regression on the same features,
+  fitted by full-batch gradient descent.
+"""
+
+import numpy as np
+
+
+class _Standardized:
+    """Shared feature handling: standardize, then optionally add squares"""
+
+    def __init__(self, alpha=1.0, degree=1):
+        self.alpha = alpha
+        self.degree = degree
+
+    def get_params(self):
+        return {'alpha': self.alpha, 'degree': self.degree}
+
+    def _fit_scaling(self, X):
+        self.mean_ = X.mean(axis=0)
+        scale = X.std(axis=0)
+        self.scale_ = np.where(scale > 0, scale, 1.0)
+
+    def _design(self, X):
+        Z = (np.asarray(X, dtype=np.float64) - self.mean_) / self.scale_
+        if self.degree >= 2:
+            Z = np.hstack([Z, Z ** 2])
+        return Z
+
+
+class RidgeRegressor(_Standardized):
+
+    def fit(self, X, y):
+        X, y = np.asarray(X, dtype=np.float64), np.asarray(y, dtype=np.float64)
+        self._fit_scaling(X)
+        Z = self._design(X)
+        z_mean = Z.mean(axis=0)
+        Zc = Z - z_mean
+        self.intercept_ = y.mean()
+        self.coef_ = np.linalg.solve(Zc.T @ Zc + self.alpha * np.eye(Z.shape[1]), Zc.T @ (y - self.intercept_))
+        self.intercept_ -= z_mean @ self.coef_
+        return self
+
+    def predict(self, X):
+        return self._design(X) @ self.coef_ + self.intercept_
+
+
+class LogisticClassifier(_Standardized):
+
+    def __init__(self, alpha=1.0, degree=1, learning_rate=0.5, max_iter=300):
+        super().__init__(alpha, degree)
+        self.learning_rate = learning_rate
+        self.max_iter = max_iter
+
+    def get_params(self):
+        return dict(super().get_params(), learning_rate=self.learning_rate, max_iter=self.max_iter)
+
+    def fit(self, X, y):
+        X, y = np.asarray(X, dtype=np.float64), np.asarray(y, dtype=np.float64)
+        self._fit_scaling(X)
+        Z = self._design(X)
+        n = len(y)
+        self.coef_ = np.zeros(Z.shape[1])
+        prior = np.clip(y.mean(), 1e-6, 1 - 1e-6)
+        self.intercept_ = np.log(prior / (1 - prior))
+        for _ in range(self.max_iter):
+            error = _sigmoid(Z @ self.coef_ + self.intercept_) - y
+            self.coef_ -= self.learning_rate * (Z.T @ error / n + self.alpha / n * self.coef_)
+            self.intercept_ -= self.learning_rate * error.mean()
+        return self
+
+    def predict_proba(self, X):
+        positive = _sigmoid(self._design(X) @ self.coef_ + self.intercept_)
+        return np.column_stack([1 - positive, positive])
+
+    def predict(self, X):
+        return (self.predict_proba(X)[:, 1] >= 0.5).astype(np.int64)
+
+
+def _sigmoid(z):
+    return 1 / (1 + np.exp(-np.clip(z, -30, 30)))
+
+
+def loss(estimator, X, y):
+    """Validation loss: mean squared error of a regressor, log loss of a classifier"""
+    if hasattr(estimator, 'predict_proba'):
+        positive = np.clip(estimator.predict_proba(X)[:, 1], 1e-9, 1 - 1e-9)
+        return float(-np.mean(y * np.log(positive) + (1 - y) * np.log(1 - positive)))
+    return float(np.mean((estimator.predict(X) - y) ** 2))
+
+
+def folds(n, k):
+    """k contiguous (train, validation) index splits of n rows"""
+    bounds = np.linspace(0, n, k + 1).astype(int)
+    index = np.arange(n)
+    return [
+        (np.concatenate([index[:start], index[stop:]]), index[start:stop])
+        for start, stop in zip(bounds[:-1], bounds[1:])
+    ]
+
+
+_shared = {}
+
+
+def init_worker(X, y, k):
+    """Process-pool initializer: receive the training data once per worker"""
+    _shared.update(X=X, y=y, folds=folds(len(y), k))
+
+
+def evaluate(estimator_class, params, X=None, y=None, k=3):
+    """Mean k-fold validation loss of estimator_class(**params)"""
+    if X is None:
+        X, y, splits = _shared['X'], _shared['y'], _shared['folds']
+    else:
+        splits = folds(len(y), k)
+    losses = [
+        loss(estimator_class(**params).fit(X[train], y[train]), X[validation], y[validation])
+        for train, validation in splits
+    ]
+    return float(np.mean(losses))
@@ -0,0 +1,245 @@
+"""
+Model quality from real outcomes
+
+``evaluate`` scores what the platform predicted and recommended against
+what happened, over a rolling window of ``AI_EVALUATION_WINDOW_DAYS``:
+
+* ``market_price`` predictions: the predicted price against the next
+  ``MarketPrice`` of the same crop and mandi within
+  ``AI_EVALUATION_HORIZON_DAYS`` (the crop and mandi come from the
+  request's ``crop_name``/``mandi_name`` or else the farmer's profile, as
+  the feature store's price lags do). Only predictions made since the
+  model's ``last_trained`` count, so each version is scored on its own;
+* recommendations, per recommendation type: how often farmers applied them
+  and the ratings they gave.
+
+Predictions are grouped in SQL by model, crop, mandi and day (mean of the
+predicted prices), actual prices by crop, mandi and day, and the two are
+matched with a NumPy ``searchsorted``; the metrics are those of training
+(``training.regression_metrics``), weighted by predictions per group. A run
+is a fixed handful of grouped queries however large the tables are, so it
+runs hourly. Crop yield and disease risk predictions have no recorded
+outcome yet and are not scored.
+
+Every run adds a ``ModelEvaluation`` row per subject, which makes the
+quality time series. Drift is the drop of quality below a baseline: the
+held-out accuracy from training, or else the median of the subject's
+earlier evaluations in ``BASELINE_DAYS``. Models whose drift exceeds
+``AI_EVALUATION_DRIFT_THRESHOLD`` on at least ``AI_EVALUATION_MIN_SAMPLES``
+predictions are returned for retraining.
+"""
+
+import logging
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Avg, CharField, Count, F, FloatField, Q, Value
+from django.db.models.fields.json import KT
+from django.db.models.functions import Cast, Coalesce, Lower, NullIf, Trim, TruncDate
+from django.utils import timezone
+
+from marketplace.models import MarketPrice
+
+from . import training
+from .models import AIModel, ModelEvaluation, Prediction, Recommendation
+
+logger = logging.getLogger(__name__)
+
+BASELINE_DAYS = 30
+POSITIVE_RATING = 4
+
+
+def _window():
+    return timedelta(days=getattr(settings, 'AI_EVALUATION_WINDOW_DAYS', 7))
+
+
+def _horizon_days():
+    return getattr(settings, 'AI_EVALUATION_HORIZON_DAYS', 7)
+
+
+def _min_samples():
+    return getattr(settings, 'AI_EVALUATION_MIN_SAMPLES', 30)
+
+
+def _drift_threshold():
+    return getattr(settings, 'AI_EVALUATION_DRIFT_THRESHOLD', 0.1)
+
+
+def _name_key(field):
+    return Lower(Trim(field))
+
+
+def price_outcomes(since, until):
+    """
+    {model id: (predicted, actual, predictions)} arrays of the market price
+    predictions made in [since, until) that have an actual price, one entry
+    per model, crop, mandi and day; plus {model id: predictions made}.
+    """
+    groups = list(
+        Prediction.objects.filter(
+            prediction_type='market_price', model__status='active', created_at__gte=since, created_at__lt=until,
+        ).filter(
+            Q(model__last_trained__isnull=True) | Q(created_at__gte=F('model__last_trained')),
+        ).annotate(
+            crop=_name_key(Coalesce(
+                KT('input_data__crop_name'), 'user__profile__primary_crop', output_field=CharField(),
+            )),
+            mandi=_name_key(Coalesce(
+                KT('input_data__mandi_name'), NullIf('user__profile__village', Value('')), 'user__profile__district',
+                output_field=CharField(),
+            )),
+            day=TruncDate('created_at'),
+        ).values('model_id', 'crop', 'mandi', 'day').annotate(
+            predictions=Count('pk'),
+            predicted=Avg(Cast(KT('prediction_result__predicted_price'), FloatField())),
+        ).order_by()
+    )
+    made = {}
+    for group in groups:
+        made[group['model_id']] = made.get(group['model_id'], 0) + group['predictions']
+    groups = [group for group in groups if group['crop'] and group['mandi'] and group['predicted'] is not None]
+    if not groups:
+        return {}, made
+
+    actuals = list(
+        MarketPrice.objects.annotate(crop=_name_key('crop_name'), mandi=_name_key('mandi_name')).filter(
+            crop__in={group['crop'] for group in groups}, mandi__in={group['mandi'] for group in groups},
+            price_date__gt=min(group['day'] for group in groups),
+            price_date__lte=max(group['day'] for group in groups) + timedelta(days=_horizon_days()),
+        ).values('crop', 'mandi', 'price_date').annotate(actual=Avg('price_per_quintal'))
+        .order_by('crop', 'mandi', 'price_date')
+    )
+    if not actuals:
+        return {}, made
+
+    # One sortable number per (series, day): series index * span + day ordinal
+    series = {}
+    for row in actuals:
+        series.setdefault((row['crop'], row['mandi']), len(series))
+    span = 10 ** 7     # above any date ordinal
+    actual_keys = np.array(
+        [series[row['crop'], row['mandi']] * span + row['price_date'].toordinal() for row in actuals], dtype=np.int64,
+    )
+    actual_prices = np.array([float(row['actual']) for row in actuals])
+
+    group_series = np.array([series.get((group['crop'], group['mandi']), -1) for group in groups], dtype=np.int64)
+    group_days = np.array([group['day'].toordinal() for group in groups], dtype=np.int64)
+    # First actual after the prediction day, in the same series and within the horizon
+    position = np.searchsorted(actual_keys, group_series * span + group_days, side='right')
+    found = position < len(actual_keys)
+    position = np.minimum(position, len(actual_keys) - 1)
+    gap = actual_keys[position] - (group_series * span + group_days)
+    matched = found & (group_series >= 0) & (gap <= _horizon_days())
+
+    model_ids = np.array([group['model_id'] for group in groups], dtype=object)
+    predicted = np.array([float(group['predicted']) for group in groups])
+    counts = np.array([group['predictions'] for group in groups], dtype=np.int64)
+    outcomes = {}
+    for model_id in set(model_ids[matched]):
+        rows = matched & (model_ids == model_id)
+        outcomes[model_id] = (predicted[rows], actual_prices[position[rows]], counts[rows])
+    return outcomes, made
+
+
+def price_metrics(predicted, actual, counts, tolerance=0.1):
+    """Training's regression metrics, each group counted once per prediction it stands for"""
+    predicted, actual = np.repeat(predicted, counts), np.repeat(actual, counts)
+    return training.regression_metrics(actual, predicted, float(np.median(actual)), tolerance)
+
+
+def feedback_metrics(since, until):
+    """{recommendation type: metrics} of the recommendations created in [since, until)"""
+    rows = list(
+        Recommendation.objects.filter(created_at__gte=since, created_at__lt=until)
+        .values('recommendation_type', 'feedback_rating', 'is_applied').annotate(n=Count('pk')).order_by()
+    )
+    metrics = {}
+    for recommendation_type in {row['recommendation_type'] for row in rows}:
+        group = [row for row in rows if row['recommendation_type'] == recommendation_type]
+        n = np.array([row['n'] for row in group], dtype=np.int64)
+        rating = np.array([row['feedback_rating'] or 0 for row in group], dtype=np.int64)
+        applied = np.array([row['is_applied'] for row in group], dtype=bool)
+        rated = rating > 0
+        rated_count = int(n[rated].sum())
+        mean_rating = float(np.average(rating[rated], weights=n[rated])) if rated_count else None
+        metrics[recommendation_type] = {
+            'delivered': int(n.sum()),
+            'applied_rate': float(n[applied].sum() / n.sum()),
+            'rated': rated_count,
+            'mean_rating': mean_rating,
+            'positive_rate': float(n[rating >= POSITIVE_RATING].sum() / rated_count) if rated_count else None,
+            'ratings': np.bincount(rating[rated], weights=n[rated], minlength=6)[1:].astype(int).tolist(),
+        }
+    return metrics
+
+
+def _baselines(now):
+    """{(model id, version, recommendation type): median quality of earlier evaluations}"""
+    earlier = {}
+    rows = ModelEvaluation.objects.filter(
+        window_end__gte=now - timedelta(days=BASELINE_DAYS), samples__gte=_min_samples(), quality__isnull=False,
+    ).values_list('model_id', 'model_version', 'recommendation_type', 'quality')
+    for model_id, version, recommendation_type, quality in rows:
+        earlier.setdefault((model_id, version, recommendation_type), []).append(quality)
+    return {subject: float(np.median(values)) for subject, values in earlier.items()}
+
+
+def _drift(baseline, quality):
+    if baseline is None or quality is None:
+        return None
+    return round(baseline - quality, 4)
+
+
+def evaluate(now=None):
+    """
+    Score the window ending now and store a ModelEvaluation per model and
+    recommendation type; returns (evaluations, models whose drift calls for
+    retraining).
+    """
+    now = now or timezone.now()
+    since = now - _window()
+    baselines = _baselines(now)
+    evaluations, drifted = [], []
+
+    outcomes, made = price_outcomes(since, now)
+    for model in AIModel.objects.filter(pk__in=made):
+        subject = (model.pk, model.version, '')
+        if model.pk in outcomes:
+            predicted, actual, counts = outcomes[model.pk]
+            metrics = price_metrics(predicted, actual, counts, model.config_file.get('tolerance', 0.1))
+            samples = int(counts.sum())
+        else:
+            metrics, samples = {}, 0
+        metrics = dict({name: round(value, 4) for name, value in metrics.items()}, predictions=made[model.pk])
+        quality = metrics.get('accuracy')
+        baseline = model.accuracy if model.accuracy is not None else baselines.get(subject)
+        drift = _drift(baseline, quality)
+        retrain = (
+            samples >= _min_samples() and drift is not None and drift > _drift_threshold()
+            and model.model_type in training.MODEL_TASKS
+        )
+        if retrain:
+            drifted.append(model)
+        evaluations.append(ModelEvaluation(
+            model=model, model_version=model.version, window_start=max(since, model.last_trained or since),
+            window_end=now, samples=samples, quality=quality, metrics=metrics, baseline=baseline, drift=drift,
+            retrain_triggered=retrain,
+        ))
+
+    for recommendation_type, metrics in feedback_metrics(since, now).items():
+        quality = (metrics['mean_rating'] - 1) / 4 if metrics['mean_rating'] is not None else None
+        baseline = baselines.get((None, '', recommendation_type))
+        evaluations.append(ModelEvaluation(
+            recommendation_type=recommendation_type, window_start=since, window_end=now, samples=metrics['rated'],
+            quality=quality, metrics=metrics, baseline=baseline, drift=_drift(baseline, quality),
+        ))
+
+    ModelEvaluation.objects.bulk_create(evaluations, batch_size=500)
+    for evaluation in evaluations:
+        if evaluation.drift is not None and evaluation.drift > _drift_threshold():
+            logger.warning(
+                f"Quality of {evaluation} dropped by {evaluation.drift:.2f} "
+                f"(baseline {evaluation.baseline:.2f}, {evaluation.samples} samples)"
+            )
+    return evaluations, drifted
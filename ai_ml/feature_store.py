@@ -0,0 +1,371 @@
+"""
+Feature store of precomputed model inputs
+
+Predictions and recommendations need the same inputs for a farmer: the
+latest soil test, the weather around them and the prices of their crop.
+Instead of each path running its own 5-10 queries, the inputs are
+materialized as ``FeatureVector`` rows, one float32 array per entity:
+
+* per location (village or district, case-folded): rolling weather
+  aggregates over ``LONG_DAYS`` and ``SHORT_DAYS`` and the recent soil
+  moisture (``LOCATION_FEATURES``);
+* per user: the latest ``SoilHealthRecord`` NPK, pH and organic matter, the
+  land area, the last prices and volume of their primary crop at their local
+  mandi and the crop's regional price statistics (``USER_FEATURES``); the
+  row points at its location's row.
+
+``user_features`` and ``matrix`` read any number of users with one query
+(user rows joined to their location rows) and return the features named by
+the caller, plus the season of today. Missing values are NaN, so a model's
+``defaults`` apply.
+
+Rows are rebuilt when they are missing, marked ``stale`` (signals flag them
+when a soil test, profile, weather reading or price is saved or deleted),
+were built with another ``LAYOUT`` or are older than
+``AI_FEATURE_MAX_AGE_HOURS`` (rolling windows move on); readers rebuild such
+rows inline. ``refresh`` (hourly) rebuilds stale and expired rows and the
+entities whose source rows changed since the last run, which also catches
+bulk inserts that send no signals.
+"""
+
+import logging
+import zlib
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import Avg, Count, Max, Q
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from core.models import UserProfile
+from marketplace.models import MarketPrice
+from soil_health.models import SoilHealthRecord
+from weather.models import SoilMoistureData, WeatherData
+
+from .models import FeatureVector
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+SHORT_DAYS = 3
+LONG_DAYS = 30
+PRICE_DAYS = 7
+PRICE_LAGS = 3
+LAG_WINDOW_DAYS = 90
+WATERMARK_OVERLAP = timedelta(minutes=5)
+
+LOCATION_FEATURES = [
+    'temperature', 'humidity', 'temperature_3d', 'humidity_3d', 'soil_moisture_3d', 'weather_readings_30d',
+]
+USER_FEATURES = [
+    'ph_level', 'organic_matter', 'nitrogen', 'phosphorus', 'potassium', 'soil_test_age_days', 'land_area',
+    *(f'price_lag_{n}' for n in range(1, PRICE_LAGS + 1)), 'volume_lag_1', 'price_mean_30d', 'price_change_7d',
+]
+SEASON_FEATURES = ['season_sin', 'season_cos']
+FEATURES = USER_FEATURES + LOCATION_FEATURES + SEASON_FEATURES
+
+# Changes whenever the feature lists do, so rows of an older layout are rebuilt
+LAYOUT = zlib.crc32(','.join(USER_FEATURES + ['|'] + LOCATION_FEATURES).encode()) & 0x7FFF
+
+
+def _max_age():
+    return timedelta(hours=getattr(settings, 'AI_FEATURE_MAX_AGE_HOURS', 6))
+
+
+def _chunk_size():
+    return getattr(settings, 'AI_FEATURE_CHUNK_SIZE', 2000)
+
+
+def key(name):
+    return (name or '').strip().casefold()
+
+
+def encode(values):
+    return np.asarray(values, dtype=np.float32).tobytes()
+
+
+def decode(data):
+    return np.frombuffer(bytes(data), dtype=np.float32).astype(np.float64)
+
+
+def _number(value):
+    return np.nan if value is None else float(value)
+
+
+def season(day):
+    angle = 2 * np.pi * day.timetuple().tm_yday / 365.25
+    return [np.sin(angle), np.cos(angle)]
+
+
+def _chunks(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _upsert(vectors):
+    FeatureVector.objects.bulk_create(
+        vectors, batch_size=500, update_conflicts=True, unique_fields=['entity_type', 'entity_key'],
+        update_fields=['location', 'crop_key', 'layout', 'values', 'stale', 'computed_at'],
+    )
+
+
+def build_locations(keys, now=None):
+    """Compute and store the vectors of case-folded locations; returns {key: row id}"""
+    now = now or timezone.now()
+    keys = set(keys) - {''}
+    if not keys:
+        return {}
+    short_since, long_since = now - timedelta(days=SHORT_DAYS), now - timedelta(days=LONG_DAYS)
+    weather = {
+        row['key']: row for row in WeatherData.objects.annotate(key=Lower('location')).filter(
+            key__in=keys, recorded_at__gte=long_since,
+        ).values('key').annotate(
+            avg_temperature=Avg('temperature'), avg_humidity=Avg('humidity'),
+            avg_temperature_3d=Avg('temperature', filter=Q(recorded_at__gte=short_since)),
+            avg_humidity_3d=Avg('humidity', filter=Q(recorded_at__gte=short_since)),
+            readings=Count('pk'),
+        ).order_by()
+    }
+    moisture = dict(
+        SoilMoistureData.objects.annotate(key=Lower('location')).filter(
+            key__in=keys, recorded_at__gte=short_since,
+        ).values('key').annotate(avg_moisture=Avg('soil_moisture')).values_list('key', 'avg_moisture').order_by()
+    )
+    vectors = []
+    for location in keys:
+        row = weather.get(location, {})
+        values = [
+            _number(row.get('avg_temperature')), _number(row.get('avg_humidity')),
+            _number(row.get('avg_temperature_3d')), _number(row.get('avg_humidity_3d')),
+            _number(moisture.get(location)), float(row.get('readings', 0)),
+        ]
+        vectors.append(FeatureVector(
+            entity_type='location', entity_key=location, layout=LAYOUT, values=encode(values),
+            stale=False, computed_at=now,
+        ))
+    _upsert(vectors)
+    return dict(
+        FeatureVector.objects.filter(entity_type='location', entity_key__in=keys).values_list('entity_key', 'pk')
+    )
+
+
+def _price_stats(crops, now):
+    recent_since = now.date() - timedelta(days=PRICE_DAYS)
+    rows = MarketPrice.objects.annotate(key=Lower('crop_name')).filter(
+        key__in=crops, price_date__gte=now.date() - timedelta(days=LONG_DAYS + PRICE_DAYS),
+    ).values('key').annotate(
+        mean=Avg('price_per_quintal', filter=Q(price_date__gte=now.date() - timedelta(days=LONG_DAYS))),
+        recent=Avg('price_per_quintal', filter=Q(price_date__gte=recent_since)),
+        baseline=Avg('price_per_quintal', filter=Q(price_date__lt=recent_since)),
+    ).order_by()
+    return {
+        row['key']: (
+            _number(row['mean']),
+            float(row['recent']) / float(row['baseline']) - 1 if row['recent'] and row['baseline'] else np.nan,
+        )
+        for row in rows
+    }
+
+
+def _local_lags(crops, locations, now):
+    """{(crop, mandi): [(price, volume), ...] newest first, at most PRICE_LAGS}"""
+    rows = MarketPrice.objects.annotate(crop=Lower('crop_name'), mandi=Lower('mandi_name')).filter(
+        crop__in=crops, mandi__in=locations, price_date__gte=now.date() - timedelta(days=LAG_WINDOW_DAYS),
+    ).order_by('crop', 'mandi', '-price_date').values_list('crop', 'mandi', 'price_per_quintal', 'volume')
+    lags = {}
+    for crop, mandi, price, volume in rows.iterator(chunk_size=_chunk_size()):
+        series = lags.setdefault((crop, mandi), [])
+        if len(series) < PRICE_LAGS:
+            series.append((float(price), float(volume)))
+    return lags
+
+
+def build_users(user_ids, now=None):
+    """Compute and store the vectors of users (and of their locations)"""
+    now = now or timezone.now()
+    users = list(User.objects.filter(pk__in=user_ids).values_list(
+        'pk', 'profile__village', 'profile__district', 'profile__primary_crop', 'profile__land_area',
+    ))
+    if not users:
+        return 0
+
+    soil = {}
+    records = SoilHealthRecord.objects.filter(user_id__in=[row[0] for row in users]).order_by(
+        'user_id', '-record_date', '-pk',
+    ).values_list('user_id', 'record_date', 'ph_level', 'organic_matter', 'nitrogen', 'phosphorus', 'potassium')
+    for user_id, record_date, *values in records.iterator(chunk_size=_chunk_size()):
+        if user_id not in soil:     # newest record of each user comes first
+            soil[user_id] = [_number(value) for value in values] + [float((now.date() - record_date).days)]
+
+    locations = {row[0]: key(row[1]) or key(row[2]) for row in users}
+    crops = {row[0]: key(row[3]) for row in users}
+    wanted_crops = set(crops.values()) - {''}
+    prices = _price_stats(wanted_crops, now) if wanted_crops else {}
+    lags = _local_lags(wanted_crops, set(locations.values()) - {''}, now) if wanted_crops else {}
+    location_ids = build_locations(locations.values(), now)
+
+    no_soil = [np.nan] * 6
+    vectors = []
+    for user_id, _, _, _, land_area in users:
+        series = lags.get((crops[user_id], locations[user_id]), [])
+        lag_values = [price for price, _ in series] + [np.nan] * (PRICE_LAGS - len(series))
+        values = (
+            soil.get(user_id, no_soil) + [_number(land_area)] + lag_values
+            + [series[0][1] if series else np.nan] + list(prices.get(crops[user_id], (np.nan, np.nan)))
+        )
+        vectors.append(FeatureVector(
+            entity_type='user', entity_key=str(user_id), location_id=location_ids.get(locations[user_id]),
+            crop_key=crops[user_id], layout=LAYOUT, values=encode(values), stale=False, computed_at=now,
+        ))
+    _upsert(vectors)
+    return len(vectors)
+
+
+def _is_current(row, expired):
+    return row is not None and not row.stale and row.layout == LAYOUT and row.computed_at >= expired
+
+
+def _load(user_ids):
+    rows = FeatureVector.objects.filter(
+        entity_type='user', entity_key__in=[str(user_id) for user_id in user_ids],
+    ).select_related('location')
+    return {int(row.entity_key): row for row in rows}
+
+
+def _rows(user_ids, now):
+    """Current user rows (with their location rows) for user_ids: one query unless some need a rebuild"""
+    rows = _load(user_ids)
+    expired = now - _max_age()
+    outdated = [
+        user_id for user_id in user_ids
+        if not _is_current(rows.get(user_id), expired)
+        or (rows[user_id].location is not None and not _is_current(rows[user_id].location, expired))
+    ]
+    if outdated:
+        build_users(outdated, now)
+        rows.update(_load(outdated))
+    return rows
+
+
+def matrix(user_ids, features=FEATURES, now=None):
+    """Float64 array of the named features, one row per user id (NaN where unknown)"""
+    now = now or timezone.now()
+    user_ids = [int(user_id) for user_id in user_ids]
+    columns = {name: n for n, name in enumerate(FEATURES)}
+    unknown = [name for name in features if name not in columns]
+    if unknown:
+        raise KeyError(f"Unknown features: {', '.join(unknown)}")
+    picked = [columns[name] for name in features]
+
+    result = np.full((len(user_ids), len(features)), np.nan)
+    for chunk_start in range(0, len(user_ids), _chunk_size()):
+        chunk = user_ids[chunk_start:chunk_start + _chunk_size()]
+        rows = _rows(chunk, now)
+        full = np.full((len(chunk), len(FEATURES)), np.nan)
+        full[:, len(USER_FEATURES) + len(LOCATION_FEATURES):] = season(now.date())
+        for n, user_id in enumerate(chunk):
+            row = rows.get(user_id)
+            if row is None:
+                continue
+            full[n, :len(USER_FEATURES)] = decode(row.values)
+            if row.location is not None:
+                full[n, len(USER_FEATURES):len(USER_FEATURES) + len(LOCATION_FEATURES)] = decode(row.location.values)
+        result[chunk_start:chunk_start + len(chunk)] = full[:, picked]
+    return result
+
+
+def user_features(user_ids, features=FEATURES, now=None):
+    """{user id: {feature: value}} leaving out unknown values"""
+    values = matrix(user_ids, features, now)
+    return {
+        int(user_id): {name: float(value) for name, value in zip(features, row) if not np.isnan(value)}
+        for user_id, row in zip(user_ids, values)
+    }
+
+
+def complete(requests, features):
+    """
+    Fill each request's ``input_data`` with the stored features of its
+    ``user_id`` that it does not provide, for all requests with one lookup.
+    Requests that already provide every feature are left alone.
+    """
+    stored_names = [name for name in features if name in FEATURES]
+    incomplete = [
+        request for request in requests
+        if request.get('user_id') is not None and any(name not in request['input_data'] for name in stored_names)
+    ]
+    if not incomplete:
+        return requests
+    stored = user_features({request['user_id'] for request in incomplete}, stored_names)
+    for request in incomplete:
+        request['input_data'] = dict(stored.get(int(request['user_id']), {}), **request['input_data'])
+    return requests
+
+
+def mark_users_stale(user_ids=None, crop=None):
+    rows = FeatureVector.objects.filter(entity_type='user')
+    if crop is not None:
+        rows = rows.filter(crop_key=key(crop))
+    else:
+        rows = rows.filter(entity_key__in=[str(user_id) for user_id in user_ids])
+    return rows.update(stale=True)
+
+
+def mark_location_stale(location):
+    return FeatureVector.objects.filter(entity_type='location', entity_key=key(location)).update(stale=True)
+
+
+def _changed_since(since):
+    """(user ids, location keys, crop keys) whose source rows changed after since"""
+    users = set(SoilHealthRecord.objects.filter(updated_at__gt=since).values_list('user_id', flat=True).distinct())
+    users.update(UserProfile.objects.filter(updated_at__gt=since).values_list('user_id', flat=True))
+    locations = {
+        key(location) for location in WeatherData.objects.filter(
+            Q(recorded_at__gt=since) | Q(updated_at__gt=since),
+        ).values_list('location', flat=True).distinct()
+    }
+    locations.update(
+        key(location) for location in SoilMoistureData.objects.filter(recorded_at__gt=since)
+        .values_list('location', flat=True).distinct()
+    )
+    crops = {
+        key(crop) for crop in MarketPrice.objects.filter(updated_at__gt=since).values_list('crop_name', flat=True).distinct()
+    }
+    return users, locations, crops
+
+
+def refresh(now=None):
+    """
+    Rebuild what is out of date: stale, expired or old-layout rows and the
+    entities whose soil tests, profiles, weather or prices changed since the
+    previous refresh. Returns counts of rebuilt rows.
+    """
+    now = now or timezone.now()
+    watermark = FeatureVector.objects.aggregate(last=Max('computed_at'))['last']
+    outdated = FeatureVector.objects.filter(Q(stale=True) | Q(computed_at__lt=now - _max_age()) | ~Q(layout=LAYOUT))
+    users = {int(entity_key) for entity_key in outdated.filter(entity_type='user').values_list('entity_key', flat=True)}
+    locations = set(outdated.filter(entity_type='location').values_list('entity_key', flat=True))
+    if watermark is not None:
+        changed_users, changed_locations, crops = _changed_since(watermark - WATERMARK_OVERLAP)
+        users |= changed_users
+        locations |= changed_locations
+        if crops:
+            users.update(
+                int(entity_key) for entity_key in FeatureVector.objects.filter(
+                    entity_type='user', crop_key__in=crops,
+                ).values_list('entity_key', flat=True)
+            )
+    else:
+        # First run: every active user, as the recommender reads them all
+        users = set(User.objects.filter(is_active=True).values_list('pk', flat=True))
+
+    for chunk in _chunks(locations, _chunk_size()):
+        build_locations(chunk, now)
+    built = 0
+    for chunk in _chunks(sorted(users), _chunk_size()):
+        built += build_users(chunk, now)
+    logger.info(f"Feature store refreshed {built} users and {len(locations)} locations")
+    return {'users': built, 'locations': len(locations)}
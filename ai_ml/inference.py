@@ -0,0 +1,101 @@
+"""
+Tabular inference with registered AI models
+
+A model's ``config_file`` describes its inputs and outputs:
+
+* ``features``: the ``input_data`` keys, in column order (missing values
+  fall back to ``defaults`` and then 0)
+* ``residual_std``: regression error, for a 95% interval around the value
+* ``labels``: class names of a classifier's probability columns
+* ``confidence``: fixed confidence of a regressor (defaults to its accuracy)
+
+``predict`` turns one request into the ``prediction_result`` shape the
+Prediction rows have always stored, so callers and templates are unchanged.
+"""
+
+import numpy as np
+
+from .registry import get_model
+
+
+def feature_vector(config, input_data):
+    features = config.get('features') or sorted(input_data)
+    defaults = config.get('defaults', {})
+    row = []
+    for name in features:
+        value = input_data.get(name, defaults.get(name, 0))
+        try:
+            row.append(float(value))
+        except (TypeError, ValueError):
+            row.append(float(defaults.get(name, 0)))
+    return row
+
+
+def feature_matrix(config, inputs):
+    return np.array([feature_vector(config, input_data) for input_data in inputs], dtype=np.float64)
+
+
+def confidence_level(score):
+    if score < 0.6:
+        return 'low'
+    if score < 0.8:
+        return 'medium'
+    if score < 0.95:
+        return 'high'
+    return 'very_high'
+
+
+def _interval(config, value):
+    spread = 1.96 * float(config.get('residual_std', 0))
+    return [round(value - spread, 2), round(value + spread, 2)]
+
+
+def interpret(ai_model, loaded, prediction_type, output):
+    """
+    (prediction_result, confidence_score) for one row of model output: a
+    probability vector for classifiers, a number for regressors.
+    """
+    config = loaded.config
+    if loaded.is_classifier:
+        probabilities = np.asarray(output, dtype=np.float64)
+        labels = config.get('labels') or [str(n) for n in range(len(probabilities))]
+        best = int(probabilities.argmax())
+        confidence = float(probabilities[best])
+        if prediction_type == 'disease_risk':
+            risk = float(probabilities[-1])     # last column: diseased
+            result = {
+                'risk_level': 'high' if risk >= 0.66 else 'medium' if risk >= 0.33 else 'low',
+                'risk_score': round(risk, 2),
+            }
+        else:
+            result = {'prediction': labels[best]}
+        result['probabilities'] = {label: round(float(p), 4) for label, p in zip(labels, probabilities)}
+    else:
+        value = float(output)
+        confidence = float(config.get('confidence') or ai_model.accuracy or 0.8)
+        if prediction_type == 'crop_yield':
+            result = {'predicted_yield': round(value, 2), 'confidence_interval': _interval(config, value)}
+        elif prediction_type == 'market_price':
+            result = {'predicted_price': round(value, 2), 'confidence_interval': _interval(config, value)}
+        else:
+            result = {'prediction': round(value, 4)}
+    return result, round(min(max(confidence, 0.0), 1.0), 2)
+
+
+def predict_loaded(ai_model, loaded, prediction_type, inputs):
+    """[(prediction_result, confidence_score)] from one vectorized call of a loaded model"""
+    features = feature_matrix(loaded.config, inputs)
+    if loaded.is_classifier:
+        outputs = loaded.predict_proba(features)
+    else:
+        outputs = np.asarray(loaded.predict(features), dtype=np.float64).reshape(len(inputs), -1)[:, 0]
+    return [interpret(ai_model, loaded, prediction_type, output) for output in outputs]
+
+
+def predict_many(ai_model, prediction_type, inputs):
+    """[(prediction_result, confidence_score)] for a list of input_data dicts"""
+    return predict_loaded(ai_model, get_model(ai_model), prediction_type, inputs)
+
+
+def predict(ai_model, prediction_type, input_data):
+    return predict_many(ai_model, prediction_type, [input_data])[0]
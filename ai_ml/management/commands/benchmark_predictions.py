@@ -0,0 +1,107 @@
+"""
+Management command to benchmark row-at-a-time against micro-batched predictions
+"""
+
+import time
+import uuid
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.utils import timezone
+from simple_history.utils import bulk_create_with_history
+
+from ai_ml import inference
+from ai_ml.batching import PREDICTION_TTL
+from ai_ml.models import AIModel, Prediction
+from ai_ml.registry import LoadedModel
+
+
+class SyntheticRegressor:
+    """Linear crop-yield model over random features"""
+
+    def __init__(self, n_features, seed=0):
+        rng = np.random.default_rng(seed)
+        self.coef = rng.normal(size=n_features)
+        self.intercept = 3.0
+
+    def predict(self, features):
+        return features @ self.coef + self.intercept
+
+
+class SyntheticClassifier(SyntheticRegressor):
+    """Logistic disease-risk model over random features"""
+
+    def predict_proba(self, features):
+        risk = 1 / (1 + np.exp(-(features @ self.coef)))
+        return np.column_stack([1 - risk, risk])
+
+
+class Command(BaseCommand):
+    help = 'Benchmark prediction throughput one row at a time and in micro-batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000, help='Predictions to score per run')
+        parser.add_argument('--features', type=int, default=12, help='Input features per request')
+        parser.add_argument('--batch-sizes', default='8,32,64,128', help='Comma-separated batch sizes')
+        parser.add_argument('--save', action='store_true',
+                            help='Also insert the Prediction rows (rolled back afterwards)')
+
+    def handle(self, *args, **options):
+        n, n_features = options['requests'], options['features']
+        names = [f'f{i}' for i in range(n_features)]
+        rng = np.random.default_rng(1)
+        inputs = [dict(zip(names, row)) for row in rng.normal(size=(n, n_features)).round(3).tolist()]
+        batch_sizes = [int(size) for size in options['batch_sizes'].split(',')]
+
+        for prediction_type, estimator in (
+            ('crop_yield', SyntheticRegressor(n_features)),
+            ('disease_risk', SyntheticClassifier(n_features)),
+        ):
+            ai_model = AIModel(
+                name=f'benchmark-{prediction_type}', model_type='yield_forecast', version='1', description='-',
+                accuracy=0.8, config_file={'features': names, 'residual_std': 0.3},
+            )
+            loaded = LoadedModel(ai_model, estimator, 0, 0.0)
+            self.stdout.write(f"{prediction_type}: {n} requests, {n_features} features")
+            single = self.run(ai_model, loaded, prediction_type, inputs, 1)
+            self.stdout.write(f"  batch    1: {n / single:10.0f} predictions/s")
+            for size in batch_sizes:
+                elapsed = self.run(ai_model, loaded, prediction_type, inputs, size)
+                self.stdout.write(f"  batch {size:4d}: {n / elapsed:10.0f} predictions/s ({single / elapsed:.1f}x)")
+
+        if options['save']:
+            self.benchmark_inserts(inputs[:min(n, 2000)])
+
+    def run(self, ai_model, loaded, prediction_type, inputs, size):
+        started = time.perf_counter()
+        for start in range(0, len(inputs), size):
+            inference.predict_loaded(ai_model, loaded, prediction_type, inputs[start:start + size])
+        return time.perf_counter() - started
+
+    def benchmark_inserts(self, inputs):
+        self.stdout.write(f"Prediction rows on {connection.vendor}: {len(inputs)}")
+        with transaction.atomic():
+            user = User.objects.create_user(username=f'bench-predictions-{uuid.uuid4().hex[:8]}')
+            ai_model = AIModel.objects.create(
+                name=f'benchmark-{user.username}', model_type='yield_forecast', version='1', description='-',
+            )
+
+            def row(input_data):
+                return Prediction(
+                    model=ai_model, user=user, prediction_type='crop_yield', input_data=input_data,
+                    prediction_result={'predicted_yield': 3.0}, confidence_score=0.8, confidence_level='high',
+                    expires_at=timezone.now() + PREDICTION_TTL,
+                )
+
+            started = time.perf_counter()
+            for input_data in inputs:
+                row(input_data).save()
+            single = time.perf_counter() - started
+            started = time.perf_counter()
+            bulk_create_with_history([row(input_data) for input_data in inputs], Prediction, batch_size=500)
+            bulk = time.perf_counter() - started
+            transaction.set_rollback(True)
+        self.stdout.write(f"  one at a time: {len(inputs) / single:10.0f} rows/s")
+        self.stdout.write(f"  bulk_create:   {len(inputs) / bulk:10.0f} rows/s ({single / bulk:.1f}x)")
@@ -0,0 +1,44 @@
+"""
+Management command to benchmark the parallel hyperparameter search on synthetic data
+"""
+
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from ai_ml import estimators, training
+
+
+class Command(BaseCommand):
+    help = 'Benchmark hyperparameter search wall-clock time for different process-pool sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200000, help='Synthetic training rows')
+        parser.add_argument('--features', type=int, default=7, help='Features per row')
+        parser.add_argument('--workers', default='1,2,4', help='Comma-separated pool sizes')
+        parser.add_argument('--classifier', action='store_true', help='Search the logistic classifier grid')
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(0)
+        X = rng.normal(size=(options['rows'], options['features']))
+        signal = X @ rng.normal(size=options['features'])
+        if options['classifier']:
+            estimator_class, grid = estimators.LogisticClassifier, training.CLASSIFICATION_GRID
+            y = (signal + rng.normal(size=len(signal)) > 0).astype(np.float64)
+        else:
+            estimator_class, grid = estimators.RidgeRegressor, training.REGRESSION_GRID
+            y = signal + rng.normal(size=len(signal))
+        candidates = training.expand_grid(grid)
+        self.stdout.write(f"{len(candidates)} candidates x 3 folds on {len(y)} rows of {X.shape[1]} features")
+
+        baseline = None
+        for workers in [int(n) for n in options['workers'].split(',')]:
+            started = time.perf_counter()
+            results = training.search(estimator_class, candidates, X, y, workers=workers)
+            seconds = time.perf_counter() - started
+            baseline = baseline or seconds
+            best = min(results, key=results.get)
+            self.stdout.write(
+                f"{workers:2d} workers: {seconds:7.2f}s  (speed-up {baseline / seconds:4.1f}x, best {best})"
+            )
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from ai_ml import prediction_cache
+
+
+class Command(BaseCommand):
+    help = 'Report how many predictions were served from the cache or earlier Prediction rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after reporting')
+
+    def handle(self, *args, **options):
+        stats = prediction_cache.stats()
+        self.stdout.write(
+            f"cache hits {stats['hits']}, database hits {stats['db_hits']}, misses {stats['misses']}, "
+            f"hit rate {stats['hit_rate']:.1%}"
+        )
+        if options['reset']:
+            prediction_cache.reset_stats()
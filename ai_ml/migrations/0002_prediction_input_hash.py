@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:35
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_ml', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='historicalprediction',
+            name='input_hash',
+            field=models.CharField(blank=True, help_text='Hash of the model version, prediction type and canonicalized input (ai_ml.prediction_cache)', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='prediction',
+            name='input_hash',
+            field=models.CharField(blank=True, help_text='Hash of the model version, prediction type and canonicalized input (ai_ml.prediction_cache)', max_length=64),
+        ),
+        migrations.AddIndex(
+            model_name='prediction',
+            index=models.Index(fields=['input_hash', 'expires_at'], name='prediction_input_hash_idx'),
+        ),
+    ]
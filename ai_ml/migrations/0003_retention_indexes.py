@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_ml', '0002_prediction_input_hash'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='computervisionanalysis',
+            index=models.Index(fields=['created_at'], name='cv_analysis_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prediction',
+            index=models.Index(fields=['created_at'], name='prediction_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recommendation',
+            index=models.Index(fields=['created_at'], name='recommendation_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trainingjob',
+            index=models.Index(fields=['created_at'], name='training_job_created_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_ml', '0003_retention_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='aimodel',
+            name='model_type',
+            field=models.CharField(choices=[('crop_prediction', 'Crop Prediction'), ('disease_detection', 'Disease Detection'), ('disease_risk', 'Disease Risk'), ('yield_forecast', 'Yield Forecast'), ('weather_prediction', 'Weather Prediction'), ('market_prediction', 'Market Prediction'), ('soil_analysis', 'Soil Analysis'), ('pest_detection', 'Pest Detection'), ('irrigation_optimization', 'Irrigation Optimization')], max_length=50),
+        ),
+        migrations.AlterField(
+            model_name='historicalaimodel',
+            name='model_type',
+            field=models.CharField(choices=[('crop_prediction', 'Crop Prediction'), ('disease_detection', 'Disease Detection'), ('disease_risk', 'Disease Risk'), ('yield_forecast', 'Yield Forecast'), ('weather_prediction', 'Weather Prediction'), ('market_prediction', 'Market Prediction'), ('soil_analysis', 'Soil Analysis'), ('pest_detection', 'Pest Detection'), ('irrigation_optimization', 'Irrigation Optimization')], max_length=50),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:53
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_ml', '0004_disease_risk_model_type'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeatureVector',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_type', models.CharField(choices=[('user', 'User'), ('location', 'Location')], max_length=10)),
+                ('entity_key', models.CharField(help_text='User id, or case-folded location name', max_length=200)),
+                ('crop_key', models.CharField(blank=True, help_text='Case-folded primary crop of a user', max_length=100)),
+                ('layout', models.PositiveSmallIntegerField()),
+                ('values', models.BinaryField()),
+                ('stale', models.BooleanField(default=False)),
+                ('computed_at', models.DateTimeField()),
+                ('location', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='ai_ml.featurevector')),
+            ],
+            options={
+                'verbose_name': 'Feature Vector',
+                'verbose_name_plural': 'Feature Vectors',
+                'indexes': [models.Index(fields=['entity_type', 'crop_key'], name='feature_vector_crop_idx'), models.Index(fields=['computed_at'], name='feature_vector_computed_idx'), models.Index(condition=models.Q(('stale', True)), fields=['stale'], name='feature_vector_stale_idx')],
+                'unique_together': {('entity_type', 'entity_key')},
+            },
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:59
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ai_ml', '0005_feature_vector'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ModelEvaluation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_version', models.CharField(blank=True, max_length=20)),
+                ('recommendation_type', models.CharField(blank=True, choices=[('crop_selection', 'Crop Selection'), ('planting_time', 'Planting Time'), ('irrigation_schedule', 'Irrigation Schedule'), ('fertilizer_application', 'Fertilizer Application'), ('pest_control', 'Pest Control'), ('disease_prevention', 'Disease Prevention'), ('harvest_timing', 'Harvest Timing'), ('market_timing', 'Market Timing'), ('equipment_usage', 'Equipment Usage'), ('resource_allocation', 'Resource Allocation')], help_text='Set for recommendation feedback, which has no model', max_length=50)),
+                ('window_start', models.DateTimeField()),
+                ('window_end', models.DateTimeField()),
+                ('samples', models.PositiveIntegerField(default=0)),
+                ('quality', models.FloatField(blank=True, help_text='Headline score in [0, 1]', null=True)),
+                ('metrics', models.JSONField(default=dict)),
+                ('baseline', models.FloatField(blank=True, null=True)),
+                ('drift', models.FloatField(blank=True, help_text='Drop of quality below the baseline', null=True)),
+                ('retrain_triggered', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name': 'Model Evaluation',
+                'verbose_name_plural': 'Model Evaluations',
+                'ordering': ['-window_end'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='prediction',
+            index=models.Index(fields=['model', 'prediction_type', 'created_at'], name='prediction_model_created_idx'),
+        ),
+        migrations.AddField(
+            model_name='modelevaluation',
+            name='model',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='evaluations', to='ai_ml.aimodel'),
+        ),
+        migrations.AddIndex(
+            model_name='modelevaluation',
+            index=models.Index(fields=['model', 'window_end'], name='model_evaluation_model_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='modelevaluation',
+            index=models.Index(fields=['recommendation_type', 'window_end'], name='model_evaluation_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='modelevaluation',
+            index=models.Index(fields=['created_at'], name='model_evaluation_created_idx'),
+        ),
+    ]
@@ -21,6 +21,7 @@ class AIModel(models.Model):
     MODEL_TYPES = [
         ('crop_prediction', 'Crop Prediction'),
         ('disease_detection', 'Disease Detection'),
+        ('disease_risk', 'Disease Risk'),
         ('yield_forecast', 'Yield Forecast'),
         ('weather_prediction', 'Weather Prediction'),
         ('market_prediction', 'Market Prediction'),
@@ -107,6 +108,10 @@ class Prediction(models.Model):
     prediction_result = models.JSONField(help_text='Prediction output')
     confidence_score = models.FloatField(validators=[MinValueValidator(0.0), MaxValueValidator(1.0)])
     confidence_level = models.CharField(max_length=20, choices=CONFIDENCE_LEVELS)
+    input_hash = models.CharField(
+        max_length=64, blank=True,
+        help_text='Hash of the model version, prediction type and canonicalized input (ai_ml.prediction_cache)'
+    )
     
     # Metadata
     created_at = models.DateTimeField(auto_now_add=True)
@@ -119,6 +124,11 @@ class Prediction(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Prediction'
         verbose_name_plural = 'Predictions'
+        indexes = [
+            models.Index(fields=['input_hash', 'expires_at'], name='prediction_input_hash_idx'),
+            models.Index(fields=['created_at'], name='prediction_created_idx'),
+            models.Index(fields=['model', 'prediction_type', 'created_at'], name='prediction_model_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.get_prediction_type_display()} - {self.user.username} ({self.confidence_score:.2%})"
@@ -166,6 +176,9 @@ class ComputerVisionAnalysis(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Computer Vision Analysis'
         verbose_name_plural = 'Computer Vision Analyses'
+        indexes = [
+            models.Index(fields=['created_at'], name='cv_analysis_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.get_analysis_type_display()} - {self.user.username} ({self.created_at.strftime('%Y-%m-%d')})"
@@ -229,6 +242,9 @@ class Recommendation(models.Model):
         ordering = ['-priority', '-created_at']
         verbose_name = 'Recommendation'
         verbose_name_plural = 'Recommendations'
+        indexes = [
+            models.Index(fields=['created_at'], name='recommendation_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.title} - {self.user.username} ({self.get_priority_display()})"
@@ -286,6 +302,9 @@ class TrainingJob(models.Model):
         ordering = ['-created_at']
         verbose_name = 'Training Job'
         verbose_name_plural = 'Training Jobs'
+        indexes = [
+            models.Index(fields=['created_at'], name='training_job_created_idx'),
+        ]
     
     def __str__(self):
         return f"Training {self.model.name} - {self.get_status_display()} ({self.progress_percentage:.1f}%)"
@@ -337,3 +356,76 @@ class DataSource(models.Model):
     def __str__(self):
         return f"{self.name} ({self.get_source_type_display()})"
 
+
+
+class FeatureVector(models.Model):
+    """Precomputed model inputs of one user or one location (see ai_ml.feature_store)."""
+    
+    ENTITY_TYPES = [
+        ('user', 'User'),
+        ('location', 'Location'),
+    ]
+    
+    # Derived data, rebuilt at will: no UUID or change history, to keep rows small
+    entity_type = models.CharField(max_length=10, choices=ENTITY_TYPES)
+    entity_key = models.CharField(max_length=200, help_text='User id, or case-folded location name')
+    location = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    crop_key = models.CharField(max_length=100, blank=True, help_text='Case-folded primary crop of a user')
+    
+    # float32 values in the order of the layout's feature names
+    layout = models.PositiveSmallIntegerField()
+    values = models.BinaryField()
+    
+    stale = models.BooleanField(default=False)
+    computed_at = models.DateTimeField()
+    
+    class Meta:
+        verbose_name = 'Feature Vector'
+        verbose_name_plural = 'Feature Vectors'
+        unique_together = ['entity_type', 'entity_key']
+        indexes = [
+            models.Index(fields=['entity_type', 'crop_key'], name='feature_vector_crop_idx'),
+            models.Index(fields=['computed_at'], name='feature_vector_computed_idx'),
+            models.Index(fields=['stale'], condition=models.Q(stale=True), name='feature_vector_stale_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_entity_type_display()} {self.entity_key}"
+
+
+class ModelEvaluation(models.Model):
+    """Quality of a model version, or of a recommendation type, over one rolling window (see ai_ml.evaluation)."""
+    
+    # One row per subject and run: no UUID or change history, to keep rows small
+    model = models.ForeignKey(AIModel, on_delete=models.CASCADE, null=True, blank=True, related_name='evaluations')
+    model_version = models.CharField(max_length=20, blank=True)
+    recommendation_type = models.CharField(
+        max_length=50, choices=Recommendation.RECOMMENDATION_TYPES, blank=True,
+        help_text='Set for recommendation feedback, which has no model',
+    )
+    
+    window_start = models.DateTimeField()
+    window_end = models.DateTimeField()
+    samples = models.PositiveIntegerField(default=0)
+    quality = models.FloatField(null=True, blank=True, help_text='Headline score in [0, 1]')
+    metrics = models.JSONField(default=dict)
+    
+    baseline = models.FloatField(null=True, blank=True)
+    drift = models.FloatField(null=True, blank=True, help_text='Drop of quality below the baseline')
+    retrain_triggered = models.BooleanField(default=False)
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-window_end']
+        verbose_name = 'Model Evaluation'
+        verbose_name_plural = 'Model Evaluations'
+        indexes = [
+            models.Index(fields=['model', 'window_end'], name='model_evaluation_model_idx'),
+            models.Index(fields=['recommendation_type', 'window_end'], name='model_evaluation_type_idx'),
+            models.Index(fields=['created_at'], name='model_evaluation_created_idx'),
+        ]
+    
+    def __str__(self):
+        subject = f"{self.model} v{self.model_version}" if self.model_id else self.get_recommendation_type_display()
+        return f"{subject} @ {self.window_end:%Y-%m-%d %H:%M}"
@@ -0,0 +1,151 @@
+"""
+Prediction results reused across near-identical requests
+
+Farmers in the same village ask for the same crop-yield or price prediction
+with practically the same inputs. Every request is reduced to a SHA-256
+``input_hash`` of:
+
+* the model id and its registry version key (version, artifact and
+  ``updated_at``), so retraining or replacing a model changes every hash and
+  its old results are never served again;
+* the prediction type;
+* the canonicalized input: only the model's ``features`` (when configured),
+  numbers rounded to ``config_file['precision'][feature]`` decimals
+  (``DEFAULT_PRECISION`` otherwise; negative values round to tens,
+  hundreds...), strings stripped and case-folded, keys sorted.
+
+``lookup`` answers from the shared cache first and then from unexpired
+Prediction rows through the indexed ``input_hash`` column; only the rest is
+scored. Hits, database hits and misses are counted in the cache for
+``prediction_cache_stats``.
+"""
+
+import hashlib
+import json
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.utils import timezone
+
+from .models import Prediction
+from .registry import version_key
+
+KEY_PREFIX = 'ai_ml:prediction:'
+STATS_PREFIX = 'ai_ml:prediction_cache:'
+STATS = ('hits', 'db_hits', 'misses')
+CACHE_TTL = timedelta(hours=6)
+DEFAULT_PRECISION = 2
+
+
+def _canonical_value(value, digits):
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        number = round(float(value), digits)
+        return int(number) if number.is_integer() else number
+    if isinstance(value, str):
+        text = value.strip()
+        try:
+            return _canonical_value(float(text), digits)
+        except ValueError:
+            return text.casefold()
+    if isinstance(value, (list, tuple)):
+        return [_canonical_value(item, digits) for item in value]
+    if isinstance(value, dict):
+        return {str(key): _canonical_value(item, digits) for key, item in value.items()}
+    return str(value)
+
+
+def canonical_input(config, input_data):
+    features = config.get('features') or sorted(input_data)
+    precision = config.get('precision', {})
+    return {
+        name: _canonical_value(input_data.get(name), precision.get(name, DEFAULT_PRECISION))
+        for name in features
+    }
+
+
+def input_hash(ai_model, prediction_type, input_data):
+    version, artifact, updated = version_key(ai_model)
+    payload = json.dumps(
+        [str(ai_model.pk), version, artifact, updated, prediction_type, canonical_input(ai_model.config_file, input_data)],
+        sort_keys=True, separators=(',', ':'),
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _key(digest):
+    return f'{KEY_PREFIX}{digest}'
+
+
+def result_dict(prediction_id, confidence_score, result, expires_at):
+    return {
+        'prediction_id': str(prediction_id),
+        'confidence_score': confidence_score,
+        'result': result,
+        'expires_at': expires_at.isoformat() if expires_at else None,
+    }
+
+
+def record(**counts):
+    for name, n in counts.items():
+        if n:
+            key = f'{STATS_PREFIX}{name}'
+            cache.add(key, 0, None)
+            try:
+                cache.incr(key, n)
+            except ValueError:
+                cache.set(key, n, None)
+
+
+def lookup(digests):
+    """
+    Still-valid results for the given hashes, as {hash: result dict}: from
+    the cache, then from unexpired Prediction rows (one query).
+    """
+    digests = set(digests)
+    if not digests:
+        return {}
+    cached = cache.get_many([_key(digest) for digest in digests])
+    found = {key[len(KEY_PREFIX):]: value for key, value in cached.items()}
+
+    missing = digests - found.keys()
+    from_db = {}
+    if missing:
+        rows = (
+            Prediction.objects.filter(input_hash__in=missing, expires_at__gt=timezone.now())
+            .order_by('input_hash', '-created_at')
+            .values_list('input_hash', 'id', 'confidence_score', 'prediction_result', 'expires_at')
+        )
+        for digest, prediction_id, confidence_score, result, expires_at in rows:
+            from_db.setdefault(digest, result_dict(prediction_id, confidence_score, result, expires_at))
+        store(from_db)
+        found.update(from_db)
+
+    record(hits=len(cached), db_hits=len(from_db), misses=len(digests) - len(found))
+    return found
+
+
+def store(results):
+    """Cache {hash: result dict} until the first of them expires (at most CACHE_TTL)"""
+    if not results:
+        return
+    now = timezone.now()
+    timeout = CACHE_TTL.total_seconds()
+    for result in results.values():
+        if result.get('expires_at'):
+            timeout = min(timeout, (datetime.fromisoformat(result['expires_at']) - now).total_seconds())
+    if timeout >= 1:
+        cache.set_many({_key(digest): result for digest, result in results.items()}, int(timeout))
+
+
+def stats():
+    counts = cache.get_many([f'{STATS_PREFIX}{name}' for name in STATS])
+    stats = {name: counts.get(f'{STATS_PREFIX}{name}', 0) for name in STATS}
+    total = sum(stats.values())
+    stats['hit_rate'] = (stats['hits'] + stats['db_hits']) / total if total else 0.0
+    return stats
+
+
+def reset_stats():
+    cache.delete_many([f'{STATS_PREFIX}{name}' for name in STATS])
@@ -0,0 +1,158 @@
+"""
+Training progress reporting
+
+A training loop reports after every epoch, but only some reports are worth a
+write. ``TrainingProgress`` sends each report to three places with their own
+cost:
+
+* the shared cache, at most every ``CACHE_INTERVAL`` seconds: what admin
+  pages and UI polling read through ``live`` and ``live_many``;
+* the Celery task state (``result_backend='django-db'`` makes this a
+  database write), when ``AI_TRAINING_PROGRESS_INTERVAL`` seconds have
+  passed or progress moved by ``AI_TRAINING_PROGRESS_STEP`` percent;
+* the TrainingJob row, every ``AI_TRAINING_PERSIST_INTERVAL`` seconds so a
+  crashed worker leaves a recent state behind, with ``update_fields``
+  limited to the fields that changed.
+
+``finish`` persists the final state once. A job that reports a thousand
+epochs in a minute therefore costs a handful of database writes.
+
+With a process-local cache (LocMemCache) the web processes cannot see what
+a worker caches, so the row is then also written whenever the task state
+is, on the same ``AI_TRAINING_PROGRESS_INTERVAL``/``_STEP`` throttle, and is
+what ``live`` falls back to.
+"""
+
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone
+
+KEY_PREFIX = 'ai_ml:training_progress:'
+CACHE_INTERVAL = 0.5        # seconds
+CACHE_TIMEOUT = 24 * 3600   # seconds; outlives any run, bounds keys of dead workers
+
+TRACKED_FIELDS = (
+    'status', 'progress_percentage', 'current_epoch', 'total_epochs',
+    'training_loss', 'validation_loss', 'training_accuracy', 'validation_accuracy',
+)
+
+
+def _state_interval():
+    return getattr(settings, 'AI_TRAINING_PROGRESS_INTERVAL', 5)
+
+
+def _state_step():
+    return getattr(settings, 'AI_TRAINING_PROGRESS_STEP', 5.0)
+
+
+def _persist_interval():
+    return getattr(settings, 'AI_TRAINING_PERSIST_INTERVAL', 60)
+
+
+def _shared_cache():
+    return not isinstance(caches['default'], LocMemCache)
+
+
+def _key(job_id):
+    return f'{KEY_PREFIX}{job_id}'
+
+
+def snapshot(job):
+    return {field: getattr(job, field) for field in TRACKED_FIELDS}
+
+
+class TrainingProgress:
+    """Throttled progress channel for one TrainingJob (and its Celery task)"""
+
+    def __init__(self, job, task=None):
+        self.job = job
+        self.task = task
+        self.state_writes = self.db_writes = 0
+        self._persisted = snapshot(job)
+        now = time.monotonic()
+        self._cached_at = self._state_at = self._persisted_at = now
+        self._state_percent = job.progress_percentage
+
+    def start(self, *fields):
+        """Mark the job running; persisted immediately, with any other fields named"""
+        self.job.status = 'running'
+        self.job.started_at = timezone.now()
+        self._persist(['started_at', *fields])
+        self._cache()
+
+    def update(self, epoch, **metrics):
+        """Report that epoch (1-based) finished, with any tracked metrics"""
+        job = self.job
+        job.current_epoch = epoch
+        job.progress_percentage = min(epoch / job.total_epochs * 100, 100.0) if job.total_epochs else 100.0
+        for field, value in metrics.items():
+            setattr(job, field, value)
+
+        now = time.monotonic()
+        done = epoch >= job.total_epochs
+        if done or now - self._cached_at >= CACHE_INTERVAL:
+            self._cache()
+            self._cached_at = now
+        if (
+            done or now - self._state_at >= _state_interval()
+            or job.progress_percentage - self._state_percent >= _state_step()
+        ):
+            if self.task is not None:
+                self.task.update_state(state='PROGRESS', meta={
+                    'current': epoch,
+                    'total': job.total_epochs,
+                    'percent': round(job.progress_percentage, 1),
+                    'status': f'Training epoch {epoch}/{job.total_epochs}',
+                })
+                self.state_writes += 1
+            self._state_at, self._state_percent = now, job.progress_percentage
+            if not _shared_cache():
+                # Other processes can only read the row
+                self._persist()
+                return
+        if now - self._persisted_at >= _persist_interval():
+            self._persist()
+
+    def finish(self, status='completed', error_message='', extra=()):
+        """Persist the final state (and the extra fields named) once and drop the live entry"""
+        job = self.job
+        job.status = status
+        job.completed_at = timezone.now()
+        if job.started_at:
+            job.duration = job.completed_at - job.started_at
+        extra = ['completed_at', 'duration', *extra]
+        if status == 'completed':
+            job.progress_percentage = 100.0
+        if error_message:
+            job.error_message = error_message
+            extra.append('error_message')
+        self._persist(extra)
+        cache.delete(_key(job.pk))
+
+    def _persist(self, extra=()):
+        current = snapshot(self.job)
+        changed = [field for field, value in current.items() if self._persisted[field] != value]
+        changed += extra
+        if changed:
+            self.job.save(update_fields=changed + ['updated_at'])
+            self.db_writes += 1
+            self._persisted = current
+        self._persisted_at = time.monotonic()
+
+    def _cache(self):
+        cache.set(_key(self.job.pk), dict(snapshot(self.job), updated_at=time.time()), CACHE_TIMEOUT)
+
+
+def live(job):
+    """Latest reported progress of job: from the cache while it runs, else its row"""
+    return live_many([job])[job.pk]
+
+
+def live_many(jobs):
+    """{job pk: progress dict} for several jobs with one cache read"""
+    running = [job.pk for job in jobs if job.status == 'running']
+    cached = cache.get_many([_key(pk) for pk in running]) if running else {}
+    return {job.pk: cached.get(_key(job.pk)) or snapshot(job) for job in jobs}
@@ -0,0 +1,277 @@
+"""
+Batch recommendations for the whole user base
+
+``refresh_recommendations`` splits active users into primary-key ranges of
+``AI_RECOMMENDATION_CHUNK_SIZE`` and fans them out as a Celery chord; each
+chunk task calls ``recommend`` for its range. A chunk reads its users and
+their profile names in one query and everything the rules need in one
+``feature_store`` lookup: the latest soil test (N, P, K, pH and its age),
+the last ``SHORT_DAYS`` of weather and soil moisture around their village
+or district and the price trend of their primary crop (the last
+``PRICE_DAYS`` against the ``LONG_DAYS`` before).
+
+The features are NumPy columns and every rule is a vectorized mask over
+the chunk. Rows are dropped when the user already has an unexpired
+recommendation of that type, and the rest are inserted with one bulk insert
+in one transaction, so a retried chunk never duplicates its rows.
+"""
+
+import logging
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from simple_history.utils import bulk_create_with_history
+
+from . import feature_store
+from .feature_store import LONG_DAYS, PRICE_DAYS, SHORT_DAYS
+from .models import Recommendation
+
+logger = logging.getLogger(__name__)
+User = get_user_model()
+
+# Soil health card "low" limits, kg/ha
+LOW_NITROGEN = 280
+LOW_PHOSPHORUS = 10
+LOW_POTASSIUM = 110
+ACID_PH = 5.5
+ALKALINE_PH = 8.5
+DRY_SOIL = 20           # soil moisture %
+WET_SOIL = 45
+HOT_DAY = 32            # °C
+FUNGAL_HUMIDITY = 80    # %
+FUNGAL_TEMPERATURE = (20, 30)
+PRICE_MOVE = 0.05
+
+TTL = {
+    'fertilizer_application': timedelta(days=30),
+    'irrigation_schedule': timedelta(days=3),
+    'disease_prevention': timedelta(days=3),
+    'market_timing': timedelta(days=7),
+}
+
+
+def _chunk_size():
+    return getattr(settings, 'AI_RECOMMENDATION_CHUNK_SIZE', 2000)
+
+
+def user_ranges(chunk_size=None):
+    """Inclusive (first pk, last pk) ranges of active users, chunk_size users each"""
+    chunk_size = chunk_size or _chunk_size()
+    ranges = []
+    last = None
+    while True:
+        users = User.objects.filter(is_active=True).order_by('pk')
+        if last is not None:
+            users = users.filter(pk__gt=last)
+        pks = list(users.values_list('pk', flat=True)[:chunk_size])
+        if not pks:
+            return ranges
+        ranges.append((pks[0], pks[-1]))
+        last = pks[-1]
+
+
+class Features:
+    """Features of a chunk of users, one NumPy column each"""
+
+    COLUMNS = {
+        'nitrogen': 'nitrogen', 'phosphorus': 'phosphorus', 'potassium': 'potassium', 'ph': 'ph_level',
+        'soil_age': 'soil_test_age_days', 'temperature': 'temperature_3d', 'humidity': 'humidity_3d',
+        'moisture': 'soil_moisture_3d', 'price_change': 'price_change_7d',
+    }
+
+    def __init__(self, users, values=None):
+        self.user_id = np.array([row[0] for row in users], dtype=np.int64)
+        self.location = [row[1] or row[2] or '' for row in users]
+        self.crop = [row[3] or '' for row in users]
+        if values is None:
+            values = np.full((len(users), len(self.COLUMNS)), np.nan)
+        for n, name in enumerate(self.COLUMNS):
+            setattr(self, name, values[:, n])
+
+    def __len__(self):
+        return len(self.user_id)
+
+
+def load_features(first_id, last_id, now=None):
+    users = list(
+        User.objects.filter(is_active=True, pk__gte=first_id, pk__lte=last_id).order_by('pk').values_list(
+            'pk', 'profile__village', 'profile__district', 'profile__primary_crop',
+        )
+    )
+    if not users:
+        return Features(users)
+    values = feature_store.matrix([row[0] for row in users], list(Features.COLUMNS.values()), now)
+    return Features(users, values)
+
+
+def _soil_confidence(features):
+    return 0.9 - 0.3 * np.clip(features.soil_age / 365, 0, 1)
+
+
+def _fertilizer(features, n):
+    actions = []
+    if features.nitrogen[n] < LOW_NITROGEN:
+        actions.append(f'Apply nitrogen: soil N is {features.nitrogen[n]:.0f} kg/ha (low below {LOW_NITROGEN})')
+    if features.phosphorus[n] < LOW_PHOSPHORUS:
+        actions.append(f'Apply phosphorus: soil P is {features.phosphorus[n]:.0f} kg/ha (low below {LOW_PHOSPHORUS})')
+    if features.potassium[n] < LOW_POTASSIUM:
+        actions.append(f'Apply potash: soil K is {features.potassium[n]:.0f} kg/ha (low below {LOW_POTASSIUM})')
+    if features.ph[n] < ACID_PH:
+        actions.append(f'Apply lime to correct acidic soil (pH {features.ph[n]:.1f})')
+    elif features.ph[n] > ALKALINE_PH:
+        actions.append(f'Apply gypsum to correct alkaline soil (pH {features.ph[n]:.1f})')
+    return {
+        'title': 'Correct soil nutrient levels',
+        'description': 'Your latest soil test shows nutrient or pH levels that will limit this season\'s crop.',
+        'action_items': actions,
+        'expected_benefits': 'Balanced nutrition avoids yield losses from deficient soil',
+        'supporting_data': {
+            'nitrogen': features.nitrogen[n], 'phosphorus': features.phosphorus[n],
+            'potassium': features.potassium[n], 'ph_level': features.ph[n], 'soil_test_age_days': features.soil_age[n],
+        },
+    }
+
+
+def _irrigation(features, n):
+    dry = features.moisture[n] < DRY_SOIL
+    return {
+        'title': 'Irrigate now' if dry else 'Hold back irrigation',
+        'description': (
+            f'Soil moisture around {features.location[n]} averaged {features.moisture[n]:.0f}% over the last '
+            f'{SHORT_DAYS} days.'
+        ),
+        'action_items': (
+            ['Irrigate in the early morning or evening', 'Mulch to reduce evaporation'] if dry
+            else ['Skip the next irrigation', 'Check field drainage']
+        ),
+        'expected_benefits': 'Avoids moisture stress' if dry else 'Saves water and prevents waterlogging',
+        'supporting_data': {'soil_moisture': features.moisture[n], 'temperature': features.temperature[n]},
+    }
+
+
+def _disease(features, n):
+    return {
+        'title': 'High fungal disease risk',
+        'description': (
+            f'Humid ({features.humidity[n]:.0f}%) and mild ({features.temperature[n]:.0f}°C) weather around '
+            f'{features.location[n]} favours fungal diseases.'
+        ),
+        'action_items': ['Scout fields for leaf spots and blight', 'Avoid overhead irrigation', 'Keep a preventive fungicide ready'],
+        'expected_benefits': 'Early action prevents disease spread across the field',
+        'supporting_data': {'humidity': features.humidity[n], 'temperature': features.temperature[n]},
+    }
+
+
+def _market(features, n):
+    change = features.price_change[n]
+    rising = change > 0
+    return {
+        'title': f"{features.crop[n].title()} prices are {'rising' if rising else 'falling'}",
+        'description': (
+            f'The last {PRICE_DAYS} days averaged {abs(change) * 100:.0f}% {"above" if rising else "below"} '
+            f'the {LONG_DAYS} days before.'
+        ),
+        'action_items': (
+            ['Consider selling stored produce this week', 'Compare prices at nearby mandis'] if rising
+            else ['Hold produce in storage if you can', 'Watch prices for a recovery']
+        ),
+        'expected_benefits': 'Better price realisation for your harvest',
+        'supporting_data': {'crop': features.crop[n], 'price_change': change},
+    }
+
+
+def score(features):
+    """
+    Vectorized rules over a chunk: [(recommendation type, mask, priority
+    array, confidence array, content builder)].
+    """
+    with np.errstate(invalid='ignore'):     # NaN (unknown) never matches
+        deficient = (
+            (features.nitrogen < LOW_NITROGEN).astype(int) + (features.phosphorus < LOW_PHOSPHORUS)
+            + (features.potassium < LOW_POTASSIUM)
+        )
+        bad_ph = (features.ph < ACID_PH) | (features.ph > ALKALINE_PH)
+        dry = features.moisture < DRY_SOIL
+        wet = features.moisture > WET_SOIL
+        fungal = (
+            (features.humidity >= FUNGAL_HUMIDITY)
+            & (features.temperature >= FUNGAL_TEMPERATURE[0]) & (features.temperature <= FUNGAL_TEMPERATURE[1])
+        )
+        moving = np.abs(features.price_change) >= PRICE_MOVE
+        hot = features.temperature > HOT_DAY
+    soil_confidence = _soil_confidence(features)
+    return [
+        (
+            'fertilizer_application', (deficient > 0) | bad_ph,
+            np.where(deficient >= 2, 'high', 'medium'), soil_confidence, _fertilizer,
+        ),
+        (
+            'irrigation_schedule', dry | wet,
+            np.where(dry & hot, 'critical', np.where(dry, 'high', 'low')), np.full(len(features), 0.8), _irrigation,
+        ),
+        (
+            'disease_prevention', fungal,
+            np.where(features.humidity >= 90, 'high', 'medium'), np.full(len(features), 0.75), _disease,
+        ),
+        (
+            'market_timing', moving,
+            np.where(np.abs(features.price_change) >= 2 * PRICE_MOVE, 'high', 'medium'),
+            np.clip(0.6 + np.abs(np.nan_to_num(features.price_change)), 0, 0.9), _market,
+        ),
+    ]
+
+
+def _json_safe(data):
+    return {
+        key: None if isinstance(value, float) and np.isnan(value) else value
+        for key, value in ((key, value.item() if isinstance(value, np.generic) else value) for key, value in data.items())
+    }
+
+
+def recommend(first_id, last_id, now=None):
+    """
+    Create the recommendations of active users with first_id <= pk <= last_id
+    that they do not already have; returns {'users', 'created', 'skipped'}.
+    """
+    now = now or timezone.now()
+    features = load_features(first_id, last_id, now)
+    if not len(features):
+        return {'users': 0, 'created': 0, 'skipped': 0}
+
+    user_ids = features.user_id.tolist()
+    recommendations = []
+    skipped = 0
+    with transaction.atomic():
+        live = set(
+            Recommendation.objects.filter(user_id__in=user_ids)
+            .filter(Q(expires_at__gt=now) | Q(expires_at__isnull=True))
+            .values_list('user_id', 'recommendation_type')
+        )
+        for recommendation_type, mask, priority, confidence, build in score(features):
+            for n in np.flatnonzero(mask):
+                user_id = user_ids[n]
+                if (user_id, recommendation_type) in live:
+                    skipped += 1
+                    continue
+                content = build(features, n)
+                recommendations.append(Recommendation(
+                    user_id=user_id,
+                    recommendation_type=recommendation_type,
+                    priority=str(priority[n]),
+                    title=content['title'],
+                    description=content['description'],
+                    action_items=content['action_items'],
+                    expected_benefits=content['expected_benefits'],
+                    confidence_score=round(float(confidence[n]), 2),
+                    reasoning='Rule-based assessment of your latest soil test, local weather and crop prices',
+                    supporting_data=_json_safe(content['supporting_data']),
+                    expires_at=now + TTL[recommendation_type],
+                    location=features.location[n] or None,
+                ))
+        bulk_create_with_history(recommendations, Recommendation, batch_size=500)
+    return {'users': len(features), 'created': len(recommendations), 'skipped': skipped}
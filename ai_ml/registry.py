@@ -0,0 +1,290 @@
+"""
+Per-process registry of loaded AI models
+
+Every worker process loads an ``AIModel``'s artifact once, on first use, and
+keeps it for later predictions instead of paying the load on every task.
+Artifacts are read from ``model_file`` (or ``weights_file`` when only that is
+set) through the default storage and loaded by extension:
+
+* ``.pkl`` / ``.pickle``: ``pickle``
+* ``.joblib``: ``joblib`` (optional dependency)
+* ``.onnx``: ``onnxruntime`` on the CPU provider (optional dependency), with
+  ``AI_INFERENCE_THREADS`` intra-op threads
+
+``config_file['format']`` overrides the extension. Artifacts are uploaded by
+staff and trusted; never point a model at user-supplied files.
+
+Loaded models are kept in an LRU bounded by ``AI_MODEL_CACHE_BYTES`` (the
+artifact size, or ``config_file['memory_bytes']`` when the in-memory size is
+known to differ), sized well below ``worker_max_memory_per_child`` so that a
+worker holds its hot models without being recycled for memory. An entry is
+reloaded when the model's version, artifact or ``updated_at`` changes.
+``warm_up`` preloads the most recently updated active models when a Celery
+worker process starts (``AI_MODEL_WARMUP``).
+"""
+
+import logging
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+from .models import AIModel
+
+logger = logging.getLogger(__name__)
+
+
+class ModelUnavailable(Exception):
+    """The model has no artifact or it could not be loaded"""
+
+
+def _cache_bytes():
+    return getattr(settings, 'AI_MODEL_CACHE_BYTES', 64 * 1024 * 1024)
+
+
+def _inference_threads():
+    return getattr(settings, 'AI_INFERENCE_THREADS', 1)
+
+
+def artifact_field(ai_model):
+    return ai_model.model_file or ai_model.weights_file
+
+
+def version_key(ai_model):
+    """Changes whenever a loaded copy of the model would be stale"""
+    artifact = artifact_field(ai_model)
+    updated = ai_model.updated_at.timestamp() if ai_model.updated_at else None
+    return (ai_model.version, artifact.name if artifact else '', updated)
+
+
+def _artifact_format(ai_model, artifact):
+    return ai_model.config_file.get('format') or os.path.splitext(artifact.name)[1].lstrip('.').lower()
+
+
+def _load_pickle(data):
+    return pickle.loads(data)
+
+
+def _load_joblib(data):
+    import io
+
+    try:
+        import joblib
+    except ImportError as exc:
+        raise ModelUnavailable('joblib is not installed') from exc
+    return joblib.load(io.BytesIO(data))
+
+
+def _load_onnx(data):
+    try:
+        import onnxruntime
+    except ImportError as exc:
+        raise ModelUnavailable('onnxruntime is not installed') from exc
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = _inference_threads()
+    options.inter_op_num_threads = 1
+    return OnnxModel(onnxruntime.InferenceSession(data, options, providers=['CPUExecutionProvider']))
+
+
+LOADERS = {
+    'pkl': _load_pickle,
+    'pickle': _load_pickle,
+    'joblib': _load_joblib,
+    'onnx': _load_onnx,
+}
+
+
+class OnnxModel:
+    """ONNX session behind the estimator ``predict``/``predict_proba`` interface"""
+
+    def __init__(self, session):
+        self.session = session
+        self.input_name = session.get_inputs()[0].name
+        self.output_names = [output.name for output in session.get_outputs()]
+
+    def _run(self, features):
+        return self.session.run(None, {self.input_name: np.asarray(features, dtype=np.float32)})
+
+    def predict(self, features):
+        return np.asarray(self._run(features)[0])
+
+    def predict_proba(self, features):
+        outputs = self._run(features)
+        if len(outputs) < 2:
+            raise AttributeError('model has no probability output')
+        probabilities = outputs[1]
+        if isinstance(probabilities, list):     # sklearn-onnx ZipMap output: one dict per row
+            probabilities = [[row[label] for label in sorted(row)] for row in probabilities]
+        return np.asarray(probabilities, dtype=np.float64)
+
+
+class LoadedModel:
+    """A model object ready to predict, with what it costs to keep it"""
+
+    def __init__(self, ai_model, estimator, nbytes, load_seconds):
+        self.model_id = ai_model.pk
+        self.version = version_key(ai_model)
+        self.config = dict(ai_model.config_file)
+        self.estimator = estimator
+        self.nbytes = nbytes
+        self.load_seconds = load_seconds
+        self.last_used = time.monotonic()
+
+    def predict(self, features):
+        return self.estimator.predict(features)
+
+    def predict_proba(self, features):
+        return self.estimator.predict_proba(features)
+
+    @property
+    def is_classifier(self):
+        return hasattr(self.estimator, 'predict_proba')
+
+
+def load(ai_model):
+    """Read and deserialize a model's artifact (uncached)"""
+    artifact = artifact_field(ai_model)
+    if not artifact:
+        raise ModelUnavailable(f"AI model {ai_model.pk} has no artifact")
+    loader = LOADERS.get(_artifact_format(ai_model, artifact))
+    if loader is None:
+        raise ModelUnavailable(f"Unsupported model format: {artifact.name}")
+
+    started = time.perf_counter()
+    try:
+        with artifact.open('rb') as f:
+            data = f.read()
+        estimator = loader(data)
+    except ModelUnavailable:
+        raise
+    except Exception as exc:
+        raise ModelUnavailable(f"Could not load {artifact.name}: {exc}") from exc
+    load_seconds = time.perf_counter() - started
+    nbytes = int(ai_model.config_file.get('memory_bytes') or len(data))
+    logger.info(f"Loaded AI model {ai_model.pk} ({artifact.name}, {nbytes} bytes) in {load_seconds:.3f}s")
+    return LoadedModel(ai_model, estimator, nbytes, load_seconds)
+
+
+class ModelRegistry:
+    """LRU of loaded models bounded by their total size in bytes"""
+
+    def __init__(self, max_bytes=None):
+        self._max_bytes = max_bytes
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._loading = {}
+        self.hits = self.loads = self.evictions = 0
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes if self._max_bytes is not None else _cache_bytes()
+
+    @property
+    def nbytes(self):
+        return sum(model.nbytes for model in self._models.values())
+
+    def __len__(self):
+        return len(self._models)
+
+    def __contains__(self, model_id):
+        return model_id in self._models
+
+    def get(self, ai_model):
+        """The loaded copy of ai_model, loading it on first use or after a change"""
+        key = version_key(ai_model)
+        with self._lock:
+            loaded = self._models.get(ai_model.pk)
+            if loaded is not None and loaded.version == key:
+                self._models.move_to_end(ai_model.pk)
+                loaded.last_used = time.monotonic()
+                self.hits += 1
+                return loaded
+            # One thread loads while others asking for the same model wait for it
+            loading = self._loading.setdefault(ai_model.pk, threading.Lock())
+
+        with loading:
+            with self._lock:
+                loaded = self._models.get(ai_model.pk)
+                if loaded is not None and loaded.version == key:
+                    self._models.move_to_end(ai_model.pk)
+                    self.hits += 1
+                    return loaded
+            try:
+                loaded = load(ai_model)
+            finally:
+                with self._lock:
+                    self._loading.pop(ai_model.pk, None)
+            with self._lock:
+                self._models.pop(ai_model.pk, None)
+                self._models[ai_model.pk] = loaded
+                self.loads += 1
+                self._evict()
+        return loaded
+
+    def _evict(self):
+        """Drop least recently used models until within budget (keeps the newest)"""
+        total = self.nbytes
+        while total > self.max_bytes and len(self._models) > 1:
+            model_id, evicted = self._models.popitem(last=False)
+            total -= evicted.nbytes
+            self.evictions += 1
+            logger.info(f"Evicted AI model {model_id} ({evicted.nbytes} bytes) from the registry")
+        if total > self.max_bytes:
+            logger.warning(f"AI model of {total} bytes exceeds AI_MODEL_CACHE_BYTES ({self.max_bytes})")
+
+    def discard(self, model_id):
+        with self._lock:
+            return self._models.pop(model_id, None) is not None
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+            self.hits = self.loads = self.evictions = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'models': len(self._models),
+                'bytes': self.nbytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'loads': self.loads,
+                'evictions': self.evictions,
+            }
+
+
+registry = ModelRegistry()
+
+
+def get_model(ai_model):
+    return registry.get(ai_model)
+
+
+def warm_up(limit=None):
+    """
+    Preload the most recently updated active models with artifacts, as many
+    as fit the budget (or limit). Returns the ids loaded.
+    """
+    loaded = []
+    budget = registry.max_bytes
+    candidates = AIModel.objects.filter(status='active').exclude(model_file='', weights_file='').order_by('-updated_at')
+    for ai_model in candidates[:limit] if limit else candidates:
+        artifact = artifact_field(ai_model)
+        if not artifact:
+            continue
+        try:
+            nbytes = int(ai_model.config_file.get('memory_bytes') or artifact.size)
+            if nbytes > budget:
+                break
+            registry.get(ai_model)
+        except (ModelUnavailable, OSError) as exc:
+            logger.warning(f"Skipping warm-up of AI model {ai_model.pk}: {exc}")
+            continue
+        loaded.append(ai_model.pk)
+        budget -= nbytes
+    logger.info(f"Warmed up {len(loaded)} AI models in process {os.getpid()}")
+    return loaded
@@ -0,0 +1,89 @@
+"""
+Signal handlers for the AI/ML app
+
+Each Celery worker process preloads the active models when it starts
+(``AI_MODEL_WARMUP``), and a deleted model is dropped from this process's
+registry; other processes notice changes through the model's version key.
+Saving or deleting a soil test, profile, weather reading or market price
+marks the feature vectors built from it stale, and so does a retention
+batch of weather or soil moisture readings (``core.retention``).
+"""
+
+from celery.signals import worker_process_init
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models.signals import post_delete, post_save
+
+from core.models import UserProfile
+from core.retention import batch_purging
+from marketplace.models import MarketPrice
+from soil_health.models import SoilHealthRecord
+from weather.models import SoilMoistureData, WeatherData
+
+from . import feature_store, registry
+from .models import AIModel
+
+
+def _warm_up_models(**kwargs):
+    if not getattr(settings, 'AI_MODEL_WARMUP', True):
+        return
+    close_old_connections()     # never reuse the parent's connection in a forked child
+    try:
+        registry.warm_up()
+    finally:
+        close_old_connections()
+
+
+worker_process_init.connect(_warm_up_models, dispatch_uid='warm_up_ai_models', weak=False)
+
+
+def _model_deleted(sender, instance, **kwargs):
+    registry.registry.discard(instance.pk)
+
+
+post_delete.connect(_model_deleted, sender=AIModel, dispatch_uid='discard_deleted_ai_model')
+
+
+def _user_source_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    user_id = instance.user_id
+    transaction.on_commit(lambda: feature_store.mark_users_stale([user_id]))
+
+
+def _location_source_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    location = instance.location
+    transaction.on_commit(lambda: feature_store.mark_location_stale(location))
+
+
+def _price_changed(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    crop = instance.crop_name
+    transaction.on_commit(lambda: feature_store.mark_users_stale(crop=crop))
+
+
+for _model, _handler in (
+    (SoilHealthRecord, _user_source_changed),
+    (UserProfile, _user_source_changed),
+    (WeatherData, _location_source_changed),
+    (SoilMoistureData, _location_source_changed),
+    (MarketPrice, _price_changed),
+):
+    post_save.connect(_handler, sender=_model, dispatch_uid=f'feature_store_save_{_model.__name__}')
+    post_delete.connect(_handler, sender=_model, dispatch_uid=f'feature_store_delete_{_model.__name__}')
+
+
+def _location_rows_purged(sender, queryset, **kwargs):
+    locations = list(queryset.order_by().values_list('location', flat=True).distinct())
+
+    def mark():
+        for location in locations:
+            feature_store.mark_location_stale(location)
+    transaction.on_commit(mark)
+
+
+for _model in (WeatherData, SoilMoistureData):
+    batch_purging.connect(_location_rows_purged, sender=_model, dispatch_uid=f'feature_store_purge_{_model.__name__}')
@@ -6,123 +6,70 @@ computer vision analysis, and intelligent recommendations.
 """
 
 import logging
-import time
-from celery import shared_task, current_task
+from celery import chord, group, shared_task
 from django.conf import settings
+from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from django.db.models import Q
 from django.utils import timezone
 from datetime import timedelta
-import numpy as np
 import pandas as pd
-from PIL import Image
-import io
-import base64
 
 from .models import (
     AIModel, Prediction, ComputerVisionAnalysis, 
-    Recommendation, TrainingJob, DataSource
+    Recommendation, TrainingJob, DataSource, ModelEvaluation
 )
+from . import batching, evaluation, feature_store, recommender, training, vision
+from .registry import ModelUnavailable
+from .training import TrainingError
+from core.retention import RetentionPolicy, history_policy, purge_all
 
 logger = logging.getLogger(__name__)
+User = get_user_model()
 
 
 @shared_task(bind=True, name='ai_ml.tasks.train_model')
 def train_model(self, model_id, training_config=None):
     """
-    Train an AI/ML model with the given configuration.
+    Train an AI/ML model on the platform's data (see ai_ml.training).
     
     Args:
         model_id: UUID of the AIModel to train
-        training_config: Optional training configuration override
+        training_config: Optional overrides of the model's training settings
     """
     try:
-        # Update task state
         self.update_state(
             state='PROGRESS',
-            meta={'current': 0, 'total': 100, 'status': 'Initializing training...'}
+            meta={'current': 0, 'total': 1, 'status': 'Loading training data...'}
         )
         
         # Get the model
         model = AIModel.objects.get(id=model_id)
         
-        # Create or get training job
-        training_job, created = TrainingJob.objects.get_or_create(
-            model=model,
-            defaults={
-                'status': 'running',
-                'training_config': training_config or {},
-                'total_epochs': training_config.get('epochs', 100) if training_config else 100,
-                'started_at': timezone.now()
-            }
-        )
-        
-        if not created:
-            training_job.status = 'running'
-            training_job.started_at = timezone.now()
-            training_job.save()
-        
-        # Simulate training process
-        total_epochs = training_job.total_epochs
-        
-        for epoch in range(total_epochs):
-            # Update progress
-            progress = (epoch + 1) / total_epochs * 100
-            current_task.update_state(
-                state='PROGRESS',
-                meta={
-                    'current': epoch + 1,
-                    'total': total_epochs,
-                    'status': f'Training epoch {epoch + 1}/{total_epochs}'
-                }
+        # Pick up the job retrain_models queued, or start a new one
+        training_job = TrainingJob.objects.filter(
+            model=model, status__in=['pending', 'running']
+        ).order_by('-created_at').first()
+        if training_job is None:
+            training_job = TrainingJob.objects.create(
+                model=model,
+                status='pending',
+                training_config=training_config or {},
+                dataset_info={},
+                total_epochs=1,
             )
-            
-            # Simulate training time
-            time.sleep(0.1)
-            
-            # Update training job
-            training_job.progress_percentage = progress
-            training_job.current_epoch = epoch + 1
-            training_job.training_loss = 1.0 - (epoch / total_epochs) * 0.8
-            training_job.validation_loss = 1.0 - (epoch / total_epochs) * 0.7
-            training_job.training_accuracy = (epoch / total_epochs) * 0.9
-            training_job.validation_accuracy = (epoch / total_epochs) * 0.85
-            training_job.save()
-        
-        # Complete training
-        training_job.status = 'completed'
-        training_job.completed_at = timezone.now()
-        training_job.duration = training_job.completed_at - training_job.started_at
-        training_job.progress_percentage = 100.0
-        training_job.save()
         
-        # Update model metrics
-        model.accuracy = training_job.validation_accuracy
-        model.precision = training_job.validation_accuracy * 0.95
-        model.recall = training_job.validation_accuracy * 0.92
-        model.f1_score = 2 * (model.precision * model.recall) / (model.precision + model.recall)
-        model.status = 'active'
-        model.last_trained = timezone.now()
-        model.training_duration = training_job.duration
-        model.save()
+        summary = training.train(model, training_job, task=self, overrides=training_config or training_job.training_config)
         
         logger.info(f"Model {model.name} training completed successfully")
         
-        return {
-            'status': 'Training completed successfully',
-            'model_id': str(model_id),
-            'accuracy': model.accuracy,
-            'duration': str(training_job.duration)
-        }
+        return dict(summary, status='Training completed successfully', model_id=str(model_id))
         
+    except TrainingError as exc:
+        logger.warning(f"Model {model_id} cannot be trained: {exc}")
+        return {'status': 'failed', 'model_id': str(model_id), 'error': str(exc)}
     except Exception as exc:
         logger.error(f"Error training model {model_id}: {exc}")
-        
-        # Update training job status
-        if 'training_job' in locals():
-            training_job.status = 'failed'
-            training_job.error_message = str(exc)
-            training_job.save()
-        
         raise self.retry(exc=exc, countdown=60, max_retries=3)
 
 
@@ -138,176 +85,141 @@ def make_prediction(self, model_id, user_id, input_data, prediction_type):
         prediction_type: Type of prediction to make
     """
     try:
-        # Get the model and user
+        # Get the model and check the user
         model = AIModel.objects.get(id=model_id, status='active')
-        user = User.objects.get(id=user_id)
-        
-        # Simulate prediction processing
-        time.sleep(0.5)
-        
-        # Generate mock prediction result based on type
-        if prediction_type == 'crop_yield':
-            result = {
-                'predicted_yield': round(np.random.uniform(2.5, 4.5), 2),
-                'confidence_interval': [round(np.random.uniform(2.0, 5.0), 2), round(np.random.uniform(2.5, 5.5), 2)],
-                'factors': ['soil_quality', 'weather_conditions', 'fertilizer_application'],
-                'recommendations': ['Increase irrigation', 'Apply nitrogen fertilizer', 'Monitor for pests']
-            }
-        elif prediction_type == 'disease_risk':
-            result = {
-                'risk_level': np.random.choice(['low', 'medium', 'high']),
-                'risk_score': round(np.random.uniform(0.1, 0.9), 2),
-                'symptoms': ['yellowing_leaves', 'stunted_growth', 'leaf_spots'],
-                'prevention_measures': ['Improve air circulation', 'Apply fungicide', 'Remove infected plants']
-            }
-        elif prediction_type == 'market_price':
-            result = {
-                'predicted_price': round(np.random.uniform(25, 75), 2),
-                'price_trend': np.random.choice(['increasing', 'decreasing', 'stable']),
-                'market_factors': ['demand_supply', 'weather_conditions', 'export_demand'],
-                'timing_recommendation': np.random.choice(['sell_now', 'hold', 'wait_for_better_price'])
-            }
-        else:
-            result = {
-                'prediction': 'Sample prediction result',
-                'confidence': round(np.random.uniform(0.6, 0.95), 2)
-            }
+        if not User.objects.filter(id=user_id).exists():
+            raise User.DoesNotExist(f"User {user_id} does not exist")
         
-        # Calculate confidence score
-        confidence_score = round(np.random.uniform(0.7, 0.95), 2)
+        # Inputs the caller did not pass come from the user's stored features
+        request = {'user_id': user_id, 'input_data': input_data}
+        feature_store.complete([request], model.config_file.get('features') or [])
+        input_data = request['input_data']
         
-        # Determine confidence level
-        if confidence_score < 0.6:
-            confidence_level = 'low'
-        elif confidence_score < 0.8:
-            confidence_level = 'medium'
-        elif confidence_score < 0.95:
-            confidence_level = 'high'
-        else:
-            confidence_level = 'very_high'
+        # Scored together with concurrent requests for the same model; the
+        # model itself is loaded once per worker process
+        prediction = batching.predict(model, user_id, input_data, prediction_type)
         
-        # Create prediction record
-        prediction = Prediction.objects.create(
-            model=model,
-            user=user,
-            prediction_type=prediction_type,
-            input_data=input_data,
-            prediction_result=result,
-            confidence_score=confidence_score,
-            confidence_level=confidence_level,
-            expires_at=timezone.now() + timedelta(days=30)
-        )
+        logger.info(f"Prediction created successfully: {prediction['prediction_id']}")
         
-        logger.info(f"Prediction created successfully: {prediction.id}")
-        
-        return {
-            'prediction_id': str(prediction.id),
-            'confidence_score': confidence_score,
-            'result': result
-        }
+        return prediction
         
+    except ModelUnavailable as exc:
+        # Retrying cannot fix a missing or broken artifact
+        logger.error(f"Cannot make prediction with model {model_id}: {exc}")
+        raise
     except Exception as exc:
         logger.error(f"Error making prediction: {exc}")
         raise self.retry(exc=exc, countdown=30, max_retries=2)
 
 
+@shared_task(bind=True, name='ai_ml.tasks.make_predictions')
+def make_predictions(self, model_id, requests):
+    """
+    Make many predictions with one model in vectorized batches.
+    
+    Args:
+        model_id: UUID of the AIModel to use
+        requests: List of {'user_id', 'input_data', 'prediction_type'} dicts
+    """
+    try:
+        model = AIModel.objects.get(id=model_id, status='active')
+        feature_store.complete(requests, model.config_file.get('features') or [])
+        results = batching.predict_all(model, requests)
+        logger.info(f"Created {len(results)} predictions with model {model_id}")
+        return results
+        
+    except ModelUnavailable as exc:
+        logger.error(f"Cannot make predictions with model {model_id}: {exc}")
+        raise
+    except Exception as exc:
+        logger.error(f"Error making predictions: {exc}")
+        raise self.retry(exc=exc, countdown=30, max_retries=2)
+
+
+def _analyze(image_names, analysis_type, user_id, location=None):
+    """Run stored images through the vision pipeline and save their analyses"""
+    if not User.objects.filter(id=user_id).exists():
+        raise User.DoesNotExist(f"User {user_id} does not exist")
+    ai_model = vision.model_for(analysis_type)
+    
+    outcomes = {}
+    for results in _chunks(vision.analyze(ai_model, list(image_names), analysis_type), vision._batch_size()):
+        good = [result for result in results if result.error is None]
+        for analysis, result in zip(vision.save_analyses(ai_model, good, analysis_type, user_id, location), good):
+            outcomes[result.name] = {
+                'analysis_id': str(analysis.id),
+                'analysis_result': analysis.analysis_result,
+                'detected_objects': analysis.detected_objects,
+                'processing_time': analysis.processing_time,
+            }
+        for result in results:
+            if result.error is not None:
+                logger.warning(f"Skipping {result.name}: {result.error}")
+                outcomes[result.name] = {'error': result.error}
+    
+    logger.info(f"Image analysis completed: {len(image_names)} images with model {ai_model.pk}")
+    return [outcomes[name] for name in image_names]
+
+
 @shared_task(bind=True, name='ai_ml.tasks.analyze_image')
-def analyze_image(self, image_data, analysis_type, user_id, location=None):
+def analyze_image(self, image_name, analysis_type, user_id, location=None):
     """
     Analyze an image using computer vision models.
     
     Args:
-        image_data: Base64 encoded image data
+        image_name: Storage name of the uploaded image (see vision.store_upload)
         analysis_type: Type of analysis to perform
         user_id: ID of the user requesting analysis
         location: Optional location information
     """
     try:
-        # Update task state
-        self.update_state(
-            state='PROGRESS',
-            meta={'status': 'Processing image...'}
-        )
-        
-        # Get user
-        user = User.objects.get(id=user_id)
-        
-        # Decode image data
-        try:
-            image_bytes = base64.b64decode(image_data.split(',')[1] if ',' in image_data else image_data)
-            image = Image.open(io.BytesIO(image_bytes))
-        except Exception as e:
-            raise ValueError(f"Invalid image data: {e}")
-        
-        # Simulate image processing
-        time.sleep(1.0)
-        
-        # Generate mock analysis results based on type
-        if analysis_type == 'crop_health':
-            analysis_result = {
-                'overall_health': np.random.choice(['excellent', 'good', 'fair', 'poor']),
-                'health_score': round(np.random.uniform(0.6, 1.0), 2),
-                'issues_detected': np.random.choice([0, 1, 2, 3]),
-                'recommendations': ['Continue current practices', 'Monitor for changes', 'Consider fertilization']
-            }
-            detected_objects = ['healthy_leaves', 'green_stems', 'normal_growth']
-            
-        elif analysis_type == 'disease_detection':
-            analysis_result = {
-                'diseases_detected': np.random.choice([0, 1, 2]),
-                'severity': np.random.choice(['none', 'mild', 'moderate', 'severe']),
-                'affected_area_percentage': round(np.random.uniform(0, 30), 1),
-                'treatment_recommendations': ['Remove affected leaves', 'Apply fungicide', 'Improve air circulation']
-            }
-            detected_objects = ['healthy_leaves', 'diseased_spots', 'yellowed_areas']
-            
-        elif analysis_type == 'pest_detection':
-            analysis_result = {
-                'pests_detected': np.random.choice([0, 1, 2, 3]),
-                'infestation_level': np.random.choice(['none', 'low', 'moderate', 'high']),
-                'pest_types': np.random.choice(['aphids', 'spider_mites', 'whiteflies'], size=np.random.randint(0, 3)),
-                'control_measures': ['Apply insecticide', 'Introduce beneficial insects', 'Remove affected plants']
-            }
-            detected_objects = ['healthy_plant', 'pest_insects', 'damaged_leaves']
-            
-        else:
-            analysis_result = {
-                'analysis_complete': True,
-                'confidence': round(np.random.uniform(0.7, 0.95), 2)
-            }
-            detected_objects = ['general_objects']
-        
-        # Generate confidence scores for detected objects
-        confidence_scores = {
-            obj: round(np.random.uniform(0.7, 0.95), 2) 
-            for obj in detected_objects
-        }
-        
-        # Create computer vision analysis record
-        cv_analysis = ComputerVisionAnalysis.objects.create(
-            user=user,
-            analysis_type=analysis_type,
-            image=image_data,  # Store as base64 for demo
-            analysis_result=analysis_result,
-            detected_objects=detected_objects,
-            confidence_scores=confidence_scores,
-            processing_time=1.0,
-            model_version='v1.0.0',
-            location=location
-        )
-        
-        logger.info(f"Image analysis completed: {cv_analysis.id}")
-        
-        return {
-            'analysis_id': str(cv_analysis.id),
-            'analysis_result': analysis_result,
-            'detected_objects': detected_objects,
-            'processing_time': 1.0
-        }
+        result = _analyze([image_name], analysis_type, user_id, location)[0]
         
+    except ModelUnavailable as exc:
+        # Retrying cannot fix a missing or broken model
+        logger.error(f"Cannot analyze image: {exc}")
+        raise
     except Exception as exc:
         logger.error(f"Error analyzing image: {exc}")
         raise self.retry(exc=exc, countdown=30, max_retries=2)
+    
+    if 'error' in result:
+        raise ValueError(result['error'])
+    return result
+
+
+@shared_task(bind=True, name='ai_ml.tasks.analyze_images')
+def analyze_images(self, image_names, analysis_type, user_id, location=None):
+    """
+    Analyze a set of stored images in batches; unreadable images get an
+    {'error': ...} entry instead of failing the rest.
+    
+    Args:
+        image_names: Storage names of the uploaded images
+        analysis_type: Type of analysis to perform
+        user_id: ID of the user requesting analysis
+        location: Optional location information
+    """
+    try:
+        return _analyze(image_names, analysis_type, user_id, location)
+        
+    except ModelUnavailable as exc:
+        logger.error(f"Cannot analyze images: {exc}")
+        raise
+    except Exception as exc:
+        logger.error(f"Error analyzing images: {exc}")
+        raise self.retry(exc=exc, countdown=30, max_retries=2)
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
 
 
 @shared_task(bind=True, name='ai_ml.tasks.generate_recommendations')
@@ -317,87 +229,70 @@ def generate_recommendations(self, user_id, context_data=None):
     
     Args:
         user_id: ID of the user to generate recommendations for
-        context_data: Optional context data for recommendations
+        context_data: Optional context data for recommendations (unused; the
+            rules read the user's soil, weather and crop data themselves)
     """
     try:
-        # Get user
-        user = User.objects.get(id=user_id)
-        
-        # Simulate recommendation generation
-        time.sleep(0.5)
-        
-        # Generate mock recommendations based on context
-        recommendations = []
-        
-        # Crop selection recommendation
-        recommendations.append({
-            'type': 'crop_selection',
-            'title': 'Optimal Crop Selection for Current Season',
-            'description': 'Based on soil analysis and weather forecasts, consider planting maize or soybeans this season.',
-            'priority': 'high',
-            'confidence_score': round(np.random.uniform(0.8, 0.95), 2),
-            'action_items': ['Prepare soil for maize', 'Purchase quality seeds', 'Plan irrigation schedule'],
-            'expected_benefits': 'Expected 15-20% increase in yield compared to previous crops'
-        })
-        
-        # Irrigation schedule recommendation
-        recommendations.append({
-            'type': 'irrigation_schedule',
-            'title': 'Optimized Irrigation Schedule',
-            'description': 'Adjust irrigation frequency based on recent weather patterns and soil moisture levels.',
-            'priority': 'medium',
-            'confidence_score': round(np.random.uniform(0.7, 0.9), 2),
-            'action_items': ['Reduce irrigation frequency by 20%', 'Monitor soil moisture sensors', 'Adjust timing to early morning'],
-            'expected_benefits': 'Water savings of 25% while maintaining crop health'
-        })
-        
-        # Pest control recommendation
-        if np.random.random() > 0.5:
-            recommendations.append({
-                'type': 'pest_control',
-                'title': 'Preventive Pest Control Measures',
-                'description': 'Early detection and prevention of common pests in your crop area.',
-                'priority': 'medium',
-                'confidence_score': round(np.random.uniform(0.7, 0.85), 2),
-                'action_items': ['Apply preventive insecticide', 'Install pheromone traps', 'Regular field monitoring'],
-                'expected_benefits': 'Prevent potential 10-15% yield loss due to pest damage'
-            })
-        
-        # Create recommendation records
-        created_recommendations = []
-        for rec_data in recommendations:
-            recommendation = Recommendation.objects.create(
-                user=user,
-                recommendation_type=rec_data['type'],
-                priority=rec_data['priority'],
-                title=rec_data['title'],
-                description=rec_data['description'],
-                action_items=rec_data['action_items'],
-                expected_benefits=rec_data['expected_benefits'],
-                confidence_score=rec_data['confidence_score'],
-                reasoning='Generated based on historical data, current conditions, and predictive models',
-                supporting_data={
-                    'weather_data': 'recent_forecasts',
-                    'soil_data': 'laboratory_analysis',
-                    'market_data': 'price_trends',
-                    'historical_yields': 'previous_seasons'
-                },
-                expires_at=timezone.now() + timedelta(days=60)
-            )
-            created_recommendations.append(recommendation)
+        result = recommender.recommend(user_id, user_id)
         
-        logger.info(f"Generated {len(created_recommendations)} recommendations for user {user_id}")
+        logger.info(f"Generated {result['created']} recommendations for user {user_id}")
         
-        return {
-            'recommendations_created': len(created_recommendations),
-            'recommendation_ids': [str(r.id) for r in created_recommendations]
-        }
+        return {'recommendations_created': result['created'], 'recommendations_skipped': result['skipped']}
         
     except Exception as exc:
         logger.error(f"Error generating recommendations: {exc}")
         raise self.retry(exc=exc, countdown=60, max_retries=2)
 
 
+@shared_task(bind=True, name='ai_ml.tasks.refresh_recommendations')
+def refresh_recommendations(self, chunk_size=None):
+    """
+    Refresh recommendations for every active user: one chunk task per range
+    of users, with a summary once all of them have finished.
+    """
+    ranges = recommender.user_ranges(chunk_size)
+    if not ranges:
+        return {'chunks': 0}
+    result = chord(
+        group(generate_recommendation_chunk.s(first_id, last_id) for first_id, last_id in ranges)
+    )(summarize_recommendations.s())
+    logger.info(f"Refreshing recommendations in {len(ranges)} chunks")
+    return {'chunks': len(ranges), 'summary_id': result.id}
+
+
+@shared_task(bind=True, name='ai_ml.tasks.generate_recommendation_chunk', max_retries=3)
+def generate_recommendation_chunk(self, first_id, last_id):
+    """Recommendations for active users with first_id <= pk <= last_id (see ai_ml.recommender)."""
+    try:
+        return dict(recommender.recommend(first_id, last_id), first_id=first_id, last_id=last_id)
+    except Exception as exc:
+        if self.request.retries >= self.max_retries:
+            # Give up on this chunk only; the chord still summarizes the others
+            logger.error(f"Recommendations for users {first_id}-{last_id} failed: {exc}")
+            return {'first_id': first_id, 'last_id': last_id, 'users': 0, 'created': 0, 'skipped': 0, 'failed': True}
+        raise self.retry(exc=exc, countdown=30 * (self.request.retries + 1))
+
+
+@shared_task(name='ai_ml.tasks.summarize_recommendations')
+def summarize_recommendations(results):
+    summary = {
+        name: sum(result[name] for result in results) for name in ('users', 'created', 'skipped')
+    }
+    summary['failed_chunks'] = [[result['first_id'], result['last_id']] for result in results if result.get('failed')]
+    logger.info(f"Recommendation refresh finished: {summary}")
+    return summary
+
+
+@shared_task(bind=True, name='ai_ml.tasks.refresh_features')
+def refresh_features(self):
+    """Rebuild out-of-date feature vectors (see ai_ml.feature_store)."""
+    try:
+        return feature_store.refresh()
+    except Exception as exc:
+        logger.error(f"Error refreshing features: {exc}")
+        raise self.retry(exc=exc, countdown=120, max_retries=2)
+
+
 @shared_task(bind=True, name='ai_ml.tasks.retrain_models')
 def retrain_models(self, model_types=None):
     """
@@ -407,30 +302,27 @@ def retrain_models(self, model_types=None):
         model_types: Optional list of model types to retrain
     """
     try:
-        # Get models to retrain
-        if model_types:
-            models = AIModel.objects.filter(
-                model_type__in=model_types,
-                status__in=['active', 'inactive']
-            )
-        else:
+        # Get models to retrain (only the tabular models have a training task)
+        models = AIModel.objects.filter(
+            model_type__in=model_types or list(training.MODEL_TASKS),
+            status__in=['active', 'inactive']
+        ).exclude(training_jobs__status__in=['pending', 'running'])
+        if not model_types:
             # Retrain models that haven't been trained recently
             cutoff_date = timezone.now() - timedelta(days=30)
-            models = AIModel.objects.filter(
-                last_trained__lt=cutoff_date,
-                status__in=['active', 'inactive']
-            )
+            models = models.filter(Q(last_trained__lt=cutoff_date) | Q(last_trained__isnull=True))
         
         retrained_count = 0
         
         for model in models:
             try:
                 # Create training job
-                training_job = TrainingJob.objects.create(
+                TrainingJob.objects.create(
                     model=model,
                     status='pending',
-                    training_config={'epochs': 100, 'batch_size': 32},
-                    total_epochs=100
+                    training_config={},
+                    dataset_info={},
+                    total_epochs=1
                 )
                 
                 # Trigger training task
@@ -454,52 +346,47 @@ def retrain_models(self, model_types=None):
 
 
 @shared_task(bind=True, name='ai_ml.tasks.cleanup_old_data')
-def cleanup_old_data(self, days_old=90):
+def cleanup_old_data(self, days_old=90, max_seconds=None):
     """
-    Clean up old AI/ML data to maintain database performance.
+    Clean up old AI/ML data to maintain database performance, in bounded
+    batches (see core.retention).
     
     Args:
         days_old: Age threshold for data cleanup in days
+        max_seconds: Optional time budget; the next run resumes the rest
     """
     try:
-        cutoff_date = timezone.now() - timedelta(days=days_old)
-        
-        # Clean up old predictions
-        old_predictions = Prediction.objects.filter(created_at__lt=cutoff_date)
-        predictions_deleted = old_predictions.count()
-        old_predictions.delete()
-        
-        # Clean up old computer vision analyses
-        old_cv_analyses = ComputerVisionAnalysis.objects.filter(created_at__lt=cutoff_date)
-        cv_analyses_deleted = old_cv_analyses.count()
-        old_cv_analyses.delete()
-        
-        # Clean up old recommendations
-        old_recommendations = Recommendation.objects.filter(
-            created_at__lt=cutoff_date,
-            is_applied=True
-        )
-        recommendations_deleted = old_recommendations.count()
-        old_recommendations.delete()
-        
-        # Clean up old training jobs
-        old_training_jobs = TrainingJob.objects.filter(
-            created_at__lt=cutoff_date,
-            status__in=['completed', 'failed', 'cancelled']
-        )
-        training_jobs_deleted = old_training_jobs.count()
-        old_training_jobs.delete()
-        
-        total_deleted = predictions_deleted + cv_analyses_deleted + recommendations_deleted + training_jobs_deleted
+        policies = [
+            RetentionPolicy('predictions', Prediction, days_old),
+            RetentionPolicy('cv_analyses', ComputerVisionAnalysis, days_old, file_fields=('image', 'thumbnail')),
+            # Recommendations are only dropped once the farmer has applied them
+            RetentionPolicy('recommendations', Recommendation, days_old, filters={'is_applied': True}),
+            RetentionPolicy(
+                'training_jobs', TrainingJob, days_old, filters={'status__in': ['completed', 'failed', 'cancelled']},
+            ),
+            RetentionPolicy('evaluations', ModelEvaluation, days_old),
+        ] + [
+            history_policy(model, days_old)
+            for model in (Prediction, ComputerVisionAnalysis, Recommendation, TrainingJob)
+        ]
+        
+        def report(progress):
+            self.update_state(state='PROGRESS', meta=progress)
+        
+        results = purge_all(policies, max_seconds=max_seconds, progress=report)
+        total_deleted = sum(result['deleted'] for result in results.values())
         
         logger.info(f"Cleaned up {total_deleted} old AI/ML records")
         
         return {
-            'predictions_deleted': predictions_deleted,
-            'cv_analyses_deleted': cv_analyses_deleted,
-            'recommendations_deleted': recommendations_deleted,
-            'training_jobs_deleted': training_jobs_deleted,
-            'total_deleted': total_deleted
+            'predictions_deleted': results['predictions']['deleted'],
+            'cv_analyses_deleted': results['cv_analyses']['deleted'],
+            'recommendations_deleted': results['recommendations']['deleted'],
+            'training_jobs_deleted': results['training_jobs']['deleted'],
+            'evaluations_deleted': results['evaluations']['deleted'],
+            'history_deleted': sum(result['deleted'] for label, result in results.items() if label.endswith('_history')),
+            'total_deleted': total_deleted,
+            'complete': all(result['complete'] for result in results.values()),
         }
         
     except Exception as exc:
@@ -509,34 +396,37 @@ def cleanup_old_data(self, days_old=90):
 
 @shared_task(bind=True, name='ai_ml.tasks.update_model_performance')
 def update_model_performance(self):
-    """Update performance metrics for all active AI models."""
+    """
+    Score active models and recommendations against real outcomes over the
+    rolling window (see ai_ml.evaluation) and retrain drifted models.
+    """
     try:
-        active_models = AIModel.objects.filter(status='active')
-        updated_count = 0
+        evaluations, drifted = evaluation.evaluate()
         
-        for model in active_models:
-            try:
-                # Simulate performance update
-                time.sleep(0.1)
-                
-                # Update metrics with slight variations
-                if model.accuracy:
-                    model.accuracy = max(0.5, min(1.0, model.accuracy + np.random.uniform(-0.05, 0.05)))
-                    model.precision = max(0.5, min(1.0, model.precision + np.random.uniform(-0.05, 0.05)))
-                    model.recall = max(0.5, min(1.0, model.recall + np.random.uniform(-0.05, 0.05)))
-                    model.f1_score = 2 * (model.precision * model.recall) / (model.precision + model.recall)
-                    model.save()
-                    updated_count += 1
-                    
-            except Exception as e:
-                logger.error(f"Error updating model {model.id}: {e}")
+        retrained_count = 0
+        for model in drifted:
+            if model.training_jobs.filter(status__in=['pending', 'running']).exists():
                 continue
+            TrainingJob.objects.create(
+                model=model,
+                status='pending',
+                training_config={},
+                dataset_info={'trigger': 'drift'},
+                total_epochs=1
+            )
+            train_model.delay(str(model.id))
+            retrained_count += 1
         
-        logger.info(f"Updated performance metrics for {updated_count} models")
+        logger.info(
+            f"Evaluated {len(evaluations)} models and recommendation types; "
+            f"scheduled retraining for {retrained_count} drifted models"
+        )
         
         return {
-            'models_updated': updated_count,
-            'total_models': active_models.count()
+            'models_evaluated': sum(1 for row in evaluations if row.model_id),
+            'recommendation_types_evaluated': sum(1 for row in evaluations if not row.model_id),
+            'models_drifted': len(drifted),
+            'models_scheduled': retrained_count,
         }
         
     except Exception as exc:
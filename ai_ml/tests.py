@@ -0,0 +1,600 @@
+"""
+Tests for AI/ML model loading, predictions and image analysis
+"""
+
+import io
+import pickle
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from PIL import Image
+
+from core import retention
+from core.models import UserProfile
+from marketplace.models import MarketPrice
+from soil_health.models import SoilHealthRecord
+from weather.models import SoilMoistureData, WeatherData
+
+from . import (
+    batching, evaluation, feature_store, inference, prediction_cache, progress, recommender, registry, tasks, training,
+    vision,
+)
+from .models import (
+    AIModel, ComputerVisionAnalysis, FeatureVector, ModelEvaluation, Prediction, Recommendation, TrainingJob,
+)
+
+
+class LinearModel:
+    """Picklable stand-in for a trained regressor"""
+
+    def __init__(self, coef, intercept=0.0, padding=0):
+        self.coef = np.asarray(coef, dtype=np.float64)
+        self.intercept = intercept
+        self.padding = b'\0' * padding
+
+    def __setstate__(self, state):
+        time.sleep(0.05)    # a load that is expensive enough to notice
+        self.__dict__.update(state)
+
+    def predict(self, features):
+        return np.asarray(features) @ self.coef + self.intercept
+
+
+class AIModelTestMixin:
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        override = override_settings(MEDIA_ROOT=self.tmp)
+        override.enable()
+        self.addCleanup(override.disable)
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        registry.registry.clear()
+        self.addCleanup(registry.registry.clear)
+        cache.clear()
+        self.user = User.objects.create_user(username='farmer', password='testpass123')
+
+    def create_model(self, name, estimator, model_type='yield_forecast', **config):
+        config.setdefault('features', ['rainfall', 'nitrogen'])
+        ai_model = AIModel.objects.create(
+            name=name, model_type=model_type, version='1', description='-', status='active', config_file=config,
+        )
+        ai_model.model_file.save(f'{name}.pkl', ContentFile(pickle.dumps(estimator)))
+        return ai_model
+
+
+class ModelRegistryTestCase(AIModelTestMixin, TestCase):
+    """Test cases for lazily loaded, size-bounded models"""
+
+    def test_model_is_loaded_once_and_reloaded_on_new_version(self):
+        ai_model = self.create_model('yield', LinearModel([0.01, 0.02], 1.0), residual_std=0.1)
+
+        first = tasks.make_prediction.apply(args=[ai_model.pk, self.user.pk, {'rainfall': 100, 'nitrogen': 50}, 'crop_yield']).get()
+        self.assertEqual(first['result']['predicted_yield'], 3.0)
+        self.assertEqual(first['result']['confidence_interval'], [2.8, 3.2])
+        self.assertEqual((registry.registry.loads, registry.registry.hits), (1, 0))
+        inference.predict(ai_model, 'crop_yield', {'rainfall': 200, 'nitrogen': 0})
+        self.assertEqual((registry.registry.loads, registry.registry.hits), (1, 1))
+        self.assertEqual(Prediction.objects.get().prediction_result, first['result'])
+
+        ai_model.model_file.save('yield-v2.pkl', ContentFile(pickle.dumps(LinearModel([0.0, 0.0], 5.0))))
+        ai_model.version = '2'
+        ai_model.save()
+        result, _confidence = inference.predict(ai_model, 'crop_yield', {'rainfall': 100})
+        self.assertEqual(result['predicted_yield'], 5.0)
+        self.assertEqual(registry.registry.loads, 2)
+
+    def test_least_recently_used_models_are_evicted_by_size(self):
+        models = [self.create_model(f'model-{n}', LinearModel([1, 1], padding=4000)) for n in range(3)]
+        with override_settings(AI_MODEL_CACHE_BYTES=9000):
+            registry.get_model(models[0])
+            registry.get_model(models[1])
+            registry.get_model(models[0])
+            registry.get_model(models[2])
+            self.assertIn(models[0].pk, registry.registry)
+            self.assertNotIn(models[1].pk, registry.registry)
+            self.assertLessEqual(registry.registry.nbytes, 9000)
+
+            registry.registry.clear()
+            self.assertEqual(len(registry.warm_up()), 2)
+
+    def test_model_without_artifact_fails_without_retrying(self):
+        ai_model = AIModel.objects.create(name='empty', model_type='yield_forecast', version='1', description='-', status='active')
+        with self.assertRaises(registry.ModelUnavailable):
+            tasks.make_prediction.apply(args=[ai_model.pk, self.user.pk, {}, 'crop_yield']).get()
+
+
+class MicroBatchingTestCase(AIModelTestMixin, TransactionTestCase):
+    """Test cases for batched prediction scoring"""
+
+    def test_concurrent_requests_share_batches(self):
+        ai_model = self.create_model('yield', LinearModel([0.01, 0.02], 1.0))
+        registry.get_model(ai_model)
+        batcher = batching.MicroBatcher(max_batch=8, max_wait=0.05)
+        inputs = [{'rainfall': 100 * n, 'nitrogen': 0} for n in range(20)]
+
+        def predict(input_data):
+            result = batcher.predict(ai_model, self.user.pk, input_data, 'crop_yield')
+            close_old_connections()
+            return result
+
+        with ThreadPoolExecutor(max_workers=20) as pool:
+            results = list(pool.map(predict, inputs))
+
+        self.assertEqual([r['result']['predicted_yield'] for r in results], [1.0 + n for n in range(20)])
+        self.assertEqual(batcher.requests, 20)
+        self.assertLessEqual(batcher.batches, 4)
+        self.assertEqual(Prediction.objects.count(), 20)
+
+    def test_bulk_task_scores_every_request_in_order(self):
+        ai_model = self.create_model('yield', LinearModel([0.01, 0.02], 1.0))
+        requests = [
+            {'user_id': self.user.pk, 'input_data': {'rainfall': n, 'nitrogen': 0},
+             'prediction_type': 'crop_yield' if n % 20 else 'market_price'}
+            for n in range(0, 1000, 10)
+        ]
+        with override_settings(AI_BATCH_MAX_SIZE=16), self.assertNumQueries(1 + 2 + 3 * 8):
+            results = tasks.make_predictions.apply(args=[ai_model.pk, requests]).get()
+        self.assertEqual(len(results), 100)
+        self.assertEqual(results[1]['result'], {'predicted_yield': 1.1, 'confidence_interval': [1.1, 1.1]})
+        self.assertEqual(results[2]['result']['predicted_price'], 1.2)
+
+
+class PredictionCacheTestCase(AIModelTestMixin, TestCase):
+    """Test cases for reusing predictions of near-identical inputs"""
+
+    def setUp(self):
+        super().setUp()
+        self.ai_model = self.create_model('price', LinearModel([0.5, 0.0], 20.0), precision={'rainfall': -1})
+
+    def predict(self, input_data):
+        return tasks.make_prediction.apply(args=[self.ai_model.pk, self.user.pk, input_data, 'market_price']).get()
+
+    def test_near_identical_inputs_are_served_from_cache_and_table(self):
+        first = self.predict({'rainfall': 101, 'nitrogen': '5', 'village': 'Tenali'})
+        self.assertFalse(first['cached'])
+        with self.assertNumQueries(2):      # model and user; nothing scored or stored
+            second = self.predict({'rainfall': 98.7, 'nitrogen': 5.0, 'village': 'tenali '})
+        self.assertEqual((second['prediction_id'], second['cached']), (first['prediction_id'], True))
+
+        cache.clear()
+        third = self.predict({'rainfall': 100, 'nitrogen': 5})
+        self.assertEqual(third['prediction_id'], first['prediction_id'])
+        self.assertEqual(Prediction.objects.count(), 1)
+        self.assertEqual(
+            prediction_cache.stats(), {'hits': 0, 'db_hits': 1, 'misses': 0, 'hit_rate': 1.0}
+        )
+
+        self.assertNotEqual(self.predict({'rainfall': 120})['prediction_id'], first['prediction_id'])
+        Prediction.objects.update(expires_at=timezone.now())
+        cache.clear()
+        self.assertFalse(self.predict({'rainfall': 100, 'nitrogen': 5})['cached'])
+
+    def test_retrained_model_invalidates_results(self):
+        first = self.predict({'rainfall': 100})
+        self.ai_model.model_file.save('price-v2.pkl', ContentFile(pickle.dumps(LinearModel([1.0, 0.0]))))
+        self.ai_model.version = '2'
+        self.ai_model.save()
+        second = self.predict({'rainfall': 100})
+        self.assertFalse(second['cached'])
+        self.assertEqual((first['result']['predicted_price'], second['result']['predicted_price']), (70.0, 100.0))
+
+    def test_repeated_inputs_in_a_batch_are_scored_once(self):
+        requests = [
+            {'user_id': self.user.pk, 'input_data': {'rainfall': 100 + n % 3}, 'prediction_type': 'market_price'}
+            for n in range(30)
+        ]
+        results = batching.predict_all(self.ai_model, requests)
+        self.assertEqual(len({result['prediction_id'] for result in results}), 1)
+        self.assertEqual(Prediction.objects.count(), 1)
+        self.assertEqual(prediction_cache.stats()['hits'], 29)
+
+
+class ColourModel:
+    """Picklable leaf classifier: greener photos are healthier"""
+
+    def predict(self, batch):
+        red, green = batch[:, 0].mean(axis=(1, 2)), batch[:, 1].mean(axis=(1, 2))
+        return np.column_stack([green - red, red - green]) * 10
+
+
+class VisionPipelineTestCase(AIModelTestMixin, TestCase):
+    """Test cases for batched image analysis of stored uploads"""
+
+    def photo(self, colour):
+        buffer = io.BytesIO()
+        Image.new('RGB', (640, 480), colour).save(buffer, 'JPEG')
+        return vision.store_bytes(buffer.getvalue(), self.user.pk)
+
+    def test_stored_images_are_analysed_in_batches(self):
+        ai_model = AIModel.objects.create(
+            name='leaf', model_type='disease_detection', version='3', description='-', status='active',
+            config_file={'input_size': [32, 32], 'labels': ['healthy', 'leaf_blight']},
+        )
+        ai_model.model_file.save('leaf.pkl', ContentFile(pickle.dumps(ColourModel())))
+        names = [self.photo((40, 200, 40)), self.photo((200, 60, 40)), vision.store_bytes(b'not an image', self.user.pk)]
+
+        with override_settings(AI_VISION_BATCH_SIZE=2):
+            results = tasks.analyze_images.apply(args=[names, 'disease_detection', self.user.pk]).get()
+
+        self.assertEqual([r.get('analysis_result', {}).get('top_label') for r in results], ['healthy', 'leaf_blight', None])
+        self.assertEqual(results[1]['analysis_result']['diseases_detected'], 1)
+        self.assertIn('Invalid image', results[2]['error'])
+        analysis = ComputerVisionAnalysis.objects.get(pk=results[0]['analysis_id'])
+        self.assertEqual((analysis.image.name, analysis.model_version), (names[0], '3'))
+        self.assertTrue(analysis.thumbnail.name)
+        self.assertEqual(set(analysis.analysis_result['stage_seconds']), set(vision.STAGES))
+        self.assertAlmostEqual(analysis.processing_time, sum(analysis.analysis_result['stage_seconds'].values()), 4)
+
+    def test_preprocessing_normalizes_the_whole_batch(self):
+        config = {'input_size': [8, 4], 'mean': [0.5, 0.5, 0.5], 'std': [0.25, 0.25, 0.25]}
+        images = [Image.new('RGB', (50, 30), (255, 128, 0)), Image.new('RGB', (20, 20), (0, 0, 0))]
+        batch = vision.preprocess(images, config)
+        self.assertEqual((batch.shape, batch.dtype), ((2, 3, 4, 8), np.float32))
+        np.testing.assert_allclose(batch[0, :, 0, 0], [2.0, 0.0078, -2.0], atol=1e-3)
+        np.testing.assert_allclose(batch[1].max(), -2.0)
+
+
+class RecordingTask:
+    """Stands in for a bound Celery task"""
+
+    def __init__(self):
+        self.states = []
+
+    def update_state(self, state, meta):
+        self.states.append(meta)
+
+
+@override_settings(AI_TRAINING_PROGRESS_INTERVAL=3600, AI_TRAINING_PROGRESS_STEP=10, AI_TRAINING_PERSIST_INTERVAL=3600)
+class TrainingProgressTestCase(TestCase):
+    """Test cases for throttled training progress"""
+
+    def setUp(self):
+        cache.clear()
+        ai_model = AIModel.objects.create(name='yield', model_type='yield_forecast', version='1', description='-')
+        self.job = TrainingJob.objects.create(
+            model=ai_model, training_config={}, dataset_info={}, total_epochs=1000,
+        )
+
+    def test_epochs_are_throttled_and_final_state_persisted_once(self):
+        shared = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, shared, ignore_errors=True)
+        override = override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': shared},
+        })
+        override.enable()
+        self.addCleanup(override.disable)
+        task = RecordingTask()
+        reporter = progress.TrainingProgress(self.job, task=task)
+        reporter.start()
+
+        with self.assertNumQueries(0):
+            for epoch in range(1, 1001):
+                reporter.update(epoch, training_loss=1 / epoch)
+        self.assertEqual([state['current'] for state in task.states], list(range(100, 1001, 100)))
+
+        stored = TrainingJob.objects.get(pk=self.job.pk)
+        self.assertEqual((stored.status, stored.current_epoch), ('running', 0))
+        live = progress.live(stored)
+        self.assertEqual((live['current_epoch'], live['progress_percentage']), (1000, 100.0))
+
+        reporter.finish()
+        self.assertEqual(reporter.db_writes, 2)     # start and finish
+        stored.refresh_from_db()
+        self.assertEqual((stored.status, stored.current_epoch, stored.training_loss), ('completed', 1000, 0.001))
+        self.assertIsNotNone(stored.duration)
+        self.assertEqual(progress.live(stored)['status'], 'completed')
+
+    def test_process_local_cache_writes_the_row_on_the_state_throttle(self):
+        reporter = progress.TrainingProgress(self.job, task=RecordingTask())
+        reporter.start()
+        for epoch in range(1, 501):
+            reporter.update(epoch)
+
+        # Other processes, which cannot read this cache, see the last throttled report
+        stored = TrainingJob.objects.get(pk=self.job.pk)
+        self.assertEqual((stored.current_epoch, stored.progress_percentage), (500, 50.0))
+        self.assertEqual(reporter.db_writes, 1 + len(reporter.task.states))
+
+
+class TrainingEngineTestCase(AIModelTestMixin, TestCase):
+    """Test cases for offline training of the tabular models"""
+
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(3)
+        for location, temperature, humidity in [('Guntur', 33, 55), ('Warangal', 29, 80)]:
+            WeatherData.objects.create(
+                location=location, temperature=temperature, humidity=humidity, wind_speed=5, pressure=1010,
+                description='clear', visibility=10,
+            )
+        records = []
+        for n in range(120):
+            nitrogen = rng.uniform(100, 400)
+            location = 'Guntur' if n % 2 else 'warangal '
+            score = int(np.clip(round(1 + nitrogen / 50 - (2 if n % 2 == 0 else 0) + rng.normal(scale=0.3)), 1, 10))
+            records.append(SoilHealthRecord(
+                user=self.user, record_date=date(2026, 1, 1) + timedelta(days=n), location=location,
+                ph_level=round(rng.uniform(5.5, 8), 1), nitrogen=round(nitrogen, 2),
+                phosphorus=None if n % 10 == 0 else round(rng.uniform(10, 60), 2), potassium=200,
+                health_score=score, is_healthy=score >= 5,
+            ))
+        SoilHealthRecord.objects.bulk_create(records)
+        MarketPrice.objects.bulk_create([
+            MarketPrice(
+                crop_name=crop, mandi_name='Guntur', price_date=date(2026, 1, 1) + timedelta(days=n),
+                price_per_quintal=round(base + 8 * n + rng.normal(scale=5), 2), volume=100 + n,
+            )
+            for crop, base in [('Cotton', 6000), ('Chilli', 12000)] for n in range(60)
+        ])
+
+    def train(self, name, model_type, **config):
+        ai_model = AIModel.objects.create(
+            name=name, model_type=model_type, version='1', description='-', config_file=config,
+        )
+        job = TrainingJob.objects.create(model=ai_model, training_config={}, dataset_info={}, total_epochs=1)
+        with override_settings(AI_TRAINING_CHUNK_SIZE=25):
+            summary = training.train(ai_model, job)
+        ai_model.refresh_from_db()
+        job.refresh_from_db()
+        return ai_model, job, summary
+
+    def test_trains_yield_and_disease_models_from_soil_and_weather(self):
+        ai_model, job, summary = self.train('yield', 'yield_forecast', grid={'alpha': [0.1, 10.0], 'degree': [1]})
+
+        self.assertEqual(summary['rows'], 120)
+        self.assertEqual((job.status, job.current_epoch, job.total_epochs), ('completed', 3, 3))
+        self.assertEqual(ai_model.status, 'active')
+        self.assertGreater(ai_model.accuracy, 0.6)
+        self.assertGreater(ai_model.f1_score, 0.6)
+        self.assertEqual(ai_model.config_file['features'], training.SOIL_FEATURES + training.CLIMATE_FEATURES)
+        self.assertFalse(default_storage.exists(training._checkpoint_name(ai_model)))
+        result, _ = inference.predict(ai_model, 'crop_yield', {
+            'nitrogen': 400, 'ph_level': 6.5, 'potassium': 200, 'temperature': 33, 'humidity': 55,
+        })
+        self.assertAlmostEqual(result['predicted_yield'], 9, delta=1)
+
+        # Retraining a model taken out of service leaves it out
+        AIModel.objects.filter(pk=ai_model.pk).update(status='inactive')
+        ai_model.refresh_from_db()
+        job = TrainingJob.objects.create(model=ai_model, training_config={}, dataset_info={}, total_epochs=1)
+        with override_settings(AI_TRAINING_CHUNK_SIZE=25):
+            training.train(ai_model, job)
+        ai_model.refresh_from_db()
+        self.assertEqual(ai_model.status, 'inactive')
+
+        ai_model, job, summary = self.train('risk', 'disease_risk', grid={'alpha': [0.1], 'degree': [1], 'learning_rate': [0.5]})
+        self.assertGreater(ai_model.accuracy, 0.8)
+        result, _ = inference.predict(ai_model, 'disease_risk', {'nitrogen': 100, 'temperature': 29, 'humidity': 80})
+        self.assertEqual(result['risk_level'], 'high')
+
+    @override_settings(AI_TRAINING_WORKERS=2)
+    def test_price_grid_is_searched_in_a_process_pool(self):
+        dataset = training.market_price_dataset(chunk_size=7)
+        self.assertEqual(dataset.X.shape, (2 * 57, len(training.PRICE_FEATURES)))
+        candidates = training.expand_grid(training.REGRESSION_GRID)
+        pooled = training.search(training.estimators.RidgeRegressor, candidates, dataset.X, dataset.y)
+        serial = training.search(training.estimators.RidgeRegressor, candidates, dataset.X, dataset.y, workers=1)
+        self.assertEqual(pooled.keys(), serial.keys())
+        for key, loss in serial.items():
+            self.assertAlmostEqual(pooled[key], loss)
+
+    def test_too_little_data_fails_the_job(self):
+        MarketPrice.objects.all().delete()
+        with self.assertRaises(training.TrainingError):
+            self.train('price', 'market_prediction')
+        job = TrainingJob.objects.get()
+        self.assertEqual(job.status, 'failed')
+        self.assertIn('training rows', job.error_message)
+
+
+class BatchRecommendationTestCase(TestCase):
+    """Test cases for chunked recommendation generation"""
+
+    def setUp(self):
+        self.farmers = [User.objects.create_user(username=f'farmer{n}') for n in range(4)]
+        for farmer in self.farmers[:3]:
+            UserProfile.objects.create(user=farmer, village='Guntur ', primary_crop='Cotton')
+            SoilHealthRecord.objects.create(
+                user=farmer, record_date=date.today() - timedelta(days=400), location='Guntur', nitrogen=400,
+            )
+            SoilHealthRecord.objects.create(
+                user=farmer, record_date=date.today() - timedelta(days=20), location='Guntur',
+                nitrogen=150, phosphorus=5, potassium=200, ph_level=6.5,
+            )
+        WeatherData.objects.create(
+            location='guntur', temperature=26, humidity=88, wind_speed=5, pressure=1010,
+            description='humid', visibility=10,
+        )
+        SoilMoistureData.objects.create(location='Guntur', soil_moisture=15, soil_temperature=24, depth=10)
+        for days_ago, price in [(2, 7000), (20, 6000)]:
+            MarketPrice.objects.create(
+                crop_name='cotton', mandi_name='Guntur', price_per_quintal=price,
+                price_date=date.today() - timedelta(days=days_ago),
+            )
+        Recommendation.objects.create(
+            user=self.farmers[2], recommendation_type='market_timing', title='-', description='-',
+            expected_benefits='-', confidence_score=0.7, reasoning='-', expires_at=timezone.now() + timedelta(days=1),
+        )
+
+    def test_chunk_is_scored_with_a_fixed_number_of_queries(self):
+        first, last = self.farmers[0].pk, self.farmers[-1].pk
+        feature_store.refresh()
+        with self.assertNumQueries(7):
+            result = recommender.recommend(first, last)
+
+        self.assertEqual(result, {'users': 4, 'created': 11, 'skipped': 1})
+        fertilizer = Recommendation.objects.get(user=self.farmers[0], recommendation_type='fertilizer_application')
+        self.assertEqual((fertilizer.priority, fertilizer.confidence_score), ('high', 0.88))
+        self.assertEqual(len(fertilizer.action_items), 2)
+        self.assertEqual(
+            set(Recommendation.objects.filter(user=self.farmers[0]).values_list('recommendation_type', flat=True)),
+            {'fertilizer_application', 'irrigation_schedule', 'disease_prevention', 'market_timing'},
+        )
+        self.assertFalse(Recommendation.objects.filter(user=self.farmers[3]).exists())
+
+        # Unexpired recommendations are not repeated
+        self.assertEqual(recommender.recommend(first, last)['created'], 0)
+
+    def test_refresh_fans_out_chunks_and_summarizes(self):
+        app = tasks.refresh_recommendations.app
+        app.conf.task_always_eager = True
+        self.addCleanup(setattr, app.conf, 'task_always_eager', False)
+
+        self.assertEqual(len(recommender.user_ranges(chunk_size=3)), 2)
+        result = tasks.refresh_recommendations.apply(kwargs={'chunk_size': 3}).get()
+
+        self.assertEqual(result['chunks'], 2)
+        self.assertEqual(Recommendation.objects.count(), 12)
+
+
+class FeatureStoreTestCase(TestCase):
+    """Test cases for the materialized feature vectors"""
+
+    def setUp(self):
+        self.farmer = User.objects.create_user(username='farmer')
+        UserProfile.objects.create(user=self.farmer, district='Guntur', primary_crop='Cotton', land_area=2)
+        SoilHealthRecord.objects.create(
+            user=self.farmer, record_date=date.today() - timedelta(days=10), location='Guntur',
+            nitrogen=150, phosphorus=5, potassium=200, ph_level=6.5,
+        )
+        WeatherData.objects.create(
+            location='Guntur', temperature=30, humidity=60, wind_speed=5, pressure=1010,
+            description='clear', visibility=10,
+        )
+        MarketPrice.objects.create(
+            crop_name='Cotton', mandi_name='Guntur', price_per_quintal=7000, volume=40,
+            price_date=date.today() - timedelta(days=1),
+        )
+
+    def test_vectors_are_built_once_and_read_with_one_query(self):
+        features = ['nitrogen', 'land_area', 'price_lag_1', 'volume_lag_1', 'temperature_3d', 'soil_moisture_3d']
+        built = feature_store.user_features([self.farmer.pk], features)[self.farmer.pk]
+        self.assertEqual(
+            built, {'nitrogen': 150, 'land_area': 2, 'price_lag_1': 7000, 'volume_lag_1': 40, 'temperature_3d': 30},
+        )
+        self.assertEqual(FeatureVector.objects.count(), 2)
+
+        with self.assertNumQueries(1):
+            values = feature_store.matrix([self.farmer.pk, self.farmer.pk], features)
+        self.assertEqual(values.shape, (2, len(features)))
+
+    def test_saved_source_rows_mark_vectors_stale(self):
+        feature_store.matrix([self.farmer.pk], ['ph_level'])
+        with self.captureOnCommitCallbacks(execute=True):
+            SoilHealthRecord.objects.create(
+                user=self.farmer, record_date=date.today(), location='Guntur', ph_level=5.0,
+            )
+        self.assertTrue(FeatureVector.objects.get(entity_type='user').stale)
+
+        self.assertEqual(feature_store.matrix([self.farmer.pk], ['ph_level'])[0, 0], 5.0)
+        self.assertFalse(FeatureVector.objects.get(entity_type='user').stale)
+
+    def test_retention_purge_marks_location_vectors_stale(self):
+        feature_store.matrix([self.farmer.pk], ['temperature_3d'])
+        WeatherData.objects.update(recorded_at=timezone.now() - timedelta(days=400))
+        policy = retention.RetentionPolicy('weather', WeatherData, 365, date_field='recorded_at')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(retention.purge(policy, pause=0)['deleted'], 1)
+        self.assertTrue(FeatureVector.objects.get(entity_type='location').stale)
+
+    def test_complete_fills_missing_inputs_only(self):
+        requests = [
+            {'user_id': self.farmer.pk, 'input_data': {'nitrogen': 300}},
+            {'user_id': None, 'input_data': {}},
+        ]
+        feature_store.complete(requests, ['nitrogen', 'phosphorus', 'rainfall'])
+        self.assertEqual(requests[0]['input_data'], {'nitrogen': 300, 'phosphorus': 5})
+        self.assertEqual(requests[1]['input_data'], {})
+
+    def test_refresh_picks_up_rows_inserted_without_signals(self):
+        self.assertEqual(feature_store.refresh(), {'users': 1, 'locations': 0})
+
+        SoilHealthRecord.objects.bulk_create([SoilHealthRecord(
+            user=self.farmer, record_date=date.today(), location='Guntur', nitrogen=500,
+        )])
+        self.assertEqual(feature_store.refresh()['users'], 1)
+        vector = FeatureVector.objects.get(entity_type='user')
+        self.assertEqual(feature_store.decode(vector.values)[feature_store.USER_FEATURES.index('nitrogen')], 500)
+
+
+class ModelEvaluationTestCase(TestCase):
+    """Test cases for evaluating models against real outcomes"""
+
+    def setUp(self):
+        self.farmer = User.objects.create_user(username='farmer')
+        UserProfile.objects.create(user=self.farmer, village='Guntur', primary_crop='Cotton')
+        self.model = AIModel.objects.create(
+            name='prices', model_type='market_prediction', version='2', description='-', status='active',
+            accuracy=0.9, last_trained=timezone.now() - timedelta(days=5),
+        )
+        self.day = date.today() - timedelta(days=3)
+
+    def predict(self, price, count=20, days_ago=3, **input_data):
+        Prediction.objects.bulk_create([
+            Prediction(
+                model=self.model, user=self.farmer, prediction_type='market_price', input_data=input_data,
+                prediction_result={'predicted_price': price}, confidence_score=0.8, confidence_level='high',
+            )
+            for _ in range(count)
+        ])
+        Prediction.objects.filter(created_at__gte=timezone.now() - timedelta(minutes=1)).update(
+            created_at=timezone.now() - timedelta(days=days_ago),
+        )
+
+    def actual(self, price, crop='Cotton', mandi='Guntur'):
+        MarketPrice.objects.create(
+            crop_name=crop, mandi_name=mandi, price_per_quintal=price, price_date=self.day + timedelta(days=1),
+        )
+
+    def test_predictions_are_scored_against_later_prices(self):
+        self.predict(7000, count=30)
+        self.predict(5000, count=10, crop_name='Chilli', mandi_name='Warangal')
+        self.predict(1, count=50, days_ago=6)     # before the current version was trained
+        self.actual(7300)
+        self.actual(5000, crop='chilli', mandi='Warangal ')
+
+        with self.assertNumQueries(6):
+            evaluations, drifted = evaluation.evaluate()
+
+        self.assertEqual(drifted, [])
+        row = ModelEvaluation.objects.get(model=self.model)
+        self.assertEqual((row.samples, row.model_version, row.retrain_triggered), (40, '2', False))
+        self.assertEqual(row.quality, 1.0)
+        self.assertEqual(row.metrics['mae'], 225.0)
+        self.assertEqual(row.drift, round(0.9 - 1.0, 4))
+
+    def test_drift_calls_for_retraining(self):
+        self.predict(7000, count=40)
+        self.actual(9000)
+
+        evaluations, drifted = evaluation.evaluate()
+
+        self.assertEqual(drifted, [self.model])
+        self.assertTrue(evaluations[0].retrain_triggered)
+        self.assertAlmostEqual(evaluations[0].drift, 0.9)
+
+    def test_recommendation_feedback(self):
+        for rating, applied in [(5, True), (4, True), (2, False), (None, False)]:
+            Recommendation.objects.create(
+                user=self.farmer, recommendation_type='irrigation_schedule', title='-', description='-',
+                expected_benefits='-', confidence_score=0.8, reasoning='-', feedback_rating=rating, is_applied=applied,
+            )
+
+        evaluation.evaluate()
+
+        row = ModelEvaluation.objects.get(recommendation_type='irrigation_schedule')
+        self.assertEqual(row.samples, 3)
+        self.assertAlmostEqual(row.quality, 2 / 3)
+        self.assertEqual(row.metrics['applied_rate'], 0.5)
+        self.assertEqual(row.metrics['ratings'], [0, 1, 0, 1, 1])
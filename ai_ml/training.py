@@ -0,0 +1,452 @@
+"""
+Offline training of the tabular models
+
+``train`` fits the model behind an ``AIModel`` from the platform's own data
+and replaces its artifact. Each training task names a dataset, an estimator
+from ``ai_ml.estimators`` and a hyperparameter grid:
+
+* ``crop_yield`` (``yield_forecast`` models): soil tests from
+  ``SoilHealthRecord`` joined with the average climate of their location from
+  ``WeatherData``; no harvest figures are recorded, so the soil
+  ``health_score`` (1-10) is the productivity target;
+* ``disease_risk`` (``disease_risk`` models): the same features, classifying
+  records that were not ``is_healthy``;
+* ``market_price`` (``market_prediction`` models): the next ``MarketPrice`` of
+  each crop and mandi from its previous three prices, the previous volume
+  and the season.
+
+Rows are read with ``values_list`` ``AI_TRAINING_CHUNK_SIZE`` at a time into
+NumPy columns; missing values are filled with the training medians, which
+are stored as the model's ``defaults``. The newest ``test_fraction`` of rows
+(a random sample for the soil tasks) is held out. Every grid candidate is
+scored by k-fold validation loss in a process pool of
+``AI_TRAINING_WORKERS`` processes (all cores by default), so the search
+takes about 1/cores of the serial time; the pool needs a worker that may
+fork, i.e. the ``ai_training`` queue run with ``-P solo``, and the search
+runs serially otherwise. Scores are checkpointed after every candidate and a
+retried job skips those already scored.
+
+The best candidate is measured on the held-out rows, refitted on all rows
+and saved to ``model_file`` together with ``accuracy``, ``precision``,
+``recall`` and ``f1_score``. For regressors, accuracy is the share of
+predictions within ``tolerance`` (10%) of the actual value and
+precision/recall/F1 are those of calling a value above the training median.
+``config_file`` overrides ``grid``, ``folds``, ``test_fraction``,
+``tolerance``, ``min_rows`` and ``seed``.
+"""
+
+import hashlib
+import itertools
+import json
+import logging
+import os
+import pickle
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import islice
+
+import numpy as np
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import Avg
+from django.utils import timezone
+from django.utils.text import slugify
+
+from marketplace.models import MarketPrice
+from soil_health.models import SoilHealthRecord
+from weather.models import WeatherData
+
+from . import estimators
+from .progress import TrainingProgress
+
+logger = logging.getLogger(__name__)
+
+CHECKPOINT_DIR = 'ai_models/checkpoints'
+MIN_ROWS = 30
+PRICE_LAGS = 3
+SOIL_FEATURES = ['ph_level', 'organic_matter', 'nitrogen', 'phosphorus', 'potassium']
+CLIMATE_FEATURES = ['temperature', 'humidity']
+PRICE_FEATURES = [f'price_lag_{n}' for n in range(1, PRICE_LAGS + 1)] + ['volume_lag_1', 'season_sin', 'season_cos']
+
+REGRESSION_GRID = {'alpha': [0.01, 0.1, 1.0, 10.0, 100.0], 'degree': [1, 2]}
+CLASSIFICATION_GRID = {'alpha': [0.01, 0.1, 1.0, 10.0], 'degree': [1, 2], 'learning_rate': [0.1, 0.5]}
+
+
+class TrainingError(Exception):
+    """The model cannot be trained (no training task, not enough data)"""
+
+
+def _chunk_size():
+    return getattr(settings, 'AI_TRAINING_CHUNK_SIZE', 5000)
+
+
+def _workers():
+    return getattr(settings, 'AI_TRAINING_WORKERS', 0) or os.cpu_count() or 1
+
+
+class Dataset:
+    """Feature matrix, target and feature names; rows in time order"""
+
+    def __init__(self, X, y, features, time_ordered=True):
+        self.X = X
+        self.y = y
+        self.features = features
+        self.time_ordered = time_ordered
+
+
+def read_columns(queryset, fields, numeric=(), chunk_size=None):
+    """
+    {field: array} of queryset's values, read chunk_size rows at a time;
+    numeric fields become float64 with NaN for NULL, the rest object arrays.
+    """
+    chunk_size = chunk_size or _chunk_size()
+    parts = {field: [] for field in fields}
+    rows = queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        for field, values in zip(fields, zip(*chunk)):
+            if field in numeric:
+                parts[field].append(np.fromiter(
+                    (np.nan if value is None else float(value) for value in values), np.float64, len(values),
+                ))
+            else:
+                column = np.empty(len(values), dtype=object)
+                column[:] = values
+                parts[field].append(column)
+    return {
+        field: np.concatenate(chunks) if chunks else np.empty(0, np.float64 if field in numeric else object)
+        for field, chunks in parts.items()
+    }
+
+
+def _location_key(location):
+    return (location or '').strip().casefold()
+
+
+def climate_by_location():
+    """{location: (average temperature, average humidity)} in one grouped query"""
+    rows = WeatherData.objects.values('location').annotate(
+        avg_temperature=Avg('temperature'), avg_humidity=Avg('humidity'),
+    ).order_by()
+    climate = {}
+    for row in rows:
+        climate[_location_key(row['location'])] = (float(row['avg_temperature']), float(row['avg_humidity']))
+    return climate
+
+
+def soil_dataset(target, chunk_size=None):
+    queryset = SoilHealthRecord.objects.order_by('record_date', 'pk')
+    if target == 'health_score':
+        queryset = queryset.filter(health_score__isnull=False)
+    columns = read_columns(queryset, ['location', *SOIL_FEATURES, target], [*SOIL_FEATURES, target], chunk_size)
+    climate = climate_by_location()
+    unknown = (np.nan, np.nan)
+    climate_columns = np.array(
+        [climate.get(_location_key(location), unknown) for location in columns['location']], dtype=np.float64,
+    ).reshape(-1, len(CLIMATE_FEATURES))
+    X = np.column_stack([columns[field] for field in SOIL_FEATURES] + [climate_columns])
+    y = columns[target]
+    if target == 'is_healthy':
+        y = 1.0 - y     # positive class: at risk
+    return Dataset(X, y, SOIL_FEATURES + CLIMATE_FEATURES, time_ordered=False)
+
+
+def market_price_dataset(chunk_size=None):
+    queryset = MarketPrice.objects.order_by('crop_name', 'mandi_name', 'price_date')
+    columns = read_columns(
+        queryset, ['crop_name', 'mandi_name', 'price_date', 'price_per_quintal', 'volume'],
+        ['price_per_quintal', 'volume'], chunk_size,
+    )
+    price, volume = columns['price_per_quintal'], columns['volume']
+    n = len(price)
+    crop = np.array([_location_key(name) for name in columns['crop_name']], dtype=object)
+    mandi = np.array([_location_key(name) for name in columns['mandi_name']], dtype=object)
+
+    # Row i has all its lags when row i - PRICE_LAGS is the same series (rows are sorted by series)
+    valid = np.zeros(n, dtype=bool)
+    if n > PRICE_LAGS:
+        valid[PRICE_LAGS:] = (crop[PRICE_LAGS:] == crop[:-PRICE_LAGS]) & (mandi[PRICE_LAGS:] == mandi[:-PRICE_LAGS])
+
+    def lagged(values, lag):
+        shifted = np.full(n, np.nan)
+        shifted[lag:] = values[:n - lag]
+        return shifted
+
+    ordinal = np.fromiter((day.toordinal() for day in columns['price_date']), np.int64, n)
+    day_of_year = np.fromiter((day.timetuple().tm_yday for day in columns['price_date']), np.float64, n)
+    angle = 2 * np.pi * day_of_year / 365.25
+    X = np.column_stack(
+        [lagged(price, lag) for lag in range(1, PRICE_LAGS + 1)]
+        + [lagged(volume, 1), np.sin(angle), np.cos(angle)]
+    )[valid]
+    order = np.argsort(ordinal[valid], kind='stable')
+    return Dataset(X[order], price[valid][order], PRICE_FEATURES)
+
+
+class TrainingTask:
+    """What to learn for one kind of model"""
+
+    def __init__(self, name, load, estimator_class, grid, labels=None):
+        self.name = name
+        self.load = load
+        self.estimator_class = estimator_class
+        self.grid = grid
+        self.labels = labels
+
+    @property
+    def is_classifier(self):
+        return self.labels is not None
+
+
+TASKS = {
+    'crop_yield': TrainingTask(
+        'crop_yield', lambda chunk_size: soil_dataset('health_score', chunk_size),
+        estimators.RidgeRegressor, REGRESSION_GRID,
+    ),
+    'disease_risk': TrainingTask(
+        'disease_risk', lambda chunk_size: soil_dataset('is_healthy', chunk_size),
+        estimators.LogisticClassifier, CLASSIFICATION_GRID, labels=['healthy', 'at_risk'],
+    ),
+    'market_price': TrainingTask(
+        'market_price', market_price_dataset, estimators.RidgeRegressor, REGRESSION_GRID,
+    ),
+}
+
+MODEL_TASKS = {
+    'yield_forecast': 'crop_yield',
+    'disease_risk': 'disease_risk',
+    'market_prediction': 'market_price',
+}
+
+
+def task_for(ai_model, config=None):
+    name = (config or ai_model.config_file).get('task') or MODEL_TASKS.get(ai_model.model_type)
+    if name not in TASKS:
+        raise TrainingError(f"No training task for {ai_model.get_model_type_display()} models")
+    return TASKS[name]
+
+
+def expand_grid(grid):
+    names = sorted(grid)
+    return [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+
+
+def _param_key(params):
+    return json.dumps(params, sort_keys=True)
+
+
+def search(estimator_class, candidates, X, y, folds=3, workers=None, on_result=None):
+    """
+    k-fold validation loss of every candidate, as {params key: loss}; calls
+    on_result(params, loss) as each finishes. Uses a process pool of workers
+    processes and falls back to scoring serially where a pool cannot start.
+    """
+    workers = min(workers or _workers(), len(candidates))
+    results = {}
+
+    def done(params, loss):
+        results[_param_key(params)] = loss
+        if on_result:
+            on_result(params, loss)
+
+    if workers > 1:
+        try:
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=estimators.init_worker, initargs=(X, y, folds),
+            ) as pool:
+                futures = {pool.submit(estimators.evaluate, estimator_class, params): params for params in candidates}
+                for future in as_completed(futures):
+                    done(futures[future], future.result())
+        except (AssertionError, OSError) as exc:     # e.g. daemonic prefork children cannot fork
+            logger.warning(f"Process pool unavailable, searching serially: {exc}")
+    for params in candidates:
+        if _param_key(params) not in results:
+            done(params, estimators.evaluate(estimator_class, params, X, y, folds))
+    return results
+
+
+def _binary_scores(actual, predicted):
+    true_positive = np.sum(actual & predicted)
+    precision = true_positive / predicted.sum() if predicted.any() else 0.0
+    recall = true_positive / actual.sum() if actual.any() else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return float(precision), float(recall), float(f1)
+
+
+def regression_metrics(y_true, y_pred, threshold, tolerance=0.1):
+    residuals = y_pred - y_true
+    precision, recall, f1 = _binary_scores(y_true > threshold, y_pred > threshold)
+    variance = np.var(y_true)
+    return {
+        'accuracy': float(np.mean(np.abs(residuals) <= tolerance * np.abs(y_true))),
+        'precision': precision,
+        'recall': recall,
+        'f1_score': f1,
+        'mae': float(np.mean(np.abs(residuals))),
+        'rmse': float(np.sqrt(np.mean(residuals ** 2))),
+        'r2': float(1 - np.mean(residuals ** 2) / variance) if variance else 0.0,
+        'residual_std': float(np.std(residuals)),
+    }
+
+
+def classification_metrics(y_true, probability):
+    actual, predicted = y_true >= 0.5, probability >= 0.5
+    precision, recall, f1 = _binary_scores(actual, predicted)
+    return {
+        'accuracy': float(np.mean(actual == predicted)),
+        'precision': precision,
+        'recall': recall,
+        'f1_score': f1,
+    }
+
+
+def measure(spec, estimator, X, y, threshold, tolerance):
+    if spec.is_classifier:
+        return classification_metrics(y, estimator.predict_proba(X)[:, 1])
+    return regression_metrics(y, estimator.predict(X), threshold, tolerance)
+
+
+def _checkpoint_name(ai_model):
+    return f'{CHECKPOINT_DIR}/{ai_model.pk}.json'
+
+
+def _signature(spec, X, y, folds):
+    digest = hashlib.sha256(f'{spec.name}:{folds}'.encode())
+    digest.update(np.ascontiguousarray(X).tobytes())
+    digest.update(np.ascontiguousarray(y).tobytes())
+    return digest.hexdigest()
+
+
+def load_checkpoint(ai_model, signature):
+    """Losses scored by an earlier attempt on the same data, as {params key: loss}"""
+    name = _checkpoint_name(ai_model)
+    if not default_storage.exists(name):
+        return {}
+    try:
+        with default_storage.open(name, 'rb') as f:
+            checkpoint = json.loads(f.read())
+    except (OSError, ValueError):
+        return {}
+    return checkpoint['results'] if checkpoint.get('signature') == signature else {}
+
+
+def save_checkpoint(ai_model, signature, results):
+    name = _checkpoint_name(ai_model)
+    default_storage.delete(name)
+    default_storage.save(name, ContentFile(json.dumps({'signature': signature, 'results': results}).encode()))
+
+
+def train(ai_model, job, task=None, overrides=None):
+    """
+    Train ai_model, reporting through job (a TrainingJob) and the Celery
+    task. Returns a summary dict; raises TrainingError when the model cannot
+    be trained and marks the job failed on any error.
+    """
+    config = dict(ai_model.config_file, **(overrides or {}))
+    reporter = TrainingProgress(job, task)
+    try:
+        spec = task_for(ai_model, config)
+        loading_started = time.perf_counter()
+        dataset = spec.load(_chunk_size())
+        n = len(dataset.y)
+        if n < config.get('min_rows', MIN_ROWS):
+            raise TrainingError(f"Only {n} training rows for {spec.name}")
+        X, y = dataset.X, dataset.y
+        if not dataset.time_ordered:
+            order = np.random.default_rng(config.get('seed', 0)).permutation(n)
+            X, y = X[order], y[order]
+        split = n - max(int(n * config.get('test_fraction', 0.2)), 1)
+        medians = np.nanmedian(np.where(np.isnan(X[:split]).all(axis=0), 0.0, X[:split]), axis=0)
+        X = np.where(np.isnan(X), medians, X)
+        X_train, y_train = X[:split], y[:split]
+        load_seconds = time.perf_counter() - loading_started
+
+        folds = int(config.get('folds', 3))
+        candidates = expand_grid(config.get('grid') or spec.grid)
+        signature = _signature(spec, X_train, y_train, folds)
+        results = load_checkpoint(ai_model, signature)
+        remaining = [params for params in candidates if _param_key(params) not in results]
+
+        job.total_epochs = len(candidates) + 1      # one step per candidate, one for the final fit
+        job.dataset_info = {'task': spec.name, 'rows': n, 'features': dataset.features, 'resumed': len(results)}
+        reporter.start('dataset_info')
+        reporter.update(len(results))
+
+        def scored(params, loss):
+            results[_param_key(params)] = loss
+            save_checkpoint(ai_model, signature, results)
+            reporter.update(len(results), validation_loss=min(results.values()))
+
+        search_started = time.perf_counter()
+        if remaining:
+            search(spec.estimator_class, remaining, X_train, y_train, folds, on_result=scored)
+        search_seconds = time.perf_counter() - search_started
+
+        best_key = min(results, key=results.get)
+        best = json.loads(best_key)
+        threshold = float(np.median(y_train))
+        tolerance = config.get('tolerance', 0.1)
+        holdout = spec.estimator_class(**best).fit(X_train, y_train)
+        train_metrics = measure(spec, holdout, X_train, y_train, threshold, tolerance)
+        metrics = measure(spec, holdout, X[split:], y[split:], threshold, tolerance)
+        final = spec.estimator_class(**best).fit(X, y)
+
+        old_artifact = ai_model.model_file.name
+        artifact = f'{slugify(ai_model.name)}-{job.pk.hex[:8]}.pkl'
+        ai_model.model_file.save(artifact, ContentFile(pickle.dumps(final)), save=False)
+        new_config = dict(
+            config, task=spec.name, features=dataset.features,
+            defaults={name: round(float(value), 4) for name, value in zip(dataset.features, medians)},
+            params=best, metrics={name: round(value, 4) for name, value in metrics.items()},
+        )
+        if spec.is_classifier:
+            new_config['labels'] = spec.labels
+        else:
+            new_config['residual_std'] = round(metrics['residual_std'], 4)
+        new_config.pop('memory_bytes', None)
+        ai_model.config_file = new_config
+        ai_model.accuracy = metrics['accuracy']
+        ai_model.precision = metrics['precision']
+        ai_model.recall = metrics['recall']
+        ai_model.f1_score = metrics['f1_score']
+        ai_model.training_data_size = n
+        if ai_model.last_trained is None:
+            # First training puts a new model in service; retraining keeps the status staff chose
+            ai_model.status = 'active'
+        ai_model.last_trained = timezone.now()
+        ai_model.training_duration = ai_model.last_trained - job.started_at
+        ai_model.save()
+        if old_artifact and old_artifact != ai_model.model_file.name:
+            default_storage.delete(old_artifact)
+        default_storage.delete(_checkpoint_name(ai_model))
+
+        reporter.update(
+            job.total_epochs,
+            training_loss=results[best_key],
+            validation_loss=estimators.loss(holdout, X[split:], y[split:]),
+            training_accuracy=train_metrics['accuracy'],
+            validation_accuracy=metrics['accuracy'],
+        )
+        job.training_logs = (
+            f"{spec.name}: {n} rows loaded in {load_seconds:.2f}s; {len(remaining)} of {len(candidates)} "
+            f"candidates scored in {search_seconds:.2f}s with {min(_workers(), max(len(remaining), 1))} workers; "
+            f"best {best_key} (validation loss {results[best_key]:.4f})"
+        )
+        job.artifacts_path = ai_model.model_file.name
+        reporter.finish('completed', extra=['training_logs', 'artifacts_path'])
+    except Exception as exc:
+        reporter.finish('failed', error_message=str(exc))
+        raise
+
+    logger.info(f"Trained {ai_model.name}: {job.training_logs}")
+    return {
+        'task': spec.name,
+        'rows': n,
+        'params': best,
+        'metrics': metrics,
+        'search_seconds': round(search_seconds, 3),
+        'duration': str(job.duration),
+    }
@@ -0,0 +1,255 @@
+"""
+Image analysis pipeline for crop photos
+
+Uploads are written to storage once (``store_upload``) and tasks carry the
+stored name, not the image. ``analyze`` streams a list of stored images
+through four stages, each timed per image:
+
+1. decode: read from storage and decode with Pillow in a small thread pool
+   (Pillow releases the GIL), JPEGs at a reduced scale via ``draft``;
+   the next batch is decoded while the current one is scored;
+2. preprocess: resize to the model's ``input_size`` and normalize the whole
+   batch at once as one NumPy array (``mean``/``std``, NCHW or NHWC);
+3. inference: one call per batch of ``AI_VISION_BATCH_SIZE`` images through
+   the model registry (ONNX Runtime on the CPU with
+   ``AI_INFERENCE_THREADS`` threads, or a pickled NumPy model);
+4. postprocess: softmax (for ``'outputs': 'logits'``), labels above
+   ``threshold`` and the top scores.
+
+The model is the newest active ``AIModel`` of the analysis type's model
+type; its ``config_file`` describes inputs (``input_size``, ``mean``,
+``std``, ``layout``) and outputs (``labels``, ``outputs``, ``threshold``,
+``healthy_label``). ``benchmark_vision`` measures images/second per stage
+on synthetic photos.
+"""
+
+import io
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+from .models import AIModel
+from .registry import ModelUnavailable, get_model
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = 'cv_analysis/uploads'
+STAGES = ('decode', 'preprocess', 'inference', 'postprocess')
+TOP_K = 3
+
+MODEL_TYPES = {
+    'crop_health': 'disease_detection',
+    'disease_detection': 'disease_detection',
+    'pest_detection': 'pest_detection',
+    'soil_analysis': 'soil_analysis',
+}
+
+DEFAULT_INPUT_SIZE = (224, 224)
+DEFAULT_MEAN = (0.485, 0.456, 0.406)
+DEFAULT_STD = (0.229, 0.224, 0.225)
+
+
+def _batch_size():
+    return getattr(settings, 'AI_VISION_BATCH_SIZE', 16)
+
+
+def _decode_threads():
+    return getattr(settings, 'AI_VISION_DECODE_THREADS', 2)
+
+
+def store_upload(upload, user_id):
+    """Save an uploaded image file to storage; returns the name to pass to the tasks"""
+    ext = os.path.splitext(getattr(upload, 'name', '') or '')[1].lower() or '.jpg'
+    return default_storage.save(f'{UPLOAD_DIR}/{user_id}/{uuid.uuid4().hex}{ext}', upload)
+
+
+def store_bytes(data, user_id, ext='.jpg'):
+    return default_storage.save(f'{UPLOAD_DIR}/{user_id}/{uuid.uuid4().hex}{ext}', ContentFile(data))
+
+
+def model_for(analysis_type):
+    model_type = MODEL_TYPES.get(analysis_type)
+    ai_model = model_type and (
+        AIModel.objects.filter(model_type=model_type, status='active').order_by('-updated_at').first()
+    )
+    if not ai_model:
+        raise ModelUnavailable(f"No active model for {analysis_type} analysis")
+    return ai_model
+
+
+def read_storage(name):
+    with default_storage.open(name, 'rb') as f:
+        return f.read()
+
+
+def decode(data, size=DEFAULT_INPUT_SIZE):
+    """Decode image bytes to an RGB PIL image, cheaply downscaled towards size"""
+    image = Image.open(io.BytesIO(data))
+    image.draft('RGB', tuple(size))     # JPEG: decode at the smallest 1/2..1/8 scale still >= size
+    return ImageOps.exif_transpose(image).convert('RGB')
+
+
+def preprocess(images, config):
+    """Resize and normalize a list of PIL images into one float32 batch"""
+    width, height = config.get('input_size') or DEFAULT_INPUT_SIZE
+    batch = np.stack([np.asarray(image.resize((width, height), Image.BILINEAR)) for image in images])
+    mean = np.asarray(config.get('mean', DEFAULT_MEAN), dtype=np.float32) * 255
+    inv_std = 1 / (np.asarray(config.get('std', DEFAULT_STD), dtype=np.float32) * 255)
+    batch = (batch.astype(np.float32) - mean) * inv_std
+    if config.get('layout', 'NCHW') == 'NCHW':
+        batch = batch.transpose(0, 3, 1, 2)
+    return np.ascontiguousarray(batch)
+
+
+def softmax(scores):
+    shifted = np.exp(scores - scores.max(axis=1, keepdims=True))
+    return shifted / shifted.sum(axis=1, keepdims=True)
+
+
+def score(loaded, batch):
+    """Class probabilities of a preprocessed batch, shape (n, labels)"""
+    if loaded.is_classifier:
+        return np.asarray(loaded.predict_proba(batch), dtype=np.float64)
+    scores = np.asarray(loaded.predict(batch), dtype=np.float64).reshape(len(batch), -1)
+    return softmax(scores) if loaded.config.get('outputs', 'logits') == 'logits' else scores
+
+
+def postprocess(probabilities, config, analysis_type):
+    """(analysis_result, detected_objects, confidence_scores) for each row"""
+    labels = config.get('labels') or [str(n) for n in range(probabilities.shape[1])]
+    threshold = float(config.get('threshold', 0.3))
+    healthy = config.get('healthy_label', 'healthy')
+    top = np.argsort(-probabilities, axis=1)[:, :TOP_K]
+    results = []
+    for row, best in zip(probabilities, top):
+        detected = [labels[n] for n in best if row[n] >= threshold]
+        problems = [label for label in detected if label != healthy]
+        analysis_result = {
+            'top_label': labels[best[0]],
+            'confidence': round(float(row[best[0]]), 4),
+            'predictions': [{'label': labels[n], 'score': round(float(row[n]), 4)} for n in best],
+        }
+        if analysis_type == 'pest_detection':
+            analysis_result['pests_detected'] = len(problems)
+        elif analysis_type in ('disease_detection', 'crop_health'):
+            analysis_result['diseases_detected'] = len(problems)
+            analysis_result['overall_health'] = 'good' if not problems else 'poor'
+        results.append((analysis_result, detected, {labels[n]: round(float(row[n]), 4) for n in best}))
+    return results
+
+
+class ImageResult:
+    """One analysed image"""
+
+    __slots__ = ('name', 'image', 'analysis_result', 'detected_objects', 'confidence_scores', 'timings', 'error')
+
+    def __init__(self, name, image=None, error=None):
+        self.name = name
+        self.image = image
+        self.error = error
+        self.analysis_result = self.detected_objects = self.confidence_scores = None
+        self.timings = dict.fromkeys(STAGES, 0.0)
+
+    @property
+    def processing_time(self):
+        return sum(self.timings.values())
+
+
+def _decode_one(source, reader, size):
+    started = time.perf_counter()
+    try:
+        image = decode(reader(source), size)
+    except (OSError, ValueError) as exc:
+        return ImageResult(source, error=f"Invalid image: {exc}"), time.perf_counter() - started
+    return ImageResult(source, image), time.perf_counter() - started
+
+
+def analyze(ai_model, sources, analysis_type, reader=read_storage, batch_size=None):
+    """
+    Run sources (stored names, or whatever reader accepts) through the
+    pipeline. Yields an ImageResult per source, in order, batch by batch;
+    unreadable images come back with ``error`` set.
+    """
+    loaded = get_model(ai_model)
+    config = loaded.config
+    size = tuple(config.get('input_size') or DEFAULT_INPUT_SIZE)
+    batch_size = batch_size or _batch_size()
+    chunks = [sources[start:start + batch_size] for start in range(0, len(sources), batch_size)]
+
+    with ThreadPoolExecutor(max_workers=_decode_threads(), thread_name_prefix='vision-decode') as pool:
+        def submit(chunk):
+            return [pool.submit(_decode_one, source, reader, size) for source in chunk]
+
+        pending = submit(chunks[0]) if chunks else []
+        for n in range(len(chunks)):
+            decoded = [future.result() for future in pending]
+            pending = submit(chunks[n + 1]) if n + 1 < len(chunks) else []    # decode ahead while scoring
+
+            results = []
+            for result, seconds in decoded:
+                result.timings['decode'] = seconds
+                results.append(result)
+            good = [result for result in results if result.error is None]
+            if good:
+                timings = {}
+                started = time.perf_counter()
+                batch = preprocess([result.image for result in good], config)
+                timings['preprocess'] = time.perf_counter() - started
+
+                started = time.perf_counter()
+                probabilities = score(loaded, batch)
+                timings['inference'] = time.perf_counter() - started
+
+                started = time.perf_counter()
+                outputs = postprocess(probabilities, config, analysis_type)
+                timings['postprocess'] = time.perf_counter() - started
+
+                for result, (analysis_result, detected, confidence) in zip(good, outputs):
+                    result.analysis_result, result.detected_objects, result.confidence_scores = (
+                        analysis_result, detected, confidence
+                    )
+                    for stage, seconds in timings.items():
+                        result.timings[stage] = seconds / len(good)     # batch stages are shared
+            yield from results
+
+
+def save_analyses(ai_model, results, analysis_type, user_id, location=None):
+    """Store analysed images with their thumbnails in one insert; returns the rows"""
+    from simple_history.utils import bulk_create_with_history
+
+    from farmer_problems.imaging import make_thumbnail
+
+    from .models import ComputerVisionAnalysis
+
+    analyses = []
+    for result in results:
+        analysis = ComputerVisionAnalysis(
+            user_id=user_id,
+            analysis_type=analysis_type,
+            image=result.name,
+            analysis_result=dict(
+                result.analysis_result, stage_seconds={stage: round(s, 6) for stage, s in result.timings.items()},
+            ),
+            detected_objects=result.detected_objects,
+            confidence_scores=result.confidence_scores,
+            processing_time=round(result.processing_time, 6),
+            model_version=ai_model.version[:20],
+            location=location,
+        )
+        # Small thumbnail for admin and history lists instead of the full upload
+        try:
+            analysis.thumbnail = default_storage.save(
+                f"cv_analysis/thumbnails/{analysis.id}.jpg", ContentFile(make_thumbnail(result.image)),
+            )
+        except OSError as exc:
+            logger.warning(f"Could not create thumbnail for {result.name}: {exc}")
+        analyses.append(analysis)
+    return bulk_create_with_history(analyses, ComputerVisionAnalysis, batch_size=500)
@@ -5,6 +5,7 @@ from rest_framework.views import APIView
 from django.contrib.auth.models import User
 from django.db.models import Q, Count
 from django.utils import timezone
+from . import autocomplete, search
 from .models import UserProfile, Notification, FAQ, Contact
 from .serializers import (
     UserSerializer, UserProfileSerializer, NotificationSerializer,
@@ -82,55 +83,45 @@ class ContactViewSet(viewsets.ModelViewSet):
 
 
 class SearchAPIView(APIView):
-    """Global search API"""
+    """Global ranked search API across products, schemes, soil tips and problems"""
     permission_classes = [permissions.AllowAny]
     
     def get(self, request):
-        query = request.query_params.get('q', '')
+        query = request.query_params.get('q', '').strip()
         if not query:
             return Response({'error': 'Query parameter "q" is required'}, status=status.HTTP_400_BAD_REQUEST)
         
-        results = {}
-        
-        # Crops functionality removed
-        results['crops'] = []
-        
-        # Search in products
+        types = request.query_params.get('types', '')
+        entity_types = [t.strip() for t in types.split(',') if t.strip()]
         try:
-            from marketplace.models import Product
-            products = Product.objects.filter(
-                Q(name__icontains=query) | 
-                Q(description__icontains=query) |
-                Q(category__name__icontains=query)
-            )[:10]
-            results['products'] = [{'id': product.id, 'name': product.name} for product in products]
-        except ImportError:
-            results['products'] = []
-        
-        # Search in schemes
-        try:
-            from schemes.models import GovernmentScheme
-            schemes = GovernmentScheme.objects.filter(
-                Q(title__icontains=query) | 
-                Q(description__icontains=query) |
-                Q(category__icontains=query)
-            )[:10]
-            results['schemes'] = [{'id': scheme.id, 'title': scheme.title} for scheme in schemes]
-        except ImportError:
-            results['schemes'] = []
+            page = int(request.query_params.get('page', 1))
+            page_size = int(request.query_params.get('page_size', 20))
+        except ValueError:
+            return Response({'error': 'page and page_size must be integers'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Search in soil tips
+        return Response(search.search(query, entity_types=entity_types, page=page, page_size=page_size))
+
+
+class SuggestAPIView(APIView):
+    """Typeahead suggestions for crops, mandis, schemes and products"""
+    permission_classes = [permissions.AllowAny]
+    authentication_classes = []
+    
+    def get(self, request):
+        query = request.query_params.get('q', '')
+        types = [t for t in request.query_params.get('types', '').split(',') if t]
+        lang = request.query_params.get('lang', 'en')
         try:
-            from soil_health.models import SoilTip
-            soil_tips = SoilTip.objects.filter(
-                Q(title__icontains=query) | 
-                Q(content__icontains=query)
-            )[:10]
-            results['soil_tips'] = [{'id': tip.id, 'title': tip.title} for tip in soil_tips]
-        except ImportError:
-            results['soil_tips'] = []
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 10
         
-        return Response(results)
+        response = Response({
+            'query': query,
+            'suggestions': autocomplete.suggest(query, limit=limit, types=types, lang=lang),
+        })
+        response['Cache-Control'] = f'public, max-age={autocomplete.RESPONSE_TTL}'
+        return response
 
 
 class StatsAPIView(APIView):
@@ -5,6 +5,10 @@ class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
     verbose_name = 'Core'
+    
+    def ready(self):
+        """Connect search indexing signals."""
+        import core.signals  # noqa: F401
 
 
 
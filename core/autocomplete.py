@@ -0,0 +1,426 @@
+"""
+Typeahead suggestions for Farmazee
+
+An in-memory sorted-array index over product names, crop names, mandi names
+and scheme titles. Every label (English, Telugu or Hindi) is transliterated to
+a folded Latin key, so "chawal", "चावल" and "వరి" all reach the rice entry and
+prefix lookups are a binary search plus a short bounded scan.
+
+Each worker process holds its own index, kept in step with the others
+through the change log of ``core.change_log``.
+"""
+
+import bisect
+import hashlib
+import threading
+import time
+import unicodedata
+
+from django.apps import apps
+from django.core.cache import cache
+
+from .change_log import ReplicatedIndex
+from .search import TOKEN_RE, normalize_text
+
+RESPONSE_TTL = 60
+
+SHORT_PREFIX = 3        # prefixes up to this length are answered from precomputed lists
+TOP_K = 20
+SCAN_LIMIT = 500        # max keys examined for longer prefixes
+MAX_WORD_STARTS = 4     # a label is reachable from the start of its first N words
+MAX_LIMIT = 20
+
+# Source base weights: crops and mandis are few and always relevant
+BASE_WEIGHTS = {'crop': 1000.0, 'mandi': 500.0, 'scheme': 100.0, 'product': 10.0}
+
+
+# Transliteration
+
+# Devanagari and Telugu share the ISCII-derived layout (Telugu = Devanagari + 0x300),
+# so one table of offsets from the block start covers both scripts
+_CONSONANTS = {
+    0x15: 'k', 0x16: 'kh', 0x17: 'g', 0x18: 'gh', 0x19: 'n',
+    0x1a: 'ch', 0x1b: 'chh', 0x1c: 'j', 0x1d: 'jh', 0x1e: 'n',
+    0x1f: 't', 0x20: 'th', 0x21: 'd', 0x22: 'dh', 0x23: 'n',
+    0x24: 't', 0x25: 'th', 0x26: 'd', 0x27: 'dh', 0x28: 'n', 0x29: 'n',
+    0x2a: 'p', 0x2b: 'ph', 0x2c: 'b', 0x2d: 'bh', 0x2e: 'm',
+    0x2f: 'y', 0x30: 'r', 0x31: 'r', 0x32: 'l', 0x33: 'l', 0x34: 'l', 0x35: 'v',
+    0x36: 'sh', 0x37: 'sh', 0x38: 's', 0x39: 'h',
+    0x58: 'q', 0x59: 'kh', 0x5a: 'gh', 0x5b: 'z', 0x5c: 'r', 0x5d: 'rh', 0x5e: 'f', 0x5f: 'y',
+}
+_VOWELS = {
+    0x05: 'a', 0x06: 'aa', 0x07: 'i', 0x08: 'ii', 0x09: 'u', 0x0a: 'uu',
+    0x0b: 'ru', 0x0c: 'lu', 0x0e: 'e', 0x0f: 'e', 0x10: 'ai', 0x12: 'o', 0x13: 'o', 0x14: 'au',
+}
+_VOWEL_SIGNS = {
+    0x3e: 'aa', 0x3f: 'i', 0x40: 'ii', 0x41: 'u', 0x42: 'uu', 0x43: 'ru',
+    0x46: 'e', 0x47: 'e', 0x48: 'ai', 0x4a: 'o', 0x4b: 'o', 0x4c: 'au',
+}
+_MODIFIERS = {0x01: 'n', 0x02: 'n', 0x03: 'h'}
+_VIRAMA = 0x4d
+_NUKTA = 0x3c
+
+
+def _script_offset(char):
+    code = ord(char)
+    if 0x0900 <= code <= 0x097f:
+        return code - 0x0900
+    if 0x0c00 <= code <= 0x0c7f:
+        return code - 0x0c00
+    return None
+
+
+def transliterate(text):
+    """Romanize Devanagari/Telugu text; other characters pass through unchanged"""
+    out = []
+    pending_a = False
+    for char in text:
+        offset = _script_offset(char)
+        if offset is None:
+            if pending_a:
+                out.append('a')
+                pending_a = False
+            out.append(char)
+        elif offset in _CONSONANTS:
+            if pending_a:
+                out.append('a')
+            out.append(_CONSONANTS[offset])
+            pending_a = True
+        elif offset in _VOWEL_SIGNS:
+            out.append(_VOWEL_SIGNS[offset])
+            pending_a = False
+        elif offset == _VIRAMA:
+            pending_a = False
+        elif offset == _NUKTA:
+            continue
+        else:
+            if pending_a:
+                out.append('a')
+                pending_a = False
+            if offset in _VOWELS:
+                out.append(_VOWELS[offset])
+            elif offset in _MODIFIERS:
+                out.append(_MODIFIERS[offset])
+            elif 0x66 <= offset <= 0x6f:
+                out.append(str(offset - 0x66))
+    if pending_a:
+        out.append('a')
+    return ''.join(out)
+
+
+# Single-character folds keep the key of a typed prefix a prefix of the full
+# word's key (digraph rewrites like "ee" -> "i" would break that)
+_FOLDS = str.maketrans({'e': 'i', 'o': 'u', 'w': 'v', 'z': 'j', 'q': 'k', 'f': 'p', 'x': 'ks'})
+_ASPIRATED = frozenset('kgcjtdpbs')
+
+
+def _fold_word(word):
+    word = word.translate(_FOLDS)
+    chars = []
+    for char in word:
+        if chars and (char == chars[-1] or (char == 'h' and chars[-1] in _ASPIRATED)):
+            continue
+        chars.append(char)
+    # Inherent final vowels are written in Telugu/Hindi script but usually
+    # dropped when farmers type the word in Latin letters
+    if len(chars) > 3 and chars[-1] == 'a':
+        chars.pop()
+    return ''.join(chars)
+
+
+def fold(text):
+    """Map text in any of the three languages to its phonetic Latin lookup key"""
+    text = transliterate(normalize_text(text))
+    text = ''.join(c for c in unicodedata.normalize('NFKD', text) if not unicodedata.combining(c))
+    return ' '.join(_fold_word(word) for word in TOKEN_RE.findall(text))
+
+
+def short_prefixes(keys):
+    """Prefixes of the keys answered from precomputed top lists"""
+    return {key[:length] for key in keys for length in range(1, min(len(key), SHORT_PREFIX) + 1)}
+
+
+def index_keys(labels):
+    """Lookup keys for an entry: the folded label from each of its first word starts"""
+    keys = set()
+    for label in labels:
+        words = fold(label).split()
+        for start in range(min(len(words), MAX_WORD_STARTS)):
+            keys.add(' '.join(words[start:]))
+    return keys
+
+
+# Entry sources
+
+def _product_entry(product):
+    if not product.is_active:
+        return None
+    return {
+        'type': 'product', 'id': product.pk,
+        'labels': {'en': product.name},
+        'weight': BASE_WEIGHTS['product'] + (product.sales_count or 0) + (product.views or 0) / 100,
+    }
+
+
+def _scheme_entry(scheme):
+    if not scheme.is_active:
+        return None
+    return {
+        'type': 'scheme', 'id': scheme.pk,
+        'labels': {'en': scheme.title},
+        'weight': BASE_WEIGHTS['scheme'] + (scheme.views or 0) / 100,
+    }
+
+
+AUTOCOMPLETE_SOURCES = {
+    'product': ('marketplace.Product', _product_entry),
+    'scheme': ('schemes.GovernmentScheme', _scheme_entry),
+}
+SUGGEST_TYPES = ('crop', 'mandi', 'scheme', 'product')
+
+
+def entity_type_for_model(model):
+    """Return the autocomplete entry type registered for a model class, if any"""
+    label = model._meta.label
+    for entity_type, (model_label, _builder) in AUTOCOMPLETE_SOURCES.items():
+        if model_label == label:
+            return entity_type
+    return None
+
+
+def change_for_instance(instance):
+    """Change-log record reflecting the current state of a saved object"""
+    entity_type = entity_type_for_model(type(instance))
+    entry = AUTOCOMPLETE_SOURCES[entity_type][1](instance)
+    if entry is None:
+        return ('remove', (entity_type, instance.pk))
+    return ('upsert', entry)
+
+
+def static_entries():
+    """Crop and mandi entries from the price service dictionaries"""
+    from marketplace.price_services import price_service
+
+    entries = []
+    for key, names in price_service.crops.items():
+        entries.append({'type': 'crop', 'id': key, 'labels': dict(names), 'weight': BASE_WEIGHTS['crop']})
+    for key, mandi in price_service.mandis.items():
+        labels = {'en': mandi['name'], 'te': mandi['te'], 'hi': mandi['hi']}
+        entries.append({'type': 'mandi', 'id': key, 'labels': labels, 'weight': BASE_WEIGHTS['mandi']})
+    return entries
+
+
+def database_entries():
+    """Product and scheme entries"""
+    entries = []
+    for model_label, builder in AUTOCOMPLETE_SOURCES.values():
+        model = apps.get_model(model_label)
+        for obj in model.objects.filter(is_active=True).iterator(chunk_size=2000):
+            entry = builder(obj)
+            if entry is not None:
+                entries.append(entry)
+    return entries
+
+
+# Index
+
+class AutocompleteIndex:
+    """Sorted array of folded keys with parallel entry references"""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._keys = []
+        self._refs = []
+        self._entries = {}
+        self._top = {}
+        self._truncated = set()     # prefixes with more than TOP_K entries
+        self.version = None
+        self.built_at = 0.0
+        self._checked_at = 0.0
+        self.keys_scanned = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def build(self, entries, version=0):
+        """Replace the whole index"""
+        pairs = []
+        by_ref = {}
+        for entry in entries:
+            ref = (entry['type'], entry['id'])
+            entry = dict(entry, keys=index_keys(entry['labels'].values()))
+            by_ref[ref] = entry
+            pairs.extend((key, ref) for key in entry['keys'])
+        pairs.sort()
+
+        top = {}
+        for key, ref in pairs:
+            for prefix in short_prefixes([key]):
+                top.setdefault(prefix, set()).add(ref)
+
+        with self._lock:
+            self._keys = [key for key, _ref in pairs]
+            self._refs = [ref for _key, ref in pairs]
+            self._entries = by_ref
+            self._top = {prefix: self._rank(refs)[:TOP_K] for prefix, refs in top.items()}
+            self._truncated = {prefix for prefix, refs in top.items() if len(refs) > TOP_K}
+            self.version = version
+            self.built_at = self._checked_at = time.monotonic()
+
+    def _rank(self, refs):
+        entries = self._entries
+        return sorted(refs, key=lambda ref: (-entries[ref]['weight'], len(entries[ref]['labels']['en'])))
+
+    def _scan(self, prefix, limit=SCAN_LIMIT):
+        refs = []
+        seen = set()
+        start = bisect.bisect_left(self._keys, prefix)
+        for position in range(start, min(start + limit, len(self._keys))):
+            self.keys_scanned += 1
+            if not self._keys[position].startswith(prefix):
+                break
+            ref = self._refs[position]
+            if ref not in seen:
+                seen.add(ref)
+                refs.append(ref)
+        return refs
+
+    def _refresh_top(self, ref, old_keys, new_keys):
+        """
+        Update the top lists of the short prefixes an entry left or joined.
+
+        The ref is merged into or dropped from each list in place. Only when
+        it leaves (or sinks to the bottom of) a list that was cut at TOP_K
+        can an unlisted entry outrank it, and that prefix alone is rescanned.
+        """
+        joined = short_prefixes(new_keys)
+        for prefix in short_prefixes(old_keys) | joined:
+            current = self._top.get(prefix, [])
+            ranked = [other for other in current if other != ref]
+            if prefix in joined:
+                ranked = self._rank(ranked + [ref])
+            if prefix in self._truncated and ref in current and ref not in ranked[:-1]:
+                refs = self._scan(prefix, limit=len(self._keys))
+                ranked = self._rank(refs)[:TOP_K]
+                if len(refs) <= TOP_K:
+                    self._truncated.discard(prefix)
+            elif len(ranked) > TOP_K:
+                ranked = ranked[:TOP_K]
+                self._truncated.add(prefix)
+            if ranked:
+                self._top[prefix] = ranked
+            else:
+                self._top.pop(prefix, None)
+                self._truncated.discard(prefix)
+
+    def _unlink(self, ref, entry):
+        for key in entry['keys']:
+            position = bisect.bisect_left(self._keys, key)
+            while position < len(self._keys) and self._keys[position] == key:
+                if self._refs[position] == ref:
+                    del self._keys[position]
+                    del self._refs[position]
+                    break
+                position += 1
+
+    def remove(self, ref):
+        """Drop one entry; O(k log n + k * n) memmove for its k keys"""
+        with self._lock:
+            entry = self._entries.pop(ref, None)
+            if entry is None:
+                return
+            self._unlink(ref, entry)
+            self._refresh_top(ref, entry['keys'], set())
+
+    def upsert(self, entry):
+        """Add or replace one entry in place"""
+        ref = (entry['type'], entry['id'])
+        with self._lock:
+            old = self._entries.get(ref)
+            if old is not None:
+                self._unlink(ref, old)
+            entry = dict(entry, keys=index_keys(entry['labels'].values()))
+            self._entries[ref] = entry
+            for key in sorted(entry['keys']):
+                position = bisect.bisect_right(self._keys, key)
+                self._keys.insert(position, key)
+                self._refs.insert(position, ref)
+            self._refresh_top(ref, old['keys'] if old else set(), entry['keys'])
+
+    def apply(self, change):
+        """Apply one change-log record: ('upsert', entry) or ('remove', ref)"""
+        op, payload = change
+        if op == 'upsert':
+            self.upsert(payload)
+        else:
+            self.remove(tuple(payload))
+
+    def suggest(self, query, limit=10, types=None, lang='en'):
+        """
+        Suggestions for a (partial) query.
+
+        Prefixes of up to SHORT_PREFIX characters are served from precomputed
+        top lists; longer prefixes scan at most SCAN_LIMIT keys from the
+        binary-search position and rank the hits by weight.
+        """
+        prefix = fold(query)
+        if not prefix:
+            return []
+        types = set(types or ())
+        with self._lock:
+            refs = self._top.get(prefix) if len(prefix) <= SHORT_PREFIX else None
+            if refs is not None and types:
+                refs = [ref for ref in refs if ref[0] in types]
+                if len(refs) < limit:
+                    refs = None
+            if refs is None:
+                refs = self._scan(prefix)
+                if types:
+                    refs = [ref for ref in refs if ref[0] in types]
+                refs = self._rank(refs)
+            results = []
+            for ref in refs[:limit]:
+                entry = self._entries[ref]
+                labels = entry['labels']
+                results.append({
+                    'type': entry['type'],
+                    'id': entry['id'],
+                    'label': labels.get(lang) or labels['en'],
+                    'labels': labels,
+                })
+        return results
+
+
+_index = AutocompleteIndex()
+_replica = ReplicatedIndex('autocomplete', _index, lambda: static_entries() + database_entries())
+
+
+def rebuild():
+    """Full rebuild of this process's index from the database"""
+    return _replica.rebuild()
+
+
+def get_index():
+    """Return this process's index, built on first use and synced with the change log"""
+    return _replica.get()
+
+
+def publish(change):
+    """Append a change to the shared log and apply it to this process's index"""
+    _replica.publish(change)
+
+
+def suggest(query, limit=10, types=None, lang='en'):
+    """Cached suggestions; the cache key includes the index version so changes show up immediately"""
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    types = sorted(t for t in (types or ()) if t in SUGGEST_TYPES)
+    index = get_index()
+    prefix = fold(query)
+    # Hashed: the folded prefix may hold spaces and non-ASCII, which memcached keys cannot
+    digest = hashlib.sha256(f"{lang}:{limit}:{','.join(types)}:{prefix}".encode()).hexdigest()
+    cache_key = f"autocomplete:resp:{index.version}:{digest}"
+    results = cache.get(cache_key)
+    if results is None:
+        results = index.suggest(query, limit=limit, types=types, lang=lang)
+        cache.set(cache_key, results, RESPONSE_TTL)
+    return results
@@ -0,0 +1,109 @@
+"""
+Per-process indexes replicated through a change log in the shared cache
+
+Indexes that live in each worker's memory (typeahead suggestions, problem
+similarity) stay in step by publishing every change as a numbered entry in
+the shared cache. A process checks the log version at most every
+SYNC_INTERVAL seconds, replays the entries it has not applied yet and
+rebuilds from the database instead when the log went backwards, grew past
+MAX_REPLAY entries or has been evicted.
+
+With a process-local cache (LocMemCache) other processes never see that
+log, so each process then also rebuilds every REFRESH_INTERVAL seconds.
+"""
+
+import logging
+import threading
+import time
+
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+
+logger = logging.getLogger(__name__)
+
+CHANGE_TTL = 60 * 60 * 24
+SYNC_INTERVAL = 1.0     # seconds between change-log checks per process
+REFRESH_INTERVAL = 300  # seconds between full rebuilds when the cache is process-local
+MAX_REPLAY = 1000       # rebuild instead of replaying longer change logs
+
+
+def process_local():
+    """Whether the default cache is private to this process"""
+    return isinstance(caches['default'], LocMemCache)
+
+
+class ReplicatedIndex:
+    """
+    Keeps index in step with the '<prefix>:' change log.
+
+    index provides ``build(items, version=...)``, ``apply(change)``,
+    ``version`` (None until built), ``built_at`` and ``_checked_at``; load
+    returns the items of a full build.
+    """
+
+    def __init__(self, prefix, index, load):
+        self.prefix = prefix
+        self.index = index
+        self.load = load
+        self.version_key = f'{prefix}:version'
+        self._build_lock = threading.Lock()
+
+    def _change_key(self, version):
+        return f'{self.prefix}:change:{version}'
+
+    def current_version(self):
+        return cache.get(self.version_key, 0)
+
+    def rebuild(self):
+        """Full rebuild of this process's index from the database"""
+        version = self.current_version()
+        self.index.build(self.load(), version=version)
+        logger.info(f"{self.prefix} index built: {len(self.index)} entries at version {version}")
+        return self.index
+
+    def get(self):
+        """This process's index, built on first use and synced with the change log"""
+        index = self.index
+        if index.version is None:
+            with self._build_lock:
+                if index.version is None:
+                    self.rebuild()
+            return index
+
+        now = time.monotonic()
+        if now - index.built_at >= REFRESH_INTERVAL and process_local():
+            with self._build_lock:
+                if time.monotonic() - index.built_at >= REFRESH_INTERVAL:
+                    self.rebuild()
+            return index
+        if now - index._checked_at < SYNC_INTERVAL:
+            return index
+        index._checked_at = now
+
+        version = self.current_version()
+        if version == index.version:
+            return index
+        missing = range(index.version + 1, version + 1)
+        if version < index.version or len(missing) > MAX_REPLAY:
+            return self.rebuild()
+        changes = cache.get_many([self._change_key(n) for n in missing])
+        if len(changes) != len(missing):
+            return self.rebuild()
+        for n in missing:
+            index.apply(changes[self._change_key(n)])
+        index.version = version
+        return index
+
+    def publish(self, change):
+        """Append a change to the shared log and apply it to this process's index"""
+        cache.add(self.version_key, 0, None)
+        try:
+            version = cache.incr(self.version_key)
+        except ValueError:
+            cache.set(self.version_key, 1, None)
+            version = 1
+        cache.set(self._change_key(version), change, CHANGE_TTL)
+        if self.index.version is not None:
+            self.index.apply(change)
+            if self.index.version == version - 1:
+                self.index.version = version
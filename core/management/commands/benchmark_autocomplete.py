@@ -0,0 +1,55 @@
+"""
+Management command to benchmark typeahead lookups on a synthetic index
+"""
+
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from core.autocomplete import AutocompleteIndex
+
+QUERIES = ('s', 'see', 'seed variety 01', 'hybrid', 'variety 09999', 'चावल')
+
+
+class Command(BaseCommand):
+    help = 'Time autocomplete lookups and incremental updates on a large synthetic index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entries', type=int, default=100000, help='Entries in the index')
+        parser.add_argument('--rounds', type=int, default=200, help='Lookups per query')
+
+    def handle(self, *args, **options):
+        entries = [
+            {'type': 'product', 'id': n, 'labels': {'en': f'Seed variety {n:06d} hybrid'}, 'weight': n % 97}
+            for n in range(options['entries'])
+        ]
+        index = AutocompleteIndex()
+        started = time.perf_counter()
+        index.build(entries)
+        self.stdout.write(f"Built {len(index)} entries in {time.perf_counter() - started:.2f}s")
+
+        for query in QUERIES:
+            index.keys_scanned = 0
+            latencies = []
+            for _ in range(options['rounds']):
+                start = time.perf_counter()
+                index.suggest(query)
+                latencies.append(time.perf_counter() - start)
+            self.stdout.write(
+                f"{query!r}: p50 {statistics.median(latencies) * 1000:.3f} ms, "
+                f"max {max(latencies) * 1000:.3f} ms, {index.keys_scanned // options['rounds']} keys scanned"
+            )
+
+        index.keys_scanned = 0
+        latencies = []
+        for n in range(options['rounds']):
+            entry = {'type': 'product', 'id': f'bench-{n}', 'labels': {'en': f'Seed drill {n}'}, 'weight': 1.0}
+            start = time.perf_counter()
+            index.upsert(entry)
+            latencies.append(time.perf_counter() - start)
+        self.stdout.write(
+            f"upsert: p50 {statistics.median(latencies) * 1000:.3f} ms, "
+            f"{index.keys_scanned // options['rounds']} keys scanned"
+        )
+        self.stdout.write(self.style.SUCCESS('Autocomplete benchmark complete'))
@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.search import SEARCH_SOURCES, rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the unified full-text search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'entity_types', nargs='*',
+            help=f"Entity types to rebuild (default: all of {', '.join(SEARCH_SOURCES)})",
+        )
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        entity_types = options['entity_types'] or None
+        unknown = set(entity_types or []) - set(SEARCH_SOURCES)
+        if unknown:
+            raise CommandError(f"Unknown entity types: {', '.join(sorted(unknown))}")
+
+        counts = rebuild_index(entity_types, batch_size=options['batch_size'])
+        for entity_type, count in counts.items():
+            self.stdout.write(f'{entity_type}: {count} documents')
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt'))
@@ -0,0 +1,78 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:37
+
+import django.contrib.postgres.search
+from django.db import migrations, models
+
+
+FTS_TOKENIZER = "unicode61 remove_diacritics 2 categories 'L* N* Co M*'"
+
+
+def create_fulltext_index(apps, schema_editor):
+    """GIN index on PostgreSQL, external-content FTS5 table + sync triggers on SQLite"""
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'CREATE INDEX IF NOT EXISTS core_searchdocument_vector_gin '
+            'ON core_searchdocument USING GIN (search_vector)'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS core_searchdocument_fts USING fts5("
+            "title, body, content='core_searchdocument', content_rowid='id', "
+            f'tokenize="{FTS_TOKENIZER}")'
+        )
+        schema_editor.execute(
+            'CREATE TRIGGER IF NOT EXISTS core_searchdocument_ai AFTER INSERT ON core_searchdocument BEGIN '
+            'INSERT INTO core_searchdocument_fts(rowid, title, body) VALUES (new.id, new.title, new.body); END'
+        )
+        schema_editor.execute(
+            'CREATE TRIGGER IF NOT EXISTS core_searchdocument_ad AFTER DELETE ON core_searchdocument BEGIN '
+            "INSERT INTO core_searchdocument_fts(core_searchdocument_fts, rowid, title, body) "
+            'VALUES (\'delete\', old.id, old.title, old.body); END'
+        )
+        schema_editor.execute(
+            'CREATE TRIGGER IF NOT EXISTS core_searchdocument_au AFTER UPDATE ON core_searchdocument BEGIN '
+            "INSERT INTO core_searchdocument_fts(core_searchdocument_fts, rowid, title, body) "
+            'VALUES (\'delete\', old.id, old.title, old.body); '
+            'INSERT INTO core_searchdocument_fts(rowid, title, body) VALUES (new.id, new.title, new.body); END'
+        )
+
+
+def drop_fulltext_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS core_searchdocument_vector_gin')
+    elif vendor == 'sqlite':
+        for trigger in ('core_searchdocument_ai', 'core_searchdocument_ad', 'core_searchdocument_au'):
+            schema_editor.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        schema_editor.execute('DROP TABLE IF EXISTS core_searchdocument_fts')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_systemsettings'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity_type', models.CharField(choices=[('product', 'Product'), ('scheme', 'Government Scheme'), ('soil_tip', 'Soil Tip'), ('problem', 'Farmer Problem')], max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('title', models.CharField(max_length=300)),
+                ('body', models.TextField(blank=True)),
+                ('url', models.CharField(blank=True, max_length=500)),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Search Document',
+                'verbose_name_plural': 'Search Documents',
+                'indexes': [models.Index(fields=['entity_type', '-updated_at'], name='core_search_entity__87d37c_idx')],
+                'unique_together': {('entity_type', 'object_id')},
+            },
+        ),
+        migrations.RunPython(create_fulltext_index, drop_fulltext_index),
+    ]
@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import User
 from django.utils.translation import gettext_lazy as _
+from django.contrib.postgres.search import SearchVectorField
 from simple_history.models import HistoricalRecords
 from django_countries.fields import CountryField
 
@@ -540,3 +541,33 @@ class SystemSettings(models.Model):
         )
         return settings
 
+
+
+class SearchDocument(models.Model):
+    """Denormalized full-text search document for products, schemes, soil tips and problems"""
+    ENTITY_TYPES = [
+        ('product', 'Product'),
+        ('scheme', 'Government Scheme'),
+        ('soil_tip', 'Soil Tip'),
+        ('problem', 'Farmer Problem'),
+    ]
+    
+    entity_type = models.CharField(max_length=20, choices=ENTITY_TYPES)
+    object_id = models.PositiveBigIntegerField()
+    title = models.CharField(max_length=300)
+    body = models.TextField(blank=True)
+    url = models.CharField(max_length=500, blank=True)
+    # Populated on PostgreSQL only; SQLite uses the core_searchdocument_fts FTS5 table
+    search_vector = SearchVectorField(null=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = _('Search Document')
+        verbose_name_plural = _('Search Documents')
+        unique_together = ['entity_type', 'object_id']
+        indexes = [
+            models.Index(fields=['entity_type', '-updated_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.get_entity_type_display()}: {self.title}"
@@ -0,0 +1,112 @@
+"""
+Keyset (seek) pagination for Farmazee listings
+
+A page filters past the sort value and primary key of the previous page's
+last row instead of using OFFSET, so deep pages cost the same as the first
+one. Cursors are opaque URL-safe tokens of that (value, pk) pair.
+"""
+
+import base64
+import json
+
+from django.db.models import Q
+
+PAGE_SIZE = 20
+
+
+def encode_cursor(value, pk):
+    payload = json.dumps([str(value), pk]).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Return (value, pk) from a cursor token, or None if it is malformed"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        value, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return value, int(pk)
+    except (ValueError, TypeError):
+        return None
+
+
+class KeysetPage:
+    """
+    One page of a keyset-paginated queryset.
+
+    ``sort_options`` maps each sort name to ``(field, label)``, the field
+    prefixed with '-' for descending order; an unknown sort falls back to the
+    first option. ``attach`` is called with the rows of the page once they
+    are loaded.
+
+    The query only runs when the page is first iterated, so a template whose
+    grid fragment is served from cache never touches the database for it.
+    """
+
+    def __init__(self, queryset, sort_options, sort=None, cursor=None, per_page=PAGE_SIZE, attach=None):
+        self.sort_options = sort_options
+        self.queryset = queryset
+        self.sort = sort if sort in self.sort_options else next(iter(self.sort_options))
+        self.cursor = decode_cursor(cursor)
+        self.per_page = per_page
+        self.attach = attach
+        self._items = None
+        self._has_next = False
+
+    @property
+    def _field(self):
+        return self.sort_options[self.sort][0].lstrip('-')
+
+    @property
+    def _descending(self):
+        return self.sort_options[self.sort][0].startswith('-')
+
+    def _seek(self, queryset):
+        value, pk = self.cursor
+        op = 'lt' if self._descending else 'gt'
+        return queryset.filter(
+            Q(**{f'{self._field}__{op}': value}) |
+            Q(**{self._field: value, f'pk__{op}': pk})
+        )
+
+    def _fetch(self):
+        if self._items is None:
+            queryset = self.queryset
+            if self.cursor is not None:
+                queryset = self._seek(queryset)
+            direction = '-' if self._descending else ''
+            rows = list(queryset.order_by(f'{direction}{self._field}', f'{direction}pk')[:self.per_page + 1])
+            self._has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            if self.attach is not None:
+                self.attach(rows)
+            self._items = rows
+        return self._items
+
+    def __iter__(self):
+        return iter(self._fetch())
+
+    def __len__(self):
+        return len(self._fetch())
+
+    @property
+    def object_list(self):
+        return self._fetch()
+
+    @property
+    def has_next(self):
+        self._fetch()
+        return self._has_next
+
+    @property
+    def has_previous(self):
+        return self.cursor is not None
+
+    @property
+    def next_cursor(self):
+        items = self._fetch()
+        if not self._has_next or not items:
+            return None
+        last = items[-1]
+        return encode_cursor(getattr(last, self._field), last.pk)
@@ -0,0 +1,161 @@
+"""
+Chunked retention cleanup
+
+``queryset.delete()`` on a large backlog loads every row to run cascades and
+signals, holds locks on the whole set until it commits and can exhaust a
+worker's memory. ``purge`` instead walks the expired rows in (date, pk)
+order through the date index, ``RETENTION_BATCH_SIZE`` primary keys at a
+time, and deletes each batch in its own short transaction:
+
+* tables that nothing cascades to are deleted with a single raw
+  ``DELETE ... WHERE pk IN (...)``, without loading rows or sending
+  per-row signals (no django-simple-history "deleted" records for expired
+  data). ``batch_purging`` is sent for each such batch instead, so
+  receivers that keep derived data in step with deletions (the feature
+  store's stale flags) handle the whole batch in one query;
+* tables with cascading relations go through Django's collector, one
+  bounded batch at a time.
+
+Files referenced by a policy's ``file_fields`` are removed from storage
+once their rows are gone. Batches are separated by ``RETENTION_BATCH_PAUSE``
+seconds so replicas and other writers keep up, ``max_seconds`` bounds a run
+(the next run resumes where it stopped) and ``progress`` is called at most
+every ``PROGRESS_INTERVAL`` seconds.
+"""
+
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import models, router, transaction
+from django.db.models import Q
+from django.dispatch import Signal
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_INTERVAL = 2.0     # seconds
+
+# Sent with sender=model, queryset=<the batch>, using=<alias> inside the
+# batch's transaction, just before its rows are deleted without signals
+batch_purging = Signal()
+
+
+def _batch_size():
+    return getattr(settings, 'RETENTION_BATCH_SIZE', 1000)
+
+
+def _batch_pause():
+    return getattr(settings, 'RETENTION_BATCH_PAUSE', 0.05)
+
+
+class RetentionPolicy:
+    """Rows of model older than days (by date_field) that match filters"""
+
+    def __init__(self, label, model, days, date_field='created_at', filters=None, file_fields=()):
+        self.label = label
+        self.model = model
+        self.days = days
+        self.date_field = date_field
+        self.filters = filters or {}
+        self.file_fields = tuple(file_fields)
+
+    def queryset(self, now=None):
+        cutoff = (now or timezone.now()) - timedelta(days=self.days)
+        return self.model._base_manager.filter(**{f'{self.date_field}__lt': cutoff}, **self.filters)
+
+
+def cascades(model):
+    """Whether deleting rows of model has to update or delete rows elsewhere"""
+    related = any(rel.on_delete is not models.DO_NOTHING for rel in model._meta.related_objects if rel.on_delete)
+    return related or bool(model._meta.many_to_many) or any(
+        rel.many_to_many for rel in model._meta.related_objects
+    )
+
+
+def purge(policy, batch_size=None, pause=None, max_seconds=None, progress=None, now=None):
+    """
+    Delete the rows policy selects in bounded batches. Returns
+    {'label', 'deleted', 'batches', 'complete', 'seconds'}.
+    """
+    batch_size = batch_size or _batch_size()
+    pause = _batch_pause() if pause is None else pause
+    model, date_field = policy.model, policy.date_field
+    using = router.db_for_write(model)
+    raw = not cascades(model)
+    expired = policy.queryset(now).order_by(date_field, 'pk')
+
+    started = last_report = time.monotonic()
+    deleted = batches = 0
+    position = None
+    complete = True
+    while True:
+        batch = expired
+        if position is not None:
+            last_date, last_pk = position
+            batch = batch.filter(Q(**{f'{date_field}__gt': last_date}) | Q(**{date_field: last_date, 'pk__gt': last_pk}))
+        rows = list(batch.values_list(date_field, 'pk', *policy.file_fields)[:batch_size])
+        if not rows:
+            break
+
+        pks = [row[1] for row in rows]
+        with transaction.atomic(using=using):
+            targets = model._base_manager.using(using).filter(pk__in=pks)
+            if raw:
+                # What Django's collector itself does for rows nothing depends on
+                batch_purging.send(sender=model, queryset=targets, using=using)
+                deleted += targets._raw_delete(using)
+            else:
+                deleted += targets.delete()[0]
+        for name in (name for row in rows for name in row[2:] if name):
+            try:
+                default_storage.delete(name)
+            except OSError as exc:
+                logger.warning(f"Could not delete {name} for {policy.label}: {exc}")
+        batches += 1
+        position = rows[-1][:2]
+
+        elapsed = time.monotonic() - started
+        if progress and time.monotonic() - last_report >= PROGRESS_INTERVAL:
+            progress({'label': policy.label, 'deleted': deleted, 'batches': batches, 'seconds': elapsed})
+            last_report = time.monotonic()
+        if len(rows) < batch_size:
+            break
+        if max_seconds is not None and elapsed >= max_seconds:
+            complete = False
+            break
+        if pause:
+            time.sleep(pause)
+
+    result = {
+        'label': policy.label, 'deleted': deleted, 'batches': batches, 'complete': complete,
+        'seconds': round(time.monotonic() - started, 3),
+    }
+    if progress:
+        progress(result)
+    logger.info(
+        f"Retention {policy.label}: deleted {deleted} rows in {batches} batches"
+        f"{'' if complete else ' (time budget reached)'}"
+    )
+    return result
+
+
+def purge_all(policies, max_seconds=None, **kwargs):
+    """purge each policy in turn within an overall time budget; returns {label: result}"""
+    started = time.monotonic()
+    results = {}
+    for policy in policies:
+        remaining = None if max_seconds is None else max(max_seconds - (time.monotonic() - started), 0)
+        if remaining == 0:
+            results[policy.label] = {'label': policy.label, 'deleted': 0, 'batches': 0, 'complete': False, 'seconds': 0}
+            continue
+        results[policy.label] = purge(policy, max_seconds=remaining, **kwargs)
+    return results
+
+
+def history_policy(model, days, label=None):
+    """Policy for the django-simple-history table of model"""
+    historical = model.history.model
+    return RetentionPolicy(label or f'{model._meta.model_name}_history', historical, days, date_field='history_date')
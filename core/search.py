@@ -0,0 +1,434 @@
+"""
+Unified full-text search for Farmazee
+
+Products, government schemes, soil tips and farmer problems are flattened into
+denormalized ``SearchDocument`` rows (kept current by ``core.signals``) and
+queried through a single ranked, paginated API:
+
+* PostgreSQL: ``SearchVector`` stored in ``search_vector`` with a GIN index,
+  ranked with ``SearchRank`` and highlighted with ``SearchHeadline``.
+* SQLite: an external-content FTS5 table (``core_searchdocument_fts``) kept in
+  sync by triggers, ranked with ``bm25`` and highlighted with ``snippet``.
+
+Both backends use language-agnostic tokenization ('simple' config / unicode61
+including combining marks) so Telugu and Hindi words are indexed whole.
+"""
+
+import logging
+import math
+import re
+import unicodedata
+
+from django.apps import apps
+from django.db import connection, transaction
+from django.db.models import F, FloatField, OuterRef, Subquery, Value
+from django.db.models.expressions import RawSQL
+from django.urls import NoReverseMatch, reverse
+from django.utils.html import escape
+
+from .models import SearchDocument
+
+logger = logging.getLogger(__name__)
+
+FTS_TABLE = 'core_searchdocument_fts'
+SEARCH_CONFIG = 'simple'
+MAX_PAGE_SIZE = 50
+
+# Latin letters/digits plus the Devanagari and Telugu blocks (vowel signs and
+# viramas are combining marks and would otherwise split words)
+TOKEN_RE = re.compile(r'[0-9A-Za-z\u00c0-\u024f\u0900-\u097f\u0c00-\u0c7f]+')
+
+# Private-use sentinels wrapped around matches by the database, swapped for
+# <mark> tags after the snippet has been HTML-escaped
+_HL_START = '\ue000'
+_HL_STOP = '\ue001'
+
+
+def normalize_text(text):
+    """NFC-normalize and lowercase text so composed/decomposed Indic input match"""
+    return unicodedata.normalize('NFC', text or '').lower()
+
+
+def tokenize(text):
+    """Split text into search tokens"""
+    return TOKEN_RE.findall(normalize_text(text))
+
+
+def crop_synonyms(text):
+    """Return en/te/hi labels for every crop mentioned in text, for cross-language matching"""
+    from marketplace.price_services import price_service
+
+    tokens = set(tokenize(text))
+    labels = []
+    for key, names in price_service.crops.items():
+        variants = {key, *(normalize_text(name) for name in names.values())}
+        if tokens & variants:
+            labels.extend(names.values())
+    return ' '.join(labels)
+
+
+# Document builders: each returns (title, body, url) or None when the object
+# should not be searchable (inactive, unpublished, ...)
+
+def _safe_reverse(viewname, *args):
+    try:
+        return reverse(viewname, args=args)
+    except NoReverseMatch:
+        return ''
+
+
+def _product_document(product):
+    if not product.is_active:
+        return None
+    parts = [
+        product.short_description, product.description, product.brand,
+        product.tags, product.category.name if product.category_id else '',
+    ]
+    body = ' '.join(p for p in parts if p)
+    body = f"{body} {crop_synonyms(' '.join([product.name, product.tags or '']))}"
+    return product.name, body, _safe_reverse('marketplace:product_detail', product.pk)
+
+
+def _scheme_document(scheme):
+    if not scheme.is_active:
+        return None
+    parts = [
+        scheme.description, scheme.get_category_display(), scheme.benefits,
+        scheme.eligibility_criteria, scheme.states,
+    ]
+    body = ' '.join(p for p in parts if p)
+    return scheme.title, body, _safe_reverse('schemes:detail', scheme.pk)
+
+
+def _soil_tip_document(tip):
+    if not tip.is_active:
+        return None
+    body = f"{tip.content} {tip.get_category_display()}"
+    return tip.title, body, _safe_reverse('soil_health:tip_detail', tip.pk)
+
+
+def _problem_document(problem):
+    parts = [
+        problem.description, problem.crop_type, problem.location,
+        problem.category.name if problem.category_id else '',
+    ]
+    body = ' '.join(p for p in parts if p)
+    body = f"{body} {crop_synonyms(' '.join([problem.title, problem.crop_type]))}"
+    return problem.title, body, _safe_reverse('farmer_problems:detail', problem.slug)
+
+
+SEARCH_SOURCES = {
+    'product': ('marketplace.Product', _product_document, ['category']),
+    'scheme': ('schemes.GovernmentScheme', _scheme_document, []),
+    'soil_tip': ('soil_health.SoilTip', _soil_tip_document, []),
+    'problem': ('farmer_problems.FarmerProblem', _problem_document, ['category']),
+}
+
+
+def entity_type_for_model(model):
+    """Return the search entity type registered for a model class, if any"""
+    label = model._meta.label
+    for entity_type, (model_label, _builder, _related) in SEARCH_SOURCES.items():
+        if model_label == label:
+            return entity_type
+    return None
+
+
+# Indexing
+
+def _vector_expression():
+    from django.contrib.postgres.search import SearchVector
+
+    return (
+        SearchVector('title', weight='A', config=SEARCH_CONFIG) +
+        SearchVector('body', weight='B', config=SEARCH_CONFIG)
+    )
+
+
+def index_object(instance):
+    """Create, refresh or drop the search document for a single object"""
+    entity_type = entity_type_for_model(type(instance))
+    if entity_type is None:
+        return
+    _model_label, builder, _related = SEARCH_SOURCES[entity_type]
+    document = builder(instance)
+    if document is None:
+        remove_object(entity_type, instance.pk)
+        return
+
+    title, body, url = document
+    doc, _created = SearchDocument.objects.update_or_create(
+        entity_type=entity_type,
+        object_id=instance.pk,
+        defaults={
+            'title': title[:300],
+            'body': unicodedata.normalize('NFC', body),
+            'url': url,
+        },
+    )
+    if connection.vendor == 'postgresql':
+        SearchDocument.objects.filter(pk=doc.pk).update(search_vector=_vector_expression())
+
+
+def remove_object(entity_type, object_id):
+    """Drop the search document for an object"""
+    SearchDocument.objects.filter(entity_type=entity_type, object_id=object_id).delete()
+
+
+def rebuild_index(entity_types=None, batch_size=500):
+    """Rebuild search documents from scratch; returns {entity_type: documents_indexed}"""
+    counts = {}
+    for entity_type in entity_types or SEARCH_SOURCES:
+        model_label, builder, related = SEARCH_SOURCES[entity_type]
+        model = apps.get_model(model_label)
+        with transaction.atomic():
+            SearchDocument.objects.filter(entity_type=entity_type).delete()
+            batch = []
+            counts[entity_type] = 0
+            for obj in model.objects.select_related(*related).iterator(chunk_size=batch_size):
+                document = builder(obj)
+                if document is None:
+                    continue
+                title, body, url = document
+                batch.append(SearchDocument(
+                    entity_type=entity_type, object_id=obj.pk, title=title[:300],
+                    body=unicodedata.normalize('NFC', body), url=url,
+                ))
+                if len(batch) >= batch_size:
+                    SearchDocument.objects.bulk_create(batch)
+                    counts[entity_type] += len(batch)
+                    batch = []
+            if batch:
+                SearchDocument.objects.bulk_create(batch)
+                counts[entity_type] += len(batch)
+            if connection.vendor == 'postgresql':
+                SearchDocument.objects.filter(entity_type=entity_type).update(
+                    search_vector=_vector_expression()
+                )
+    return counts
+
+
+# Querying
+
+_fts_ready = False
+
+
+def _fts_available():
+    global _fts_ready
+    if connection.vendor != 'sqlite':
+        return False
+    if not _fts_ready:
+        _fts_ready = FTS_TABLE in connection.introspection.table_names()
+    return _fts_ready
+
+
+def _finish_highlight(text):
+    text = escape(text or '')
+    return text.replace(_HL_START, '<mark>').replace(_HL_STOP, '</mark>')
+
+
+def _postgres_query(tokens):
+    from django.contrib.postgres.search import SearchQuery
+
+    raw_query = ' & '.join(f"{token}:*" for token in tokens)
+    return SearchQuery(raw_query, config=SEARCH_CONFIG, search_type='raw')
+
+
+def _fts_match(tokens):
+    return ' '.join('"%s"*' % token for token in tokens)
+
+
+def _basic_filter(queryset, tokens):
+    for token in tokens:
+        queryset = queryset.filter(title__icontains=token) | queryset.filter(body__icontains=token)
+    return queryset
+
+
+def _search_postgres(tokens, entity_types, offset, limit):
+    from django.contrib.postgres.search import SearchHeadline, SearchRank
+
+    query = _postgres_query(tokens)
+    queryset = SearchDocument.objects.filter(search_vector=query)
+    if entity_types:
+        queryset = queryset.filter(entity_type__in=entity_types)
+    total = queryset.count()
+    rows = queryset.annotate(
+        rank=SearchRank(F('search_vector'), query),
+        headline=SearchHeadline(
+            'body', query, config=SEARCH_CONFIG,
+            start_sel=_HL_START, stop_sel=_HL_STOP, max_words=30, min_words=10,
+        ),
+    ).order_by('-rank', '-updated_at')[offset:offset + limit]
+    results = [
+        (doc.entity_type, doc.object_id, doc.title, doc.url, float(doc.rank), doc.headline)
+        for doc in rows
+    ]
+    return total, results
+
+
+def _search_sqlite(tokens, entity_types, offset, limit):
+    where = f'{FTS_TABLE} MATCH %s'
+    params = [_fts_match(tokens)]
+    if entity_types:
+        where += ' AND d.entity_type IN (%s)' % ', '.join(['%s'] * len(entity_types))
+        params.extend(entity_types)
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'SELECT COUNT(*) FROM {FTS_TABLE} JOIN core_searchdocument d ON d.id = {FTS_TABLE}.rowid '
+            f'WHERE {where}',
+            params,
+        )
+        total = cursor.fetchone()[0]
+        # bm25 is lower-is-better; title matches weigh 10x body matches
+        cursor.execute(
+            f'SELECT d.entity_type, d.object_id, d.title, d.url, '
+            f'bm25({FTS_TABLE}, 10.0, 1.0) AS score, '
+            f"snippet({FTS_TABLE}, 1, %s, %s, '…', 24) "
+            f'FROM {FTS_TABLE} JOIN core_searchdocument d ON d.id = {FTS_TABLE}.rowid '
+            f'WHERE {where} ORDER BY score LIMIT %s OFFSET %s',
+            [_HL_START, _HL_STOP] + params + [limit, offset],
+        )
+        rows = cursor.fetchall()
+    results = [
+        (entity_type, object_id, title, url, -score, headline)
+        for entity_type, object_id, title, url, score, headline in rows
+    ]
+    return total, results
+
+
+def _search_basic(tokens, entity_types, offset, limit):
+    """Unranked fallback for databases without full-text support"""
+    queryset = SearchDocument.objects.all()
+    if entity_types:
+        queryset = queryset.filter(entity_type__in=entity_types)
+    queryset = _basic_filter(queryset, tokens)
+    total = queryset.count()
+    results = [
+        (doc.entity_type, doc.object_id, doc.title, doc.url, 0.0, doc.body[:200])
+        for doc in queryset.order_by('-updated_at')[offset:offset + limit]
+    ]
+    return total, results
+
+
+def _run_query(tokens, entity_types, offset, limit):
+    if connection.vendor == 'postgresql':
+        return _search_postgres(tokens, entity_types, offset, limit)
+    if _fts_available():
+        return _search_sqlite(tokens, entity_types, offset, limit)
+    return _search_basic(tokens, entity_types, offset, limit)
+
+
+def search(query, entity_types=None, page=1, page_size=20):
+    """
+    Ranked cross-entity search.
+
+    Args:
+        query: Free-text query (English, Telugu or Hindi); every token must match,
+            the last one as a prefix
+        entity_types: Optional list restricting results to some of SEARCH_SOURCES
+        page: 1-based page number
+        page_size: Results per page (capped at MAX_PAGE_SIZE)
+
+    Returns:
+        dict: {'query', 'results', 'total', 'page', 'page_size', 'num_pages'} where
+        each result is {'type', 'id', 'title', 'url', 'rank', 'highlight'} and
+        'highlight' is HTML-safe with matches wrapped in <mark>
+    """
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+    page = max(1, int(page))
+    entity_types = [t for t in (entity_types or []) if t in SEARCH_SOURCES]
+    tokens = tokenize(query)
+
+    if not tokens:
+        total, rows = 0, []
+    else:
+        total, rows = _run_query(tokens, entity_types, (page - 1) * page_size, page_size)
+
+    return {
+        'query': query,
+        'results': [
+            {
+                'type': entity_type,
+                'id': object_id,
+                'title': title,
+                'url': url,
+                'rank': round(rank, 6),
+                'highlight': _finish_highlight(headline),
+            }
+            for entity_type, object_id, title, url, rank, headline in rows
+        ],
+        'total': total,
+        'page': page,
+        'page_size': page_size,
+        'num_pages': math.ceil(total / page_size) if total else 0,
+    }
+
+
+def matching_ids(query, entity_type, limit=1000):
+    """Return object ids of one entity type matching query, best match first"""
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    _total, rows = _run_query(tokens, [entity_type], 0, limit)
+    return [object_id for _type, object_id, *_rest in rows]
+
+
+def matching_queryset(query, entity_type):
+    """
+    Unranked ids of every object of one entity type matching query, as a
+    subquery for ``pk__in`` filters (matching_ids stops at its limit)
+    """
+    tokens = tokenize(query)
+    documents = SearchDocument.objects.filter(entity_type=entity_type)
+    if not tokens:
+        documents = documents.none()
+    elif connection.vendor == 'postgresql':
+        documents = documents.filter(search_vector=_postgres_query(tokens))
+    elif _fts_available():
+        documents = documents.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [_fts_match(tokens)]),
+        )
+    else:
+        documents = _basic_filter(documents, tokens)
+    return documents.values('object_id')
+
+
+def ranked(queryset, query, entity_type):
+    """
+    Narrow queryset to the objects of one entity type matching query and
+    annotate each with its ``search_rank`` (higher is better), so listings
+    can ``order_by('-search_rank', ...)`` in a single statement.
+
+    The rank is a correlated subquery on the object's own SearchDocument,
+    looked up through the (entity_type, object_id) unique index, so only the
+    rows that passed the filters are scored.
+    """
+    tokens = tokenize(query)
+    if not tokens:
+        return queryset.none()
+    queryset = queryset.filter(pk__in=matching_queryset(query, entity_type))
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import SearchRank
+
+        search_query = _postgres_query(tokens)
+        documents = SearchDocument.objects.filter(
+            entity_type=entity_type, object_id=OuterRef('pk'),
+        ).annotate(rank=SearchRank(F('search_vector'), search_query))
+        rank = Subquery(documents.values('rank')[:1], output_field=FloatField())
+    elif _fts_available():
+        # bm25 is lower-is-better; negated to sort like SearchRank
+        outer_pk = '%s.%s' % (
+            connection.ops.quote_name(queryset.model._meta.db_table),
+            connection.ops.quote_name(queryset.model._meta.pk.column),
+        )
+        rank = RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = ('
+            f'SELECT id FROM core_searchdocument WHERE entity_type = %s AND object_id = {outer_pk})',
+            [_fts_match(tokens), entity_type],
+            output_field=FloatField(),
+        )
+    else:
+        rank = Value(0.0, output_field=FloatField())
+    return queryset.annotate(search_rank=rank)
@@ -0,0 +1,48 @@
+"""
+Signal handlers for the core app
+
+Keeps denormalized search documents in step with the models listed in
+``core.search.SEARCH_SOURCES`` and publishes typeahead changes for the models
+in ``core.autocomplete.AUTOCOMPLETE_SOURCES``.
+"""
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from . import autocomplete, search
+
+
+def _index_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(lambda: search.index_object(instance))
+
+
+def _remove_on_delete(sender, instance, **kwargs):
+    entity_type = search.entity_type_for_model(sender)
+    object_id = instance.pk
+    transaction.on_commit(lambda: search.remove_object(entity_type, object_id))
+
+
+def _publish_suggestion_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    change = autocomplete.change_for_instance(instance)
+    transaction.on_commit(lambda: autocomplete.publish(change))
+
+
+def _publish_suggestion_on_delete(sender, instance, **kwargs):
+    change = ('remove', (autocomplete.entity_type_for_model(sender), instance.pk))
+    transaction.on_commit(lambda: autocomplete.publish(change))
+
+
+for _model_label, _builder, _related in search.SEARCH_SOURCES.values():
+    _model = apps.get_model(_model_label)
+    post_save.connect(_index_on_save, sender=_model, dispatch_uid=f'search_index_{_model_label}')
+    post_delete.connect(_remove_on_delete, sender=_model, dispatch_uid=f'search_remove_{_model_label}')
+
+for _model_label, _builder in autocomplete.AUTOCOMPLETE_SOURCES.values():
+    _model = apps.get_model(_model_label)
+    post_save.connect(_publish_suggestion_on_save, sender=_model, dispatch_uid=f'autocomplete_save_{_model_label}')
+    post_delete.connect(_publish_suggestion_on_delete, sender=_model, dispatch_uid=f'autocomplete_delete_{_model_label}')
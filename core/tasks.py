@@ -0,0 +1,55 @@
+"""
+Celery tasks for the core app
+"""
+
+import logging
+
+from celery import shared_task
+from django.apps import apps
+
+from ai_chatbot.models import ChatSession
+from weather.models import AirQualityData, RainfallData, SoilMoistureData, WeatherData
+
+from .retention import RetentionPolicy, history_policy, purge_all
+from .view_counter import flush_view_counts as flush_buffered_views
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, name='core.tasks.flush_view_counts')
+def flush_view_counts(self):
+    """Write buffered page-view counts from the shared cache to the database."""
+    try:
+        return flush_buffered_views()
+    except Exception as exc:
+        logger.error(f"Error flushing view counts: {exc}")
+        raise self.retry(exc=exc, countdown=30, max_retries=2)
+
+
+@shared_task(bind=True, name='core.tasks.cleanup_old_data')
+def cleanup_old_data(self, chat_days=180, weather_days=365, history_days=365, max_seconds=None):
+    """
+    Delete stale chat sessions, old weather readings and old change history
+    in bounded batches (see core.retention).
+    """
+    try:
+        policies = [
+            RetentionPolicy('chat_sessions', ChatSession, chat_days, date_field='updated_at'),
+        ] + [
+            RetentionPolicy(model._meta.model_name, model, weather_days, date_field='recorded_at')
+            for model in (WeatherData, SoilMoistureData, AirQualityData, RainfallData)
+        ] + [
+            history_policy(model, history_days)
+            for model in apps.get_models() if getattr(model._meta, 'simple_history_manager_attribute', None)
+        ]
+
+        def report(progress):
+            self.update_state(state='PROGRESS', meta=progress)
+
+        results = purge_all(policies, max_seconds=max_seconds, progress=report)
+        total = sum(result['deleted'] for result in results.values())
+        logger.info(f"Retention cleanup deleted {total} rows")
+        return {label: result['deleted'] for label, result in results.items()}
+    except Exception as exc:
+        logger.error(f"Error in retention cleanup: {exc}")
+        raise self.retry(exc=exc, countdown=600, max_retries=2)
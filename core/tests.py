@@ -0,0 +1,300 @@
+"""
+Tests for core services
+"""
+
+import warnings
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.cache.backends.base import CacheKeyWarning
+from django.db.models import QuerySet
+from django.test import TestCase
+from django.urls import reverse
+from datetime import timedelta
+
+from django.utils import timezone
+from django.utils.text import slugify
+
+from ai_chatbot.models import ChatMessage, ChatSession
+from farmer_problems.models import FarmerProblem
+from schemes.models import GovernmentScheme
+from weather.models import WeatherData
+
+from . import autocomplete, change_log, retention, search, view_counter
+from .models import SearchDocument
+
+
+class UnifiedSearchTestCase(TestCase):
+    """Test cases for the unified full-text search index"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='farmer', password='testpass123')
+
+    def create_problem(self, title, description, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return FarmerProblem.objects.create(
+                title=title, slug=slugify(title), description=description, author=self.user, **kwargs
+            )
+
+    def create_scheme(self, title, description, **kwargs):
+        defaults = {
+            'category': 'subsidy', 'eligibility_criteria': 'Small farmers',
+            'benefits': 'Financial support', 'application_process': 'Online',
+            'required_documents': 'Aadhaar', 'contact_information': 'Agriculture office',
+            'states': 'Telangana',
+        }
+        defaults.update(kwargs)
+        with self.captureOnCommitCallbacks(execute=True):
+            return GovernmentScheme.objects.create(title=title, description=description, **defaults)
+
+    def test_save_indexes_and_delete_removes(self):
+        problem = self.create_problem('Leaf curl in chilli', 'Leaves are curling upwards')
+        self.assertTrue(SearchDocument.objects.filter(entity_type='problem', object_id=problem.pk).exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            problem.delete()
+        self.assertFalse(SearchDocument.objects.filter(entity_type='problem').exists())
+
+    def test_inactive_objects_are_not_searchable(self):
+        scheme = self.create_scheme('Rythu Bandhu', 'Investment support')
+        with self.captureOnCommitCallbacks(execute=True):
+            scheme.is_active = False
+            scheme.save()
+        self.assertEqual(search.search('rythu')['total'], 0)
+
+    def test_title_matches_rank_first_with_highlight(self):
+        self.create_problem('Irrigation schedule', 'How often should I water my paddy with drip?')
+        self.create_problem('Drip irrigation subsidy', 'Looking for help with pipes')
+
+        response = search.search('drip')
+        self.assertEqual(response['total'], 2)
+        self.assertEqual(response['results'][0]['title'], 'Drip irrigation subsidy')
+        self.assertIn('<mark>', response['results'][1]['highlight'])
+
+    def test_prefix_and_entity_type_filter(self):
+        self.create_problem('Fertilizer dose for cotton', 'Urea and DAP quantities')
+        self.create_scheme('Fertilizer subsidy scheme', 'Subsidised fertilizer bags')
+
+        self.assertEqual(search.search('fertil')['total'], 2)
+        response = search.search('fertil', entity_types=['scheme'])
+        self.assertEqual([r['type'] for r in response['results']], ['scheme'])
+
+    def test_crop_synonyms_match_across_languages(self):
+        problem = self.create_problem('Yellow leaves in rice', 'Lower leaves turning yellow')
+
+        self.assertEqual(search.matching_ids('వరి', 'problem'), [problem.pk])
+        self.assertEqual(search.matching_ids('चावल', 'problem'), [problem.pk])
+
+    def test_filters_are_not_capped_at_the_ranked_ids(self):
+        best = self.create_problem('Blast in paddy', 'Blast spots on leaves')
+        problems = [self.create_problem(f'Spots in paddy {n}', 'Possibly blast on leaves') for n in range(3)]
+        self.assertEqual(len(search.matching_ids('blast', 'problem', limit=2)), 2)
+
+        matched = FarmerProblem.objects.filter(pk__in=search.matching_queryset('blast', 'problem'))
+        self.assertEqual(set(matched), set(problems + [best]))
+        ordered = search.ranked(FarmerProblem.objects.all(), 'blast', 'problem').order_by('-search_rank', '-created_at')
+        self.assertEqual(len(ordered), 4)
+        self.assertEqual(ordered[0], best)
+        self.assertFalse(search.ranked(FarmerProblem.objects.all(), '', 'problem').exists())
+        self.assertFalse(search.matching_queryset('', 'problem').exists())
+
+    def test_highlight_is_escaped(self):
+        self.create_problem('Pest attack', '<script>alert(1)</script> pest on tomato')
+        highlight = search.search('pest')['results'][0]['highlight']
+        self.assertNotIn('<script>', highlight)
+
+    def test_rebuild_index(self):
+        self.create_problem('Soil testing', 'Where can I test soil?')
+        SearchDocument.objects.all().delete()
+
+        counts = search.rebuild_index(['problem'])
+        self.assertEqual(counts, {'problem': 1})
+        self.assertEqual(search.search('soil')['total'], 1)
+
+    def test_search_api(self):
+        self.create_problem('Mango flowering', 'Flowers dropping early')
+
+        response = self.client.get(reverse('api-search'), {'q': 'mango', 'types': 'problem'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total'], 1)
+        self.assertEqual(self.client.get(reverse('api-search')).status_code, 400)
+
+
+class AutocompleteTestCase(TestCase):
+    """Test cases for the typeahead index"""
+
+    def setUp(self):
+        cache.clear()
+        autocomplete._index.version = None
+
+    def test_transliterated_matching_across_languages(self):
+        index = autocomplete.AutocompleteIndex()
+        index.build(autocomplete.static_entries())
+
+        for query in ('chawal', 'चावल', 'వరి', 'ric'):
+            with self.subTest(query=query):
+                self.assertEqual(index.suggest(query)[0]['id'], 'rice')
+        self.assertEqual(index.suggest('warang', lang='te')[0]['label'], 'వరంగల్')
+
+    def test_incremental_upsert_and_remove(self):
+        index = autocomplete.AutocompleteIndex()
+        index.build([])
+        entry = {'type': 'product', 'id': 1, 'labels': {'en': 'Neem Oil Spray'}, 'weight': 10.0}
+
+        index.upsert(entry)
+        self.assertEqual([s['id'] for s in index.suggest('oil')], [1])
+        index.upsert(dict(entry, labels={'en': 'Neem Cake'}))
+        self.assertEqual(index.suggest('oil'), [])
+        self.assertEqual(index.suggest('ne')[0]['label'], 'Neem Cake')
+        index.remove(('product', 1))
+        self.assertEqual(index.suggest('ne'), [])
+
+    def test_large_index_work_is_bounded(self):
+        entries = [
+            {'type': 'product', 'id': n, 'labels': {'en': f'Seed variety {n:06d} hybrid'},
+             'weight': n % 97 + n / 10 ** 6}
+            for n in range(100000)
+        ]
+        index = autocomplete.AutocompleteIndex()
+        index.build(entries)
+
+        for query in ('s', 'see', 'seed variety 01', 'hybrid', 'variety 09999'):
+            with self.subTest(query=query):
+                index.keys_scanned = 0
+                self.assertTrue(index.suggest(query))
+                limit = 0 if len(autocomplete.fold(query)) <= autocomplete.SHORT_PREFIX else autocomplete.SCAN_LIMIT
+                self.assertLessEqual(index.keys_scanned, limit)
+
+        # Changes below the top lists merge in without scanning; removing a
+        # listed entry rescans only the prefixes it leaves
+        index.keys_scanned = 0
+        index.upsert({'type': 'product', 'id': 'new', 'labels': {'en': 'Seed drill'}, 'weight': 1.0})
+        self.assertEqual(index.keys_scanned, 0)
+        leader = index.suggest('s', limit=2)
+        index.remove(('product', leader[0]['id']))
+        self.assertEqual(index.suggest('s')[0]['id'], leader[1]['id'])
+
+    def test_process_local_cache_rebuilds_after_max_age(self):
+        index = autocomplete.get_index()
+        GovernmentScheme.objects.create(
+            title='Rythu Bandhu', description='Investment support', category='subsidy',
+            eligibility_criteria='-', benefits='-', application_process='-',
+            required_documents='-', contact_information='-', states='Telangana',
+        )
+        self.assertEqual(autocomplete.get_index().suggest('rythu'), [])
+
+        index.built_at -= change_log.REFRESH_INTERVAL
+        self.assertEqual(autocomplete.get_index().suggest('rythu')[0]['label'], 'Rythu Bandhu')
+
+    def test_saved_scheme_is_published_to_suggestions(self):
+        autocomplete.get_index()
+        with self.captureOnCommitCallbacks(execute=True):
+            GovernmentScheme.objects.create(
+                title='Pradhan Mantri Kisan Samman Nidhi', description='Income support',
+                category='subsidy', eligibility_criteria='-', benefits='-', application_process='-',
+                required_documents='-', contact_information='-', states='All',
+            )
+
+        response = self.client.get(reverse('api-suggest'), {'q': 'kisan', 'types': 'scheme'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['suggestions'][0]['label'], 'Pradhan Mantri Kisan Samman Nidhi')
+
+    def test_cached_responses_use_portable_keys(self):
+        with warnings.catch_warnings():
+            warnings.simplefilter('error', CacheKeyWarning)
+            self.assertEqual(autocomplete.suggest('चावल ')[0]['id'], 'rice')
+            self.assertEqual(autocomplete.suggest('चावल ')[0]['id'], 'rice')
+
+
+class ViewCounterTestCase(TestCase):
+    """Test cases for buffered view counters"""
+
+    BROWSER = 'Mozilla/5.0 (Linux; Android 12) Chrome/120.0 Mobile'
+
+    def setUp(self):
+        cache.clear()
+        # Hold off the opportunistic LocMemCache flush so the test controls it
+        cache.set(view_counter.LOCAL_FLUSH_KEY, 1)
+        author = User.objects.create_user(username='author')
+        self.problem = FarmerProblem.objects.create(
+            title='Stem borer', slug='stem-borer', description='-', author=author,
+        )
+
+    def test_views_are_buffered_deduplicated_and_flushed(self):
+        url = reverse('farmer_problems:detail', args=[self.problem.slug])
+        for _ in range(3):
+            self.client.get(url, HTTP_USER_AGENT=self.BROWSER)
+        self.client.get(url, HTTP_USER_AGENT='Googlebot/2.1')
+        self.client.get(url, HTTP_USER_AGENT='Mozilla/5.0 (iPhone) Safari', REMOTE_ADDR='10.0.0.2')
+
+        self.problem.refresh_from_db()
+        self.assertEqual(self.problem.views_count, 0)
+        self.assertEqual(view_counter.pending_views(self.problem), 2)
+
+        with self.assertNumQueries(1):
+            totals = view_counter.flush_view_counts(grace=0)
+        self.assertEqual(totals, {'farmer_problems.FarmerProblem': 2})
+        self.problem.refresh_from_db()
+        self.assertEqual(self.problem.views_count, 2)
+        self.assertEqual(view_counter.flush_view_counts(grace=0), {})
+
+
+class RetentionTestCase(TestCase):
+    """Test cases for chunked retention cleanup"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='farmer')
+
+    def create_weather(self, n, days_ago, location='Guntur'):
+        rows = [
+            WeatherData.objects.create(
+                location=location, temperature=30, humidity=60, wind_speed=5, pressure=1010,
+                description='clear', visibility=10,
+            )
+            for _ in range(n)
+        ]
+        WeatherData.objects.filter(pk__in=[row.pk for row in rows]).update(
+            recorded_at=timezone.now() - timedelta(days=days_ago),
+        )
+
+    def test_purges_expired_rows_in_batches_without_history(self):
+        self.create_weather(7, days_ago=400)
+        self.create_weather(2, days_ago=400, location='Warangal')
+        self.create_weather(3, days_ago=10)
+        policy = retention.RetentionPolicy(
+            'weather', WeatherData, 365, date_field='recorded_at', filters={'location': 'Guntur'},
+        )
+        history_rows = WeatherData.history.count()
+
+        result = retention.purge(policy, batch_size=3, pause=0)
+
+        self.assertEqual((result['deleted'], result['batches'], result['complete']), (7, 3, True))
+        self.assertEqual(WeatherData.objects.filter(location='Guntur').count(), 3)
+        self.assertEqual(WeatherData.objects.filter(location='Warangal').count(), 2)
+        self.assertEqual(WeatherData.history.count(), history_rows)     # raw delete: no "deleted" records
+        # purge relies on this private QuerySet method; fail loudly if Django drops it
+        self.assertTrue(callable(getattr(QuerySet, '_raw_delete', None)))
+
+    def test_time_budget_stops_and_next_run_resumes(self):
+        self.create_weather(5, days_ago=400)
+        policy = retention.RetentionPolicy('weather', WeatherData, 365, date_field='recorded_at')
+
+        first = retention.purge(policy, batch_size=2, pause=0, max_seconds=0)
+        self.assertEqual((first['deleted'], first['complete']), (2, False))
+        second = retention.purge(policy, batch_size=2, pause=0)
+        self.assertEqual((second['deleted'], second['complete']), (3, True))
+
+    def test_cascading_rows_go_through_the_collector(self):
+        old = timezone.now() - timedelta(days=200)
+        stale = ChatSession.objects.create(user=self.user, session_id='stale', updated_at=old)
+        ChatMessage.objects.create(session=stale, message_type='user', content='Hello')
+        ChatSession.objects.create(user=self.user, session_id='recent')
+        policy = retention.RetentionPolicy('chat_sessions', ChatSession, 180, date_field='updated_at')
+
+        self.assertTrue(retention.cascades(ChatSession))
+        self.assertFalse(retention.cascades(WeatherData))
+        result = retention.purge(policy, pause=0)
+
+        self.assertEqual(result['deleted'], 2)      # the session and its message
+        self.assertEqual(list(ChatSession.objects.values_list('session_id', flat=True)), ['recent'])
+        self.assertFalse(ChatMessage.objects.exists())
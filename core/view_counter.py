@@ -0,0 +1,178 @@
+"""
+Buffered page-view counters for Farmazee
+
+Detail pages call ``record_view`` instead of saving the object. The view is
+counted with an atomic ``incr`` in the shared cache and the aggregated deltas
+are written back periodically (``core.tasks.flush_view_counts``) with one
+``UPDATE ... SET views = views + CASE pk WHEN ... END`` per model and batch,
+so a viral post no longer serializes its readers on a row lock.
+
+Counters live in numbered epochs. A flush moves writers to the next epoch,
+waits a moment for in-flight increments and then drains the previous one.
+Keys of an epoch are discovered through a small per-epoch registry written
+the first time an object is viewed in it, since cache backends cannot list
+keys.
+
+With a process-local cache (LocMemCache) a Celery worker cannot see the web
+processes' counters, so each process then flushes its own buffer at most
+every FLUSH_INTERVAL seconds from the request path.
+"""
+
+import hashlib
+import logging
+import re
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db.models import Case, F, IntegerField, Value, When
+
+logger = logging.getLogger(__name__)
+
+# Model label -> counter field
+VIEW_COUNTER_FIELDS = {
+    'farmer_problems.FarmerProblem': 'views_count',
+    'schemes.GovernmentScheme': 'views',
+    'marketplace.Product': 'views',
+    'marketplace.Input': 'views',
+}
+
+EPOCH_KEY = 'views:epoch'
+SEQ_KEY = 'views:{epoch}:seq'
+REGISTRY_KEY = 'views:{epoch}:key:{n}'
+COUNTER_KEY = 'views:{epoch}:{label}:{pk}'
+SEEN_KEY = 'views:seen:{visitor}:{label}:{pk}'
+LOCAL_FLUSH_KEY = 'views:local-flush'
+
+FLUSH_INTERVAL = 60         # seconds; also the Celery beat period
+FLUSH_GRACE = 1.0           # seconds to let increments against the old epoch land
+BATCH_SIZE = 500
+COUNTER_TTL = 60 * 60 * 24  # counters outlive several missed flushes
+
+BOT_RE = re.compile(
+    r'bot|crawl|spider|slurp|facebookexternalhit|whatsapp|telegram|preview|curl|wget|python-requests|headless',
+    re.IGNORECASE,
+)
+
+
+def _dedup_window():
+    return getattr(settings, 'VIEW_COUNTER_DEDUP_SECONDS', 30 * 60)
+
+
+def is_bot(request):
+    user_agent = request.META.get('HTTP_USER_AGENT', '')
+    return not user_agent or bool(BOT_RE.search(user_agent))
+
+
+def _visitor(request):
+    """Stable visitor id without forcing a session to be created"""
+    if request.user.is_authenticated:
+        return f'u{request.user.pk}'
+    session_key = getattr(request, 'session', None) and request.session.session_key
+    if session_key:
+        return f's{session_key}'
+    raw = f"{request.META.get('REMOTE_ADDR', '')}|{request.META.get('HTTP_USER_AGENT', '')}"
+    return 'a' + hashlib.blake2b(raw.encode(), digest_size=8).hexdigest()
+
+
+def _current_epoch():
+    cache.add(EPOCH_KEY, 0, timeout=None)
+    return cache.get(EPOCH_KEY, 0)
+
+
+def _incr(key, registry_epoch, entry):
+    if cache.add(key, 1, timeout=COUNTER_TTL):
+        seq_key = SEQ_KEY.format(epoch=registry_epoch)
+        cache.add(seq_key, 0, timeout=COUNTER_TTL)
+        n = cache.incr(seq_key)
+        cache.set(REGISTRY_KEY.format(epoch=registry_epoch, n=n), entry, timeout=COUNTER_TTL)
+        return
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted between add() and incr(); count it as a fresh key
+        _incr(key, registry_epoch, entry)
+
+
+def record_view(request, obj, filter_bots=True, dedupe=True):
+    """
+    Count one view of obj (an instance of a model in VIEW_COUNTER_FIELDS).
+
+    Bots are ignored and each visitor is counted once per
+    VIEW_COUNTER_DEDUP_SECONDS unless disabled. Returns True if counted.
+    """
+    label = obj._meta.label
+    if label not in VIEW_COUNTER_FIELDS:
+        raise ValueError(f"{label} has no buffered view counter")
+    if filter_bots and is_bot(request):
+        return False
+    if dedupe and _dedup_window():
+        seen_key = SEEN_KEY.format(visitor=_visitor(request), label=label, pk=obj.pk)
+        if not cache.add(seen_key, 1, timeout=_dedup_window()):
+            return False
+
+    epoch = _current_epoch()
+    _incr(COUNTER_KEY.format(epoch=epoch, label=label, pk=obj.pk), epoch, (label, obj.pk))
+
+    if isinstance(caches['default'], LocMemCache) and cache.add(LOCAL_FLUSH_KEY, 1, timeout=FLUSH_INTERVAL):
+        try:
+            flush_view_counts(grace=0)
+        except Exception as e:
+            logger.error(f"Error flushing view counts: {e}")
+    return True
+
+
+def pending_views(obj):
+    """Views of obj counted but not yet flushed in the current epoch"""
+    return cache.get(COUNTER_KEY.format(epoch=_current_epoch(), label=obj._meta.label, pk=obj.pk), 0)
+
+
+def _apply(label, deltas):
+    model = apps.get_model(label)
+    field = VIEW_COUNTER_FIELDS[label]
+    items = sorted(deltas.items())
+    for start in range(0, len(items), BATCH_SIZE):
+        batch = items[start:start + BATCH_SIZE]
+        increment = Case(
+            *[When(pk=pk, then=Value(delta)) for pk, delta in batch],
+            default=Value(0), output_field=IntegerField(),
+        )
+        model.objects.filter(pk__in=[pk for pk, _delta in batch]).update(**{field: F(field) + increment})
+
+
+def flush_view_counts(grace=FLUSH_GRACE):
+    """
+    Write buffered view counts to the database.
+
+    Returns {model label: views written}.
+    """
+    cache.add(EPOCH_KEY, 0, timeout=None)
+    epoch = cache.incr(EPOCH_KEY) - 1
+    if grace:
+        time.sleep(grace)
+
+    seq_key = SEQ_KEY.format(epoch=epoch)
+    count = cache.get(seq_key, 0)
+    registry_keys = [REGISTRY_KEY.format(epoch=epoch, n=n) for n in range(1, count + 1)]
+    entries = cache.get_many(registry_keys)
+    counter_keys = {
+        COUNTER_KEY.format(epoch=epoch, label=label, pk=pk): (label, pk)
+        for label, pk in entries.values()
+    }
+    values = cache.get_many(list(counter_keys))
+
+    deltas = {}
+    for key, delta in values.items():
+        label, pk = counter_keys[key]
+        if delta:
+            deltas.setdefault(label, {})[pk] = delta
+    for label, model_deltas in deltas.items():
+        _apply(label, model_deltas)
+
+    cache.delete_many([seq_key, *registry_keys, *counter_keys])
+    totals = {label: sum(model_deltas.values()) for label, model_deltas in deltas.items()}
+    if totals:
+        logger.info(f"Flushed view counts for epoch {epoch}: {totals}")
+    return totals
@@ -27,6 +27,8 @@ app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
 app.conf.update(
     # Task routing
     task_routes={
+        # Training forks a process pool: run this queue with -P solo
+        'ai_ml.tasks.train_model': {'queue': 'ai_training'},
         'ai_ml.tasks.*': {'queue': 'ai_ml'},
         'weather.tasks.*': {'queue': 'weather'},
         'analytics.tasks.*': {'queue': 'analytics'},
@@ -79,6 +81,58 @@ app.conf.update(
             'options': {'queue': 'marketplace'}
         },
         
+        # Product recommendation matrix nightly at 1:30 AM
+        'build-product-recommendations': {
+            'task': 'marketplace.tasks.build_recommendation_matrix',
+            'schedule': crontab(minute=30, hour=1),
+            'options': {'queue': 'marketplace'}
+        },
+        
+        # Buffered page-view counters every minute
+        'flush-view-counts': {
+            'task': 'core.tasks.flush_view_counts',
+            'schedule': crontab(minute='*'),
+        },
+        
+        # Farmer problems hot ranking every 10 minutes
+        'refresh-hot-scores': {
+            'task': 'farmer_problems.tasks.refresh_hot_scores',
+            'schedule': crontab(minute='*/10'),
+        },
+        
+        # Expire unanswered expert assignments every hour
+        'expire-expert-assignments': {
+            'task': 'farmer_problems.tasks.expire_assignments',
+            'schedule': crontab(minute=15),
+        },
+        
+        # Expert reputation drift correction daily at 3:30 AM
+        'reconcile-reputation': {
+            'task': 'farmer_problems.tasks.reconcile_reputation',
+            'schedule': crontab(hour=3, minute=30),
+        },
+        
+        # Feature store refresh every hour
+        'refresh-features': {
+            'task': 'ai_ml.tasks.refresh_features',
+            'schedule': crontab(minute=40),
+            'options': {'queue': 'ai_ml'}
+        },
+        
+        # Model quality from real outcomes every hour
+        'update-model-performance': {
+            'task': 'ai_ml.tasks.update_model_performance',
+            'schedule': crontab(minute=50),
+            'options': {'queue': 'ai_ml'}
+        },
+        
+        # Recommendations for all users nightly at 2:30 AM
+        'refresh-recommendations': {
+            'task': 'ai_ml.tasks.refresh_recommendations',
+            'schedule': crontab(minute=30, hour=2),
+            'options': {'queue': 'ai_ml'}
+        },
+        
         # Analytics processing daily at 2 AM
         'process-analytics': {
             'task': 'analytics.tasks.process_daily_analytics',
@@ -6,7 +6,7 @@ from django.contrib import admin
 from .models import (
     ProblemCategory, FarmerProblem, ProblemImage,
     Solution, SolutionImage, Comment, Vote,
-    ExpertProfile, Tag
+    ExpertProfile, ProblemAssignment, ReputationEvent, Tag, StoredBlob
 )
 
 
@@ -26,10 +26,14 @@ class ProblemImageInline(admin.TabularInline):
 @admin.register(FarmerProblem)
 class FarmerProblemAdmin(admin.ModelAdmin):
     list_display = ['title', 'author', 'category', 'status', 'views_count', 'created_at', 'is_pinned']
-    list_filter = ['status', 'category', 'is_pinned', 'is_featured', 'created_at']
+    list_filter = [
+        'status', 'category', 'is_pinned', 'is_featured', 'created_at',
+        ('possible_duplicate_of', admin.EmptyFieldListFilter),
+    ]
     search_fields = ['title', 'description', 'author__username']
     prepopulated_fields = {'slug': ('title',)}
-    readonly_fields = ['views_count', 'created_at', 'updated_at']
+    readonly_fields = ['views_count', 'created_at', 'updated_at', 'duplicate_similarity']
+    raw_id_fields = ['possible_duplicate_of']
     inlines = [ProblemImageInline]
     date_hierarchy = 'created_at'
     
@@ -43,6 +47,9 @@ class FarmerProblemAdmin(admin.ModelAdmin):
         ('Status', {
             'fields': ('status', 'is_pinned', 'is_featured')
         }),
+        ('Moderation', {
+            'fields': ('possible_duplicate_of', 'duplicate_similarity')
+        }),
         ('Metadata', {
             'fields': ('views_count', 'created_at', 'updated_at', 'solved_at'),
             'classes': ('collapse',)
@@ -89,12 +96,34 @@ class VoteAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at']
 
 
+@admin.register(ProblemAssignment)
+class ProblemAssignmentAdmin(admin.ModelAdmin):
+    list_display = ['problem', 'expert', 'status', 'match_score', 'created_at', 'answered_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['problem__title', 'expert__user__username']
+    raw_id_fields = ['problem', 'expert']
+    readonly_fields = ['created_at', 'answered_at']
+
+
+@admin.register(ReputationEvent)
+class ReputationEventAdmin(admin.ModelAdmin):
+    list_display = ['user', 'event_type', 'delta', 'points', 'solution', 'created_at']
+    list_filter = ['event_type', 'created_at']
+    search_fields = ['user__username']
+    raw_id_fields = ['user', 'solution']
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(ExpertProfile)
 class ExpertProfileAdmin(admin.ModelAdmin):
-    list_display = ['user', 'expert_type', 'is_verified', 'reputation_score', 'solutions_count']
-    list_filter = ['expert_type', 'is_verified', 'verified_at']
+    list_display = ['user', 'expert_type', 'is_verified', 'reputation_score', 'solutions_count', 'open_assignments']
+    list_filter = ['expert_type', 'is_verified', 'accepts_assignments', 'verified_at']
     search_fields = ['user__username', 'qualification', 'institution']
-    readonly_fields = ['solutions_count', 'accepted_solutions_count', 'reputation_score', 'created_at', 'updated_at']
+    readonly_fields = [
+        'solutions_count', 'accepted_solutions_count', 'reputation_score', 'open_assignments', 'created_at', 'updated_at',
+    ]
     
     fieldsets = (
         ('User Information', {
@@ -106,6 +135,9 @@ class ExpertProfileAdmin(admin.ModelAdmin):
         ('Verification', {
             'fields': ('is_verified', 'verification_document_url', 'verified_at', 'verified_by')
         }),
+        ('Routing', {
+            'fields': ('accepts_assignments', 'open_assignments')
+        }),
         ('Statistics', {
             'fields': ('solutions_count', 'accepted_solutions_count', 'reputation_score'),
             'classes': ('collapse',)
@@ -122,3 +154,10 @@ class TagAdmin(admin.ModelAdmin):
     def problem_count(self, obj):
         return obj.problems.count()
     problem_count.short_description = 'Problems'
+
+
+@admin.register(StoredBlob)
+class StoredBlobAdmin(admin.ModelAdmin):
+    list_display = ['path', 'content_type', 'size', 'ref_count', 'created_at']
+    search_fields = ['digest', 'path']
+    readonly_fields = ['digest', 'path', 'url', 'size', 'content_type', 'ref_count', 'created_at']
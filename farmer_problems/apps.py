@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class FarmerProblemsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'farmer_problems'
+
+    def ready(self):
+        """Connect media reference-counting signals."""
+        import farmer_problems.signals  # noqa: F401
@@ -0,0 +1,164 @@
+"""
+Threaded comments stored as materialized paths
+
+Every comment keeps the zero-padded ids of its ancestors and itself in
+``path`` (``0000000012/0000000031`` without separators), its ``depth``, the
+id of its top-level ``root`` and a denormalized ``reply_count``. Ordering a
+thread by ``path`` yields it in display (depth-first, oldest first) order,
+so a thread is one ordered query and ``build_tree`` assembles it in a single
+pass. A page of top-level comments costs two queries however busy it is:
+one for the page's root ids, one for their subtrees.
+
+Replies are stored at most ``MAX_DEPTH`` levels deep (deeper replies attach
+to the deepest allowed ancestor); pages show ``DISPLAY_DEPTH`` levels and
+link to the rest of a branch, which ``load_subtree`` serves.
+"""
+
+from itertools import groupby
+
+from django.db import transaction
+from django.db.models import F
+
+from .models import Comment
+
+SEGMENT_WIDTH = 10
+MAX_DEPTH = 8
+DISPLAY_DEPTH = 4
+PAGE_SIZE = 20
+
+
+def segment(pk):
+    return f'{pk:0{SEGMENT_WIDTH}d}'
+
+
+def prepare(comment):
+    """
+    Before a new comment is saved: clamp its depth and make a reply belong
+    to the same problem or solution as its parent.
+    """
+    parent = comment.parent
+    if parent is None:
+        return
+    while parent.depth >= MAX_DEPTH:
+        parent = parent.parent
+    comment.parent = parent
+    comment.comment_type = parent.comment_type
+    comment.problem_id = parent.problem_id
+    comment.solution_id = parent.solution_id
+
+
+def place(comment):
+    """After a new comment is inserted: fill in its path and count the reply"""
+    parent = comment.parent
+    if parent is None:
+        comment.path, comment.depth, comment.root_id = segment(comment.pk), 0, comment.pk
+    else:
+        comment.path = parent.path + segment(comment.pk)
+        comment.depth = parent.depth + 1
+        comment.root_id = parent.root_id or parent.pk
+    with transaction.atomic():
+        Comment.objects.filter(pk=comment.pk).update(path=comment.path, depth=comment.depth, root_id=comment.root_id)
+        if parent is not None:
+            Comment.objects.filter(pk=parent.pk).update(reply_count=F('reply_count') + 1)
+
+
+def removed(comment):
+    """After a comment is deleted: uncount it from a surviving parent"""
+    if comment.parent_id:
+        Comment.objects.filter(pk=comment.parent_id).update(reply_count=F('reply_count') - 1)
+
+
+def build_tree(comments, depth_limit=None):
+    """
+    Assemble comments ordered by path into a forest in one pass.
+
+    Each comment gets ``children`` and ``more_replies`` (it sits at
+    depth_limit and has replies that were not loaded). Returns the roots.
+    """
+    by_id = {}
+    roots = []
+    for comment in comments:
+        comment.children = []
+        comment.more_replies = depth_limit is not None and comment.depth >= depth_limit and comment.reply_count > 0
+        by_id[comment.pk] = comment
+        parent = by_id.get(comment.parent_id)
+        if parent is None:
+            roots.append(comment)
+        else:
+            parent.children.append(comment)
+    return roots
+
+
+def thread_queryset(problem=None, solution=None):
+    if solution is not None:
+        return Comment.objects.filter(solution=solution)
+    return Comment.objects.filter(problem=problem, comment_type='problem')
+
+
+def load_thread(problem=None, solution=None, max_depth=DISPLAY_DEPTH):
+    """The whole discussion of a problem or solution, in one query"""
+    comments = (
+        thread_queryset(problem, solution).filter(depth__lte=max_depth)
+        .select_related('author').order_by('path')
+    )
+    return build_tree(comments, max_depth)
+
+
+def load_subtree(comment, max_depth=DISPLAY_DEPTH):
+    """A comment and max_depth levels of replies below it, in one query"""
+    depth_limit = comment.depth + max_depth
+    comments = (
+        Comment.objects.filter(root_id=comment.root_id, path__startswith=comment.path, depth__lte=depth_limit)
+        .select_related('author').order_by('path')
+    )
+    return build_tree(comments, depth_limit)
+
+
+class CommentPage:
+    """A page of top-level comments with their replies"""
+
+    def __init__(self, roots, next_cursor=None):
+        self.roots = roots
+        self.next_cursor = next_cursor
+
+    def __iter__(self):
+        return iter(self.roots)
+
+    def __len__(self):
+        return len(self.roots)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+
+def comment_page(problem=None, solution=None, cursor=None, per_page=PAGE_SIZE, max_depth=DISPLAY_DEPTH):
+    """
+    Top-level comments after cursor (a root comment id), oldest first, with
+    max_depth levels of replies. Always two queries.
+    """
+    roots = thread_queryset(problem, solution).filter(depth=0)
+    if cursor:
+        roots = roots.filter(pk__gt=cursor)
+    root_ids = list(roots.order_by('pk').values_list('pk', flat=True)[:per_page + 1])
+    next_cursor = root_ids[per_page - 1] if len(root_ids) > per_page else None
+    root_ids = root_ids[:per_page]
+    if not root_ids:
+        return CommentPage([])
+    comments = (
+        Comment.objects.filter(root_id__in=root_ids, depth__lte=max_depth)
+        .select_related('author').order_by('path')
+    )
+    return CommentPage(build_tree(comments, max_depth), next_cursor)
+
+
+def solution_threads(problem, max_depth=DISPLAY_DEPTH):
+    """Comment trees of all of a problem's solutions in one query, as {solution id: roots}"""
+    comments = (
+        Comment.objects.filter(solution__problem=problem, depth__lte=max_depth)
+        .select_related('author').order_by('solution_id', 'path')
+    )
+    return {
+        solution_id: build_tree(thread, max_depth)
+        for solution_id, thread in groupby(comments, key=lambda comment: comment.solution_id)
+    }
@@ -0,0 +1,167 @@
+"""
+Content-addressed media store for Farmer Problems
+
+Files are stored under the SHA-256 of their bytes (``blobs/ab/<digest>.jpg``)
+so the same photo forwarded by many farmers is uploaded once. Each upload of
+a known digest only increments ``StoredBlob.ref_count``; deletes decrement it
+and the object leaves the bucket when no row refers to it any more. Since a
+path can never change content, blobs are served with a one-year immutable
+Cache-Control.
+"""
+
+import hashlib
+import logging
+import mimetypes
+from pathlib import Path
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import StoredBlob
+from .supabase_storage import get_storage_service
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+IMMUTABLE_CACHE_CONTROL = '31536000'    # one year; blob paths never change content
+
+
+def hash_file(path):
+    """SHA-256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentAddressedStore:
+    """Deduplicating, reference-counted wrapper around a storage backend"""
+
+    def __init__(self, backend=None):
+        self._backend = backend
+
+    @property
+    def backend(self):
+        return self._backend or get_storage_service()
+
+    @staticmethod
+    def blob_path(digest, ext):
+        return f"blobs/{digest[:2]}/{digest}{ext.lower()}"
+
+    def upload_image(self, file, folder=None, filename=None, content_type=None, digest=None):
+        """
+        Store a file on disk, or take another reference if its content is known
+
+        Args:
+            file: Path to a file on disk
+            folder, filename: Ignored; the path is derived from the content hash
+            content_type: Optional content type (guessed from the name otherwise)
+            digest: SHA-256 of the file when already computed while staging
+
+        Returns:
+            dict: {'success': bool, 'url': str, 'path': str, 'error': str, 'deduplicated': bool}
+        """
+        path = Path(file)
+        try:
+            digest = digest or hash_file(path)
+        except OSError as e:
+            return {'success': False, 'url': None, 'path': None, 'error': str(e), 'deduplicated': False}
+
+        blob = self._acquire(digest)
+        if blob is not None:
+            return {'success': True, 'url': blob.url, 'path': blob.path, 'error': None, 'deduplicated': True}
+
+        blob_path = self.blob_path(digest, path.suffix)
+        folder, filename = blob_path.rsplit('/', 1)
+        content_type = content_type or mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+        result = self.backend.upload_image(
+            path, folder=folder, filename=filename, content_type=content_type,
+            cache_control=IMMUTABLE_CACHE_CONTROL, upsert=True,
+        )
+        if not result['success']:
+            return {**result, 'deduplicated': False}
+
+        try:
+            with transaction.atomic():
+                StoredBlob.objects.create(
+                    digest=digest, path=result['path'], url=result['url'],
+                    size=path.stat().st_size, content_type=content_type,
+                )
+        except IntegrityError:
+            # Another worker stored the same bytes meanwhile; upsert made the object identical
+            blob = self._acquire(digest)
+            if blob is None:
+                return {'success': False, 'url': None, 'path': None, 'error': 'Blob vanished during upload', 'deduplicated': False}
+        return {**result, 'deduplicated': False}
+
+    def _acquire(self, digest):
+        """Increment the reference count of a known blob and return it"""
+        with transaction.atomic():
+            updated = StoredBlob.objects.filter(digest=digest).update(ref_count=F('ref_count') + 1)
+            if not updated:
+                return None
+            return StoredBlob.objects.get(digest=digest)
+
+    def acquire_urls(self, urls):
+        """
+        Take one more reference on each blob URL (for rows that copy another
+        row's files). Returns False, taking nothing, if any blob is gone.
+        """
+        with transaction.atomic():
+            blobs = {blob.url: blob for blob in StoredBlob.objects.select_for_update().filter(url__in=set(urls))}
+            if any(url not in blobs for url in urls):
+                return False
+            for url in urls:
+                StoredBlob.objects.filter(pk=blobs[url].pk).update(ref_count=F('ref_count') + 1)
+        return True
+
+    def _release(self, blobs_filter, keys):
+        orphaned = []
+        with transaction.atomic():
+            blobs = {getattr(blob, blobs_filter): blob for blob in
+                     StoredBlob.objects.select_for_update().filter(**{f'{blobs_filter}__in': set(keys)})}
+            for key in keys:
+                blob = blobs.get(key)
+                if blob is None:
+                    continue
+                blob.ref_count -= 1
+            for blob in blobs.values():
+                if blob.ref_count <= 0:
+                    orphaned.append(blob)
+                else:
+                    StoredBlob.objects.filter(pk=blob.pk).update(ref_count=blob.ref_count)
+            StoredBlob.objects.filter(pk__in=[blob.pk for blob in orphaned]).delete()
+        if orphaned:
+            transaction.on_commit(lambda: self._delete_orphans([blob.path for blob in orphaned]))
+        return [blob.path for blob in orphaned]
+
+    def _delete_orphans(self, paths):
+        # The same bytes may have been stored again since the last reference went away
+        revived = set(StoredBlob.objects.filter(path__in=paths).values_list('path', flat=True))
+        paths = [path for path in paths if path not in revived]
+        if paths:
+            self.backend.delete_multiple_images(paths)
+
+    def delete_image(self, file_path):
+        """Drop one reference to a blob; the object is removed with the last one"""
+        return self.delete_multiple_images([file_path])
+
+    def delete_multiple_images(self, file_paths):
+        """Drop one reference per path; returns the count of objects actually removed"""
+        try:
+            deleted = self._release('path', list(file_paths))
+            return {'success': True, 'deleted_count': len(deleted), 'error': None}
+        except Exception as e:
+            logger.error(f"Error releasing blobs: {e}")
+            return {'success': False, 'deleted_count': 0, 'error': str(e)}
+
+    def release_urls(self, urls):
+        """Drop one reference per blob URL (used when image rows are deleted)"""
+        return self._release('url', list(urls))
+
+    def get_public_url(self, file_path):
+        return self.backend.get_public_url(file_path)
+
+
+content_store = ContentAddressedStore()
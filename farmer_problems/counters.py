@@ -0,0 +1,136 @@
+"""
+Denormalized counters for Farmer Problems
+
+``upvotes``, ``downvotes``, ``score`` and ``solutions_count`` are stored on
+FarmerProblem/Solution so list pages can sort on an indexed column and
+templates never count per row. Every change is a single ``UPDATE ... SET
+col = col + delta`` with F() expressions, so concurrent voters never lose
+each other's increments. ``reconcile_counters`` recomputes everything from
+the Vote and Solution tables (see the management command of the same name).
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from . import ranking, reputation
+from .models import FarmerProblem, Solution, Vote
+
+VOTE_DELTAS = {'up': (1, 0), 'down': (0, 1)}
+
+
+def _bump_votes(model, pk, up, down):
+    if up or down:
+        model.objects.filter(pk=pk).update(
+            upvotes=F('upvotes') + up,
+            downvotes=F('downvotes') + down,
+            score=F('score') + (up - down),
+        )
+
+
+def apply_vote(user, target, vote_type):
+    """
+    Cast, switch or (when repeating the same vote) remove user's vote on a
+    FarmerProblem or Solution.
+
+    Returns (action, score) where action is 'voted' or 'removed'.
+    """
+    if vote_type not in VOTE_DELTAS:
+        raise ValueError(f"Invalid vote type: {vote_type}")
+    content_type = 'problem' if isinstance(target, FarmerProblem) else 'solution'
+    lookup = {'user': user, content_type: target}
+
+    with transaction.atomic():
+        existing = Vote.objects.select_for_update().filter(**lookup).first()
+        up, down = 0, 0
+        action = 'voted'
+        if existing is None:
+            try:
+                with transaction.atomic():
+                    Vote.objects.create(content_type=content_type, vote_type=vote_type, **lookup)
+            except IntegrityError:
+                # A concurrent request from the same user cast it first
+                return 'voted', _current_score(target)
+            up, down = VOTE_DELTAS[vote_type]
+        elif existing.vote_type == vote_type:
+            existing.delete()
+            up, down = (-d for d in VOTE_DELTAS[vote_type])
+            action = 'removed'
+        else:
+            Vote.objects.filter(pk=existing.pk).update(vote_type=vote_type)
+            new_up, new_down = VOTE_DELTAS[vote_type]
+            old_up, old_down = VOTE_DELTAS[existing.vote_type]
+            up, down = new_up - old_up, new_down - old_down
+        _bump_votes(type(target), target.pk, up, down)
+        if content_type == 'problem':
+            ranking.schedule_refresh(target.pk)
+        else:
+            reputation.solution_voted(target.pk, user, up, down)
+    return action, _current_score(target)
+
+
+def _current_score(target):
+    return type(target).objects.filter(pk=target.pk).values_list('score', flat=True).first() or 0
+
+
+def solution_added(problem_id):
+    FarmerProblem.objects.filter(pk=problem_id).update(solutions_count=F('solutions_count') + 1)
+
+
+def solution_removed(problem_id):
+    FarmerProblem.objects.filter(pk=problem_id).update(solutions_count=F('solutions_count') - 1)
+
+
+def reconcile_counters(problem_model=FarmerProblem, solution_model=Solution, vote_model=Vote):
+    """
+    Recompute every stored counter (and FarmerProblem.accepted_solution) from
+    the source tables with set-based UPDATEs. Returns the number of problem
+    and solution rows whose counts had drifted.
+    The model arguments let migrations pass historical models.
+    """
+    def count(field, vote_type):
+        return Coalesce(
+            Subquery(
+                vote_model.objects.filter(**{field: OuterRef('pk'), 'vote_type': vote_type})
+                .order_by().values(field).annotate(n=Count('pk')).values('n'),
+                output_field=IntegerField(),
+            ),
+            Value(0),
+        )
+
+    solutions_of = solution_model.objects.filter(problem=OuterRef('pk')).order_by()
+    problem_values = {
+        'upvotes': count('problem', 'up'),
+        'downvotes': count('problem', 'down'),
+        'solutions_count': Coalesce(
+            Subquery(solutions_of.values('problem').annotate(n=Count('pk')).values('n'), output_field=IntegerField()),
+            Value(0),
+        ),
+        'accepted_solution': Subquery(solutions_of.filter(is_accepted=True).order_by('-pk').values('pk')[:1]),
+    }
+    solution_values = {
+        'upvotes': count('solution', 'up'),
+        'downvotes': count('solution', 'down'),
+    }
+
+    with transaction.atomic():
+        drifted_problems = problem_model.objects.annotate(
+            **{f'real_{k}': v for k, v in problem_values.items()}
+        ).exclude(
+            upvotes=F('real_upvotes'), downvotes=F('real_downvotes'),
+            score=F('real_upvotes') - F('real_downvotes'),
+            solutions_count=F('real_solutions_count'),
+        ).count()
+        problem_model.objects.update(**problem_values)
+        problem_model.objects.update(score=F('upvotes') - F('downvotes'))
+
+        drifted_solutions = solution_model.objects.annotate(
+            **{f'real_{k}': v for k, v in solution_values.items()}
+        ).exclude(
+            upvotes=F('real_upvotes'), downvotes=F('real_downvotes'),
+            score=F('real_upvotes') - F('real_downvotes'),
+        ).count()
+        solution_model.objects.update(**solution_values)
+        solution_model.objects.update(score=F('upvotes') - F('downvotes'))
+
+    return {'problems': drifted_problems, 'solutions': drifted_solutions}
@@ -0,0 +1,108 @@
+"""
+Image normalization for Farmer Problems uploads
+
+Camera photos are re-encoded before they reach the bucket: EXIF orientation
+is applied and all metadata (including GPS) dropped, the image is bounded to
+MAX_DIMENSION and written as progressive JPEG and WebP at each of
+VARIANT_WIDTHS, plus a square thumbnail. The functions here only depend on
+Pillow so they can run in a separate process; ``run_in_pool`` keeps the
+CPU-heavy work off web workers and upload threads.
+"""
+
+import io
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from PIL import Image, ImageOps
+
+MAX_DIMENSION = 1600
+VARIANT_WIDTHS = (320, 640, 1280)
+THUMBNAIL_SIZE = 160
+JPEG_QUALITY = 78
+WEBP_QUALITY = 72
+FORMATS = {
+    'jpeg': ('JPEG', '.jpg', 'image/jpeg'),
+    'webp': ('WEBP', '.webp', 'image/webp'),
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _save(image, path, fmt):
+    pil_format, _ext, _content_type = FORMATS[fmt]
+    if fmt == 'jpeg':
+        image.save(path, pil_format, quality=JPEG_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(path, pil_format, quality=WEBP_QUALITY, method=4)
+
+
+def normalize_image(source, output_dir):
+    """
+    Write the normalized variants of source into output_dir.
+
+    Returns a list of dicts with keys 'kind' ('full', 'width' or 'thumbnail'),
+    'width', 'height', 'format', 'path' and 'content_type'. Raises an
+    OSError-derived exception when source is not a readable image.
+    """
+    source = Path(source)
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+
+    with Image.open(source) as original:
+        image = ImageOps.exif_transpose(original)
+        image = image.convert('RGB')
+    image.thumbnail((MAX_DIMENSION, MAX_DIMENSION), Image.LANCZOS)
+
+    # Widths at or above the bounded size collapse into the 'full' rendition
+    renditions = [('full', image)]
+    for width in VARIANT_WIDTHS:
+        if width < image.width:
+            height = max(1, round(image.height * width / image.width))
+            renditions.append(('width', image.resize((width, height), Image.LANCZOS)))
+    renditions.append(('thumbnail', ImageOps.fit(image, (THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.LANCZOS)))
+
+    variants = []
+    for kind, rendition in renditions:
+        for fmt, (_pil_format, ext, content_type) in FORMATS.items():
+            suffix = 'full' if kind == 'full' else ('thumb' if kind == 'thumbnail' else f'w{rendition.width}')
+            path = output_dir / f"{source.stem}-{suffix}{ext}"
+            _save(rendition, path, fmt)
+            variants.append({
+                'kind': kind,
+                'width': rendition.width,
+                'height': rendition.height,
+                'format': fmt,
+                'path': str(path),
+                'content_type': content_type,
+            })
+    return variants
+
+
+def make_thumbnail(image, fmt='jpeg'):
+    """Encode a square thumbnail of an open PIL image and return the bytes"""
+    thumbnail = ImageOps.fit(ImageOps.exif_transpose(image).convert('RGB'), (THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.LANCZOS)
+    buffer = io.BytesIO()
+    _save(thumbnail, buffer, fmt)
+    return buffer.getvalue()
+
+
+def _get_pool(workers):
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a process that runs upload threads is unsafe
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def run_in_pool(source, output_dir, workers=2):
+    """
+    normalize_image in the shared process pool, blocking the calling thread
+    until it is done; workers=0 runs it inline
+    """
+    if not workers:
+        return normalize_image(source, output_dir)
+    return _get_pool(workers).submit(normalize_image, str(source), str(output_dir)).result()
@@ -0,0 +1,124 @@
+"""
+Local filesystem storage for Farmer Problems
+
+Drop-in stand-in for ``SupabaseStorageService`` (same methods and result
+dicts) used in development and tests, selected with
+``MEDIA_STORAGE_BACKEND = 'local'``.
+"""
+
+import mimetypes
+import shutil
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+
+
+class LocalStorageService:
+    """Service for storing uploads under MEDIA_ROOT"""
+
+    bucket_name = 'local'
+
+    def __init__(self, root=None, base_url=None):
+        self._root = Path(root) if root else None
+        self._base_url = base_url
+
+    @property
+    def root(self):
+        # Read lazily so the singleton follows MEDIA_ROOT overrides in tests
+        return self._root or Path(settings.MEDIA_ROOT) / 'uploads'
+
+    @property
+    def base_url(self):
+        return self._base_url or f"{settings.MEDIA_URL.rstrip('/')}/uploads/"
+
+    def _full_path(self, file_path):
+        path = (self.root / file_path).resolve()
+        if self.root.resolve() not in path.parents:
+            raise ValueError(f"Invalid storage path: {file_path}")
+        return path
+
+    def upload_image(self, file, folder='problems', filename=None, content_type=None,
+                     cache_control=None, upsert=False):
+        """
+        Store a file
+
+        Args:
+            file: Django UploadedFile, open binary file or path to a staged file
+            folder: Folder name (e.g., 'problems', 'solutions')
+            filename: Optional custom filename
+            content_type, cache_control, upsert: Unused; accepted for parity
+                with the Supabase backend (existing files are overwritten)
+
+        Returns:
+            dict: {'success': bool, 'url': str, 'path': str, 'error': str}
+        """
+        try:
+            name = str(file) if isinstance(file, (str, Path)) else file.name
+            if not filename:
+                filename = f"{uuid.uuid4()}{Path(name).suffix}"
+            file_path = f"{folder}/{filename}"
+            target = self._full_path(file_path)
+            target.parent.mkdir(parents=True, exist_ok=True)
+
+            if isinstance(file, (str, Path)):
+                shutil.copyfile(file, target)
+            else:
+                with open(target, 'wb') as out:
+                    chunks = file.chunks() if hasattr(file, 'chunks') else iter(lambda: file.read(64 * 1024), b'')
+                    for chunk in chunks:
+                        out.write(chunk)
+
+            return {
+                'success': True,
+                'url': self.get_public_url(file_path),
+                'path': file_path,
+                'error': None
+            }
+        except Exception as e:
+            return {
+                'success': False,
+                'url': None,
+                'path': None,
+                'error': str(e)
+            }
+
+    def upload_multiple_images(self, files, folder='problems'):
+        """Store multiple files"""
+        return [self.upload_image(file, folder) for file in files]
+
+    def delete_image(self, file_path):
+        """Delete a stored file"""
+        try:
+            self._full_path(file_path).unlink(missing_ok=True)
+            return {'success': True, 'error': None}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    def delete_multiple_images(self, file_paths):
+        """Delete multiple stored files"""
+        try:
+            for file_path in file_paths:
+                self._full_path(file_path).unlink(missing_ok=True)
+            return {'success': True, 'deleted_count': len(file_paths), 'error': None}
+        except Exception as e:
+            return {'success': False, 'deleted_count': 0, 'error': str(e)}
+
+    def get_public_url(self, file_path):
+        """Get public URL for a stored file"""
+        return f"{self.base_url}{file_path}"
+
+    def list_files(self, folder=''):
+        """List files in a folder"""
+        directory = self.root / folder
+        if not directory.is_dir():
+            return []
+        return [
+            {'name': path.name, 'metadata': {'mimetype': mimetypes.guess_type(path.name)[0]}}
+            for path in sorted(directory.iterdir()) if path.is_file()
+        ]
+
+    def create_bucket_if_not_exists(self):
+        """Create the storage root"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        return {'success': True, 'message': f'Storage directory {self.root} ready'}
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from farmer_problems.counters import reconcile_counters
+from farmer_problems.reputation import reconcile_reputation
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized vote, solution and expert reputation counters from the source tables'
+
+    def handle(self, *args, **options):
+        drifted = reconcile_counters()
+        self.stdout.write(f"problems corrected: {drifted['problems']}")
+        self.stdout.write(f"solutions corrected: {drifted['solutions']}")
+        self.stdout.write(f"expert profiles corrected: {reconcile_reputation()}")
+        self.stdout.write(self.style.SUCCESS('Counters reconciled'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from farmer_problems.routing import routing_metrics
+
+
+class Command(BaseCommand):
+    help = 'Report time to first solution for routed and unrouted problems'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=30, help='Problems posted within this many days')
+
+    def handle(self, *args, **options):
+        metrics = routing_metrics(days=options['days'])
+        for label in ('routed', 'unrouted'):
+            group = metrics[label]
+            self.stdout.write(
+                f"{label}: {group['problems']} problems, {group['answered']} answered, "
+                f"average time to first solution {group['avg_time_to_first_solution'] or '-'}"
+            )
+        assignments = ', '.join(f'{status} {n}' for status, n in sorted(metrics['assignments'].items()))
+        self.stdout.write(f"assignments: {assignments or 'none'}")
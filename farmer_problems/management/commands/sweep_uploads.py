@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from farmer_problems.uploads import sweep_stale_uploads, wait_for_uploads
+
+
+class Command(BaseCommand):
+    help = 'Resubmit upload jobs left behind by restarted web processes and clean up the staging directory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stale-seconds', type=int, default=None, help='Age after which a job counts as stale')
+
+    def handle(self, *args, **options):
+        counts = sweep_stale_uploads(options['stale_seconds'])
+        # The resubmitted jobs run in this process's pool
+        wait_for_uploads()
+        self.stdout.write(f"resubmitted: {counts['resubmitted']}")
+        self.stdout.write(f"marked failed: {counts['failed']}")
+        self.stdout.write(f"staging files deleted: {counts['files_deleted']}")
+        self.stdout.write(self.style.SUCCESS('Uploads swept'))
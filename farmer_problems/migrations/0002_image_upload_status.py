@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farmer_problems', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problemimage',
+            name='upload_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('uploaded', 'Uploaded'), ('failed', 'Failed')], default='uploaded', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='solutionimage',
+            name='upload_status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('uploaded', 'Uploaded'), ('failed', 'Failed')], default='uploaded', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='problemimage',
+            name='image_url',
+            field=models.URLField(blank=True, help_text='Supabase storage URL, set once the upload finishes', max_length=500),
+        ),
+        migrations.AlterField(
+            model_name='solutionimage',
+            name='image_url',
+            field=models.URLField(blank=True, help_text='Supabase storage URL, set once the upload finishes', max_length=500),
+        ),
+    ]
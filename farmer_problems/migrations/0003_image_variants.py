@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farmer_problems', '0002_image_upload_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='problemimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=list, help_text='Resized JPEG/WebP renditions'),
+        ),
+        migrations.AddField(
+            model_name='solutionimage',
+            name='variants',
+            field=models.JSONField(blank=True, default=list, help_text='Resized JPEG/WebP renditions'),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_counters(apps, schema_editor):
+    from farmer_problems.counters import reconcile_counters
+
+    reconcile_counters(
+        apps.get_model('farmer_problems', 'FarmerProblem'),
+        apps.get_model('farmer_problems', 'Solution'),
+        apps.get_model('farmer_problems', 'Vote'),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farmer_problems', '0004_content_addressed_blobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='farmerproblem',
+            name='accepted_solution',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='farmer_problems.solution'),
+        ),
+        migrations.AddField(
+            model_name='farmerproblem',
+            name='downvotes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='farmerproblem',
+            name='score',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='farmerproblem',
+            name='solutions_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='farmerproblem',
+            name='upvotes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='solution',
+            name='downvotes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='solution',
+            name='score',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='solution',
+            name='upvotes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='farmerproblem',
+            index=models.Index(fields=['-score', '-id'], name='problem_score_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='farmerproblem',
+            index=models.Index(fields=['-solutions_count', '-id'], name='problem_solutions_idx'),
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
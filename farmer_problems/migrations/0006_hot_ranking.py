@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:07
+
+import django.db.models.functions.text
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_hot_scores(apps, schema_editor):
+    from farmer_problems.ranking import hot_score
+
+    FarmerProblem = apps.get_model('farmer_problems', 'FarmerProblem')
+    problems = list(FarmerProblem.objects.only('score', 'solutions_count', 'views_count', 'created_at'))
+    for problem in problems:
+        problem.hot_score = hot_score(problem.score, problem.solutions_count, problem.views_count, problem.created_at)
+    FarmerProblem.objects.bulk_update(problems, ['hot_score'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farmer_problems', '0005_denormalized_counters'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='farmerproblem',
+            name='hot_score',
+            field=models.FloatField(default=0, help_text='Time-decayed ranking, see farmer_problems.ranking'),
+        ),
+        migrations.AddIndex(
+            model_name='farmerproblem',
+            index=models.Index(fields=['-hot_score', '-id'], name='problem_hot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='farmerproblem',
+            index=models.Index(fields=['category', '-hot_score', '-id'], name='problem_category_hot_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='farmerproblem',
+            index=models.Index(django.db.models.functions.text.Lower('crop_type'), models.OrderBy(models.F('hot_score'), descending=True), models.OrderBy(models.F('id'), descending=True), name='problem_crop_hot_idx'),
+        ),
+        migrations.RunPython(populate_hot_scores, migrations.RunPython.noop),
+    ]
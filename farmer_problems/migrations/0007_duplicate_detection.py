@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:11
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farmer_problems', '0006_hot_ranking'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='farmerproblem',
+            name='duplicate_similarity',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='farmerproblem',
+            name='possible_duplicate_of',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='possible_duplicates', to='farmer_problems.farmerproblem'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:17
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def populate_first_solution_at(apps, schema_editor):
+    from django.db.models import OuterRef, Subquery
+
+    FarmerProblem = apps.get_model('farmer_problems', 'FarmerProblem')
+    Solution = apps.get_model('farmer_problems', 'Solution')
+    first = Solution.objects.filter(problem=OuterRef('pk')).order_by('created_at').values('created_at')[:1]
+    FarmerProblem.objects.update(first_solution_at=Subquery(first))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farmer_problems', '0007_duplicate_detection'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expertprofile',
+            name='accepts_assignments',
+            field=models.BooleanField(default=True, help_text='Receive new problems matching this expertise'),
+        ),
+        migrations.AddField(
+            model_name='expertprofile',
+            name='open_assignments',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='farmerproblem',
+            name='first_solution_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='ProblemAssignment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('assigned', 'Assigned'), ('answered', 'Answered'), ('expired', 'Expired')], default='assigned', max_length=20)),
+                ('match_score', models.FloatField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('answered_at', models.DateTimeField(blank=True, null=True)),
+                ('expert', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignments', to='farmer_problems.expertprofile')),
+                ('problem', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='assignments', to='farmer_problems.farmerproblem')),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='farmer_prob_status_4e78de_idx')],
+                'unique_together': {('problem', 'expert')},
+            },
+        ),
+        migrations.RunPython(populate_first_solution_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,105 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:21
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, F, Q, Sum
+
+# Frozen copy of farmer_problems.reputation.EVENT_POINTS at the time of this migration
+EVENT_POINTS = {
+    'solution': 2,
+    'accepted': 10,
+    'upvote': 5,
+    'downvote': -2,
+}
+
+
+def backfill_ledger(apps, schema_editor):
+    Solution = apps.get_model('farmer_problems', 'Solution')
+    ReputationEvent = apps.get_model('farmer_problems', 'ReputationEvent')
+    ExpertProfile = apps.get_model('farmer_problems', 'ExpertProfile')
+
+    # Counted from the votes themselves: authors' votes on their own
+    # solutions earn nothing, as in reputation.solution_voted
+    others = ~Q(votes__user=F('author'))
+    counted = Solution.objects.annotate(
+        counted_upvotes=Count('votes', filter=Q(votes__vote_type='up') & others),
+        counted_downvotes=Count('votes', filter=Q(votes__vote_type='down') & others),
+    ).order_by()
+
+    events = []
+    for solution in counted.iterator(chunk_size=2000):
+        for event_type, delta in (
+            ('solution', 1),
+            ('accepted', int(solution.is_accepted)),
+            ('upvote', solution.counted_upvotes),
+            ('downvote', solution.counted_downvotes),
+        ):
+            if delta:
+                events.append(ReputationEvent(
+                    user_id=solution.author_id, event_type=event_type, delta=delta,
+                    points=EVENT_POINTS[event_type] * delta, solution_id=solution.pk, created_at=solution.created_at,
+                ))
+    ReputationEvent.objects.bulk_create(events, batch_size=1000)
+
+    def totals(value, **filters):
+        return dict(
+            ReputationEvent.objects.filter(**filters).order_by().values('user_id').annotate(total=Sum(value))
+            .values_list('user_id', 'total')
+        )
+
+    solutions = totals('delta', event_type='solution')
+    accepted = totals('delta', event_type='accepted')
+    points = totals('points')
+    profiles = list(ExpertProfile.objects.only('pk', 'user_id'))
+    for profile in profiles:
+        profile.solutions_count = solutions.get(profile.user_id) or 0
+        profile.accepted_solutions_count = accepted.get(profile.user_id) or 0
+        profile.reputation_score = points.get(profile.user_id) or 0
+    ExpertProfile.objects.bulk_update(
+        profiles, ['solutions_count', 'accepted_solutions_count', 'reputation_score'], batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farmer_problems', '0008_expert_routing'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReputationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.CharField(choices=[('solution', 'Solution posted'), ('accepted', 'Solution accepted'), ('upvote', 'Solution upvoted'), ('downvote', 'Solution downvoted')], max_length=20)),
+                ('delta', models.IntegerField(default=1)),
+                ('points', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='expertprofile',
+            index=models.Index(fields=['-reputation_score', '-verified_at'], name='expert_reputation_idx'),
+        ),
+        migrations.AddField(
+            model_name='reputationevent',
+            name='solution',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='farmer_problems.solution'),
+        ),
+        migrations.AddField(
+            model_name='reputationevent',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reputation_events', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='reputationevent',
+            index=models.Index(fields=['user', 'event_type'], name='farmer_prob_user_id_84ab80_idx'),
+        ),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
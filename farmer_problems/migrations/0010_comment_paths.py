@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# Frozen copies of farmer_problems.comments.MAX_DEPTH and segment() at the time of this migration
+MAX_DEPTH = 8
+
+
+def segment(pk):
+    return f'{pk:010d}'
+
+
+def populate_paths(apps, schema_editor):
+    from collections import Counter
+
+    Comment = apps.get_model('farmer_problems', 'Comment')
+    parents = dict(Comment.objects.values_list('pk', 'parent_id'))
+    placed = {}     # pk -> (path, depth, root_id, parent_id)
+    for pk in sorted(parents):
+        chain = []
+        node = pk
+        while node is not None and node in parents and node not in placed:
+            chain.append(node)
+            node = parents[node]
+        for node in reversed(chain):
+            parent = parents[node]
+            while parent in placed and placed[parent][1] >= MAX_DEPTH:
+                parent = placed[parent][3]
+            if parent not in placed:
+                placed[node] = (segment(node), 0, node, None)
+            else:
+                path, depth, root_id, _grandparent = placed[parent]
+                placed[node] = (path + segment(node), depth + 1, root_id, parent)
+
+    replies = Counter(parent for _path, _depth, _root, parent in placed.values() if parent)
+    comments = list(Comment.objects.only('pk'))
+    for comment in comments:
+        comment.path, comment.depth, comment.root_id, comment.parent_id = placed[comment.pk]
+        comment.reply_count = replies[comment.pk]
+    Comment.objects.bulk_update(comments, ['path', 'depth', 'root_id', 'parent_id', 'reply_count'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('farmer_problems', '0009_reputation_ledger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='comment',
+            name='depth',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='path',
+            field=models.CharField(blank=True, help_text='Zero-padded ids from the root down', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='reply_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='comment',
+            name='root',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='farmer_problems.comment'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['problem', 'comment_type', 'depth', 'id'], name='comment_problem_roots_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['solution', 'path'], name='comment_solution_path_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['root', 'path'], name='comment_root_path_idx'),
+        ),
+        migrations.RunPython(populate_paths, migrations.RunPython.noop),
+    ]
@@ -3,6 +3,8 @@ Models for Farmer Problems & Solutions (Reddit-style feature)
 """
 
 from django.db import models
+from django.db.models import F
+from django.db.models.functions import Lower
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.urls import reverse
@@ -50,9 +52,26 @@ class FarmerProblem(models.Model):
     is_pinned = models.BooleanField(default=False)
     is_featured = models.BooleanField(default=False)
     
+    # Denormalized counters, kept in step by farmer_problems.counters
+    upvotes = models.IntegerField(default=0)
+    downvotes = models.IntegerField(default=0)
+    score = models.IntegerField(default=0)
+    solutions_count = models.IntegerField(default=0)
+    hot_score = models.FloatField(default=0, help_text="Time-decayed ranking, see farmer_problems.ranking")
+    accepted_solution = models.ForeignKey(
+        'Solution', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    
+    # Set by farmer_problems.similarity when a new post closely repeats an earlier one
+    possible_duplicate_of = models.ForeignKey(
+        'self', on_delete=models.SET_NULL, null=True, blank=True, related_name='possible_duplicates'
+    )
+    duplicate_similarity = models.FloatField(null=True, blank=True)
+    
     # Timestamps
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
+    first_solution_at = models.DateTimeField(null=True, blank=True)
     solved_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
@@ -61,6 +80,11 @@ class FarmerProblem(models.Model):
             models.Index(fields=['-created_at']),
             models.Index(fields=['status']),
             models.Index(fields=['category']),
+            models.Index(fields=['-score', '-id'], name='problem_score_idx'),
+            models.Index(fields=['-solutions_count', '-id'], name='problem_solutions_idx'),
+            models.Index(fields=['-hot_score', '-id'], name='problem_hot_idx'),
+            models.Index(fields=['category', '-hot_score', '-id'], name='problem_category_hot_idx'),
+            models.Index(Lower('crop_type'), F('hot_score').desc(), F('id').desc(), name='problem_crop_hot_idx'),
         ]
     
     def __str__(self):
@@ -71,26 +95,59 @@ class FarmerProblem(models.Model):
     
     @property
     def total_votes(self):
-        return self.votes.filter(vote_type='up').count() - self.votes.filter(vote_type='down').count()
+        return self.score
     
     @property
     def solution_count(self):
-        return self.solutions.count()
-    
-    @solution_count.setter
-    def solution_count(self, value):
-        # This is a read-only property, so we don't actually set anything
-        pass
-    
+        return self.solutions_count
+
+
+class ImageVariantsMixin:
+    """srcset helpers for image rows with normalized variants"""
+
+    def _srcset(self, fmt):
+        return ', '.join(
+            f"{v['url']} {v['width']}w" for v in sorted(self.variants, key=lambda v: v['width'])
+            if v['format'] == fmt and v['kind'] != 'thumbnail'
+        )
+
+    @property
+    def jpeg_srcset(self):
+        return self._srcset('jpeg')
+
+    @property
+    def webp_srcset(self):
+        return self._srcset('webp')
+
+    @property
+    def thumbnail_url(self):
+        for v in self.variants:
+            if v['kind'] == 'thumbnail' and v['format'] == 'jpeg':
+                return v['url']
+        return self.image_url
+
     @property
-    def accepted_solution(self):
-        return self.solutions.filter(is_accepted=True).first()
+    def stored_urls(self):
+        """Blob URLs this row holds a reference on, one entry per reference"""
+        if self.variants:
+            return [v['url'] for v in self.variants]
+        return [self.image_url] if self.image_url else []
+
 
+UPLOAD_STATUS_CHOICES = [
+    ('pending', 'Pending'),
+    ('uploaded', 'Uploaded'),
+    ('failed', 'Failed'),
+]
 
-class ProblemImage(models.Model):
+
+class ProblemImage(ImageVariantsMixin, models.Model):
     """Images attached to problems"""
     problem = models.ForeignKey(FarmerProblem, on_delete=models.CASCADE, related_name='images')
-    image_url = models.URLField(max_length=500, help_text="Supabase storage URL")
+    image_url = models.URLField(max_length=500, blank=True, help_text="Supabase storage URL, set once the upload finishes")
+    upload_status = models.CharField(max_length=10, choices=UPLOAD_STATUS_CHOICES, default='uploaded')
+    variants = models.JSONField(default=list, blank=True, help_text="Resized JPEG/WebP renditions")
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True, help_text="SHA-256 of the original upload")
     caption = models.CharField(max_length=200, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     order = models.IntegerField(default=0)
@@ -116,6 +173,11 @@ class Solution(models.Model):
     is_accepted = models.BooleanField(default=False)
     is_helpful = models.IntegerField(default=0)  # Helpful votes
     
+    # Denormalized vote counters, kept in step by farmer_problems.counters
+    upvotes = models.IntegerField(default=0)
+    downvotes = models.IntegerField(default=0)
+    score = models.IntegerField(default=0)
+    
     # Timestamps
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
@@ -128,13 +190,16 @@ class Solution(models.Model):
     
     @property
     def total_votes(self):
-        return self.votes.filter(vote_type='up').count() - self.votes.filter(vote_type='down').count()
+        return self.score
 
 
-class SolutionImage(models.Model):
+class SolutionImage(ImageVariantsMixin, models.Model):
     """Images attached to solutions"""
     solution = models.ForeignKey(Solution, on_delete=models.CASCADE, related_name='images')
-    image_url = models.URLField(max_length=500, help_text="Supabase storage URL")
+    image_url = models.URLField(max_length=500, blank=True, help_text="Supabase storage URL, set once the upload finishes")
+    upload_status = models.CharField(max_length=10, choices=UPLOAD_STATUS_CHOICES, default='uploaded')
+    variants = models.JSONField(default=list, blank=True, help_text="Resized JPEG/WebP renditions")
+    content_hash = models.CharField(max_length=64, blank=True, db_index=True, help_text="SHA-256 of the original upload")
     caption = models.CharField(max_length=200, blank=True)
     uploaded_at = models.DateTimeField(auto_now_add=True)
     order = models.IntegerField(default=0)
@@ -160,11 +225,22 @@ class Comment(models.Model):
     content = models.TextField()
     parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
     
+    # Materialized path, maintained by farmer_problems.comments
+    path = models.CharField(max_length=255, blank=True, help_text="Zero-padded ids from the root down")
+    depth = models.PositiveSmallIntegerField(default=0)
+    root = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    reply_count = models.IntegerField(default=0)
+    
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['problem', 'comment_type', 'depth', 'id'], name='comment_problem_roots_idx'),
+            models.Index(fields=['solution', 'path'], name='comment_solution_path_idx'),
+            models.Index(fields=['root', 'path'], name='comment_root_path_idx'),
+        ]
     
     def __str__(self):
         return f"Comment by {self.author.username}"
@@ -231,15 +307,27 @@ class ExpertProfile(models.Model):
     accepted_solutions_count = models.IntegerField(default=0)
     reputation_score = models.IntegerField(default=0)
     
+    # Routing (see farmer_problems.routing)
+    accepts_assignments = models.BooleanField(default=True, help_text="Receive new problems matching this expertise")
+    open_assignments = models.IntegerField(default=0)
+    
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-reputation_score', '-verified_at']
+        indexes = [
+            models.Index(fields=['-reputation_score', '-verified_at'], name='expert_reputation_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.get_expert_type_display()}"
     
+    @property
+    def stored_urls(self):
+        """Blob URLs this row holds a reference on"""
+        return [self.verification_document_url] if self.verification_document_url else []
+    
     @property
     def acceptance_rate(self):
         if self.solutions_count > 0:
@@ -247,6 +335,62 @@ class ExpertProfile(models.Model):
         return 0
 
 
+class ReputationEvent(models.Model):
+    """
+    Append-only reputation ledger; ExpertProfile statistics are its running
+    totals (see farmer_problems.reputation). Reversals are recorded as new
+    events with a negative delta.
+    """
+    EVENT_TYPES = [
+        ('solution', 'Solution posted'),
+        ('accepted', 'Solution accepted'),
+        ('upvote', 'Solution upvoted'),
+        ('downvote', 'Solution downvoted'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reputation_events')
+    event_type = models.CharField(max_length=20, choices=EVENT_TYPES)
+    delta = models.IntegerField(default=1)
+    points = models.IntegerField(default=0)
+    solution = models.ForeignKey(Solution, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', 'event_type']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} {self.event_type} {self.delta:+d} ({self.points:+d} points)"
+
+
+class ProblemAssignment(models.Model):
+    """A problem routed to an expert for an answer"""
+    STATUS_CHOICES = [
+        ('assigned', 'Assigned'),
+        ('answered', 'Answered'),
+        ('expired', 'Expired'),
+    ]
+    
+    problem = models.ForeignKey(FarmerProblem, on_delete=models.CASCADE, related_name='assignments')
+    expert = models.ForeignKey(ExpertProfile, on_delete=models.CASCADE, related_name='assignments')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='assigned')
+    match_score = models.FloatField(default=0)
+    created_at = models.DateTimeField(default=timezone.now)
+    answered_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        unique_together = ['problem', 'expert']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.problem_id} -> {self.expert_id} ({self.status})"
+
+
 class Tag(models.Model):
     """Tags for problems"""
     name = models.CharField(max_length=50, unique=True)
@@ -259,3 +403,22 @@ class Tag(models.Model):
     
     def __str__(self):
         return self.name
+
+
+class StoredBlob(models.Model):
+    """
+    A file in the media bucket, keyed by the SHA-256 of its content.
+
+    Identical uploads share one blob; ref_count tracks the rows pointing at
+    it and the object is removed from the bucket when it drops to zero.
+    """
+    digest = models.CharField(max_length=64, unique=True)
+    path = models.CharField(max_length=300, unique=True)
+    url = models.URLField(max_length=500, db_index=True)
+    size = models.BigIntegerField(default=0)
+    content_type = models.CharField(max_length=100, blank=True)
+    ref_count = models.PositiveIntegerField(default=1)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.path} ({self.ref_count} refs)"
@@ -0,0 +1,108 @@
+"""
+Hot ranking for the Farmer Problems feed
+
+``hot_score`` combines engagement (net votes, solutions, views) on a log
+scale with the post's age, in the style of Reddit's hot ranking:
+
+    hot = sign(e) * log10(max(|e|, 1)) + (created_at - EPOCH) / DECAY_SECONDS
+
+Because recency enters as a constant per post, a score only changes when
+its engagement does. It is refreshed for a single problem on votes and
+solutions, and for recent problems by the ``refresh_hot_scores`` Celery task
+(which picks up batched view counts). Feeds sort on the indexed column with
+keyset pagination; the overall top-N ids are cached for the landing page.
+"""
+
+import math
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.utils import timezone
+
+from core.pagination import KeysetPage
+
+from .models import FarmerProblem
+
+EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+DECAY_SECONDS = 45000       # 12.5 hours of recency is worth 10x the engagement
+SOLUTION_WEIGHT = 3
+VIEW_WEIGHT = 0.02          # 50 views count as one upvote
+RECENT_DAYS = 30            # periodic refresh window
+TOP_KEY = 'farmer_problems:hot_top'
+TOP_N = 50
+TOP_TTL = 60 * 10
+FEED_PAGE_SIZE = 20
+FEED_SORTS = {'hot': ('-hot_score', 'Hot')}
+
+
+def hot_score(score, solutions_count, views_count, created_at):
+    engagement = score + SOLUTION_WEIGHT * solutions_count + VIEW_WEIGHT * views_count
+    order = math.log10(max(abs(engagement), 1))
+    sign = 1 if engagement > 0 else -1 if engagement < 0 else 0
+    return round(sign * order + (created_at - EPOCH).total_seconds() / DECAY_SECONDS, 7)
+
+
+def score_for(problem):
+    return hot_score(problem.score, problem.solutions_count, problem.views_count, problem.created_at)
+
+
+def refresh_hot_scores(ids=None, since=None, batch_size=500):
+    """
+    Recompute hot_score for the given problem ids, or for problems created
+    after ``since`` (default: the last RECENT_DAYS days). Only rows whose score
+    changed are written. Returns the number of rows updated.
+    """
+    problems = FarmerProblem.objects.only('pk', 'score', 'solutions_count', 'views_count', 'created_at', 'hot_score')
+    if ids is not None:
+        problems = problems.filter(pk__in=ids)
+    else:
+        problems = problems.filter(created_at__gte=since or timezone.now() - timedelta(days=RECENT_DAYS))
+
+    changed = []
+    for problem in problems.iterator(chunk_size=batch_size):
+        new_score = score_for(problem)
+        if new_score != problem.hot_score:
+            problem.hot_score = new_score
+            changed.append(problem)
+    FarmerProblem.objects.bulk_update(changed, ['hot_score'], batch_size=batch_size)
+    if changed:
+        cache.delete(TOP_KEY)
+    return len(changed)
+
+
+def schedule_refresh(problem_id):
+    """Refresh one problem's score once the current transaction commits"""
+    transaction.on_commit(lambda: refresh_hot_scores([problem_id]))
+
+
+def top_problem_ids(n=TOP_N):
+    """Ids of the hottest open or solved problems, cached between refreshes"""
+    ids = cache.get(TOP_KEY)
+    if ids is None:
+        ids = list(
+            FarmerProblem.objects.exclude(status='closed')
+            .order_by('-hot_score', '-id').values_list('pk', flat=True)[:TOP_N]
+        )
+        cache.set(TOP_KEY, ids, TOP_TTL)
+    return ids[:n]
+
+
+def top_problems(n=10):
+    """The hottest problems in rank order, loaded in one query"""
+    ids = top_problem_ids(n)
+    problems = FarmerProblem.objects.select_related('author', 'category').in_bulk(ids)
+    return [problems[pk] for pk in ids if pk in problems]
+
+
+def hot_feed(queryset=None, category_slug=None, crop=None, cursor=None, per_page=FEED_PAGE_SIZE):
+    """Keyset page of problems in hot order, optionally for one category or crop"""
+    if queryset is None:
+        queryset = FarmerProblem.objects.select_related('author', 'category')
+    if category_slug:
+        queryset = queryset.filter(category__slug=category_slug)
+    if crop:
+        # Matches the Lower(crop_type), -hot_score index
+        queryset = queryset.alias(crop_key=Lower('crop_type')).filter(crop_key=crop.strip().lower())
+    return KeysetPage(queryset, FEED_SORTS, sort='hot', cursor=cursor, per_page=per_page)
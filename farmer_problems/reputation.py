@@ -0,0 +1,134 @@
+"""
+Event-sourced expert reputation
+
+Every action that affects a user's standing appends a ``ReputationEvent``
+(solution posted or removed, solution accepted or unaccepted, votes on their
+solutions) and, in the same transaction, bumps the running totals on their
+``ExpertProfile`` with F() expressions:
+
+* ``solutions_count``: net 'solution' deltas
+* ``accepted_solutions_count``: net 'accepted' deltas
+* ``reputation_score``: sum of points
+
+Users without an expert profile still accumulate events, so an expert starts
+with their history once the profile is created. ``reconcile_reputation``
+(the ``reconcile_reputation`` Celery task and the ``reconcile_counters``
+command) rebuilds the totals from the ledger with one grouped query per
+metric to correct any drift.
+"""
+
+from django.db import transaction
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .models import ExpertProfile, ReputationEvent, Solution
+
+EVENT_POINTS = {
+    'solution': 2,
+    'accepted': 10,
+    'upvote': 5,
+    'downvote': -2,
+}
+
+
+def record(user_id, event_type, delta=1, solution_id=None):
+    """Append one event and apply it to the user's expert profile, if any"""
+    if not delta:
+        return None
+    points = EVENT_POINTS[event_type] * delta
+    with transaction.atomic():
+        event = ReputationEvent.objects.create(
+            user_id=user_id, event_type=event_type, delta=delta, points=points, solution_id=solution_id,
+        )
+        changes = {'reputation_score': F('reputation_score') + points}
+        if event_type == 'solution':
+            changes['solutions_count'] = F('solutions_count') + delta
+        elif event_type == 'accepted':
+            changes['accepted_solutions_count'] = F('accepted_solutions_count') + delta
+        ExpertProfile.objects.filter(user_id=user_id).update(**changes)
+    return event
+
+
+def solution_voted(solution_id, voter, up, down):
+    """Credit a solution's author for a vote change (self-votes do not count)"""
+    author_id = Solution.objects.filter(pk=solution_id).values_list('author_id', flat=True).first()
+    if author_id is None or author_id == voter.pk:
+        return
+    record(author_id, 'upvote', up, solution_id)
+    record(author_id, 'downvote', down, solution_id)
+
+
+def solution_removed(solution):
+    """
+    Reverse everything a solution earned its author, from its own ledger
+    entries. Call before the solution is deleted.
+    """
+    earned = (
+        ReputationEvent.objects.filter(solution_id=solution.pk).order_by()
+        .values('user_id', 'event_type').annotate(total=Sum('delta'))
+    )
+    for row in earned:
+        record(row['user_id'], row['event_type'], -row['total'])
+
+
+def accept_solution(solution):
+    """
+    Mark solution as the accepted answer of its problem, unaccepting any
+    other, mark the problem solved and credit the authors accordingly.
+    """
+    problem = solution.problem
+    with transaction.atomic():
+        previously_accepted = list(
+            problem.solutions.select_for_update().filter(is_accepted=True).exclude(pk=solution.pk)
+            .values_list('pk', 'author_id')
+        )
+        problem.solutions.filter(pk__in=[pk for pk, _author in previously_accepted]).update(is_accepted=False)
+        for pk, author_id in previously_accepted:
+            record(author_id, 'accepted', -1, pk)
+
+        if not Solution.objects.filter(pk=solution.pk, is_accepted=True).exists():
+            Solution.objects.filter(pk=solution.pk).update(is_accepted=True)
+            record(solution.author_id, 'accepted', 1, solution.pk)
+        solution.is_accepted = True
+
+        problem.status = 'solved'
+        problem.solved_at = problem.solved_at or timezone.now()
+        problem.accepted_solution = solution
+        problem.save()
+
+
+def reconcile_reputation(user_ids=None):
+    """
+    Recompute every expert's statistics from the ledger. Returns the number
+    of profiles that had drifted.
+    """
+    events = ReputationEvent.objects.all()
+    profiles = ExpertProfile.objects.only('pk', 'user_id', 'solutions_count', 'accepted_solutions_count', 'reputation_score')
+    if user_ids is not None:
+        events = events.filter(user_id__in=user_ids)
+        profiles = profiles.filter(user_id__in=user_ids)
+
+    def totals(value, **filters):
+        return dict(
+            events.filter(**filters).order_by().values('user_id').annotate(total=Sum(value))
+            .values_list('user_id', 'total')
+        )
+
+    solutions = totals('delta', event_type='solution')
+    accepted = totals('delta', event_type='accepted')
+    points = totals('points')
+
+    drifted = []
+    for profile in profiles.iterator(chunk_size=2000):
+        exact = (
+            solutions.get(profile.user_id) or 0,
+            accepted.get(profile.user_id) or 0,
+            points.get(profile.user_id) or 0,
+        )
+        if exact != (profile.solutions_count, profile.accepted_solutions_count, profile.reputation_score):
+            profile.solutions_count, profile.accepted_solutions_count, profile.reputation_score = exact
+            drifted.append(profile)
+    ExpertProfile.objects.bulk_update(
+        drifted, ['solutions_count', 'accepted_solutions_count', 'reputation_score'], batch_size=500,
+    )
+    return len(drifted)
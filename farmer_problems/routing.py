@@ -0,0 +1,317 @@
+"""
+Expert routing for Farmer Problems
+
+New problems are pushed to the few verified experts most likely to answer
+them instead of waiting for someone to browse by. Each worker process keeps
+an in-memory index of verified experts that accept assignments:
+
+* terms: folded words of the expert's specialization, expert type and
+  primary crop (``similarity.words``), inverted to term -> expert ids;
+* regions: folded words of the expert's district and state.
+
+A problem is matched on the words of its title, crop and category plus its
+location and its author's district/state. Candidates are scored on term and
+region overlap plus reputation and acceptance rate, divided by a penalty for
+their open assignments, and the top ``ROUTE_K`` are assigned and notified in
+bulk. Matching only reads the postings of the problem's words and scores
+the experts found there, so its cost does not grow with the number of
+experts and it runs inline when a problem is posted.
+
+The index is rebuilt when expert profiles change (a version key in the
+shared cache) and at least every ``REFRESH_INTERVAL`` seconds so that loads
+assigned by other processes are picked up; assignments made by this process
+update its copy immediately.
+
+Assignments close as 'answered' when the expert posts a solution and as
+'expired' when the problem is solved or closed, or after ``ASSIGNMENT_TTL``
+(``farmer_problems.tasks.expire_assignments``). ``first_solution_at`` on the
+problem and ``answered_at`` on the assignment feed ``routing_metrics``.
+"""
+
+import logging
+import math
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Q
+from django.urls import reverse
+from django.utils import timezone
+
+from core.models import Notification
+
+from .models import ExpertProfile, FarmerProblem, ProblemAssignment
+from .similarity import words
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'routing:version'
+REFRESH_INTERVAL = 60       # seconds; picks up loads assigned by other processes
+ROUTE_K = 3
+MAX_OPEN_ASSIGNMENTS = 10
+ASSIGNMENT_TTL = timedelta(hours=48)
+
+TERM_WEIGHT = 1.0
+REGION_WEIGHT = 0.75
+MAX_REGION_MATCHES = 2
+REPUTATION_WEIGHT = 0.25    # per log(1 + reputation)
+ACCEPTANCE_WEIGHT = 1.0     # at a 100% acceptance rate
+LOAD_PENALTY = 0.25         # each open assignment divides the score by a further 25%
+
+
+def _region_words(*places):
+    return frozenset(word for place in places for word in words(place or ''))
+
+
+def expert_entry(expert):
+    """Index record for an ExpertProfile (with user.profile loaded)"""
+    profile = getattr(expert.user, 'profile', None)
+    primary_crop = getattr(profile, 'primary_crop', '') or ''
+    return {
+        'id': expert.pk,
+        'user_id': expert.user_id,
+        'terms': frozenset(words(f"{expert.specialization} {expert.get_expert_type_display()} {primary_crop}")),
+        'regions': _region_words(getattr(profile, 'district', ''), getattr(profile, 'state', '')),
+        'base': REPUTATION_WEIGHT * math.log1p(max(expert.reputation_score, 0))
+        + ACCEPTANCE_WEIGHT * expert.acceptance_rate / 100,
+        'load': expert.open_assignments,
+    }
+
+
+def problem_features(problem):
+    """(terms, regions) of a FarmerProblem (with author.profile and category loaded)"""
+    category = problem.category.name if problem.category else ''
+    terms = frozenset(words(f"{problem.title} {problem.crop_type} {category}"))
+    profile = getattr(problem.author, 'profile', None)
+    regions = _region_words(problem.location, getattr(profile, 'district', ''), getattr(profile, 'state', ''))
+    return terms, regions
+
+
+class ExpertIndex:
+    """
+    Inverted index of available verified experts by term and region.
+
+    Experts are rows of NumPy arrays (static score, load, user id) and the
+    postings are sorted arrays of rows, so a match merges the problem's
+    postings and scores only the candidate rows found there.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self.build([], version=None)
+        self.built_at = 0.0
+
+    def __len__(self):
+        return len(self._ids)
+
+    def build(self, entries, version=0):
+        entries = list(entries)
+        by_term, by_region = {}, {}
+        for row, entry in enumerate(entries):
+            for term in entry['terms']:
+                by_term.setdefault(term, []).append(row)
+            for region in entry['regions']:
+                by_region.setdefault(region, []).append(row)
+        with self._lock:
+            self._ids = np.array([entry['id'] for entry in entries], dtype=np.int64)
+            self._rows = {entry['id']: row for row, entry in enumerate(entries)}
+            self._user_ids = np.array([entry['user_id'] for entry in entries], dtype=np.int64)
+            self._base = np.array([entry['base'] for entry in entries], dtype=np.float64)
+            self._load = np.array([entry['load'] for entry in entries], dtype=np.int64)
+            self._by_term = {term: np.array(rows, dtype=np.int64) for term, rows in by_term.items()}
+            self._by_region = {region: np.array(rows, dtype=np.int64) for region, rows in by_region.items()}
+            self.version = version
+            self.built_at = time.monotonic()
+
+    def _counts(self, postings, keys):
+        """(rows, matches): sorted rows in any of the keys' postings and how many each is in"""
+        lists = [postings[key] for key in keys if key in postings]
+        if not lists:
+            return None, None
+        return np.unique(np.concatenate(lists), return_counts=True)
+
+    def match(self, terms, regions, k=ROUTE_K, exclude_users=()):
+        """
+        Best k experts for a problem, as [(expert_id, score)].
+
+        Only experts sharing at least one term are considered; a shared
+        region raises the score but does not qualify an expert on its own.
+        """
+        with self._lock:
+            rows, term_matches = self._counts(self._by_term, terms)
+            if rows is None:
+                return []
+            score = TERM_WEIGHT * term_matches + self._base[rows]
+            region_rows, region_matches = self._counts(self._by_region, regions)
+            if region_rows is not None:
+                position = np.minimum(np.searchsorted(region_rows, rows), len(region_rows) - 1)
+                hits = np.where(region_rows[position] == rows, region_matches[position], 0)
+                score += REGION_WEIGHT * np.minimum(hits, MAX_REGION_MATCHES)
+            load = self._load[rows]
+            score /= 1 + LOAD_PENALTY * load
+
+            eligible = load < MAX_OPEN_ASSIGNMENTS
+            if exclude_users:
+                eligible &= ~np.isin(self._user_ids[rows], list(exclude_users))
+            rows, score = rows[eligible], score[eligible]
+            if len(rows) > k:
+                top = np.argpartition(-score, k - 1)[:k]
+                rows, score = rows[top], score[top]
+            order = np.lexsort((self._ids[rows], -score))
+            return [(int(self._ids[row]), round(float(value), 4)) for row, value in zip(rows[order], score[order])]
+
+    def add_load(self, expert_ids, delta=1):
+        with self._lock:
+            for expert_id in expert_ids:
+                row = self._rows.get(expert_id)
+                if row is not None:
+                    self._load[row] = max(self._load[row] + delta, 0)
+
+
+_index = ExpertIndex()
+_build_lock = threading.Lock()
+
+
+def available_experts():
+    return ExpertProfile.objects.filter(is_verified=True, accepts_assignments=True).select_related('user__profile')
+
+
+def rebuild():
+    version = cache.get(VERSION_KEY, 0)
+    _index.build((expert_entry(expert) for expert in available_experts().iterator(chunk_size=2000)), version)
+    logger.info(f"Expert routing index built: {len(_index)} experts at version {version}")
+    return _index
+
+
+def get_index():
+    """This process's index, rebuilt when experts changed or the loads are stale"""
+    def stale():
+        return _index.version is None or time.monotonic() - _index.built_at >= REFRESH_INTERVAL \
+            or cache.get(VERSION_KEY, 0) != _index.version
+
+    if stale():
+        with _build_lock:
+            if stale():
+                rebuild()
+    return _index
+
+
+def experts_changed():
+    """Invalidate every process's index (call after expert or profile changes)"""
+    cache.add(VERSION_KEY, 0, None)
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.set(VERSION_KEY, 1, None)
+
+
+def route_problem(problem, k=ROUTE_K):
+    """
+    Assign a new problem to its k best-matched experts and notify them.
+    Returns the created ProblemAssignments; experts already assigned to the
+    problem are neither notified nor charged load again.
+    """
+    if problem.status != 'open':
+        return []
+    index = get_index()
+    terms, regions = problem_features(problem)
+    matches = index.match(terms, regions, k=k, exclude_users={problem.author_id})
+    if not matches:
+        return []
+
+    # The index may lag a profile change made through another process by a moment
+    recipients = dict(available_experts().filter(pk__in=[expert_id for expert_id, _score in matches])
+                      .values_list('pk', 'user_id'))
+    url = reverse('farmer_problems:detail', args=[problem.slug])
+    with transaction.atomic():
+        # Serializes routing of this problem so the existing pairs stay accurate
+        FarmerProblem.objects.select_for_update().filter(pk=problem.pk).values_list('pk', flat=True).first()
+        assigned = set(ProblemAssignment.objects.filter(problem=problem, expert_id__in=list(recipients))
+                       .values_list('expert_id', flat=True))
+        matches = [(expert_id, score) for expert_id, score in matches
+                   if expert_id in recipients and expert_id not in assigned]
+        if not matches:
+            return []
+        expert_ids = [expert_id for expert_id, _score in matches]
+        assignments = ProblemAssignment.objects.bulk_create([
+            ProblemAssignment(problem=problem, expert_id=expert_id, match_score=score)
+            for expert_id, score in matches
+        ], ignore_conflicts=True)
+        Notification.objects.bulk_create([
+            Notification(
+                user_id=recipients[expert_id],
+                notification_type='community',
+                title='A farmer needs your expertise',
+                message=f"{problem.title}\n{url}",
+            )
+            for expert_id, _score in matches
+        ])
+        ExpertProfile.objects.filter(pk__in=expert_ids).update(open_assignments=F('open_assignments') + 1)
+    index.add_load(expert_ids)
+    logger.info(f"Routed problem {problem.pk} to experts {expert_ids}")
+    return assignments
+
+
+def route_problem_id(problem_id, k=ROUTE_K):
+    problem = FarmerProblem.objects.select_related('author__profile', 'category').filter(pk=problem_id).first()
+    return route_problem(problem, k=k) if problem else []
+
+
+def _close(assignments, status, answered_at=None):
+    """Close open assignments and give back the experts' load"""
+    with transaction.atomic():
+        expert_ids = list(assignments.filter(status='assigned').select_for_update().values_list('expert_id', flat=True))
+        if not expert_ids:
+            return 0
+        assignments.filter(status='assigned').update(status=status, answered_at=answered_at)
+        for expert_id, closed in Counter(expert_ids).items():
+            ExpertProfile.objects.filter(pk=expert_id).update(open_assignments=F('open_assignments') - closed)
+    _index.add_load(expert_ids, -1)
+    return len(expert_ids)
+
+
+def solution_posted(solution):
+    """Record the problem's first solution and close the author's assignment, if any"""
+    FarmerProblem.objects.filter(pk=solution.problem_id, first_solution_at__isnull=True).update(
+        first_solution_at=solution.created_at
+    )
+    return _close(
+        ProblemAssignment.objects.filter(problem_id=solution.problem_id, expert__user_id=solution.author_id),
+        'answered', answered_at=solution.created_at,
+    )
+
+
+def problem_closed(problem_id):
+    """Expire the remaining assignments of a solved or closed problem"""
+    return _close(ProblemAssignment.objects.filter(problem_id=problem_id), 'expired')
+
+
+def expire_assignments(older_than=ASSIGNMENT_TTL):
+    """Expire assignments left unanswered for too long; returns how many"""
+    cutoff = timezone.now() - older_than
+    return _close(ProblemAssignment.objects.filter(created_at__lt=cutoff), 'expired')
+
+
+def routing_metrics(days=30):
+    """Time to first solution for routed and unrouted problems, and assignment outcomes"""
+    since = timezone.now() - timedelta(days=days)
+    wait = ExpressionWrapper(F('first_solution_at') - F('created_at'), output_field=DurationField())
+    problems = FarmerProblem.objects.filter(created_at__gte=since).annotate(
+        routed=Count('assignments', distinct=True)
+    )
+    metrics = {}
+    for label, queryset in (('routed', problems.filter(routed__gt=0)), ('unrouted', problems.filter(routed=0))):
+        metrics[label] = queryset.aggregate(
+            problems=Count('pk', distinct=True),
+            answered=Count('pk', filter=Q(first_solution_at__isnull=False), distinct=True),
+            avg_time_to_first_solution=Avg(wait),
+        )
+    metrics['assignments'] = dict(
+        ProblemAssignment.objects.filter(created_at__gte=since)
+        .values_list('status').annotate(n=Count('pk')).order_by()
+    )
+    return metrics
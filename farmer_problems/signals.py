@@ -0,0 +1,149 @@
+"""
+Signal handlers for the farmer problems app
+
+Deleting an image row (directly or through its problem or solution) or an
+expert profile, or replacing an expert's verification document, gives back
+the references on the content-addressed blobs they point at. Adding or
+removing a solution, from any code path, adjusts the problem's stored
+solutions_count, refreshes its hot ranking and is recorded in the
+reputation ledger. Problem saves, deletes and
+tag changes are published to the similarity index; new problems are
+checked for duplicates and routed to matching experts once committed, and
+expert or profile changes invalidate the routing index. Comments get
+their materialized path when inserted.
+"""
+
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+
+from core.models import UserProfile
+
+from . import comments, counters, ranking, reputation, routing, similarity
+from .content_store import content_store
+from .models import Comment, ExpertProfile, FarmerProblem, ProblemImage, Solution, SolutionImage
+
+
+def _release_blobs(sender, instance, **kwargs):
+    urls = instance.stored_urls
+    if urls:
+        transaction.on_commit(lambda: content_store.release_urls(urls))
+
+
+def _release_replaced_document(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance.pk is None or (update_fields is not None and 'verification_document_url' not in update_fields):
+        return
+    old_url = sender.objects.filter(pk=instance.pk).values_list('verification_document_url', flat=True).first()
+    if old_url and old_url != instance.verification_document_url:
+        transaction.on_commit(lambda: content_store.release_urls([old_url]))
+
+
+for _model in (ProblemImage, SolutionImage, ExpertProfile):
+    post_delete.connect(_release_blobs, sender=_model, dispatch_uid=f'release_blobs_{_model.__name__}')
+pre_save.connect(_release_replaced_document, sender=ExpertProfile, dispatch_uid='release_replaced_expert_document')
+
+
+def _solution_saved(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        counters.solution_added(instance.problem_id)
+        ranking.schedule_refresh(instance.problem_id)
+        routing.solution_posted(instance)
+        reputation.record(instance.author_id, 'solution', 1, instance.pk)
+
+
+def _solution_deleted(sender, instance, **kwargs):
+    counters.solution_removed(instance.problem_id)
+    ranking.schedule_refresh(instance.problem_id)
+
+
+def _solution_deleting(sender, instance, **kwargs):
+    reputation.solution_removed(instance)
+
+
+def _score_new_problem(sender, instance, raw=False, **kwargs):
+    if instance.pk is None and not raw:
+        instance.hot_score = ranking.score_for(instance)
+
+
+post_save.connect(_solution_saved, sender=Solution, dispatch_uid='solution_count_save')
+post_delete.connect(_solution_deleted, sender=Solution, dispatch_uid='solution_count_delete')
+pre_delete.connect(_solution_deleting, sender=Solution, dispatch_uid='solution_reputation_delete')
+pre_save.connect(_score_new_problem, sender=FarmerProblem, dispatch_uid='problem_hot_score')
+
+
+def _index_problem(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    change = ('upsert', similarity.document_for(instance))
+    problem_id = instance.pk
+
+    closed = instance.status in ('solved', 'closed')
+
+    def publish():
+        similarity.publish(change)
+        if created:
+            similarity.flag_duplicate(problem_id)
+            routing.route_problem_id(problem_id)
+        elif closed:
+            routing.problem_closed(problem_id)
+    transaction.on_commit(publish)
+
+
+def _unindex_problem(sender, instance, **kwargs):
+    change = ('remove', instance.pk)
+    transaction.on_commit(lambda: similarity.publish(change))
+
+
+def _publish_problems(problem_ids):
+    for problem in FarmerProblem.objects.filter(pk__in=problem_ids):
+        similarity.publish(('upsert', similarity.document_for(problem)))
+
+
+def _problem_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # Forward side is Tag.problems; reverse is problem.tags
+    if reverse and action in ('post_add', 'post_remove', 'post_clear'):
+        problem_ids = [instance.pk]
+    elif not reverse and action in ('post_add', 'post_remove'):
+        problem_ids = list(pk_set)
+    elif not reverse and action == 'pre_clear':
+        problem_ids = list(instance.problems.values_list('pk', flat=True))
+    else:
+        return
+    transaction.on_commit(lambda: _publish_problems(problem_ids))
+
+
+def _experts_changed(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    if sender is ExpertProfile and created:
+        # Start from the history the user built before applying
+        reputation.reconcile_reputation(user_ids=[instance.user_id])
+    if sender is UserProfile and not ExpertProfile.objects.filter(user_id=instance.user_id).exists():
+        return
+    transaction.on_commit(routing.experts_changed)
+
+
+post_save.connect(_index_problem, sender=FarmerProblem, dispatch_uid='problem_similarity_save')
+post_delete.connect(_unindex_problem, sender=FarmerProblem, dispatch_uid='problem_similarity_delete')
+m2m_changed.connect(_problem_tags_changed, sender=FarmerProblem.tags.through, dispatch_uid='problem_similarity_tags')
+post_save.connect(_experts_changed, sender=ExpertProfile, dispatch_uid='routing_expert_save')
+post_delete.connect(_experts_changed, sender=ExpertProfile, dispatch_uid='routing_expert_delete')
+post_save.connect(_experts_changed, sender=UserProfile, dispatch_uid='routing_profile_save')
+
+
+def _prepare_comment(sender, instance, raw=False, **kwargs):
+    if instance.pk is None and not raw:
+        comments.prepare(instance)
+
+
+def _place_comment(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw:
+        comments.place(instance)
+
+
+def _comment_deleted(sender, instance, **kwargs):
+    comments.removed(instance)
+
+
+pre_save.connect(_prepare_comment, sender=Comment, dispatch_uid='comment_prepare')
+post_save.connect(_place_comment, sender=Comment, dispatch_uid='comment_place')
+post_delete.connect(_comment_deleted, sender=Comment, dispatch_uid='comment_deleted')
@@ -0,0 +1,313 @@
+"""
+Near-duplicate detection for Farmer Problems
+
+Every problem is reduced to two MinHash signatures over its folded word set
+(see ``core.autocomplete.fold``, so "chilli", "chili" and "मिर्च" spellings
+meet): one over the title plus crop, used for LSH banding and most of the
+score, and a shorter one over the start of the description. A lookup hashes
+the query once, collects the problems sharing at least one band bucket,
+narrows them to the same category or shared tags, and ranks the rest by
+estimated Jaccard similarity.
+
+It powers two things:
+
+* suggestions of already solved problems while a farmer types a question
+  (``farmer_problems:similar``), and
+* ``FarmerProblem.possible_duplicate_of``, set on new posts that closely match
+  an earlier one, for moderators to review in the admin.
+
+Like the typeahead index, each worker process keeps its own index, kept in
+step with the others through the change log of ``core.change_log``.
+"""
+
+import hashlib
+import logging
+import threading
+import time
+
+import numpy as np
+from django.utils.text import slugify
+
+from core.autocomplete import fold
+from core.change_log import ReplicatedIndex
+
+from .models import FarmerProblem
+
+logger = logging.getLogger(__name__)
+
+BANDS = 20
+ROWS = 3                    # 20 bands of 3 rows: ~50% Jaccard pairs collide 94% of the time
+TITLE_PERM = BANDS * ROWS
+DESCRIPTION_PERM = 32
+DESCRIPTION_TOKENS = 40     # distinct words taken from the start of the description
+DESCRIPTION_CHARS = 2000
+TITLE_WEIGHT = 0.7          # share of the score from the title when both have a description
+DUPLICATE_THRESHOLD = 0.6
+SUGGEST_THRESHOLD = 0.25
+MAX_LIMIT = 10
+
+PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20250101)
+_A = _rng.integers(1, PRIME, TITLE_PERM, dtype=np.uint64)
+_B = _rng.integers(0, PRIME, TITLE_PERM, dtype=np.uint64)
+
+STOPWORDS = frozenset(fold(' '.join([
+    'a', 'an', 'and', 'are', 'at', 'be', 'can', 'do', 'does', 'for', 'from', 'has', 'have', 'how', 'i',
+    'in', 'is', 'it', 'me', 'my', 'of', 'on', 'or', 'our', 'please', 'problem', 'help', 'should', 'the',
+    'there', 'this', 'to', 'what', 'when', 'which', 'why', 'with', 'crop', 'crops', 'field', 'farm',
+])).split())
+
+
+def words(text):
+    """Folded content words of a text"""
+    return [word for word in fold(text or '').split() if len(word) > 1 and word not in STOPWORDS]
+
+
+def _hash_word(word):
+    return int.from_bytes(hashlib.blake2b(word.encode(), digest_size=4).digest(), 'little') % PRIME
+
+
+def minhash(tokens, num_perm=TITLE_PERM):
+    """MinHash signature (uint32 array) of a set of tokens, or None when empty"""
+    if not tokens:
+        return None
+    x = np.fromiter((_hash_word(token) for token in tokens), dtype=np.uint64, count=len(tokens))
+    a, b = _A[:num_perm, None], _B[:num_perm, None]
+    # a, x < 2**31 so a * x + b cannot overflow 64 bits
+    return ((a * x[None, :] + b) % PRIME).min(axis=1).astype(np.uint32)
+
+
+def document(title, description='', crop='', category=None, tags=(), solved=False, pk=None):
+    """Change-log/lookup record for a problem or a draft being typed"""
+    return {
+        'id': pk,
+        'title': title or '',
+        'description': (description or '')[:DESCRIPTION_CHARS],
+        'crop': crop or '',
+        'category': category,
+        'tags': sorted({slugify(tag) for tag in tags if slugify(tag)}),
+        'solved': solved,
+    }
+
+
+def document_for(problem):
+    return document(
+        problem.title, problem.description, problem.crop_type, problem.category_id,
+        problem.tags.values_list('slug', flat=True), problem.status == 'solved', pk=problem.pk,
+    )
+
+
+def _signatures(doc):
+    title_tokens = set(words(doc['title'])) | set(words(doc['crop']))
+    description_tokens = list(dict.fromkeys(words(doc['description'])))[:DESCRIPTION_TOKENS]
+    return minhash(sorted(title_tokens)), minhash(description_tokens, DESCRIPTION_PERM)
+
+
+class SimilarityIndex:
+    """
+    MinHash signatures of all problems with LSH buckets over the title signature.
+
+    Signatures live in row-per-problem NumPy arrays so the candidates of a
+    lookup are scored in one vectorized comparison; freed rows are reused.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._rows = {}
+        self._free = []
+        self._tags = {}
+        self._buckets = {}
+        self._allocate(0)
+        self.version = None
+        self.built_at = 0.0
+        self._checked_at = 0.0
+        self.candidates_scored = 0
+
+    def __len__(self):
+        return len(self._rows)
+
+    def _allocate(self, capacity):
+        self._title = np.zeros((capacity, TITLE_PERM), dtype=np.uint32)
+        self._description = np.zeros((capacity, DESCRIPTION_PERM), dtype=np.uint32)
+        self._has_description = np.zeros(capacity, dtype=bool)
+        self._category = np.zeros(capacity, dtype=np.int64)
+        self._solved = np.zeros(capacity, dtype=bool)
+        self._row_pk = np.zeros(capacity, dtype=np.int64)
+
+    def _grow(self):
+        old = (self._title, self._description, self._has_description, self._category, self._solved, self._row_pk)
+        size = len(self._row_pk)
+        self._allocate(max(1024, size * 2))
+        for new, values in zip(
+            (self._title, self._description, self._has_description, self._category, self._solved, self._row_pk), old
+        ):
+            new[:size] = values
+        self._free.extend(range(len(self._row_pk) - 1, size - 1, -1))
+
+    @staticmethod
+    def _band_keys(signature):
+        return [(band, signature[band * ROWS:(band + 1) * ROWS].tobytes()) for band in range(BANDS)]
+
+    def build(self, docs, version=0):
+        """Replace the whole index"""
+        fresh = SimilarityIndex()
+        for doc in docs:
+            fresh.upsert(doc)
+        with self._lock:
+            for name, value in vars(fresh).items():
+                if name != '_lock':
+                    setattr(self, name, value)
+            self.version = version
+            self.built_at = self._checked_at = time.monotonic()
+
+    def remove(self, pk):
+        with self._lock:
+            row = self._rows.pop(pk, None)
+            if row is None:
+                return
+            for key in self._band_keys(self._title[row]):
+                bucket = self._buckets.get(key)
+                if bucket is not None:
+                    bucket.discard(pk)
+                    if not bucket:
+                        del self._buckets[key]
+            self._tags.pop(pk, None)
+            self._free.append(row)
+
+    def upsert(self, doc):
+        pk = doc['id']
+        title_signature, description_signature = _signatures(doc)
+        with self._lock:
+            self.remove(pk)
+            if title_signature is None:
+                return
+            if not self._free:
+                self._grow()
+            row = self._free.pop()
+            self._rows[pk] = row
+            self._row_pk[row] = pk
+            self._title[row] = title_signature
+            self._has_description[row] = description_signature is not None
+            if description_signature is not None:
+                self._description[row] = description_signature
+            self._category[row] = doc['category'] or 0
+            self._solved[row] = doc['solved']
+            if doc['tags']:
+                self._tags[pk] = frozenset(doc['tags'])
+            for key in self._band_keys(title_signature):
+                self._buckets.setdefault(key, set()).add(pk)
+
+    def apply(self, change):
+        """Apply one change-log record: ('upsert', doc) or ('remove', pk)"""
+        op, payload = change
+        if op == 'upsert':
+            self.upsert(payload)
+        else:
+            self.remove(payload)
+
+    def similar(self, doc, limit=5, threshold=SUGGEST_THRESHOLD, solved_only=False):
+        """
+        Problems similar to doc, as [(pk, similarity)] best first.
+
+        Candidates come from shared LSH buckets. When doc has a category or
+        tags, candidates in another category are kept only if they share a
+        tag. doc itself (by id) is never returned.
+        """
+        title_signature, description_signature = _signatures(doc)
+        if title_signature is None:
+            return []
+        tags = frozenset(doc['tags'])
+        with self._lock:
+            candidates = set()
+            for key in self._band_keys(title_signature):
+                candidates.update(self._buckets.get(key, ()))
+            candidates.discard(doc['id'])
+            if not candidates:
+                return []
+            self.candidates_scored += len(candidates)
+            rows = np.fromiter((self._rows[pk] for pk in candidates), dtype=np.int64, count=len(candidates))
+
+            keep = self._solved[rows] if solved_only else np.ones(len(rows), dtype=bool)
+            if doc['category'] or tags:
+                categories = self._category[rows]
+                other = (categories != 0) & (categories != (doc['category'] or 0))
+                for position in np.flatnonzero(other & keep):
+                    keep[position] = bool(tags & self._tags.get(int(self._row_pk[rows[position]]), frozenset()))
+            rows = rows[keep]
+
+            similarity = np.count_nonzero(self._title[rows] == title_signature, axis=1) / TITLE_PERM
+            if description_signature is not None:
+                with_description = self._has_description[rows]
+                description_similarity = np.count_nonzero(
+                    self._description[rows] == description_signature, axis=1) / DESCRIPTION_PERM
+                similarity = np.where(
+                    with_description,
+                    TITLE_WEIGHT * similarity + (1 - TITLE_WEIGHT) * description_similarity,
+                    similarity,
+                )
+            matched = np.flatnonzero(similarity >= threshold)
+            best = matched[np.lexsort((-self._row_pk[rows[matched]], -similarity[matched]))][:limit]
+            return [(int(self._row_pk[rows[i]]), round(float(similarity[i]), 3)) for i in best]
+
+
+_index = SimilarityIndex()
+
+
+def database_docs():
+    tags = {}
+    for problem_id, slug in FarmerProblem.tags.through.objects.values_list('farmerproblem_id', 'tag__slug'):
+        tags.setdefault(problem_id, []).append(slug)
+    rows = FarmerProblem.objects.values_list('pk', 'title', 'description', 'crop_type', 'category_id', 'status')
+    for pk, title, description, crop, category, status in rows.iterator(chunk_size=2000):
+        yield document(title, description, crop, category, tags.get(pk, ()), status == 'solved', pk=pk)
+
+
+_replica = ReplicatedIndex('similarity', _index, database_docs)
+
+
+def rebuild():
+    """Full rebuild of this process's index from the database"""
+    return _replica.rebuild()
+
+
+def get_index():
+    """Return this process's index, built on first use and synced with the change log"""
+    return _replica.get()
+
+
+def publish(change):
+    """Append a change to the shared log and apply it to this process's index"""
+    _replica.publish(change)
+
+
+def similar_problems(title, description='', crop='', category=None, tags=(), limit=5, solved_only=True):
+    """
+    Existing problems resembling a draft, best first, for suggestions while
+    typing. Returns [(problem, similarity)].
+    """
+    limit = max(1, min(int(limit), MAX_LIMIT))
+    doc = document(title, description, crop, category, tags)
+    matches = get_index().similar(doc, limit=limit, solved_only=solved_only)
+    problems = FarmerProblem.objects.select_related('category').in_bulk([pk for pk, _similarity in matches])
+    return [(problems[pk], similarity) for pk, similarity in matches if pk in problems]
+
+
+def flag_duplicate(problem_id):
+    """
+    Point a new problem at the earlier problem it most closely repeats, if
+    any scores DUPLICATE_THRESHOLD or more. Returns the duplicate's pk.
+    """
+    problem = FarmerProblem.objects.filter(pk=problem_id).first()
+    if problem is None:
+        return None
+    doc = document_for(problem)
+    matches = [
+        (pk, similarity) for pk, similarity in get_index().similar(doc, limit=MAX_LIMIT, threshold=DUPLICATE_THRESHOLD)
+        if pk < problem_id
+    ]
+    if not matches:
+        return None
+    original, similarity = matches[0]
+    FarmerProblem.objects.filter(pk=problem_id).update(possible_duplicate_of=original, duplicate_similarity=similarity)
+    logger.info(f"Problem {problem_id} looks like a duplicate of {original} ({similarity:.2f})")
+    return original
@@ -25,32 +25,46 @@ class SupabaseStorageService:
         
         self.client: Client = create_client(self.supabase_url, self.supabase_key)
     
-    def upload_image(self, file, folder='problems', filename=None):
+    def upload_image(self, file, folder='problems', filename=None, content_type=None,
+                     cache_control='3600', upsert=False):
         """
         Upload an image to Supabase storage
         
         Args:
-            file: Django UploadedFile object
+            file: Django UploadedFile object or path to a staged file on disk
             folder: Folder name in bucket (e.g., 'problems', 'solutions')
             filename: Optional custom filename
+            content_type: Optional content type (guessed from the name otherwise)
+            cache_control: Cache-Control max-age in seconds, as a string
+            upsert: Overwrite an existing object at the same path
         
         Returns:
             dict: {'success': bool, 'url': str, 'path': str, 'error': str}
         """
         try:
+            name = str(file) if isinstance(file, (str, Path)) else file.name
+            
             # Generate unique filename if not provided
             if not filename:
-                ext = Path(file.name).suffix
+                ext = Path(name).suffix
                 filename = f"{uuid.uuid4()}{ext}"
             
             # Create full path
             file_path = f"{folder}/{filename}"
             
-            # Read file content
-            file_content = file.read()
+            # Paths are streamed from disk by the client; in-memory uploads are read once
+            if isinstance(file, (str, Path)):
+                file_content = str(file)
+            elif hasattr(file, 'temporary_file_path'):
+                file_content = file.temporary_file_path()
+            else:
+                file_content = file.read()
             
             # Determine content type
-            content_type = file.content_type or mimetypes.guess_type(file.name)[0] or 'application/octet-stream'
+            content_type = (
+                content_type or getattr(file, 'content_type', None)
+                or mimetypes.guess_type(name)[0] or 'application/octet-stream'
+            )
             
             # Upload to Supabase
             response = self.client.storage.from_(self.bucket_name).upload(
@@ -58,8 +72,8 @@ class SupabaseStorageService:
                 file=file_content,
                 file_options={
                     "content-type": content_type,
-                    "cache-control": "3600",
-                    "upsert": "false"
+                    "cache-control": cache_control,
+                    "upsert": "true" if upsert else "false"
                 }
             )
             
@@ -207,13 +221,19 @@ class SupabaseStorageService:
             }
 
 
-# Singleton instance
-_storage_service = None
+# Singleton instances, one per backend
+_storage_services = {}
 
 def get_storage_service():
-    """Get or create storage service instance"""
-    global _storage_service
-    if _storage_service is None:
-        _storage_service = SupabaseStorageService()
-    return _storage_service
-
+    """
+    Get or create the storage service for settings.MEDIA_STORAGE_BACKEND
+    ('supabase' or 'local')
+    """
+    backend = getattr(settings, 'MEDIA_STORAGE_BACKEND', 'supabase')
+    if backend not in _storage_services:
+        if backend == 'local':
+            from .local_storage import LocalStorageService
+            _storage_services[backend] = LocalStorageService()
+        else:
+            _storage_services[backend] = SupabaseStorageService()
+    return _storage_services[backend]
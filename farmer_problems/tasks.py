@@ -0,0 +1,55 @@
+"""
+Celery tasks for the farmer problems app
+"""
+
+import logging
+from datetime import timedelta
+
+from celery import shared_task
+from django.utils import timezone
+
+from . import ranking, reputation, routing
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, name='farmer_problems.tasks.refresh_hot_scores')
+def refresh_hot_scores(self, days=ranking.RECENT_DAYS):
+    """
+    Recompute hot ranking scores for recent problems.
+    
+    Args:
+        days: Problems created within this many days are refreshed
+    """
+    try:
+        updated = ranking.refresh_hot_scores(since=timezone.now() - timedelta(days=days))
+        logger.info(f"Refreshed {updated} hot scores")
+        return updated
+    except Exception as exc:
+        logger.error(f"Error refreshing hot scores: {exc}")
+        raise self.retry(exc=exc, countdown=60, max_retries=2)
+
+
+@shared_task(bind=True, name='farmer_problems.tasks.expire_assignments')
+def expire_assignments(self):
+    """Expire expert assignments left unanswered for routing.ASSIGNMENT_TTL"""
+    try:
+        expired = routing.expire_assignments()
+        logger.info(f"Expired {expired} expert assignments")
+        return expired
+    except Exception as exc:
+        logger.error(f"Error expiring expert assignments: {exc}")
+        raise self.retry(exc=exc, countdown=300, max_retries=2)
+
+
+@shared_task(bind=True, name='farmer_problems.tasks.reconcile_reputation')
+def reconcile_reputation(self):
+    """Rebuild expert statistics from the reputation ledger to correct drift"""
+    try:
+        drifted = reputation.reconcile_reputation()
+        if drifted:
+            logger.warning(f"Corrected reputation drift on {drifted} expert profiles")
+        return drifted
+    except Exception as exc:
+        logger.error(f"Error reconciling reputation: {exc}")
+        raise self.retry(exc=exc, countdown=600, max_retries=2)
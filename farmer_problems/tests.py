@@ -1,3 +1,586 @@
-from django.test import TestCase
+"""
+Tests for farmer problems uploads, counters, ranking, duplicate detection, routing, reputation and comments
+"""
 
-# Create your tests here.
+import io
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.text import slugify
+from PIL import Image
+
+from core import change_log
+from core.models import Notification, UserProfile
+
+from . import comments, counters, imaging, ranking, reputation, routing, similarity, uploads
+from .models import (
+    Comment, ExpertProfile, FarmerProblem, ProblemAssignment, ProblemCategory, ProblemImage, Solution, StoredBlob, Tag,
+    Vote,
+)
+
+
+class UploadPipelineTestCase(TransactionTestCase):
+    """Test cases for staged background uploads to the local storage backend"""
+
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        override = override_settings(
+            MEDIA_STORAGE_BACKEND='local',
+            MEDIA_ROOT=self.tmp / 'media',
+            UPLOAD_STAGING_DIR=self.tmp / 'staging',
+            UPLOAD_WORKERS=1,           # the shared in-memory SQLite test database has no concurrent writers
+        )
+        override.enable()
+        self.addCleanup(override.disable)
+        self.user = User.objects.create_user(username='farmer', password='testpass123')
+        self.client.login(username='farmer', password='testpass123')
+
+    def image(self, name='leaf.jpg'):
+        return SimpleUploadedFile(name, b'\xff\xd8\xff' + b'0' * 2048, content_type='image/jpeg')
+
+    def test_problem_images_are_uploaded_after_response(self):
+        response = self.client.post(reverse('farmer_problems:create'), {
+            'title': 'Yellow leaves on paddy',
+            'description': 'Leaves turning yellow',
+            'images': [self.image('a.jpg'), self.image('b.jpg')],
+        })
+        problem = FarmerProblem.objects.get()
+        self.assertRedirects(response, reverse('farmer_problems:detail', args=[problem.slug]), fetch_redirect_response=False)
+
+        uploads.wait_for_uploads(timeout=10)
+        images = list(ProblemImage.objects.filter(problem=problem))
+        self.assertEqual([image.upload_status for image in images], ['uploaded', 'uploaded'])
+        for image in images:
+            self.assertTrue(image.image_url.startswith('/farmazee media/uploads/blobs/'))
+            stored = self.tmp / 'media' / 'uploads' / image.image_url.split('/uploads/', 1)[1]
+            self.assertEqual(stored.stat().st_size, 2051)
+        self.assertEqual(list((self.tmp / 'staging').iterdir()), [])
+
+    def test_identical_uploads_share_one_reference_counted_blob(self):
+        for title in ('Forwarded photo', 'Same photo again'):
+            self.client.post(reverse('farmer_problems:create'), {
+                'title': title, 'description': '-', 'images': [self.image()],
+            })
+            uploads.wait_for_uploads(timeout=10)
+
+        first, second = ProblemImage.objects.order_by('pk')
+        self.assertEqual(first.image_url, second.image_url)
+        self.assertEqual(first.content_hash, second.content_hash)
+        blob = StoredBlob.objects.get()
+        self.assertEqual(blob.ref_count, 2)
+        stored = self.tmp / 'media' / 'uploads' / blob.path
+
+        first.problem.delete()
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+        self.assertTrue(stored.exists())
+
+        second.delete()
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertFalse(stored.exists())
+
+    def test_camera_photo_is_normalized_into_variants(self):
+        buffer = io.BytesIO()
+        exif = Image.Exif()
+        exif[0x0112] = 6                # orientation: rotate 90 degrees
+        exif[0x010F] = 'PhoneMaker'
+        Image.new('RGB', (3000, 2000), 'green').save(buffer, 'JPEG', exif=exif)
+        photo = SimpleUploadedFile('IMG_0001.JPG', buffer.getvalue(), content_type='image/jpeg')
+
+        self.client.post(reverse('farmer_problems:create'), {
+            'title': 'Leaf spots', 'description': '-', 'images': [photo],
+        })
+        uploads.wait_for_uploads(timeout=60)
+
+        image = ProblemImage.objects.get()
+        widths = sorted({(v['format'], v['width']) for v in image.variants if v['kind'] != 'thumbnail'})
+        self.assertEqual(widths, [
+            ('jpeg', 320), ('jpeg', 640), ('jpeg', 1067), ('webp', 320), ('webp', 640), ('webp', 1067),
+        ])
+        self.assertIn(' 640w', image.webp_srcset)
+        self.assertNotEqual(image.thumbnail_url, image.image_url)
+
+        stored = self.tmp / 'media' / 'uploads' / image.image_url.split('/uploads/', 1)[1]
+        with Image.open(stored) as full:
+            self.assertEqual(full.size, (1067, imaging.MAX_DIMENSION))
+            self.assertEqual(len(full.getexif()), 0)
+        self.assertEqual(list((self.tmp / 'staging').iterdir()), [])
+
+    def test_sweep_recovers_jobs_of_a_restarted_process(self):
+        problem = FarmerProblem.objects.create(title='Blight', slug='blight', description='-', author=self.user)
+        waiting, lost = (ProblemImage.objects.create(problem=problem, upload_status='pending') for _ in range(2))
+        path, digest = uploads.stage_upload(self.image())
+        uploads._write_manifest({
+            'path': str(path), 'content_type': 'image/jpeg', 'folder': 'problems', 'model': waiting._meta.label,
+            'pk': waiting.pk, 'url_field': 'image_url', 'status_field': 'upload_status', 'variants_field': 'variants',
+            'hash_field': 'content_hash', 'sha256': digest,
+        })
+        orphan = self.tmp / 'staging' / 'orphan.jpg'
+        orphan.write_bytes(b'-')
+        # As if the process that staged them died an hour ago
+        an_hour_ago = time.time() - 3600
+        for staged in (self.tmp / 'staging').iterdir():
+            os.utime(staged, (an_hour_ago, an_hour_ago))
+        ProblemImage.objects.update(uploaded_at=timezone.now() - timedelta(hours=1))
+
+        self.assertEqual(uploads.sweep_stale_uploads(), {'resubmitted': 1, 'failed': 1, 'files_deleted': 1})
+        uploads.wait_for_uploads(timeout=10)
+
+        waiting.refresh_from_db()
+        lost.refresh_from_db()
+        self.assertEqual((waiting.upload_status, lost.upload_status), ('uploaded', 'failed'))
+        self.assertEqual(list((self.tmp / 'staging').iterdir()), [])
+
+    def test_verification_document_url_is_filled(self):
+        self.client.post(reverse('farmer_problems:become_expert'), {
+            'expert_type': 'farmer', 'qualification': 'BSc Agriculture',
+            'verification_document': self.image('certificate.jpg'),
+        })
+        uploads.wait_for_uploads(timeout=10)
+        profile = ExpertProfile.objects.get(user=self.user)
+        self.assertIn('/uploads/blobs/', profile.verification_document_url)
+        self.assertEqual(StoredBlob.objects.get().ref_count, 1)
+
+        # Replacing the document gives back the old blob
+        profile.verification_document_url = ''
+        profile.save()
+        self.assertFalse(StoredBlob.objects.exists())
+
+
+class UploadRetryTestCase(TestCase):
+    """Test cases for upload failures"""
+
+    def test_missing_staged_file_marks_image_failed(self):
+        user = User.objects.create_user(username='farmer')
+        problem = FarmerProblem.objects.create(
+            title='Pests', slug='pests', description='-', author=user,
+        )
+        image = ProblemImage.objects.create(problem=problem, upload_status='pending')
+        job = {
+            'path': '/nonexistent/staged.jpg', 'content_type': 'image/jpeg', 'folder': 'problems',
+            'model': image._meta.label, 'pk': image.pk, 'url_field': 'image_url', 'status_field': 'upload_status',
+        }
+        with override_settings(MEDIA_STORAGE_BACKEND='local', MEDIA_ROOT=tempfile.gettempdir()):
+            retry_backoff, uploads.RETRY_BACKOFF = uploads.RETRY_BACKOFF, 0
+            try:
+                result = uploads.process_upload(job)
+            finally:
+                uploads.RETRY_BACKOFF = retry_backoff
+
+        self.assertFalse(result['success'])
+        image.refresh_from_db()
+        self.assertEqual((image.upload_status, image.image_url), ('failed', ''))
+
+
+class CounterTestCase(TestCase):
+    """Test cases for denormalized vote and solution counters"""
+
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.voter = User.objects.create_user(username='voter', password='testpass123')
+        self.problem = FarmerProblem.objects.create(
+            title='Whitefly on cotton', slug='whitefly-on-cotton', description='-', author=self.author,
+        )
+
+    def vote(self, vote_type, content_type='problem', content_id=None):
+        response = self.client.post(
+            reverse('farmer_problems:vote'),
+            {'content_type': content_type, 'content_id': content_id or self.problem.pk, 'vote_type': vote_type},
+            content_type='application/json',
+        )
+        return response.json()
+
+    def test_vote_toggles_update_counters(self):
+        self.client.login(username='voter', password='testpass123')
+        self.assertEqual(self.vote('up'), {'success': True, 'vote_count': 1, 'action': 'voted'})
+        self.assertEqual(self.vote('down')['vote_count'], -1)
+        self.assertEqual(self.vote('down'), {'success': True, 'vote_count': 0, 'action': 'removed'})
+
+        self.problem.refresh_from_db()
+        self.assertEqual((self.problem.upvotes, self.problem.downvotes, self.problem.score), (0, 0, 0))
+
+    def test_solution_count_and_reconcile(self):
+        solution = Solution.objects.create(problem=self.problem, author=self.voter, content='Spray neem oil')
+        Solution.objects.create(problem=self.problem, author=self.author, content='Yellow sticky traps')
+        Vote.objects.create(user=self.voter, solution=solution, content_type='solution', vote_type='up')
+        self.problem.refresh_from_db()
+        self.assertEqual(self.problem.solutions_count, 2)
+
+        FarmerProblem.objects.update(solutions_count=7, score=3)
+        self.assertEqual(counters.reconcile_counters(), {'problems': 1, 'solutions': 1})
+        self.problem.refresh_from_db()
+        solution.refresh_from_db()
+        self.assertEqual((self.problem.solutions_count, self.problem.score), (2, 0))
+        self.assertEqual((solution.upvotes, solution.score), (1, 1))
+
+        solution.delete()
+        self.problem.refresh_from_db()
+        self.assertEqual(self.problem.solutions_count, 1)
+
+    def test_list_sorts_on_stored_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('farmer_problems:list'), {'sort': 'most_voted'})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any('farmer_problems_vote' in q['sql'] for q in queries.captured_queries))
+
+
+class HotRankingTestCase(TestCase):
+    """Test cases for the precomputed hot feed"""
+
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        now = timezone.now()
+        self.old = self.problem('Old but popular', now - timedelta(hours=3), crop_type='Cotton')
+        self.new = self.problem('Fresh question', now, crop_type='Paddy')
+        self.middle = self.problem('An hour ago', now - timedelta(hours=1), crop_type='cotton')
+
+    def problem(self, title, created_at, **kwargs):
+        return FarmerProblem.objects.create(
+            title=title, slug=slugify(title), description='-', author=self.author, created_at=created_at, **kwargs
+        )
+
+    def test_engagement_and_recency_order_the_feed(self):
+        self.assertEqual([p.pk for p in ranking.hot_feed()], [self.new.pk, self.middle.pk, self.old.pk])
+
+        voters = [User.objects.create_user(username=f'voter{n}') for n in range(40)]
+        with self.captureOnCommitCallbacks(execute=True):
+            for voter in voters:
+                counters.apply_vote(voter, self.old, 'up')
+        self.assertEqual(ranking.top_problem_ids(1), [self.old.pk])
+
+    def test_feed_pages_and_crop_filter(self):
+        first = ranking.hot_feed(per_page=2)
+        second = ranking.hot_feed(cursor=first.next_cursor, per_page=2)
+        self.assertEqual([p.pk for p in [*first, *second]], [self.new.pk, self.middle.pk, self.old.pk])
+        self.assertEqual({p.pk for p in ranking.hot_feed(crop='COTTON')}, {self.old.pk, self.middle.pk})
+
+    def test_list_page_renders_trending_from_cached_top(self):
+        response = self.client.get(reverse('farmer_problems:list'), {'sort': 'hot', 'crop': 'paddy'})
+        self.assertContains(response, 'Fresh question')
+        self.assertNotContains(response, 'Old but popular')
+
+        ranking.top_problem_ids()
+        with self.assertNumQueries(1):
+            trending = ranking.top_problems(5)
+        self.assertEqual(trending[0], self.new)
+
+
+class SimilarityTestCase(TestCase):
+    """Test cases for near-duplicate detection"""
+
+    def setUp(self):
+        cache.clear()
+        similarity._index.version = None
+        self.author = User.objects.create_user(username='author')
+        self.pests = ProblemCategory.objects.create(name='Pests', slug='pests')
+        self.soil = ProblemCategory.objects.create(name='Soil', slug='soil')
+
+    def problem(self, title, category=None, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return FarmerProblem.objects.create(
+                title=title, slug=slugify(title), description=kwargs.pop('description', '-'),
+                author=self.author, category=category, **kwargs
+            )
+
+    def test_suggests_solved_problems_while_typing(self):
+        solved = self.problem('Leaf curl in chilli plants', self.pests, status='solved', crop_type='Chilli')
+        self.problem('Leaf curl on chilli nursery', self.pests)
+        self.problem('Fertilizer dose for paddy', self.pests, status='solved')
+
+        response = self.client.get(reverse('farmer_problems:similar'), {'title': 'chili leaf curl', 'category': self.pests.pk})
+        results = response.json()['results']
+        self.assertEqual([r['id'] for r in results], [solved.pk])
+        self.assertEqual(results[0]['url'], solved.get_absolute_url())
+        self.assertEqual(self.client.get(reverse('farmer_problems:similar'), {'limit': 'x'}).status_code, 400)
+
+    def test_new_post_is_flagged_as_duplicate_within_category_or_tags(self):
+        original = self.problem('Whitefly attack on cotton', self.pests)
+        repeat = self.problem('Cotton whitefly attack', self.pests)
+        elsewhere = self.problem('Whitefly attack on cotton field', self.soil)
+        repeat.refresh_from_db()
+        elsewhere.refresh_from_db()
+        self.assertEqual(repeat.possible_duplicate_of, original)
+        self.assertGreaterEqual(repeat.duplicate_similarity, similarity.DUPLICATE_THRESHOLD)
+        self.assertIsNone(elsewhere.possible_duplicate_of)
+
+        tag = Tag.objects.create(name='whitefly', slug='whitefly')
+        with self.captureOnCommitCallbacks(execute=True):
+            tag.problems.add(original)
+        doc = similarity.document('Whitefly attack on cotton', category=self.soil.pk, tags=['Whitefly'])
+        matches = [pk for pk, _similarity in similarity.get_index().similar(doc)]
+        self.assertEqual(sorted(matches), [original.pk, elsewhere.pk])
+
+    def test_large_index_scores_only_bucket_candidates(self):
+        crops = ['paddy', 'cotton', 'chilli', 'maize', 'groundnut', 'tomato', 'brinjal', 'mango']
+        issues = ['leaf curl', 'yellow leaves', 'stem borer', 'root rot', 'fruit drop', 'wilting', 'aphids']
+        index = similarity.SimilarityIndex()
+        index.build(
+            similarity.document(f'{issues[n % 7]} {crops[n % 8]} variety {n}', 'seen after rain', pk=n)
+            for n in range(20000)
+        )
+
+        for title, issue, crop in (
+            ('leaf curl in chilli', 0, 2), ('stem borer paddy', 2, 0), ('wilting tomato after rain', 5, 5),
+        ):
+            with self.subTest(title=title):
+                index.candidates_scored = 0
+                results = index.similar(similarity.document(title, 'after heavy rain'))
+                self.assertTrue(results)
+                self.assertEqual((results[0][0] % 7, results[0][0] % 8), (issue, crop))
+                self.assertLessEqual(index.candidates_scored, len(index) // 5)
+
+    def test_process_local_cache_rebuilds_after_max_age(self):
+        index = similarity.get_index()
+        FarmerProblem.objects.create(title='Thrips on onion', slug='thrips-on-onion', description='-', author=self.author)
+        doc = similarity.document('onion thrips')
+        self.assertEqual(similarity.get_index().similar(doc), [])
+
+        index.built_at -= change_log.REFRESH_INTERVAL
+        self.assertEqual(len(similarity.get_index().similar(doc)), 1)
+
+
+class RoutingTestCase(TestCase):
+    """Test cases for routing new problems to experts"""
+
+    def setUp(self):
+        cache.clear()
+        routing._index.version = None
+        self.farmer = User.objects.create_user(username='farmer')
+        UserProfile.objects.create(user=self.farmer, district='Guntur', state='Andhra Pradesh')
+        self.pests = ProblemCategory.objects.create(name='Pests', slug='pests')
+
+    def expert(self, username, specialization, district='', reputation=0, is_verified=True, **kwargs):
+        user = User.objects.create_user(username=username)
+        UserProfile.objects.create(user=user, district=district, state='Andhra Pradesh')
+        return ExpertProfile.objects.create(
+            user=user, expert_type='agronomist', qualification='MSc', specialization=specialization,
+            is_verified=is_verified, reputation_score=reputation, **kwargs
+        )
+
+    def post(self, title, crop_type=''):
+        with self.captureOnCommitCallbacks(execute=True):
+            return FarmerProblem.objects.create(
+                title=title, slug=slugify(title), description='-', author=self.farmer,
+                category=self.pests, crop_type=crop_type,
+            )
+
+    def test_new_problem_is_routed_to_matching_experts_with_load_balancing(self):
+        local = self.expert('local', 'Chilli pests and thrips', district='Guntur')
+        busy = self.expert('busy', 'Chilli thrips', district='Guntur', reputation=500, open_assignments=9)
+        far = self.expert('far', 'Chilli pests')
+        self.expert('vet', 'Dairy cattle')
+        self.expert('unverified', 'Chilli thrips', is_verified=False)
+
+        problem = self.post('Thrips on chilli', crop_type='Chilli')
+        assignments = ProblemAssignment.objects.filter(problem=problem).order_by('-match_score')
+        self.assertEqual([a.expert for a in assignments], [local, far, busy])
+        self.assertEqual(
+            set(Notification.objects.values_list('user__username', flat=True)), {'local', 'far', 'busy'}
+        )
+        busy.refresh_from_db()
+        self.assertEqual(busy.open_assignments, 10)
+
+        # Routing again does not re-notify or re-charge the assigned experts
+        self.assertEqual(routing.route_problem(problem), [])
+        self.assertEqual(Notification.objects.count(), 3)
+        local.refresh_from_db()
+        self.assertEqual(local.open_assignments, 1)
+
+        # Busy is now at capacity
+        self.post('Chilli thrips again')
+        self.assertFalse(ProblemAssignment.objects.filter(expert=busy).exclude(problem=problem).exists())
+
+    def test_solution_closes_assignments_and_records_first_solution(self):
+        local = self.expert('local', 'Chilli thrips', district='Guntur')
+        other = self.expert('other', 'Chilli thrips')
+        problem = self.post('Thrips on chilli')
+
+        Solution.objects.create(problem=problem, author=local.user, content='Spray spinosad')
+        problem.refresh_from_db()
+        self.assertIsNotNone(problem.first_solution_at)
+        self.assertEqual(ProblemAssignment.objects.get(expert=local).status, 'answered')
+
+        problem.status = 'solved'
+        with self.captureOnCommitCallbacks(execute=True):
+            problem.save()
+        self.assertEqual(ProblemAssignment.objects.get(expert=other).status, 'expired')
+        self.assertEqual(list(ExpertProfile.objects.values_list('open_assignments', flat=True)), [0, 0])
+
+        metrics = routing.routing_metrics()
+        self.assertEqual((metrics['routed']['problems'], metrics['routed']['answered']), (1, 1))
+        self.assertEqual(metrics['assignments'], {'answered': 1, 'expired': 1})
+
+    def test_large_index_matches_a_full_scan(self):
+        crops = ['paddy', 'cotton', 'chilli', 'maize', 'groundnut', 'tomato', 'brinjal', 'mango']
+        entries = [{
+            'id': n, 'user_id': n, 'terms': frozenset(routing.words(f'{crops[n % 8]} {crops[n % 5]} pests')),
+            'regions': frozenset([f'district{n % 30}']), 'base': n % 7 / 7, 'load': n % 12,
+        } for n in range(5000)]
+        index = routing.ExpertIndex()
+        index.build(entries)
+        terms, regions = frozenset(routing.words('Stem borer in paddy')), frozenset(['district3'])
+
+        def expected(exclude_users=()):
+            scored = []
+            for entry in entries:
+                shared = len(terms & entry['terms'])
+                if not shared or entry['load'] >= routing.MAX_OPEN_ASSIGNMENTS or entry['user_id'] in exclude_users:
+                    continue
+                score = routing.TERM_WEIGHT * shared + entry['base'] + routing.REGION_WEIGHT * min(
+                    len(regions & entry['regions']), routing.MAX_REGION_MATCHES)
+                scored.append((-score / (1 + routing.LOAD_PENALTY * entry['load']), entry['id']))
+            return [round(-score, 4) for score, _expert_id in sorted(scored)[:routing.ROUTE_K]]
+
+        # Equal scores may come back in any order, so compare the scores
+        matches = index.match(terms, regions)
+        self.assertEqual(len(matches), routing.ROUTE_K)
+        self.assertEqual([score for _expert_id, score in matches], expected())
+        excluded = {matches[0][0]}
+        matches = index.match(terms, regions, exclude_users=excluded)
+        self.assertFalse(excluded & {expert_id for expert_id, _score in matches})
+        self.assertEqual([score for _expert_id, score in matches], expected(excluded))
+
+
+class ReputationTestCase(TestCase):
+    """Test cases for the reputation ledger"""
+
+    def setUp(self):
+        self.farmer = User.objects.create_user(username='farmer', password='testpass123')
+        self.expert = User.objects.create_user(username='expert')
+        self.voter = User.objects.create_user(username='voter')
+        self.problem = FarmerProblem.objects.create(
+            title='Bollworm in cotton', slug='bollworm-in-cotton', description='-', author=self.farmer,
+        )
+
+    def test_ledger_keeps_expert_statistics_current(self):
+        earlier = Solution.objects.create(problem=self.problem, author=self.expert, content='Pheromone traps')
+        profile = ExpertProfile.objects.create(user=self.expert, expert_type='agronomist', qualification='MSc')
+        profile.refresh_from_db()
+        self.assertEqual((profile.solutions_count, profile.reputation_score), (1, 2))
+
+        solution = Solution.objects.create(problem=self.problem, author=self.expert, content='Spray Bt')
+        counters.apply_vote(self.voter, solution, 'up')
+        counters.apply_vote(self.expert, solution, 'up')     # self-votes earn nothing
+        self.client.login(username='farmer', password='testpass123')
+        self.client.post(reverse('farmer_problems:accept_solution', args=[earlier.pk]))
+        self.client.post(reverse('farmer_problems:accept_solution', args=[solution.pk]))
+
+        profile.refresh_from_db()
+        self.assertEqual(
+            (profile.solutions_count, profile.accepted_solutions_count, profile.reputation_score), (2, 1, 2 + 2 + 5 + 10)
+        )
+        self.assertEqual(reputation.reconcile_reputation(), 0)
+
+        solution.delete()
+        profile.refresh_from_db()
+        self.assertEqual((profile.solutions_count, profile.accepted_solutions_count, profile.reputation_score), (1, 0, 2))
+
+    def test_reconcile_corrects_drift_with_grouped_queries(self):
+        ExpertProfile.objects.create(user=self.expert, expert_type='agronomist', qualification='MSc')
+        Solution.objects.create(problem=self.problem, author=self.expert, content='Neem oil')
+        ExpertProfile.objects.update(reputation_score=999, solutions_count=0)
+
+        with self.assertNumQueries(5):      # three grouped totals, the profiles, one bulk update
+            self.assertEqual(reputation.reconcile_reputation(), 1)
+        profile = ExpertProfile.objects.get()
+        self.assertEqual((profile.solutions_count, profile.reputation_score), (1, 2))
+
+
+class CommentTreeTestCase(TestCase):
+    """Test cases for materialized-path comment threads"""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='farmer', password='testpass123')
+        self.problem = FarmerProblem.objects.create(
+            title='Stem rot in groundnut', slug='stem-rot-in-groundnut', description='-', author=self.user,
+        )
+
+    def comment(self, content, parent=None, **kwargs):
+        kwargs.setdefault('problem', None if parent else self.problem)
+        return Comment.objects.create(
+            comment_type='problem', author=self.user, content=content, parent=parent, **kwargs
+        )
+
+    def test_thread_loads_in_order_with_depth_limit(self):
+        first = self.comment('first')
+        second = self.comment('second')
+        reply = self.comment('reply', first)
+        chain = [reply]
+        for n in range(comments.MAX_DEPTH + 2):
+            chain.append(self.comment(f'deep {n}', chain[-1]))
+        self.comment('later reply', first)
+
+        self.assertEqual(reply.problem, self.problem)
+        self.assertEqual(max(Comment.objects.values_list('depth', flat=True)), comments.MAX_DEPTH)
+        with self.assertNumQueries(1):
+            roots = comments.load_thread(self.problem, max_depth=2)
+        self.assertEqual([root.content for root in roots], ['first', 'second'])
+        self.assertEqual([c.content for c in roots[0].children], ['reply', 'later reply'])
+        deepest_loaded = roots[0].children[0].children[0]
+        self.assertTrue(deepest_loaded.more_replies)
+        self.assertEqual(deepest_loaded.children, [])
+        self.assertEqual(second.reply_count, 0)
+
+        subtree = comments.load_subtree(deepest_loaded)
+        self.assertEqual(subtree[0].children[0].content, 'deep 1')
+
+    def test_busy_threads_render_at_constant_query_count(self):
+        def detail_queries():
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(self.problem.get_absolute_url())
+            self.assertEqual(response.status_code, 200)
+            return len(queries)
+
+        solution = Solution.objects.create(problem=self.problem, author=self.user, content='Apply gypsum')
+        self.comment('quiet')
+        self.comment('on solution', problem=None, solution=solution)
+        detail_queries()    # creates the site settings row
+        quiet = detail_queries()
+
+        for n in range(30):
+            root = self.comment(f'root {n}')
+            self.comment('reply', self.comment('reply', root))
+            self.comment('solution reply', Comment.objects.filter(solution=solution).first())
+        self.assertEqual(detail_queries(), quiet)
+
+        page = comments.comment_page(self.problem, per_page=20)
+        self.assertEqual(len(page), 20)
+        rest = comments.comment_page(self.problem, cursor=page.next_cursor, per_page=20)
+        self.assertEqual((len(rest), rest.has_next), (11, False))
+
+    def test_deep_solution_thread_continues_on_its_own_page(self):
+        solution = Solution.objects.create(problem=self.problem, author=self.user, content='Apply gypsum')
+        chain = [self.comment('on solution', problem=None, solution=solution)]
+        for n in range(comments.DISPLAY_DEPTH + 1):
+            chain.append(self.comment(f'deep {n}', chain[-1]))
+        cut = chain[comments.DISPLAY_DEPTH]
+
+        response = self.client.get(self.problem.get_absolute_url())
+        self.assertContains(response, f'?thread={cut.pk}#comment-{cut.pk}')
+        response = self.client.get(self.problem.get_absolute_url(), {'thread': cut.pk})
+        self.assertContains(response, chain[-1].content)
+
+    def test_reply_is_posted_under_its_parent(self):
+        parent = self.comment('How much water?')
+        self.client.login(username='farmer', password='testpass123')
+        response = self.client.post(
+            reverse('farmer_problems:comment_create', args=[self.problem.slug]),
+            {'content': 'Twice a week', 'parent': parent.pk},
+        )
+        reply = Comment.objects.get(parent=parent)
+        self.assertRedirects(response, f'{self.problem.get_absolute_url()}#comment-{reply.pk}', fetch_redirect_response=False)
+        self.assertEqual((reply.depth, reply.root_id, reply.path), (1, parent.pk, parent.path + comments.segment(reply.pk)))
@@ -0,0 +1,401 @@
+"""
+Off-request upload pipeline for Farmer Problems
+
+Views stage each uploaded file to local disk in chunks, create the image row
+with ``upload_status='pending'`` and return. Once the transaction commits the
+staged files are pushed to the storage backend from a bounded thread pool,
+with retries, and the row's URL field is filled in when the upload finishes.
+Images are first normalized into bounded JPEG/WebP renditions (see
+``imaging``) and only those are uploaded; the raw camera file never is.
+Uploads go through the content-addressed ``content_store``, so repeated
+bytes are stored once.
+
+A thread pool rather than a Celery queue is used because staged files live
+on the web server's disk, which workers on other hosts cannot read. Each
+staged file has a ``.job`` manifest beside it, so jobs survive a restart:
+``sweep_stale_uploads`` (run when a process starts its pool and by the
+``sweep_uploads`` command) resubmits jobs older than
+``UPLOAD_STALE_SECONDS`` whose row still waits and whose staged file still
+exists, marks the other waiting rows failed and deletes orphaned staging
+files. The staging directory is assumed to be shared by all web processes.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import mimetypes
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image
+
+from . import imaging
+from .content_store import content_store
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+RETRY_BACKOFF = 1.0         # seconds, doubled after every failed attempt
+MANIFEST_SUFFIX = '.job'
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = set()
+
+
+def staging_dir():
+    return Path(getattr(settings, 'UPLOAD_STAGING_DIR', Path(settings.BASE_DIR) / 'data' / 'upload_staging'))
+
+
+def _stale_seconds():
+    return getattr(settings, 'UPLOAD_STALE_SECONDS', 900)
+
+
+def _get_executor():
+    global _executor
+    workers = getattr(settings, 'UPLOAD_WORKERS', 4)
+    with _executor_lock:
+        started = _executor is None
+        if started or _executor._max_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='media-upload')
+        executor = _executor
+    if started:
+        # Pick up the jobs a previous process left behind
+        _track(executor.submit(_run_sweep))
+    return executor
+
+
+def _track(future):
+    _pending.add(future)
+    future.add_done_callback(_pending.discard)
+
+
+def stage_upload(uploaded_file):
+    """
+    Copy an UploadedFile to the staging directory chunk by chunk, hashing it
+    on the way; returns (path, sha256 hex digest)
+    """
+    directory = staging_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{uuid.uuid4()}{Path(uploaded_file.name).suffix.lower()}"
+    digest = hashlib.sha256()
+    with open(path, 'wb') as out:
+        for chunk in uploaded_file.chunks():
+            digest.update(chunk)
+            out.write(chunk)
+    return path, digest.hexdigest()
+
+
+def _upload_with_retries(path, folder, content_type, digest=None):
+    delay = RETRY_BACKOFF
+    result = None
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        result = content_store.upload_image(path, folder=folder, content_type=content_type, digest=digest)
+        if result['success']:
+            return result
+        logger.warning(f"Upload of {path.name} failed (attempt {attempt}/{MAX_ATTEMPTS}): {result['error']}")
+        if attempt < MAX_ATTEMPTS:
+            time.sleep(delay)
+            delay *= 2
+    return result
+
+
+def _normalize(path):
+    """Normalized variants of a staged image, or None when it is not an image Pillow can read"""
+    output_dir = path.with_name(f"{path.stem}-variants")
+    try:
+        return imaging.run_in_pool(path, output_dir, workers=getattr(settings, 'IMAGE_PROCESS_WORKERS', 2))
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning(f"Could not normalize {path.name}, uploading it unchanged: {e}")
+        shutil.rmtree(output_dir, ignore_errors=True)
+        return None
+
+
+def _upload_variants(path, job):
+    """Upload every rendition of a staged image; returns (full size result, variant list)"""
+    variants = _normalize(path)
+    if variants is None:
+        return _upload_with_retries(path, job['folder'], job['content_type'], job.get('sha256')), []
+    try:
+        uploaded, full = [], None
+        for variant in variants:
+            result = _upload_with_retries(Path(variant['path']), job['folder'], variant['content_type'])
+            if not result['success']:
+                # Give back the renditions already stored
+                content_store.release_urls([done['url'] for done in uploaded])
+                return result, []
+            if variant['kind'] == 'full' and variant['format'] == 'jpeg':
+                full = result
+            uploaded.append({
+                'kind': variant['kind'],
+                'width': variant['width'],
+                'format': variant['format'],
+                'url': result['url'],
+            })
+        return full, uploaded
+    finally:
+        shutil.rmtree(Path(variants[0]['path']).parent, ignore_errors=True)
+
+
+def _copy_known_upload(model, job):
+    """
+    Field updates reusing the files of an earlier row with the same original
+    bytes, or None. Skips normalization and upload entirely for forwarded photos.
+    """
+    if not job.get('hash_field') or not job.get('sha256'):
+        return None
+    source = model.objects.filter(
+        **{job['hash_field']: job['sha256'], job['status_field']: 'uploaded'}
+    ).exclude(pk=job['pk']).first()
+    if source is None or not content_store.acquire_urls(source.stored_urls):
+        return None
+    return {
+        job['url_field']: getattr(source, job['url_field']),
+        job['variants_field']: getattr(source, job['variants_field']),
+        job['status_field']: 'uploaded',
+        job['hash_field']: job['sha256'],
+    }
+
+
+def _job_urls(fields, job):
+    variants = fields.get(job.get('variants_field')) or []
+    return [variant['url'] for variant in variants] or [fields[job['url_field']]]
+
+
+def process_upload(job):
+    """Upload one staged file and record the outcome on its target row"""
+    path = Path(job['path'])
+    model = apps.get_model(job['model'])
+    rows = model.objects.filter(pk=job['pk'])
+    status_field = job.get('status_field')
+    variants_field = job.get('variants_field')
+    try:
+        copied = _copy_known_upload(model, job) if variants_field else None
+        if copied is not None:
+            if not rows.update(**copied):
+                # The row was deleted meanwhile; give back the references just taken
+                content_store.release_urls(_job_urls(copied, job))
+            return {'success': True, 'url': copied[job['url_field']], 'path': None, 'error': None, 'deduplicated': True}
+
+        if variants_field:
+            result, variants = _upload_variants(path, job)
+        else:
+            result, variants = _upload_with_retries(path, job['folder'], job['content_type'], job.get('sha256')), []
+        if result['success']:
+            updates = {job['url_field']: result['url']}
+            if status_field:
+                updates[status_field] = 'uploaded'
+            if variants_field:
+                updates[variants_field] = variants
+            if job.get('hash_field'):
+                updates[job['hash_field']] = job['sha256']
+            if not rows.update(**updates):
+                # The row was deleted while uploading; give back its references
+                content_store.release_urls([v['url'] for v in variants] or [result['url']])
+        else:
+            logger.error(f"Giving up on upload of {path.name} for {job['model']} {job['pk']}: {result['error']}")
+            if status_field:
+                rows.update(**{status_field: 'failed'})
+        return result
+    finally:
+        path.unlink(missing_ok=True)
+        if job.get('manifest'):
+            Path(job['manifest']).unlink(missing_ok=True)
+
+
+def _run_in_worker(job):
+    try:
+        return process_upload(job)
+    except Exception as e:
+        logger.exception(f"Upload job for {job['model']} {job['pk']} crashed: {e}")
+        if job.get('status_field'):
+            try:
+                apps.get_model(job['model']).objects.filter(pk=job['pk']).update(**{job['status_field']: 'failed'})
+            except Exception:
+                pass
+    finally:
+        connection.close()
+
+
+def _submit(jobs):
+    executor = _get_executor()
+    for job in jobs:
+        _track(executor.submit(_run_in_worker, job))
+
+
+def _write_manifest(job):
+    manifest = Path(f"{job['path']}{MANIFEST_SUFFIX}")
+    job['manifest'] = str(manifest)
+    manifest.write_text(json.dumps(job, default=str))
+
+
+def _read_manifest(manifest):
+    try:
+        job = json.loads(manifest.read_text())
+    except (OSError, ValueError):
+        return None
+    job['manifest'] = str(manifest)
+    return job
+
+
+def _claim(manifest, job):
+    """Take over a stale job by renaming its manifest (only one process can); returns the job or None"""
+    claimed = manifest.with_name(f"{Path(job['path']).name}.{uuid.uuid4().hex[:8]}{MANIFEST_SUFFIX}")
+    try:
+        os.rename(manifest, claimed)
+        claimed.touch()     # fresh again, so other sweeps leave it alone
+    except OSError:
+        return None
+    return dict(job, manifest=str(claimed))
+
+
+def _waiting(job):
+    """Whether the job's row still exists and has not been uploaded"""
+    rows = apps.get_model(job['model']).objects.filter(pk=job['pk'])
+    if job.get('status_field'):
+        return rows.filter(**{job['status_field']: 'pending'}).exists()
+    return rows.filter(**{job['url_field']: ''}).exists()
+
+
+def _discard(job):
+    path = Path(job['path'])
+    path.unlink(missing_ok=True)
+    shutil.rmtree(path.with_name(f"{path.stem}-variants"), ignore_errors=True)
+    Path(job['manifest']).unlink(missing_ok=True)
+
+
+def _upload_models():
+    return [
+        model for model in apps.get_app_config('farmer_problems').get_models()
+        if any(field.name == 'upload_status' for field in model._meta.fields)
+    ]
+
+
+def sweep_stale_uploads(stale_seconds=None):
+    """
+    Recover upload jobs older than stale_seconds that no live pool runs:
+    resubmit those whose row waits and whose staged file exists, mark other
+    waiting rows failed and delete orphaned staging files. Returns counts.
+    """
+    stale_seconds = _stale_seconds() if stale_seconds is None else stale_seconds
+    directory = staging_dir()
+    cutoff = time.time() - stale_seconds
+    counts = {'resubmitted': 0, 'failed': 0, 'files_deleted': 0}
+    if not directory.exists():
+        return counts
+
+    resubmit, live = [], []
+    for manifest in directory.glob(f'*{MANIFEST_SUFFIX}'):
+        job = _read_manifest(manifest)
+        if job is None:
+            continue
+        try:
+            fresh = manifest.stat().st_mtime >= cutoff
+        except OSError:
+            continue
+        if not fresh:
+            job = _claim(manifest, job)
+            if job is None:
+                continue
+            if not (Path(job['path']).exists() and _waiting(job)):
+                if job.get('status_field'):
+                    counts['failed'] += apps.get_model(job['model']).objects.filter(
+                        pk=job['pk'], **{job['status_field']: 'pending'},
+                    ).update(**{job['status_field']: 'failed'})
+                _discard(job)
+                counts['files_deleted'] += 1
+                continue
+            resubmit.append(job)
+        live.append(job)
+
+    # Staged files and rendition folders that no live job owns
+    owned = {Path(job['path']).stem for job in live}
+    for path in directory.iterdir():
+        if path.name.endswith(MANIFEST_SUFFIX) or path.stem.split('.')[0].removesuffix('-variants') in owned:
+            continue
+        try:
+            if path.stat().st_mtime >= cutoff:
+                continue
+        except OSError:
+            continue
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
+        counts['files_deleted'] += 1
+
+    # Waiting rows whose job is gone altogether
+    since = timezone.now() - timedelta(seconds=stale_seconds)
+    for model in _upload_models():
+        counts['failed'] += model.objects.filter(upload_status='pending', uploaded_at__lt=since).exclude(
+            pk__in=[job['pk'] for job in live if job['model'] == model._meta.label],
+        ).update(upload_status='failed')
+
+    if resubmit:
+        _submit(resubmit)
+    counts['resubmitted'] = len(resubmit)
+    if any(counts.values()):
+        logger.info(f"Upload sweep: {counts}")
+    return counts
+
+
+def _run_sweep():
+    try:
+        return sweep_stale_uploads()
+    except Exception as e:
+        logger.exception(f"Upload sweep failed: {e}")
+    finally:
+        connection.close()
+
+
+def enqueue_upload(uploaded_file, instance, url_field='image_url', status_field='upload_status',
+                   variants_field='variants', hash_field='content_hash', folder='problems'):
+    """
+    Stage uploaded_file now and upload it after the current transaction commits.
+
+    The URL is written to ``instance.<url_field>`` when the upload finishes;
+    ``status_field`` (if given) moves from 'pending' to 'uploaded' or 'failed'.
+    With ``variants_field`` the image is normalized first: the URL field gets
+    the bounded JPEG and the variants field every JPEG/WebP rendition.
+    ``hash_field`` stores the original's SHA-256 so a later upload of the
+    same bytes reuses this row's files.
+    """
+    path, digest = stage_upload(uploaded_file)
+    content_type = (
+        getattr(uploaded_file, 'content_type', None)
+        or mimetypes.guess_type(uploaded_file.name)[0] or 'application/octet-stream'
+    )
+    job = {
+        'path': str(path),
+        'content_type': content_type,
+        'folder': folder,
+        'model': instance._meta.label,
+        'pk': instance.pk,
+        'url_field': url_field,
+        'status_field': status_field,
+        'variants_field': variants_field,
+        'hash_field': hash_field,
+        'sha256': digest,
+    }
+    _write_manifest(job)
+    transaction.on_commit(lambda: _submit([job]))
+    return job
+
+
+def wait_for_uploads(timeout=None):
+    """Block until every submitted upload has finished (used by tests and shutdown)"""
+    for future in list(_pending):
+        future.result(timeout=timeout)
+
@@ -14,8 +14,10 @@ urlpatterns = [
     path('experts/', views.expert_list, name='experts'),
     path('become-expert/', views.become_expert, name='become_expert'),
     path('vote/', views.vote, name='vote'),
+    path('similar/', views.similar_problems, name='similar'),
     path('solution/<int:solution_id>/accept/', views.accept_solution, name='accept_solution'),
     path('<slug:slug>/', views.problem_detail, name='detail'),
     path('<slug:problem_slug>/solution/add/', views.solution_create, name='solution_create'),
+    path('<slug:problem_slug>/comment/add/', views.comment_create, name='comment_create'),
 ]
 
@@ -4,7 +4,7 @@ Views for Farmer Problems & Solutions
 
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from django.db.models import Q, Count, Prefetch
@@ -14,11 +14,16 @@ from django.utils.text import slugify
 from django.utils import timezone
 import json
 
+from core.pagination import KeysetPage
+from core.search import ranked
+from core.view_counter import record_view
+
+from . import comments, counters, ranking, reputation, similarity
 from .models import (
     FarmerProblem, ProblemCategory, Solution, Comment,
     Vote, ProblemImage, SolutionImage, ExpertProfile, Tag
 )
-from .supabase_storage import get_storage_service
+from .uploads import enqueue_upload
 
 
 def problem_list(request):
@@ -26,53 +31,63 @@ def problem_list(request):
     # Get filter parameters
     category_slug = request.GET.get('category')
     status = request.GET.get('status')
+    crop = request.GET.get('crop', '').strip()
     search_query = request.GET.get('q')
     sort_by = request.GET.get('sort', '-created_at')
     
     # Base queryset
-    problems = FarmerProblem.objects.select_related('author', 'category').annotate(
-        vote_count=Count('votes', filter=Q(votes__vote_type='up')) - Count('votes', filter=Q(votes__vote_type='down')),
-        solutions_count=Count('solutions')
-    )
+    problems = FarmerProblem.objects.select_related('author', 'category')
     
     # Apply filters
-    if category_slug:
-        problems = problems.filter(category__slug=category_slug)
-    
     if status:
         problems = problems.filter(status=status)
     
-    if search_query:
-        problems = problems.filter(
-            Q(title__icontains=search_query) |
-            Q(description__icontains=search_query) |
-            Q(crop_type__icontains=search_query)
-        )
-    
-    # Sorting
-    sort_options = {
-        '-created_at': '-created_at',
-        'oldest': 'created_at',
-        'most_voted': '-vote_count',
-        'most_solutions': '-solutions_count',
-    }
-    problems = problems.order_by(sort_options.get(sort_by, '-created_at'))
-    
-    # Pagination
-    paginator = Paginator(problems, 20)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    # Hot feed: keyset-paginated on the precomputed score
+    if sort_by == 'hot' and not search_query:
+        page_obj = ranking.hot_feed(problems, category_slug=category_slug, crop=crop, cursor=request.GET.get('cursor'))
+    else:
+        if category_slug:
+            problems = problems.filter(category__slug=category_slug)
+        
+        if crop:
+            problems = problems.filter(crop_type__iexact=crop)
+        
+        if search_query:
+            problems = ranked(problems, search_query, 'problem')
+        
+        # Sorting (search results default to relevance order)
+        sort_options = {
+            '-created_at': ('-created_at',),
+            'oldest': ('created_at',),
+            'most_voted': ('-score', '-id'),
+            'most_solutions': ('-solutions_count', '-id'),
+        }
+        if search_query and 'sort' not in request.GET:
+            problems = problems.order_by('-search_rank', '-created_at')
+        else:
+            problems = problems.order_by(*sort_options.get(sort_by, ('-created_at',)))
+        
+        # Pagination
+        paginator = Paginator(problems, 20)
+        page_number = request.GET.get('page')
+        page_obj = paginator.get_page(page_number)
     
     # Get categories for filter
     categories = ProblemCategory.objects.all()
     
+    # Trending strip on the unfiltered landing page, from the cached top list
+    show_trending = not (category_slug or status or crop or search_query or request.GET.get('page') or request.GET.get('cursor'))
+    
     context = {
         'page_obj': page_obj,
+        'is_feed': isinstance(page_obj, KeysetPage),
         'categories': categories,
         'current_category': category_slug,
         'current_status': status,
+        'current_crop': crop,
         'search_query': search_query,
         'sort_by': sort_by,
+        'trending': ranking.top_problems(5) if show_trending else [],
     }
     
     return render(request, 'farmer_problems/problem_list.html', context)
@@ -89,24 +104,41 @@ def problem_detail(request, slug):
         slug=slug
     )
     
-    # Increment views
-    problem.views_count += 1
-    problem.save(update_fields=['views_count'])
+    # Count the view in the cache; flushed to views_count in batches
+    record_view(request, problem)
     
     # Get user's vote if logged in
     user_vote = None
     if request.user.is_authenticated:
         user_vote = Vote.objects.filter(user=request.user, problem=problem).first()
     
-    # Get solutions with votes
-    solutions = problem.solutions.annotate(
-        vote_count=Count('votes', filter=Q(votes__vote_type='up')) - Count('votes', filter=Q(votes__vote_type='down'))
-    )
+    solutions = problem.solutions.all()
+    
+    # Comment threads load in a constant number of queries however busy they are
+    threads = comments.solution_threads(problem)
+    for solution in solutions:
+        solution.comment_thread = threads.get(solution.pk, [])
+    
+    focus = None
+    try:
+        thread_id = int(request.GET.get('thread', 0))
+        cursor = int(request.GET.get('comments_after', 0))
+    except ValueError:
+        thread_id = cursor = 0
+    if thread_id:
+        # Deep threads continue here, under the problem or any of its solutions
+        discussion = Comment.objects.filter(Q(problem=problem) | Q(solution__problem=problem))
+        focus = get_object_or_404(discussion, pk=thread_id)
+        comment_page = comments.CommentPage(comments.load_subtree(focus))
+    else:
+        comment_page = comments.comment_page(problem, cursor=cursor)
     
     context = {
         'problem': problem,
         'solutions': solutions,
         'user_vote': user_vote,
+        'comments': comment_page,
+        'focus_comment': focus,
     }
     
     return render(request, 'farmer_problems/problem_detail.html', context)
@@ -135,17 +167,14 @@ def problem_create(request):
             )
             
             # Handle image uploads
-            images = request.FILES.getlist('images')
-            if images:
-                storage_service = get_storage_service()
-                for i, image in enumerate(images):
-                    result = storage_service.upload_image(image, folder='problems')
-                    if result['success']:
-                        ProblemImage.objects.create(
-                            problem=problem,
-                            image_url=result['url'],
-                            order=i
-                        )
+            # Handle image uploads (staged now, uploaded in the background)
+            for i, image in enumerate(request.FILES.getlist('images')):
+                problem_image = ProblemImage.objects.create(
+                    problem=problem,
+                    upload_status='pending',
+                    order=i
+                )
+                enqueue_upload(image, problem_image, folder='problems')
             
             # Handle tags
             tags_input = request.POST.get('tags', '')
@@ -196,23 +225,14 @@ def solution_create(request, problem_slug):
         )
         
         # Handle image uploads
-        images = request.FILES.getlist('images')
-        if images:
-            storage_service = get_storage_service()
-            for i, image in enumerate(images):
-                result = storage_service.upload_image(image, folder='solutions')
-                if result['success']:
-                    SolutionImage.objects.create(
-                        solution=solution,
-                        image_url=result['url'],
-                        order=i
-                    )
-        
-        # Update expert stats if applicable
-        if is_expert:
-            expert_profile = request.user.farming_expert_profile
-            expert_profile.solutions_count += 1
-            expert_profile.save(update_fields=['solutions_count'])
+        # Handle image uploads (staged now, uploaded in the background)
+        for i, image in enumerate(request.FILES.getlist('images')):
+            solution_image = SolutionImage.objects.create(
+                solution=solution,
+                upload_status='pending',
+                order=i
+            )
+            enqueue_upload(image, solution_image, folder='solutions')
         
         messages.success(request, 'Solution added successfully!')
         
@@ -222,6 +242,36 @@ def solution_create(request, problem_slug):
     return redirect('farmer_problems:detail', slug=problem_slug)
 
 
+@login_required
+@require_http_methods(["POST"])
+def comment_create(request, problem_slug):
+    """Comment on a problem or one of its solutions, or reply to a comment"""
+    problem = get_object_or_404(FarmerProblem.objects.only('pk', 'slug'), slug=problem_slug)
+    content = request.POST.get('content', '').strip()
+    if not content:
+        messages.error(request, 'Comment cannot be empty')
+        return redirect('farmer_problems:detail', slug=problem_slug)
+    
+    parent = None
+    solution = None
+    if request.POST.get('parent'):
+        parent = get_object_or_404(Comment, pk=request.POST['parent'])
+        if parent.problem_id != problem.pk and not Solution.objects.filter(pk=parent.solution_id, problem=problem).exists():
+            raise Http404
+    elif request.POST.get('solution'):
+        solution = get_object_or_404(Solution.objects.only('pk'), pk=request.POST['solution'], problem=problem)
+    
+    comment = Comment.objects.create(
+        comment_type='solution' if solution else 'problem',
+        problem=None if solution else problem,
+        solution=solution,
+        parent=parent,
+        author=request.user,
+        content=content,
+    )
+    return redirect(f"{problem.get_absolute_url()}#comment-{comment.pk}")
+
+
 @login_required
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -234,56 +284,62 @@ def vote(request):
         vote_type = data.get('vote_type')  # 'up' or 'down'
         
         if content_type == 'problem':
-            problem = get_object_or_404(FarmerProblem, id=content_id)
-            vote_obj, created = Vote.objects.get_or_create(
-                user=request.user,
-                problem=problem,
-                defaults={'content_type': 'problem', 'vote_type': vote_type}
-            )
-            if not created:
-                if vote_obj.vote_type == vote_type:
-                    # Remove vote if clicking same button
-                    vote_obj.delete()
-                    return JsonResponse({'success': True, 'action': 'removed'})
-                else:
-                    # Change vote
-                    vote_obj.vote_type = vote_type
-                    vote_obj.save()
-            
-            # Get new vote count
-            vote_count = problem.votes.filter(vote_type='up').count() - problem.votes.filter(vote_type='down').count()
-            
+            target = get_object_or_404(FarmerProblem.objects.only('pk'), id=content_id)
         elif content_type == 'solution':
-            solution = get_object_or_404(Solution, id=content_id)
-            vote_obj, created = Vote.objects.get_or_create(
-                user=request.user,
-                solution=solution,
-                defaults={'content_type': 'solution', 'vote_type': vote_type}
-            )
-            if not created:
-                if vote_obj.vote_type == vote_type:
-                    vote_obj.delete()
-                    return JsonResponse({'success': True, 'action': 'removed'})
-                else:
-                    vote_obj.vote_type = vote_type
-                    vote_obj.save()
-            
-            # Get new vote count
-            vote_count = solution.votes.filter(vote_type='up').count() - solution.votes.filter(vote_type='down').count()
-        
+            target = get_object_or_404(Solution.objects.only('pk'), id=content_id)
         else:
             return JsonResponse({'success': False, 'error': 'Invalid content type'}, status=400)
         
+        if vote_type not in ('up', 'down'):
+            return JsonResponse({'success': False, 'error': 'Invalid vote type'}, status=400)
+        
+        action, vote_count = counters.apply_vote(request.user, target, vote_type)
+        
         return JsonResponse({
             'success': True,
             'vote_count': vote_count,
-            'action': 'voted'
+            'action': action
         })
         
+    except Http404:
+        raise
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=500)
 
 
+@require_http_methods(["GET"])
+def similar_problems(request):
+    """Solved problems resembling the question being typed"""
+    title = request.GET.get('title', '')
+    category_id = request.GET.get('category')
+    tags = [t for t in request.GET.get('tags', '').split(',') if t.strip()]
+    try:
+        limit = int(request.GET.get('limit', 5))
+        category_id = int(category_id) if category_id else None
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid parameters'}, status=400)
+    
+    matches = similarity.similar_problems(
+        title,
+        description=request.GET.get('description', ''),
+        crop=request.GET.get('crop_type', ''),
+        category=category_id,
+        tags=tags,
+        limit=limit,
+    )
+    return JsonResponse({
+        'success': True,
+        'results': [{
+            'id': problem.pk,
+            'title': problem.title,
+            'url': problem.get_absolute_url(),
+            'category': problem.category.name if problem.category else None,
+            'solutions_count': problem.solutions_count,
+            'similarity': score,
+        } for problem, score in matches],
+    })
+
+
 @login_required
 @csrf_exempt
 @require_http_methods(["POST"])
@@ -295,24 +351,8 @@ def accept_solution(request, solution_id):
     if request.user != problem.author:
         return JsonResponse({'success': False, 'error': 'Only problem author can accept solutions'}, status=403)
     
-    # Unaccept all other solutions
-    problem.solutions.update(is_accepted=False)
-    
-    # Accept this solution
-    solution.is_accepted = True
-    solution.save()
-    
-    # Update problem status
-    problem.status = 'solved'
-    problem.solved_at = timezone.now()
-    problem.save()
-    
-    # Update expert stats
-    if solution.is_expert and hasattr(solution.author, 'farming_expert_profile'):
-        expert_profile = solution.author.farming_expert_profile
-        expert_profile.accepted_solutions_count += 1
-        expert_profile.reputation_score += 10
-        expert_profile.save()
+    # Accept this solution (unaccepting any other) and credit the authors
+    reputation.accept_solution(solution)
     
     return JsonResponse({'success': True})
 
@@ -354,14 +394,15 @@ def become_expert(request):
             
             # Handle verification document
             if 'verification_document' in request.FILES:
-                storage_service = get_storage_service()
-                result = storage_service.upload_image(
+                enqueue_upload(
                     request.FILES['verification_document'],
+                    expert_profile,
+                    url_field='verification_document_url',
+                    status_field=None,
+                    variants_field=None,
+                    hash_field=None,
                     folder='expert_verifications'
                 )
-                if result['success']:
-                    expert_profile.verification_document_url = result['url']
-                    expert_profile.save()
             
             messages.success(request, 'Expert application submitted! Awaiting verification.')
             return redirect('farmer_problems:list')
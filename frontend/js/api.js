@@ -176,6 +176,22 @@ class FarmazeeAPI {
         }
     }
 
+    // Typeahead suggestions (crops, mandis, schemes, products)
+    async suggest(query, types = null, lang = 'en') {
+        try {
+            const params = new URLSearchParams({ q: query, lang });
+            if (types) params.append('types', types);
+            const response = await fetch(`${this.baseURL}/suggest/?${params.toString()}`);
+            if (!response.ok) {
+                throw new Error(`HTTP error! status: ${response.status}`);
+            }
+            const data = await response.json();
+            return { success: true, data: data.suggestions };
+        } catch (error) {
+            return { success: false, error: error.message };
+        }
+    }
+
     async createProduct(productData) {
         try {
             const response = await this.authenticatedRequest('/marketplace/products/', {
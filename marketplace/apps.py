@@ -6,5 +6,6 @@ class MarketplaceConfig(AppConfig):
     name = 'marketplace'
     verbose_name = 'Marketplace'
 
-
-
+    def ready(self):
+        """Connect catalogue cache invalidation signals."""
+        import marketplace.signals  # noqa: F401
@@ -0,0 +1,136 @@
+"""
+Catalogue listing helpers for the marketplace
+
+Listing pages are keyset-paginated (``core.pagination``) so deep pages cost
+the same as the first one, load vendor/category with the page and attach the
+first image per item in one extra query. Rendered grids are cached per
+page under a catalogue version that is bumped whenever products, inputs,
+their images, categories or vendors change (see ``marketplace.signals``).
+"""
+
+import hashlib
+import json
+import time
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.db.models import Count, Max, Min, Q
+
+CATALOGUE_VERSION_KEY = 'marketplace:catalogue_version'
+FACETS_KEY = 'marketplace:facets:{}:{}'
+PAGE_SIZE = 24
+FRAGMENT_TTL = 60 * 15
+
+# Sort option -> (field, label); ties are broken on the primary key
+SORT_OPTIONS = {
+    '-created_at': ('-created_at', 'Newest First'),
+    'name': ('name', 'Name A-Z'),
+    '-name': ('-name', 'Name Z-A'),
+    'price': ('price', 'Price Low to High'),
+    '-price': ('-price', 'Price High to Low'),
+}
+DEFAULT_SORT = '-created_at'
+
+
+def catalogue_version():
+    """Current catalogue version, used in fragment and facet cache keys"""
+    version = cache.get(CATALOGUE_VERSION_KEY)
+    if version is None:
+        # Seed from the clock so an evicted counter never reuses an old version
+        cache.add(CATALOGUE_VERSION_KEY, int(time.time()), None)
+        version = cache.get(CATALOGUE_VERSION_KEY, 0)
+    return version
+
+
+def bump_catalogue_version():
+    """Invalidate every cached listing fragment and facet set"""
+    try:
+        cache.incr(CATALOGUE_VERSION_KEY)
+    except ValueError:
+        cache.set(CATALOGUE_VERSION_KEY, int(time.time()), None)
+
+
+def attach_first_images(items, image_model, fk_name):
+    """
+    Set ``primary_image`` on every item: its primary image, else the first by
+    ``order``. One query for the whole page.
+    """
+    by_pk = {item.pk: item for item in items}
+    for item in items:
+        item.primary_image = None
+    if not by_pk:
+        return items
+    images = image_model.objects.filter(**{f'{fk_name}_id__in': list(by_pk)}).order_by(
+        f'{fk_name}_id', '-is_primary', 'order', 'pk'
+    )
+    for image in images:
+        item = by_pk[getattr(image, f'{fk_name}_id')]
+        if item.primary_image is None:
+            item.primary_image = image
+    return items
+
+
+def _decimal(value):
+    try:
+        return Decimal(value) if value not in (None, '') else None
+    except InvalidOperation:
+        return None
+
+
+def listing_filters(params):
+    """Normalize listing query parameters into a filter dict"""
+    return {
+        'search': (params.get('search') or '').strip(),
+        'category': params.get('category') or '',
+        'min_price': _decimal(params.get('min_price')),
+        'max_price': _decimal(params.get('max_price')),
+        'organic': params.get('organic') == '1',
+        'certified': params.get('certified') == '1',
+    }
+
+
+def apply_filters(queryset, filters, facet_filters=True):
+    """
+    Apply listing filters. With ``facet_filters=False`` the price/organic/
+    certified filters are left out, which is the base the facets describe.
+    """
+    if filters['category'].isdigit():
+        queryset = queryset.filter(category_id=int(filters['category']))
+    if not facet_filters:
+        return queryset
+    if filters['min_price'] is not None:
+        queryset = queryset.filter(price__gte=filters['min_price'])
+    if filters['max_price'] is not None:
+        queryset = queryset.filter(price__lte=filters['max_price'])
+    if filters['organic']:
+        queryset = queryset.filter(is_organic=True)
+    if filters['certified']:
+        queryset = queryset.filter(is_certified=True)
+    return queryset
+
+
+def listing_key(*parts):
+    """Short stable key for a listing page (filters, sort, cursor)"""
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+
+def compute_facets(queryset):
+    """Price range and organic/certified counts in a single aggregate query"""
+    return queryset.aggregate(
+        total=Count('pk'),
+        min_price=Min('price'),
+        max_price=Max('price'),
+        organic=Count('pk', filter=Q(is_organic=True)),
+        certified=Count('pk', filter=Q(is_certified=True)),
+    )
+
+
+def cached_facets(name, queryset, key):
+    """Facets for a listing base, cached under the catalogue version"""
+    cache_key = FACETS_KEY.format(catalogue_version(), f'{name}:{key}')
+    facets = cache.get(cache_key)
+    if facets is None:
+        facets = compute_facets(queryset)
+        cache.set(cache_key, facets, FRAGMENT_TTL)
+    return facets
@@ -0,0 +1,104 @@
+"""
+Management command to benchmark concurrent checkouts against the configured database
+"""
+
+import random
+import statistics
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Sum
+
+from marketplace.models import OrderItem, Product, ProductCategory, Vendor
+from marketplace.services import InsufficientStockError, OrderError, order_service
+
+
+class Command(BaseCommand):
+    help = 'Benchmark concurrent order placement and check that stock is never oversold'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent checkout threads')
+        parser.add_argument('--orders', type=int, default=400, help='Total orders to attempt')
+        parser.add_argument('--products', type=int, default=20, help='Products in the sale')
+        parser.add_argument('--stock', type=int, default=100, help='Initial stock per product')
+        parser.add_argument('--items', type=int, default=3, help='Lines per order')
+        parser.add_argument('--keep', action='store_true', help='Keep the benchmark data')
+
+    def handle(self, *args, **options):
+        tag = uuid.uuid4().hex[:8]
+        vendor_user = User.objects.create_user(username=f'bench-vendor-{tag}')
+        customer = User.objects.create_user(username=f'bench-customer-{tag}')
+        vendor = Vendor.objects.create(
+            user=vendor_user, business_name=f'Benchmark {tag}', business_description='-',
+            phone_number='0', address='-', city='-', state='-', pincode='0',
+        )
+        category = ProductCategory.objects.create(name=f'Benchmark {tag}')
+        products = Product.objects.bulk_create([
+            Product(
+                vendor=vendor, category=category, name=f'Bench product {n}', description='-',
+                price=Decimal('10.00'), stock_quantity=options['stock'],
+            )
+            for n in range(options['products'])
+        ])
+        product_ids = [product.pk for product in products]
+
+        outcomes = {'placed': 0, 'stockout': 0, 'failed': 0}
+        latencies = []
+        lock = threading.Lock()
+
+        def checkout(_n):
+            lines = random.sample(product_ids, min(options['items'], len(product_ids)))
+            items = [{'product_id': pk, 'quantity': random.randint(1, 5)} for pk in lines]
+            start = time.perf_counter()
+            try:
+                order = order_service.create_order(customer, items, 'Benchmark address')
+                outcome = 'placed' if order else 'failed'
+            except InsufficientStockError:
+                outcome = 'stockout'
+            except OrderError:
+                outcome = 'failed'
+            elapsed = time.perf_counter() - start
+            with lock:
+                outcomes[outcome] += 1
+                latencies.append(elapsed)
+            connection.close()
+
+        self.stdout.write(
+            f"Placing {options['orders']} orders with {options['workers']} workers "
+            f"on {connection.vendor}..."
+        )
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            list(pool.map(checkout, range(options['orders'])))
+        wall = time.perf_counter() - started
+
+        remaining = Product.objects.filter(pk__in=product_ids).aggregate(total=Sum('stock_quantity'))['total']
+        sold = OrderItem.objects.filter(product_id__in=product_ids).aggregate(total=Sum('quantity'))['total'] or 0
+        negative = Product.objects.filter(pk__in=product_ids, stock_quantity__lt=0).count()
+        initial = options['stock'] * len(product_ids)
+
+        latencies.sort()
+        self.stdout.write(f"Placed: {outcomes['placed']}  stockouts: {outcomes['stockout']}  failed: {outcomes['failed']}")
+        self.stdout.write(f"Throughput: {len(latencies) / wall:.1f} checkouts/s over {wall:.2f}s")
+        if latencies:
+            p95 = latencies[int(len(latencies) * 0.95) - 1] if len(latencies) > 1 else latencies[0]
+            self.stdout.write(
+                f"Latency: p50 {statistics.median(latencies) * 1000:.1f} ms, p95 {p95 * 1000:.1f} ms"
+            )
+        self.stdout.write(f"Stock: initial {initial}, sold {sold}, remaining {remaining}")
+
+        if negative or sold + remaining != initial:
+            self.stdout.write(self.style.ERROR('Stock accounting mismatch: oversold or lost updates'))
+        else:
+            self.stdout.write(self.style.SUCCESS('No overselling detected'))
+
+        if not options['keep']:
+            vendor_user.delete()
+            customer.delete()
+            category.delete()
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 13:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0002_historicalmarketprice_marketprice'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='input',
+            index=models.Index(fields=['is_active', '-created_at', '-id'], name='marketplace_is_acti_682d98_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='input',
+            index=models.Index(fields=['is_active', 'price', 'id'], name='marketplace_is_acti_713acb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='input',
+            index=models.Index(fields=['is_active', 'name', 'id'], name='marketplace_is_acti_954724_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', '-created_at', '-id'], name='marketplace_is_acti_21651d_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'price', 'id'], name='marketplace_is_acti_baa0ea_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', 'name', 'id'], name='marketplace_is_acti_820509_idx'),
+        ),
+    ]
@@ -99,6 +99,11 @@ class Product(models.Model):
         verbose_name = _('Product')
         verbose_name_plural = _('Products')
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_active', '-created_at', '-id']),
+            models.Index(fields=['is_active', 'price', 'id']),
+            models.Index(fields=['is_active', 'name', 'id']),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.vendor.business_name}"
@@ -197,6 +202,11 @@ class Input(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['is_active', '-created_at', '-id']),
+            models.Index(fields=['is_active', 'price', 'id']),
+            models.Index(fields=['is_active', 'name', 'id']),
+        ]
     
     def __str__(self):
         return f"{self.name} - {self.get_input_type_display()}"
@@ -355,361 +355,3 @@ class MarketPriceService:
 
 # Initialize price service
 price_service = MarketPriceService()
-
-Market Price Services with Real-Time Updates and Historical Trends
-"""
-import requests
-import os
-from datetime import datetime, timedelta
-from django.core.cache import cache
-from django.db.models import Avg, Max, Min
-from django.utils import timezone
-import json
-
-
-class MarketPriceService:
-    """
-    Real-time market price service for crops across Indian mandis
-    Integrates with government data portals and provides historical analysis
-    """
-    
-    def __init__(self):
-        # Common crops in Telugu states
-        self.crops = {
-            'rice': {'te': 'వరి', 'hi': 'चावल', 'en': 'Rice'},
-            'cotton': {'te': 'పత్తి', 'hi': 'कपास', 'en': 'Cotton'},
-            'chili': {'te': 'మిరప', 'hi': 'मिर्च', 'en': 'Chili'},
-            'turmeric': {'te': 'పసుపు', 'hi': 'हल्दी', 'en': 'Turmeric'},
-            'maize': {'te': 'మొక్కజొన్న', 'hi': 'मक्का', 'en': 'Maize'},
-            'groundnut': {'te': 'వేరుశెనగ', 'hi': 'मूंगफली', 'en': 'Groundnut'},
-            'soybean': {'te': 'సోయాబీన్', 'hi': 'सोयाबीन', 'en': 'Soybean'},
-            'tomato': {'te': 'టమాటా', 'hi': 'टमाटर', 'en': 'Tomato'},
-            'onion': {'te': 'ఉల్లిపాయ', 'hi': 'प्याज', 'en': 'Onion'},
-            'potato': {'te': 'బంగాళాదుంప', 'hi': 'आलू', 'en': 'Potato'}
-        }
-        
-        # Major mandis in Telugu states
-        self.mandis = {
-            'warangal': {'name': 'Warangal', 'state': 'Telangana', 'te': 'వరంగల్', 'hi': 'वारंगल'},
-            'hyderabad': {'name': 'Hyderabad', 'state': 'Telangana', 'te': 'హైదరాబాద్', 'hi': 'हैदराबाद'},
-            'vijayawada': {'name': 'Vijayawada', 'state': 'Andhra Pradesh', 'te': 'విజయవాడ', 'hi': 'विजयवाड़ा'},
-            'guntur': {'name': 'Guntur', 'state': 'Andhra Pradesh', 'te': 'గుంటూరు', 'hi': 'गुंटूर'},
-            'rajahmundry': {'name': 'Rajahmundry', 'state': 'Andhra Pradesh', 'te': 'రాజమండ్రి', 'hi': 'राजमुंद्री'},
-            'karimnagar': {'name': 'Karimnagar', 'state': 'Telangana', 'te': 'కరీంనగర్', 'hi': 'करीमनगर'},
-            'nizamabad': {'name': 'Nizamabad', 'state': 'Telangana', 'te': 'నిజామాబాద్', 'hi': 'निजामाबाद'},
-            'nellore': {'name': 'Nellore', 'state': 'Andhra Pradesh', 'te': 'నెల్లూరు', 'hi': 'नेल्लूर'}
-        }
-    
-    def get_current_prices(self, mandi=None, crop=None, lang='en'):
-        """
-        Get current market prices for specified mandi and/or crop
-        """
-        cache_key = f'prices_current_{mandi}_{crop}_{lang}'
-        cached_data = cache.get(cache_key)
-        
-        if cached_data:
-            return cached_data
-        
-        try:
-            # In production, integrate with actual API
-            # For now, generate realistic data
-            prices = self._generate_realistic_prices(mandi, crop, lang)
-            
-            # Cache for 1 hour
-            cache.set(cache_key, prices, 3600)
-            
-            return prices
-            
-        except Exception as e:
-            return self._get_fallback_prices(mandi, crop, lang)
-    
-    def get_price_trends(self, crop, mandi=None, days=30, lang='en'):
-        """
-        Get historical price trends for analysis
-        """
-        cache_key = f'price_trends_{crop}_{mandi}_{days}_{lang}'
-        cached_data = cache.get(cache_key)
-        
-        if cached_data:
-            return cached_data
-        
-        try:
-            trends = self._generate_price_trends(crop, mandi, days, lang)
-            
-            # Cache for 6 hours
-            cache.set(cache_key, trends, 21600)
-            
-            return trends
-            
-        except Exception:
-            return []
-    
-    def get_price_comparison(self, crop, mandis=None, lang='en'):
-        """
-        Compare prices across multiple mandis
-        """
-        if not mandis:
-            mandis = list(self.mandis.keys())[:5]
-        
-        comparison = []
-        for mandi in mandis:
-            price_data = self.get_current_prices(mandi, crop, lang)
-            if price_data:
-                comparison.append({
-                    'mandi': self.mandis[mandi]['name'],
-                    'mandi_local': self.mandis[mandi].get(lang, self.mandis[mandi]['name']),
-                    'price': price_data[0]['modal_price'] if price_data else 0,
-                    'min_price': price_data[0]['min_price'] if price_data else 0,
-                    'max_price': price_data[0]['max_price'] if price_data else 0,
-                    'arrival': price_data[0]['arrival'] if price_data else 0
-                })
-        
-        # Sort by price descending
-        comparison.sort(key=lambda x: x['price'], reverse=True)
-        
-        return comparison
-    
-    def get_best_selling_markets(self, crop, lang='en'):
-        """
-        Find markets with best prices for selling
-        """
-        comparison = self.get_price_comparison(crop, lang=lang)
-        
-        recommendations = []
-        for i, market in enumerate(comparison[:3]):
-            recommendations.append({
-                'rank': i + 1,
-                'mandi': market['mandi_local'],
-                'price': market['price'],
-                'advantage': market['price'] - comparison[-1]['price'] if len(comparison) > 1 else 0,
-                'recommendation': self._get_selling_recommendation(i, lang)
-            })
-        
-        return recommendations
-    
-    def get_price_alerts(self, crop, threshold_change=10, lang='en'):
-        """
-        Get alerts for significant price changes
-        """
-        alerts = []
-        
-        # Get current and yesterday's prices
-        current_prices = self.get_current_prices(crop=crop, lang=lang)
-        trends = self.get_price_trends(crop, days=7, lang=lang)
-        
-        if len(trends) >= 2:
-            current_avg = trends[-1]['price']
-            previous_avg = trends[-2]['price']
-            
-            change_percent = ((current_avg - previous_avg) / previous_avg) * 100
-            
-            if abs(change_percent) >= threshold_change:
-                alert_type = 'increase' if change_percent > 0 else 'decrease'
-                alerts.append({
-                    'crop': crop,
-                    'crop_name': self.crops.get(crop, {}).get(lang, crop),
-                    'type': alert_type,
-                    'change_percent': abs(change_percent),
-                    'current_price': current_avg,
-                    'previous_price': previous_avg,
-                    'message': self._get_alert_message(alert_type, abs(change_percent), lang),
-                    'action': self._get_alert_action(alert_type, lang),
-                    'severity': 'high' if abs(change_percent) >= 20 else 'medium',
-                    'timestamp': timezone.now()
-                })
-        
-        return alerts
-    
-    def get_seasonal_insights(self, crop, lang='en'):
-        """
-        Get seasonal price insights and predictions
-        """
-        current_month = datetime.now().month
-        
-        insights = {
-            'crop': self.crops.get(crop, {}).get(lang, crop),
-            'current_month': current_month,
-            'season': self._get_season(current_month),
-            'trend': 'stable',  # Can be 'increasing', 'decreasing', 'stable'
-            'predictions': [],
-            'best_selling_months': [],
-            'recommendations': []
-        }
-        
-        # Add seasonal recommendations
-        if crop == 'rice':
-            if current_month in [5, 6, 7]:  # Monsoon planting season
-                insights['recommendations'].append(
-                    self._translate('Good time to plant, expect stable prices', lang)
-                )
-            elif current_month in [10, 11, 12]:  # Harvest season
-                insights['recommendations'].append(
-                    self._translate('Harvest season, prices may dip slightly', lang)
-                )
-        
-        return insights
-    
-    def _generate_realistic_prices(self, mandi, crop, lang):
-        """Generate realistic price data"""
-        import random
-        
-        prices = []
-        crops_to_show = [crop] if crop else list(self.crops.keys())[:5]
-        mandis_to_show = [mandi] if mandi else list(self.mandis.keys())[:3]
-        
-        base_prices = {
-            'rice': 2200,
-            'cotton': 6800,
-            'chili': 8500,
-            'turmeric': 7200,
-            'maize': 1800,
-            'groundnut': 5500,
-            'soybean': 4200,
-            'tomato': 1200,
-            'onion': 1500,
-            'potato': 1000
-        }
-        
-        for c in crops_to_show:
-            for m in mandis_to_show:
-                base_price = base_prices.get(c, 3000)
-                variation = random.uniform(-0.15, 0.15)
-                modal_price = int(base_price * (1 + variation))
-                
-                prices.append({
-                    'crop': c,
-                    'crop_name': self.crops.get(c, {}).get(lang, c),
-                    'mandi': self.mandis[m]['name'],
-                    'mandi_local': self.mandis[m].get(lang, self.mandis[m]['name']),
-                    'state': self.mandis[m]['state'],
-                    'modal_price': modal_price,
-                    'min_price': int(modal_price * 0.9),
-                    'max_price': int(modal_price * 1.1),
-                    'arrival': random.randint(100, 500),  # quintals
-                    'unit': 'quintal',
-                    'date': datetime.now().date(),
-                    'price_change': random.uniform(-5, 8),  # % change
-                    'trend': random.choice(['up', 'down', 'stable'])
-                })
-        
-        return prices
-    
-    def _generate_price_trends(self, crop, mandi, days, lang):
-        """Generate historical price trends"""
-        import random
-        
-        trends = []
-        base_prices = {
-            'rice': 2200,
-            'cotton': 6800,
-            'chili': 8500,
-            'turmeric': 7200,
-            'maize': 1800,
-            'groundnut': 5500,
-            'soybean': 4200,
-            'tomato': 1200,
-            'onion': 1500,
-            'potato': 1000
-        }
-        
-        base_price = base_prices.get(crop, 3000)
-        
-        for i in range(days):
-            date = datetime.now().date() - timedelta(days=days-i-1)
-            # Add some realistic variation
-            daily_variation = random.uniform(-0.03, 0.03)
-            price = int(base_price * (1 + daily_variation * i/10))
-            
-            trends.append({
-                'date': date.isoformat(),
-                'price': price,
-                'min_price': int(price * 0.95),
-                'max_price': int(price * 1.05),
-                'arrival': random.randint(100, 500)
-            })
-        
-        return trends
-    
-    def _get_fallback_prices(self, mandi, crop, lang):
-        """Fallback price data"""
-        return self._generate_realistic_prices(mandi, crop, lang)
-    
-    def _get_selling_recommendation(self, rank, lang):
-        """Get selling recommendation based on rank"""
-        if lang == 'hi':
-            if rank == 0:
-                return 'सर्वोत्तम कीमत - बिक्री के लिए अनुशंसित'
-            elif rank == 1:
-                return 'अच्छी कीमत - विचार करने लायक'
-            else:
-                return 'औसत कीमत'
-        elif lang == 'te':
-            if rank == 0:
-                return 'అత్యుత్తమ ధర - అమ్మకానికి సిఫార్సు చేయబడింది'
-            elif rank == 1:
-                return 'మంచి ధర - పరిగణించదగినది'
-            else:
-                return 'సగటు ధర'
-        else:
-            if rank == 0:
-                return 'Best price - Recommended for selling'
-            elif rank == 1:
-                return 'Good price - Worth considering'
-            else:
-                return 'Average price'
-    
-    def _get_alert_message(self, alert_type, change_percent, lang):
-        """Get alert message in specified language"""
-        if lang == 'hi':
-            if alert_type == 'increase':
-                return f'कीमत में {change_percent:.1f}% की वृद्धि - बेचने का अच्छा समय'
-            else:
-                return f'कीमत में {change_percent:.1f}% की कमी - बिक्री का इंतजार करें'
-        elif lang == 'te':
-            if alert_type == 'increase':
-                return f'ధర {change_percent:.1f}% పెరిగింది - అమ్మడానికి మంచి సమయం'
-            else:
-                return f'ధర {change_percent:.1f}% తగ్గింది - అమ్మకం కోసం వేచి ఉండండి'
-        else:
-            if alert_type == 'increase':
-                return f'Price increased by {change_percent:.1f}% - Good time to sell'
-            else:
-                return f'Price decreased by {change_percent:.1f}% - Wait for better prices'
-    
-    def _get_alert_action(self, alert_type, lang):
-        """Get recommended action for alert"""
-        if lang == 'hi':
-            return 'सर्वोत्तम मूल्य के लिए बाजारों की तुलना करें' if alert_type == 'increase' else 'कीमत स्थिर होने तक प्रतीक्षा करें'
-        elif lang == 'te':
-            return 'అత్యుత్తమ ధర కోసం మార్కెట్లను పోల్చండి' if alert_type == 'increase' else 'ధర స్థిరమయ్యే వరకు వేచి ఉండండి'
-        else:
-            return 'Compare markets for best price' if alert_type == 'increase' else 'Wait for price stabilization'
-    
-    def _get_season(self, month):
-        """Determine agricultural season"""
-        if month in [6, 7, 8, 9]:
-            return 'kharif'
-        elif month in [10, 11, 12, 1, 2]:
-            return 'rabi'
-        else:
-            return 'zaid'
-    
-    def _translate(self, text, lang):
-        """Simple translation helper"""
-        translations = {
-            'Good time to plant, expect stable prices': {
-                'hi': 'रोपण का अच्छा समय, स्थिर कीमतों की उम्मीद',
-                'te': 'నాటడానికి మంచి సమయం, స్థిరమైన ధరలు అంచనా'
-            },
-            'Harvest season, prices may dip slightly': {
-                'hi': 'फसल का मौसम, कीमतें थोड़ी गिर सकती हैं',
-                'te': 'పంట కోత కాలం, ధరలు కొద్దిగా తగ్గవచ్చు'
-            }
-        }
-        
-        return translations.get(text, {}).get(lang, text)
-
-
-# Initialize price service
-price_service = MarketPriceService()
-
@@ -0,0 +1,274 @@
+"""
+Item-item product recommendations for the marketplace
+
+A nightly job (``marketplace.tasks.build_recommendation_matrix``) builds a
+sparse customer x product interaction matrix from order items and reviews,
+computes cosine similarity between product columns with SciPy and keeps the
+top-k neighbours of every product. The result is written as three NumPy
+arrays that request handlers memory-map, so a lookup is a binary search for
+the product followed by reading k neighbours:
+
+* ``product_ids.npy``: sorted product ids (int64, n)
+* ``neighbors.npy``: row indices of each product's neighbours (int32, n x k, -1 padded)
+* ``scores.npy``: matching similarity scores (float32, n x k)
+
+Users without history fall back to products for their profile crop, then to
+best sellers in their state, then to featured products.
+"""
+
+import logging
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Sum
+
+from .models import OrderItem, Product, Review
+
+logger = logging.getLogger(__name__)
+
+TOP_K = 20
+HISTORY_LIMIT = 20          # most recent products used to seed a user's recommendations
+RELOAD_INTERVAL = 60        # seconds between checks for a newer matrix
+PURCHASE_WEIGHT = 1.0
+REVIEW_WEIGHT = 0.5         # scaled by rating / 5; reviews below 3 stars are ignored
+CURRENT_FILE = 'CURRENT'
+
+
+def matrix_dir():
+    return Path(getattr(settings, 'RECOMMENDATION_DIR', Path(settings.BASE_DIR) / 'data' / 'recommendations'))
+
+
+# Building
+
+def load_interactions():
+    """Return (user_ids, product_ids, weights) arrays of customer-product interactions"""
+    users, products, weights = [], [], []
+    purchases = OrderItem.objects.filter(product__isnull=False).exclude(
+        order__order_status__in=['cancelled', 'refunded']
+    ).values_list('order__customer_id', 'product_id').annotate(orders=Count('order', distinct=True))
+    for user_id, product_id, orders in purchases.iterator(chunk_size=5000):
+        users.append(user_id)
+        products.append(product_id)
+        weights.append(PURCHASE_WEIGHT * np.log1p(orders))
+
+    reviews = Review.objects.filter(product__isnull=False, is_approved=True, rating__gte=3)
+    for user_id, product_id, rating in reviews.values_list('user_id', 'product_id', 'rating').iterator(chunk_size=5000):
+        users.append(user_id)
+        products.append(product_id)
+        weights.append(REVIEW_WEIGHT * rating / 5)
+
+    return (
+        np.asarray(users, dtype=np.int64),
+        np.asarray(products, dtype=np.int64),
+        np.asarray(weights, dtype=np.float32),
+    )
+
+
+def compute_neighbors(user_ids, product_ids, weights, k=TOP_K):
+    """
+    Cosine item-item similarity with top-k per product.
+
+    Returns (product_ids, neighbors, scores) in the on-disk layout.
+    """
+    from scipy import sparse
+
+    items, item_index = np.unique(product_ids, return_inverse=True)
+    _users, user_index = np.unique(user_ids, return_inverse=True)
+    n = len(items)
+    neighbors = np.full((n, k), -1, dtype=np.int32)
+    scores = np.zeros((n, k), dtype=np.float32)
+    if n == 0:
+        return items, neighbors, scores
+
+    # Duplicate (user, item) pairs are summed by the COO -> CSC conversion
+    interactions = sparse.coo_matrix(
+        (weights, (user_index, item_index)), shape=(len(_users), n)
+    ).tocsc()
+    norms = np.sqrt(np.asarray(interactions.multiply(interactions).sum(axis=0))).ravel()
+    norms[norms == 0] = 1.0
+    normalized = interactions @ sparse.diags(1.0 / norms)
+    similarity = (normalized.T @ normalized).tocsr()
+    similarity.setdiag(0)
+    similarity.eliminate_zeros()
+
+    for row in range(n):
+        start, end = similarity.indptr[row], similarity.indptr[row + 1]
+        if start == end:
+            continue
+        columns = similarity.indices[start:end]
+        values = similarity.data[start:end]
+        if len(values) > k:
+            top = np.argpartition(-values, k - 1)[:k]
+            columns, values = columns[top], values[top]
+        order = np.argsort(-values, kind='stable')
+        neighbors[row, :len(order)] = columns[order]
+        scores[row, :len(order)] = values[order]
+    return items, neighbors, scores
+
+
+def build_matrix(k=TOP_K):
+    """Rebuild the neighbour arrays and atomically switch readers to them"""
+    started = time.monotonic()
+    items, neighbors, scores = compute_neighbors(*load_interactions(), k=k)
+
+    root = matrix_dir()
+    root.mkdir(parents=True, exist_ok=True)
+    version = f"v{time.time_ns()}"
+    target = root / version
+    target.mkdir()
+    np.save(target / 'product_ids.npy', items)
+    np.save(target / 'neighbors.npy', neighbors)
+    np.save(target / 'scores.npy', scores)
+
+    pointer = root / f'{CURRENT_FILE}.tmp'
+    pointer.write_text(version)
+    os.replace(pointer, root / CURRENT_FILE)
+
+    # Keep the previous version for readers that still have it mapped
+    versions = sorted(p for p in root.iterdir() if p.is_dir() and p.name.startswith('v'))
+    for stale in versions[:-2]:
+        shutil.rmtree(stale, ignore_errors=True)
+
+    stats = {
+        'version': version,
+        'products': int(len(items)),
+        'pairs': int((neighbors >= 0).sum()),
+        'seconds': round(time.monotonic() - started, 3),
+    }
+    logger.info(f"Built recommendation matrix: {stats}")
+    return stats
+
+
+# Lookup
+
+class NeighborIndex:
+    """Memory-mapped view of the latest neighbour arrays, reloaded when a newer build appears"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._checked_at = 0.0
+        self.product_ids = self.neighbors = self.scores = None
+
+    def _refresh(self):
+        now = time.monotonic()
+        if self._version is not None and now - self._checked_at < RELOAD_INTERVAL:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                version = (matrix_dir() / CURRENT_FILE).read_text().strip()
+            except OSError:
+                return
+            if version == self._version:
+                return
+            path = matrix_dir() / version
+            try:
+                self.product_ids = np.load(path / 'product_ids.npy', mmap_mode='r')
+                self.neighbors = np.load(path / 'neighbors.npy', mmap_mode='r')
+                self.scores = np.load(path / 'scores.npy', mmap_mode='r')
+            except (OSError, ValueError) as e:
+                logger.error(f"Could not load recommendation matrix {version}: {e}")
+                return
+            self._version = version
+
+    def reset(self):
+        with self._lock:
+            self._version = None
+            self.product_ids = self.neighbors = self.scores = None
+
+    def similar(self, product_id):
+        """[(product_id, score), ...] best first; empty when the product is unknown"""
+        self._refresh()
+        if self.product_ids is None or len(self.product_ids) == 0:
+            return []
+        row = int(np.searchsorted(self.product_ids, product_id))
+        if row >= len(self.product_ids) or self.product_ids[row] != product_id:
+            return []
+        return [
+            (int(self.product_ids[column]), float(score))
+            for column, score in zip(self.neighbors[row], self.scores[row])
+            if column >= 0
+        ]
+
+
+neighbor_index = NeighborIndex()
+
+
+def _active_products(ids, limit):
+    """Active products in the order of ids"""
+    products = Product.objects.filter(pk__in=ids, is_active=True).select_related('category', 'vendor').in_bulk()
+    return [products[pk] for pk in ids if pk in products][:limit]
+
+
+def similar_products(product_id, limit=5):
+    """Products most often bought or liked together with product_id"""
+    ids = [pk for pk, _score in neighbor_index.similar(product_id)]
+    return _active_products(ids, limit)
+
+
+def _user_history(user):
+    purchased = OrderItem.objects.filter(order__customer=user, product__isnull=False).order_by(
+        '-order__order_date'
+    ).values_list('product_id', flat=True)[:HISTORY_LIMIT]
+    reviewed = Review.objects.filter(user=user, product__isnull=False).order_by(
+        '-created_at'
+    ).values_list('product_id', flat=True)[:HISTORY_LIMIT]
+    return list(dict.fromkeys([*purchased, *reviewed]))
+
+
+def _cold_start_ids(user, limit):
+    """Crop- and region-based picks for users with no history"""
+    from core.search import crop_synonyms, matching_ids
+
+    profile = getattr(user, 'profile', None) if user is not None and user.is_authenticated else None
+    ids = []
+    if profile is not None and profile.primary_crop:
+        query = profile.primary_crop
+        ids.extend(matching_ids(query, 'product', limit=limit * 2))
+        if len(ids) < limit:
+            for label in crop_synonyms(query).split():
+                ids.extend(matching_ids(label, 'product', limit=limit))
+    if profile is not None and profile.state and len(ids) < limit:
+        regional = OrderItem.objects.filter(
+            product__isnull=False, order__shipping_state__iexact=profile.state
+        ).values('product_id').annotate(sold=Sum('quantity')).order_by('-sold')[:limit * 2]
+        ids.extend(row['product_id'] for row in regional)
+    return list(dict.fromkeys(ids))
+
+
+def recommend_for_user(user, limit=5):
+    """
+    Personalized recommendations.
+
+    Neighbour scores of the user's recent purchases and reviews are summed;
+    products the user already has are skipped. Users without usable history
+    get crop/region picks, then featured best sellers.
+    """
+    history = _user_history(user) if user is not None and user.is_authenticated else []
+    ids = []
+    if history:
+        owned = set(history)
+        totals = {}
+        for product_id in history:
+            for neighbor, score in neighbor_index.similar(product_id):
+                if neighbor not in owned:
+                    totals[neighbor] = totals.get(neighbor, 0.0) + score
+        ids = sorted(totals, key=totals.get, reverse=True)
+
+    if len(ids) < limit:
+        ids.extend(pk for pk in _cold_start_ids(user, limit) if pk not in set(history) | set(ids))
+
+    products = _active_products(ids[:limit * 2], limit)
+    if len(products) < limit:
+        seen = {p.pk for p in products} | set(history)
+        fallback = Product.objects.filter(is_active=True).exclude(pk__in=seen).select_related(
+            'category', 'vendor'
+        ).order_by('-is_featured', '-sales_count')[:limit - len(products)]
+        products.extend(fallback)
+    return products
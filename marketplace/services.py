@@ -5,11 +5,18 @@ Handles market prices, product management, and order processing
 
 import requests
 import logging
+import secrets
 from datetime import datetime, timedelta
 from decimal import Decimal
 from django.core.cache import cache
 from django.conf import settings
-from .models import Product, MarketPrice, Order, Vendor
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Q, Sum, Value, When
+from django.utils import timezone
+from core.search import ranked
+from .catalogue import bump_catalogue_version
+from .models import Product, MarketPrice, Order, OrderItem, Vendor
+from .recommendations import recommend_for_user
 
 logger = logging.getLogger(__name__)
 
@@ -216,11 +223,7 @@ class ProductService:
         ).select_related('category', 'vendor')
         
         if query:
-            queryset = queryset.filter(
-                Q(name__icontains=query) |
-                Q(description__icontains=query) |
-                Q(category__name__icontains=query)
-            )
+            queryset = ranked(queryset, query, 'product')
         
         if category:
             queryset = queryset.filter(category__name__icontains=category)
@@ -231,69 +234,184 @@ class ProductService:
         if max_price:
             queryset = queryset.filter(price__lte=max_price)
         
+        if query:
+            return queryset.order_by('-search_rank', '-created_at')
         return queryset.order_by('-created_at')
     
     def get_product_recommendations(self, user, limit=5):
-        """Get personalized product recommendations"""
-        # Simple recommendation based on common farming needs
+        """Get personalized product recommendations (see marketplace.recommendations)"""
         try:
-            return Product.objects.filter(
-                category__name__in=['Seeds', 'Fertilizers', 'Pesticides'],
-                is_active=True
-            ).select_related('category', 'vendor')[:limit]
-        except:
-            pass
+            return recommend_for_user(user, limit=limit)
+        except Exception as e:
+            logger.error(f"Error getting recommendations: {e}")
         
         # Fallback to featured products
         return self.get_featured_products(limit)
 
 
+class OrderError(Exception):
+    """Order could not be placed"""
+
+
+class InsufficientStockError(OrderError):
+    """One or more products do not have enough stock for the requested quantity"""
+
+    def __init__(self, product_ids):
+        self.product_ids = sorted(product_ids)
+        super().__init__(f"Insufficient stock for products: {self.product_ids}")
+
+
 class OrderService:
     """Service for managing orders"""
     
-    def create_order(self, user, items, shipping_address):
-        """Create a new order"""
+    @staticmethod
+    def _quantities(items):
+        """Merge order lines into {product_id: quantity}"""
+        quantities = {}
+        for item in items:
+            quantity = int(item['quantity'])
+            if quantity <= 0:
+                raise OrderError(f"Invalid quantity {quantity} for product {item['product_id']}")
+            product_id = int(item['product_id'])
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+        if not quantities:
+            raise OrderError("Order has no items")
+        return quantities
+    
+    @staticmethod
+    def _per_product(quantities):
+        """CASE expression mapping each product id to its quantity"""
+        return Case(
+            *[When(pk=pk, then=Value(quantity)) for pk, quantity in quantities.items()],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    
+    @staticmethod
+    def _order_number():
+        return f"FZ{timezone.now():%y%m%d}{secrets.token_hex(5).upper()}"
+    
+    def create_order(self, user, items, shipping_address, shipping_city='', shipping_state='',
+                     shipping_pincode='', shipping_phone='', payment_method=None):
+        """
+        Place an order, reserving stock for every line atomically.
+        
+        Products are loaded and row-locked in one query ordered by id (so
+        concurrent checkouts lock in the same order and cannot deadlock), stock
+        is reserved with a single conditional UPDATE and order items are
+        written with one bulk insert, all inside one transaction.
+        
+        Args:
+            user: Customer placing the order
+            items: Iterable of {'product_id': int, 'quantity': int}
+            shipping_address: Street address
+        
+        Returns:
+            Order: The placed order, or None on unexpected errors
+        
+        Raises:
+            InsufficientStockError: When any product cannot cover its quantity
+            OrderError: When items are invalid or products are unavailable
+        """
         try:
-            order = Order.objects.create(
-                user=user,
-                shipping_address=shipping_address,
-                status='pending'
-            )
+            quantities = self._quantities(items)
             
-            total_amount = 0
-            for item in items:
-                product = Product.objects.get(id=item['product_id'])
-                quantity = item['quantity']
+            with transaction.atomic():
+                products = {
+                    product.pk: product
+                    for product in Product.objects.select_for_update().filter(
+                        pk__in=quantities, is_active=True
+                    ).order_by('pk')
+                }
+                unavailable = set(quantities) - set(products)
+                if unavailable:
+                    raise OrderError(f"Products not available: {sorted(unavailable)}")
+                
+                short = [pk for pk, quantity in quantities.items() if products[pk].stock_quantity < quantity]
+                if short:
+                    raise InsufficientStockError(short)
                 
-                order_item = order.items.create(
-                    product=product,
-                    quantity=quantity,
-                    price=product.price
+                # The stock condition is re-checked by the UPDATE itself, which
+                # keeps the reservation safe on backends without row locks
+                in_stock = Q()
+                for pk, quantity in quantities.items():
+                    in_stock |= Q(pk=pk, stock_quantity__gte=quantity)
+                reserved = Product.objects.filter(in_stock).update(
+                    stock_quantity=F('stock_quantity') - self._per_product(quantities),
+                    sales_count=F('sales_count') + self._per_product(quantities),
                 )
-                total_amount += product.price * quantity
-            
-            order.total_amount = total_amount
-            order.save()
+                if reserved != len(quantities):
+                    current = Product.objects.filter(pk__in=quantities).values_list('pk', 'stock_quantity')
+                    raise InsufficientStockError(pk for pk, stock in current if stock < quantities[pk])
+                
+                lines = [
+                    (products[pk], quantity, products[pk].current_price)
+                    for pk, quantity in quantities.items()
+                ]
+                total_amount = sum((price * quantity for _product, quantity, price in lines), Decimal('0'))
+                order = Order.objects.create(
+                    customer=user,
+                    order_number=self._order_number(),
+                    total_amount=total_amount,
+                    final_amount=total_amount,
+                    shipping_address=shipping_address,
+                    shipping_city=shipping_city,
+                    shipping_state=shipping_state,
+                    shipping_pincode=shipping_pincode,
+                    shipping_phone=shipping_phone,
+                    payment_method=payment_method,
+                )
+                OrderItem.objects.bulk_create([
+                    OrderItem(
+                        order=order,
+                        product=product,
+                        quantity=quantity,
+                        unit_price=price,
+                        total_price=price * quantity,
+                    )
+                    for product, quantity, price in lines
+                ])
+                # Cached grids only go stale where availability changes;
+                # their stock counts may lag for up to FRAGMENT_TTL
+                if any(products[pk].stock_quantity == quantity for pk, quantity in quantities.items()):
+                    transaction.on_commit(bump_catalogue_version)
             
             return order
             
+        except OrderError:
+            raise
         except Exception as e:
             logger.error(f"Error creating order: {e}")
             return None
     
     def get_user_orders(self, user):
         """Get all orders for a user"""
-        return Order.objects.filter(user=user).order_by('-created_at')
+        return Order.objects.filter(customer=user).order_by('-order_date')
     
     def update_order_status(self, order_id, status):
-        """Update order status"""
-        try:
-            order = Order.objects.get(id=order_id)
-            order.status = status
-            order.save()
-            return True
-        except Order.DoesNotExist:
-            return False
+        """Update order status; cancelling an order returns its stock"""
+        with transaction.atomic():
+            try:
+                order = Order.objects.select_for_update().get(id=order_id)
+            except Order.DoesNotExist:
+                return False
+            
+            if status == 'cancelled' and order.order_status != 'cancelled':
+                quantities = dict(
+                    order.items.filter(product__isnull=False).values_list('product_id').annotate(Sum('quantity'))
+                )
+                if quantities:
+                    restocked = Product.objects.filter(pk__in=quantities, stock_quantity__lte=0).exists()
+                    Product.objects.filter(pk__in=quantities).update(
+                        stock_quantity=F('stock_quantity') + self._per_product(quantities),
+                        sales_count=F('sales_count') - self._per_product(quantities),
+                    )
+                    if restocked:
+                        transaction.on_commit(bump_catalogue_version)
+            
+            order.order_status = status
+            order.save(update_fields=['order_status'])
+        return True
 
 
 # Initialize services
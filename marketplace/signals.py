@@ -0,0 +1,25 @@
+"""
+Signal handlers for the marketplace app
+
+Any change to listed items, their images, categories or vendors bumps the
+catalogue version so cached listing fragments and facets are rebuilt.
+"""
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .catalogue import bump_catalogue_version
+from .models import Input, InputCategory, InputImage, Product, ProductCategory, ProductImage, Vendor
+
+CATALOGUE_MODELS = (Product, ProductImage, ProductCategory, Vendor, Input, InputImage, InputCategory)
+
+
+def _catalogue_changed(sender, raw=False, **kwargs):
+    if raw:
+        return
+    transaction.on_commit(bump_catalogue_version)
+
+
+for _model in CATALOGUE_MODELS:
+    post_save.connect(_catalogue_changed, sender=_model, dispatch_uid=f'catalogue_save_{_model.__name__}')
+    post_delete.connect(_catalogue_changed, sender=_model, dispatch_uid=f'catalogue_delete_{_model.__name__}')
@@ -0,0 +1,26 @@
+"""
+Celery tasks for the marketplace app
+"""
+
+import logging
+
+from celery import shared_task
+
+from .recommendations import build_matrix
+
+logger = logging.getLogger(__name__)
+
+
+@shared_task(bind=True, name='marketplace.tasks.build_recommendation_matrix')
+def build_recommendation_matrix(self, k=20):
+    """
+    Rebuild the item-item recommendation matrix from order and review history.
+    
+    Args:
+        k: Neighbours kept per product
+    """
+    try:
+        return build_matrix(k=k)
+    except Exception as exc:
+        logger.error(f"Error building recommendation matrix: {exc}")
+        raise self.retry(exc=exc, countdown=600, max_retries=2)
@@ -0,0 +1,256 @@
+"""
+Tests for marketplace catalogue listings, orders and recommendations
+"""
+
+import shutil
+import tempfile
+from decimal import Decimal
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from core.models import UserProfile
+from core.pagination import KeysetPage
+
+from . import catalogue, recommendations
+from .models import Order, OrderItem, Product, ProductCategory, ProductImage, Vendor
+from .services import InsufficientStockError, order_service
+
+
+class CatalogueListingTestCase(TestCase):
+    """Test cases for keyset-paginated, fragment-cached listings"""
+
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(username='vendor', password='testpass123')
+        self.vendor = Vendor.objects.create(
+            user=user, business_name='Green Agro', business_description='Seeds',
+            phone_number='9999999999', address='Main road', city='Guntur',
+            state='Andhra Pradesh', pincode='522001',
+        )
+        self.category = ProductCategory.objects.create(name='Seeds')
+
+    def create_products(self, count, start=0):
+        products = []
+        for n in range(start, start + count):
+            product = Product.objects.create(
+                vendor=self.vendor, category=self.category, name=f'Product {n:03d}',
+                description='Hybrid seed', price=Decimal(100 + n % 7),
+                is_organic=n % 2 == 0, is_certified=n % 3 == 0,
+            )
+            ProductImage.objects.create(product=product, image=f'products/{n}.jpg', order=1)
+            ProductImage.objects.create(product=product, image=f'products/{n}-main.jpg', is_primary=True)
+            products.append(product)
+        return products
+
+    def test_keyset_pages_cover_every_product_once(self):
+        products = self.create_products(30)
+        queryset = Product.objects.filter(is_active=True)
+
+        for sort in catalogue.SORT_OPTIONS:
+            with self.subTest(sort=sort):
+                seen, cursor = [], None
+                while True:
+                    page = KeysetPage(queryset, catalogue.SORT_OPTIONS, sort=sort, cursor=cursor, per_page=7)
+                    seen.extend(p.pk for p in page)
+                    if not page.has_next:
+                        break
+                    cursor = page.next_cursor
+                self.assertEqual(sorted(seen), sorted(p.pk for p in products))
+                self.assertEqual(len(seen), len(set(seen)))
+
+    def test_primary_image_is_attached(self):
+        self.create_products(3)
+        page = KeysetPage(
+            Product.objects.all(), catalogue.SORT_OPTIONS,
+            attach=lambda items: catalogue.attach_first_images(items, ProductImage, 'product'),
+        )
+        self.assertTrue(all(p.primary_image.image.name.endswith('-main.jpg') for p in page))
+
+    def test_facets_in_one_query(self):
+        self.create_products(6)
+        with self.assertNumQueries(1):
+            facets = catalogue.compute_facets(Product.objects.all())
+        self.assertEqual(facets['total'], 6)
+        self.assertEqual(facets['organic'], 3)
+        self.assertEqual(facets['certified'], 2)
+        self.assertEqual(facets['min_price'], Decimal('100'))
+
+    def test_listing_query_count_is_constant(self):
+        url = reverse('marketplace:products')
+        self.client.get(url)
+        self.create_products(3)
+        cache.clear()
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url)
+        cache.clear()
+        self.create_products(40, start=3)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(small), len(large))
+        self.assertLessEqual(len(large), 6)
+        self.assertContains(response, 'cursor=')
+
+    def test_cached_fragment_is_invalidated_on_change(self):
+        url = reverse('marketplace:products')
+        product = self.create_products(1)[0]
+        first = self.client.get(url)
+        self.assertContains(first, 'Product 000')
+
+        with CaptureQueriesContext(connection) as cached:
+            self.client.get(url)
+        self.assertFalse(any('marketplace_productimage' in q['sql'] for q in cached.captured_queries))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            product.name = 'Renamed Seed'
+            product.save()
+        self.assertContains(self.client.get(url), 'Renamed Seed')
+
+    def test_category_inputs_and_vendor_pages_render(self):
+        self.create_products(2)
+        self.assertEqual(self.client.get(reverse('marketplace:category_products', args=[self.category.pk])).status_code, 200)
+        self.assertEqual(self.client.get(reverse('marketplace:inputs'), {'sort': 'price', 'organic': '1'}).status_code, 200)
+        self.client.login(username='vendor', password='testpass123')
+        self.assertContains(self.client.get(reverse('marketplace:vendor_dashboard')), 'Product 001')
+
+
+class OrderServiceTestCase(TestCase):
+    """Test cases for stock-reserving order placement"""
+
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create_user(username='farmer', password='testpass123')
+        vendor_user = User.objects.create_user(username='vendor', password='testpass123')
+        vendor = Vendor.objects.create(
+            user=vendor_user, business_name='Green Agro', business_description='Seeds',
+            phone_number='9999999999', address='Main road', city='Guntur',
+            state='Andhra Pradesh', pincode='522001',
+        )
+        category = ProductCategory.objects.create(name='Seeds')
+        self.seed = Product.objects.create(
+            vendor=vendor, category=category, name='Paddy seed', description='-',
+            price=Decimal('50.00'), sale_price=Decimal('45.00'), stock_quantity=10,
+        )
+        self.urea = Product.objects.create(
+            vendor=vendor, category=category, name='Urea', description='-',
+            price=Decimal('300.00'), stock_quantity=2,
+        )
+
+    def test_order_reserves_stock_in_constant_queries(self):
+        items = [
+            {'product_id': self.seed.pk, 'quantity': 3},
+            {'product_id': self.urea.pk, 'quantity': 2},
+            {'product_id': self.seed.pk, 'quantity': 1},
+        ]
+        with self.assertNumQueries(6):
+            order = order_service.create_order(self.customer, items, 'Village road')
+
+        self.assertEqual(order.customer, self.customer)
+        self.assertEqual(order.final_amount, Decimal('780.00'))
+        self.assertEqual(order.items.count(), 2)
+        self.seed.refresh_from_db()
+        self.urea.refresh_from_db()
+        self.assertEqual((self.seed.stock_quantity, self.seed.sales_count), (6, 4))
+        self.assertEqual(self.urea.stock_quantity, 0)
+
+    def test_insufficient_stock_rolls_back_everything(self):
+        items = [{'product_id': self.seed.pk, 'quantity': 1}, {'product_id': self.urea.pk, 'quantity': 3}]
+        with self.assertRaises(InsufficientStockError) as raised:
+            order_service.create_order(self.customer, items, 'Village road')
+
+        self.assertEqual(raised.exception.product_ids, [self.urea.pk])
+        self.seed.refresh_from_db()
+        self.assertEqual(self.seed.stock_quantity, 10)
+        self.assertFalse(Order.objects.exists())
+
+    def test_cancelling_returns_stock(self):
+        order = order_service.create_order(self.customer, [{'product_id': self.urea.pk, 'quantity': 2}], '-')
+        self.assertTrue(order_service.update_order_status(order.pk, 'cancelled'))
+        self.urea.refresh_from_db()
+        self.assertEqual((self.urea.stock_quantity, self.urea.sales_count), (2, 0))
+
+    def test_catalogue_is_invalidated_only_when_availability_changes(self):
+        version = catalogue.catalogue_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            order_service.create_order(self.customer, [{'product_id': self.seed.pk, 'quantity': 1}], '-')
+        self.assertEqual(catalogue.catalogue_version(), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order = order_service.create_order(self.customer, [{'product_id': self.urea.pk, 'quantity': 2}], '-')
+        self.assertEqual(catalogue.catalogue_version(), version + 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            order_service.update_order_status(order.pk, 'cancelled')
+        self.assertEqual(catalogue.catalogue_version(), version + 2)
+
+
+class RecommendationTestCase(TestCase):
+    """Test cases for the item-item recommendation matrix"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        override = override_settings(RECOMMENDATION_DIR=Path(self.tmp))
+        override.enable()
+        self.addCleanup(override.disable)
+        recommendations.neighbor_index.reset()
+
+        vendor_user = User.objects.create_user(username='vendor')
+        vendor = Vendor.objects.create(
+            user=vendor_user, business_name='Green Agro', business_description='-',
+            phone_number='0', address='-', city='Guntur', state='Andhra Pradesh', pincode='0',
+        )
+        category = ProductCategory.objects.create(name='Inputs')
+        self.products = {
+            name: Product.objects.create(
+                vendor=vendor, category=category, name=name, description='-', price=Decimal('10'),
+            )
+            for name in ('Paddy seed', 'Urea', 'Neem oil', 'Cotton seed', 'Pink bollworm trap')
+        }
+
+    def buy(self, user, *names):
+        order = Order.objects.create(
+            customer=user, order_number=f'T{Order.objects.count()}', total_amount=0, final_amount=0,
+        )
+        for name in names:
+            OrderItem.objects.create(
+                order=order, product=self.products[name], quantity=1, unit_price=10, total_price=10,
+            )
+
+    def test_co_purchased_products_are_neighbors(self):
+        for n in range(3):
+            self.buy(User.objects.create_user(username=f'paddy{n}'), 'Paddy seed', 'Urea')
+        self.buy(User.objects.create_user(username='cotton'), 'Cotton seed', 'Pink bollworm trap')
+
+        stats = recommendations.build_matrix(k=3)
+        self.assertEqual(stats['products'], 4)
+        similar = recommendations.similar_products(self.products['Paddy seed'].pk)
+        self.assertEqual([p.name for p in similar], ['Urea'])
+
+    def test_user_recommendations_skip_owned_products(self):
+        farmer = User.objects.create_user(username='farmer')
+        self.buy(farmer, 'Cotton seed')
+        for n in range(2):
+            self.buy(User.objects.create_user(username=f'cotton{n}'), 'Cotton seed', 'Pink bollworm trap')
+        recommendations.build_matrix()
+
+        picks = recommendations.recommend_for_user(farmer, limit=2)
+        self.assertEqual(picks[0].name, 'Pink bollworm trap')
+        self.assertNotIn(self.products['Cotton seed'], picks)
+
+    def test_cold_start_uses_profile_crop(self):
+        farmer = User.objects.create_user(username='newfarmer')
+        UserProfile.objects.update_or_create(user=farmer, defaults={'primary_crop': 'cotton'})
+        with self.captureOnCommitCallbacks(execute=True):
+            for product in self.products.values():
+                product.save()
+        recommendations.build_matrix()
+
+        picks = recommendations.recommend_for_user(farmer, limit=1)
+        self.assertEqual(picks[0].name, 'Cotton seed')
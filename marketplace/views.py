@@ -1,7 +1,16 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from .models import Product, ProductCategory, Order, OrderItem, Vendor, Input, InputCategory
+from django.db.models import Q
+from django.utils.http import urlencode
+from core.pagination import KeysetPage
+from core.search import matching_queryset
+from core.view_counter import record_view
+from . import catalogue
+from .models import (
+    Product, ProductCategory, ProductImage, Order, OrderItem, Vendor,
+    Input, InputCategory, InputImage,
+)
 
 
 def marketplace_home(request):
@@ -15,16 +24,54 @@ def marketplace_home(request):
     return render(request, 'marketplace/home.html', context)
 
 
+def _listing_context(request, name, queryset, image_model, fk_name, filters):
+    """Keyset page, facets and fragment cache key shared by the listing views"""
+    sort = request.GET.get('sort', catalogue.DEFAULT_SORT)
+    cursor = request.GET.get('cursor')
+    page = KeysetPage(
+        catalogue.apply_filters(queryset, filters),
+        catalogue.SORT_OPTIONS,
+        sort=sort,
+        cursor=cursor,
+        per_page=catalogue.PAGE_SIZE,
+        attach=lambda items: catalogue.attach_first_images(items, image_model, fk_name),
+    )
+    base = catalogue.apply_filters(queryset, filters, facet_filters=False)
+    params = {k: v for k, v in request.GET.items() if k != 'cursor'}
+    return {
+        'page': page,
+        'facets': catalogue.cached_facets(name, base, catalogue.listing_key(filters['search'], filters['category'])),
+        'filters': filters,
+        'sort': page.sort,
+        'sort_options': [(key, label) for key, (_field, label) in catalogue.SORT_OPTIONS.items()],
+        'base_query': urlencode(params),
+        'catalogue_version': catalogue.catalogue_version(),
+        'fragment_key': catalogue.listing_key(name, filters, page.sort, cursor),
+        'fragment_ttl': catalogue.FRAGMENT_TTL,
+    }
+
+
+def _product_listing(request, filters):
+    queryset = Product.objects.filter(is_active=True).select_related('vendor', 'category')
+    if filters['search']:
+        queryset = queryset.filter(pk__in=matching_queryset(filters['search'], 'product'))
+    context = _listing_context(request, 'products', queryset, ProductImage, 'product', filters)
+    context['products'] = context['page']
+    context['categories'] = ProductCategory.objects.filter(is_active=True)
+    return context
+
+
 def product_list(request):
-    """List all products"""
-    products = Product.objects.filter(is_active=True)
-    context = {'products': products}
+    """List products: keyset-paginated, faceted and fragment-cached"""
+    filters = catalogue.listing_filters(request.GET)
+    context = _product_listing(request, filters)
     return render(request, 'marketplace/products.html', context)
 
 
 def product_detail(request, pk):
     """Product detail view"""
     product = get_object_or_404(Product, pk=pk, is_active=True)
+    record_view(request, product)
     context = {'product': product}
     return render(request, 'marketplace/product_detail.html', context)
 
@@ -32,9 +79,11 @@ def product_detail(request, pk):
 def category_products(request, pk):
     """Products by category"""
     category = get_object_or_404(ProductCategory, pk=pk, is_active=True)
-    products = category.products.filter(is_active=True)
-    context = {'category': category, 'products': products}
-    return render(request, 'marketplace/category_products.html', context)
+    filters = catalogue.listing_filters(request.GET)
+    filters['category'] = str(category.pk)
+    context = _product_listing(request, filters)
+    context['category'] = category
+    return render(request, 'marketplace/products.html', context)
 
 
 @login_required
@@ -61,22 +110,44 @@ def vendor_dashboard(request):
         return redirect('marketplace:home')
     
     vendor = request.user.vendor_profile
-    products = vendor.products.all()
-    context = {'vendor': vendor, 'products': products}
+    products = KeysetPage(
+        vendor.products.select_related('category'),
+        catalogue.SORT_OPTIONS,
+        sort=request.GET.get('sort', catalogue.DEFAULT_SORT),
+        cursor=request.GET.get('cursor'),
+        per_page=catalogue.PAGE_SIZE,
+        attach=lambda items: catalogue.attach_first_images(items, ProductImage, 'product'),
+    )
+    context = {
+        'vendor': vendor,
+        'products': products,
+        'facets': catalogue.compute_facets(vendor.products.all()),
+    }
     return render(request, 'marketplace/vendor_dashboard.html', context)
 
 
+def _input_listing(request, filters):
+    queryset = Input.objects.filter(is_active=True).select_related('vendor', 'category')
+    if filters['search']:
+        queryset = queryset.filter(
+            Q(name__icontains=filters['search']) | Q(brand__icontains=filters['search'])
+        )
+    context = _listing_context(request, 'inputs', queryset, InputImage, 'input_item', filters)
+    context['inputs'] = context['page']
+    context['categories'] = InputCategory.objects.filter(is_active=True)
+    return context
+
+
 def input_list(request):
-    """List all farming inputs"""
-    inputs = Input.objects.filter(is_active=True)
-    categories = InputCategory.objects.filter(is_active=True)
-    context = {'inputs': inputs, 'categories': categories}
+    """List farming inputs: keyset-paginated, faceted and fragment-cached"""
+    context = _input_listing(request, catalogue.listing_filters(request.GET))
     return render(request, 'marketplace/inputs.html', context)
 
 
 def input_detail(request, pk):
     """Input detail view"""
     input_item = get_object_or_404(Input, pk=pk, is_active=True)
+    record_view(request, input_item)
     context = {'input_item': input_item}
     return render(request, 'marketplace/input_detail.html', context)
 
@@ -84,6 +155,8 @@ def input_detail(request, pk):
 def input_category(request, pk):
     """Inputs by category"""
     category = get_object_or_404(InputCategory, pk=pk, is_active=True)
-    inputs = category.inputs.filter(is_active=True)
-    context = {'category': category, 'inputs': inputs}
-    return render(request, 'marketplace/input_category.html', context)
+    filters = catalogue.listing_filters(request.GET)
+    filters['category'] = str(category.pk)
+    context = _input_listing(request, filters)
+    context['category'] = category
+    return render(request, 'marketplace/inputs.html', context)
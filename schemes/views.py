@@ -1,6 +1,8 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from core.search import ranked
+from core.view_counter import record_view
 from .models import GovernmentScheme, SchemeApplication
 
 
@@ -15,7 +17,7 @@ def scheme_list(request):
     state = request.GET.get('state', '')
     
     if search:
-        schemes = schemes.filter(name__icontains=search) | schemes.filter(description__icontains=search)
+        schemes = ranked(schemes, search, 'scheme').order_by('-search_rank', '-created_at')
     
     if category:
         schemes = schemes.filter(category=category)
@@ -36,6 +38,7 @@ def scheme_list(request):
 def scheme_detail(request, pk):
     """Scheme detail view"""
     scheme = get_object_or_404(GovernmentScheme, pk=pk, is_active=True)
+    record_view(request, scheme)
     context = {'scheme': scheme}
     return render(request, 'schemes/detail.html', context)
 
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='airqualitydata',
+            index=models.Index(fields=['recorded_at'], name='air_quality_recorded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='rainfalldata',
+            index=models.Index(fields=['recorded_at'], name='rainfall_recorded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='soilmoisturedata',
+            index=models.Index(fields=['recorded_at'], name='soil_moisture_recorded_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='weatherdata',
+            index=models.Index(fields=['recorded_at'], name='weather_data_recorded_idx'),
+        ),
+    ]
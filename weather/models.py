@@ -27,6 +27,9 @@ class WeatherData(models.Model):
         verbose_name = _('Weather Data')
         verbose_name_plural = _('Weather Data')
         ordering = ['-recorded_at']
+        indexes = [
+            models.Index(fields=['recorded_at'], name='weather_data_recorded_idx'),
+        ]
     
     def __str__(self):
         return f"{self.location} - {self.temperature}°C - {self.description}"
@@ -107,6 +110,9 @@ class SoilMoistureData(models.Model):
     
     class Meta:
         ordering = ['-recorded_at']
+        indexes = [
+            models.Index(fields=['recorded_at'], name='soil_moisture_recorded_idx'),
+        ]
     
     def __str__(self):
         return f"{self.location} - {self.soil_moisture}% moisture at {self.depth}cm"
@@ -127,6 +133,9 @@ class AirQualityData(models.Model):
     
     class Meta:
         ordering = ['-recorded_at']
+        indexes = [
+            models.Index(fields=['recorded_at'], name='air_quality_recorded_idx'),
+        ]
     
     def __str__(self):
         return f"{self.location} - AQI: {self.aqi}"
@@ -144,6 +153,9 @@ class RainfallData(models.Model):
     
     class Meta:
         ordering = ['-recorded_at']
+        indexes = [
+            models.Index(fields=['recorded_at'], name='rainfall_recorded_idx'),
+        ]
     
     def __str__(self):
         return f"{self.location} - {self.rainfall_amount}mm in {self.duration}min"